@@ -0,0 +1,592 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+零延迟趋势策略回测 - 用NumPy向量化复现 zero_lag_strategy_webhook.pine 的信号和交易
+
+策略逻辑原来只能在TradingView中回测。本模块按Pine脚本的语义在OHLCV数组上计算：
+    zlema      = ta.ema(close + (close - close[lag]), length)，lag = floor((length - 1) / 2)
+    volatility = ta.highest(ta.atr(length), length * 3) * mult
+    trend      收盘价上穿 zlema + volatility 转为1，下穿 zlema - volatility 转为-1，否则保持
+    多时间框架 request.security(..., trend)（lookahead_off：高级别K线收盘后才生效），
+               前3个时间框架同向时才开仓
+    开仓       trend 上穿/下穿0，下一根K线开盘价成交（反手时先平仓）
+    止损止盈   持仓期间每根K线按收盘价重新挂出 stop/limit，在下一根K线内触发
+
+功能特点：
+1. 指标全部向量化：EMA/RMA 分块递推（块内用累积和计算），滚动最大值用分块前缀/后缀最大值（O(n)），
+   趋势状态由穿越事件前向填充得到，多时间框架用 reduceat 重采样、searchsorted 对齐
+2. 只有持仓状态（开仓、止损止盈、反手）按信号逐个处理，每笔交易用 searchsorted
+   在预先计算的触发位置中查找出场K线，与K线数量无关
+3. 成交规则与TradingView回测一致：市价单下一根开盘成交；止损/止盈跳空时按开盘价成交；
+   同一根K线内都触发时按"开盘价离最高价近则先到最高价"判断先后
+4. 仓位按权益百分比（default_qty_value=100）计算，手续费按成交额百分比（0.1%）
+5. 多个交易对可以用多进程并行回测（--jobs）
+
+使用方法：
+    python backtest.py data/BTC-USDT-SWAP-1m.csv data/ETH-USDT-SWAP-1m.npz --jobs 4
+    python backtest.py --synthetic 1051200            # 两年1分钟随机行情，测试回测速度
+    python backtest.py data/*.csv --no-mtf --length 50 --mult 1.5 --output backtest.json
+
+数据文件：CSV（表头包含 ts/open/high/low/close，可选 volume，时间戳为毫秒或秒）
+或 .npz（键 ts/open/high/low/close/volume）；--cache 把读取的CSV另存为 .npz 加快下次读取。
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from candle_aggregator import MINUTE_MS, timeframe_ms
+
+logger = logging.getLogger(__name__)
+
+# CSV表头的可接受列名
+COLUMN_NAMES = {
+    'ts': ('ts', 'timestamp', 'time', 'open_time', 'datetime'),
+    'open': ('open', 'o'),
+    'high': ('high', 'h'),
+    'low': ('low', 'l'),
+    'close': ('close', 'c'),
+    'volume': ('volume', 'vol', 'v'),
+}
+
+# EMA分块递推时块内的最大放大倍数（(1-alpha)^-block），保证累积和不损失精度
+_EMA_BLOCK_EXPONENT = 30.0
+
+
+# ===== 数据 =====
+
+class Bars:
+    """一个交易对的K线数组（时间戳为毫秒，按时间递增）"""
+
+    __slots__ = ('symbol', 'ts', 'open', 'high', 'low', 'close', 'volume', 'interval')
+
+    def __init__(self, ts, open, high, low, close, volume=None, symbol='', interval=None):
+        self.symbol = symbol
+        self.ts = np.asarray(ts, dtype=np.int64)
+        self.open = np.asarray(open, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.float64) if volume is not None else np.zeros(len(self.ts))
+        if interval is None:
+            # 按最常见的时间间隔推断K线周期（数据中可能有缺失的K线）
+            gaps = np.diff(self.ts[:10001])
+            interval = int(np.median(gaps)) if len(gaps) else MINUTE_MS
+        self.interval = interval
+
+    def __len__(self):
+        return len(self.ts)
+
+    def resample(self, period_ms, offset_ms=0):
+        """
+        合成高级别K线，返回 (Bars, 各K线的收盘时间)
+        按 (ts - offset) // period 分组，period 不大于当前周期时返回自身
+        """
+        if period_ms <= self.interval:
+            return self, self.ts + self.interval
+        buckets = (self.ts - offset_ms) // period_ms
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        ends = np.concatenate((starts[1:], [len(self.ts)])) - 1
+        bars = Bars(
+            self.ts[starts],
+            self.open[starts],
+            np.maximum.reduceat(self.high, starts),
+            np.minimum.reduceat(self.low, starts),
+            self.close[ends],
+            np.add.reduceat(self.volume, starts),
+            symbol=self.symbol,
+            interval=period_ms
+        )
+        return bars, (buckets[starts] + 1) * period_ms + offset_ms
+
+
+def load_bars(path, cache=False):
+    """读取CSV或.npz格式的K线文件"""
+    symbol = os.path.basename(path).split('.')[0]
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return Bars(data['ts'], data['open'], data['high'], data['low'], data['close'],
+                        data['volume'] if 'volume' in data else None, symbol=symbol)
+
+    with open(path, 'r', encoding='utf-8') as f:
+        header = [name.strip().lower() for name in f.readline().split(',')]
+    columns = {}
+    for field, names in COLUMN_NAMES.items():
+        for name in names:
+            if name in header:
+                columns[field] = header.index(name)
+                break
+    missing = [field for field in ('ts', 'open', 'high', 'low', 'close') if field not in columns]
+    if missing:
+        raise ValueError(f"{path} 缺少列: {missing}（表头: {header}）")
+
+    fields = list(columns)
+    data = np.loadtxt(path, delimiter=',', skiprows=1, usecols=[columns[field] for field in fields], ndmin=2)
+    values = dict(zip(fields, data.T))
+    ts = values['ts']
+    if len(ts) and ts.max() < 1e11:
+        ts = ts * 1000   # 秒级时间戳
+    order = np.argsort(ts, kind='stable')
+    bars = Bars(ts[order], values['open'][order], values['high'][order], values['low'][order],
+                values['close'][order], values['volume'][order] if 'volume' in values else None, symbol=symbol)
+    if cache:
+        np.savez(os.path.splitext(path)[0] + '.npz', ts=bars.ts, open=bars.open, high=bars.high,
+                 low=bars.low, close=bars.close, volume=bars.volume)
+    return bars
+
+
+def synthetic_bars(count, interval=MINUTE_MS, price=30000.0, volatility=0.0008, seed=None, symbol='SYNTHETIC'):
+    """随机游走K线（测试回测速度用）"""
+    rng = np.random.default_rng(seed)
+    # 加入缓慢变化的漂移，产生趋势段
+    drift = np.repeat(rng.normal(0, volatility / 40, count // 1440 + 1), 1440)[:count]
+    returns = rng.normal(0, volatility, count) + drift
+    close = price * np.exp(np.cumsum(returns))
+    open = np.concatenate(([price], close[:-1]))
+    spread = np.abs(rng.normal(0, volatility / 2, count)) * close
+    high = np.maximum(open, close) + spread
+    low = np.minimum(open, close) - spread
+    ts = 1577836800000 + np.arange(count, dtype=np.int64) * interval
+    return Bars(ts, open, high, low, close, rng.uniform(1, 100, count), symbol=symbol, interval=interval)
+
+
+# ===== 指标（与Pine内置函数语义相同）=====
+
+def ema(values, length, alpha=None):
+    """
+    ta.ema（alpha=2/(length+1)）/ ta.rma（alpha=1/length）
+    第一个有效值为前 length 个非na值的简单平均，之后 y[t] = alpha * x[t] + (1 - alpha) * y[t-1]
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    result = np.full(n, np.nan)
+    alpha = 2.0 / (length + 1) if alpha is None else alpha
+    valid = np.flatnonzero(~np.isnan(values))
+    if not len(valid) or valid[0] + length > n:
+        return result
+    seed_index = valid[0] + length - 1
+    result[seed_index] = values[valid[0]:seed_index + 1].mean()
+
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        result[seed_index + 1:] = values[seed_index + 1:]
+        return result
+    # 分块递推：块内 y[i+j-1] = d^j * (y[i-1] + alpha * Σ x[i+k-1] * d^-k)，块间传递上一块的最后一个值
+    block = max(1, int(_EMA_BLOCK_EXPONENT / -math.log(decay)))
+    steps = np.arange(1, block + 1)
+    growth = decay ** -steps
+    shrink = decay ** steps
+    previous = result[seed_index]
+    start = seed_index + 1
+    while start < n:
+        chunk = values[start:start + block]
+        size = len(chunk)
+        result[start:start + size] = shrink[:size] * (previous + alpha * np.cumsum(chunk * growth[:size]))
+        previous = result[start + size - 1]
+        start += size
+    return result
+
+
+def true_range(high, low, close):
+    """ta.tr(true)：第一根K线为 high - low"""
+    previous = np.concatenate(([np.nan], close[:-1]))
+    tr = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+    tr[0] = high[0] - low[0]
+    return tr
+
+
+def rolling_max(values, window):
+    """
+    ta.highest：最近 window 个值的最大值，不足 window 个或窗口内有na时为na
+    分块前缀/后缀最大值（van Herk/Gil-Werman），与窗口大小无关的 O(n)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    result = np.full(n, np.nan)
+    if window <= 0 or n < window:
+        return result
+    blocks = -(-n // window)
+    padded = np.full(blocks * window, -np.inf)
+    padded[:n] = np.where(np.isnan(values), np.inf, values)   # na 用 +inf 标记，之后还原为na
+    shaped = padded.reshape(blocks, window)
+    prefix = np.maximum.accumulate(shaped, axis=1).ravel()
+    suffix = np.maximum.accumulate(shaped[:, ::-1], axis=1)[:, ::-1].ravel()
+    ends = np.arange(window - 1, n)
+    result[window - 1:] = np.maximum(suffix[ends - window + 1], prefix[ends])
+    result[np.isinf(result)] = np.nan
+    return result
+
+
+def crossover(a, b):
+    """ta.crossover：a[t] > b[t] 且 a[t-1] <= b[t-1]（含na时为False）"""
+    above = a > b
+    result = np.zeros(len(above), dtype=bool)
+    result[1:] = above[1:] & (a[:-1] <= b[:-1])
+    return result
+
+
+def crossunder(a, b):
+    """ta.crossunder：a[t] < b[t] 且 a[t-1] >= b[t-1]"""
+    below = a < b
+    result = np.zeros(len(below), dtype=bool)
+    result[1:] = below[1:] & (a[:-1] >= b[:-1])
+    return result
+
+
+def forward_fill_events(events):
+    """事件序列（0 表示无事件）前向填充为状态序列，第一个事件之前为0"""
+    index = np.where(events != 0, np.arange(len(events)), 0)
+    np.maximum.accumulate(index, out=index)
+    return events[index]
+
+
+def zero_lag_trend(bars, length=70, mult=1.2):
+    """返回 (trend, zlema, volatility)，trend 取值 1/-1/0（尚未出现穿越）"""
+    close = bars.close
+    lag = (length - 1) // 2
+    lagged = np.concatenate((np.full(lag, np.nan), close[:len(close) - lag])) if lag else close
+    zlema = ema(close + (close - lagged), length)
+    atr = ema(true_range(bars.high, bars.low, close), length, alpha=1.0 / length)
+    volatility = rolling_max(atr, length * 3) * mult
+
+    events = np.zeros(len(close), dtype=np.int8)
+    events[crossover(close, zlema + volatility)] = 1
+    # 同一根K线两个条件都成立时后执行的下穿生效（与Pine脚本中 if 的顺序相同）
+    events[crossunder(close, zlema - volatility)] = -1
+    return forward_fill_events(events), zlema, volatility
+
+
+def security_trend(bars, timeframe, length=70, mult=1.2):
+    """
+    request.security(syminfo.tickerid, timeframe, trend)，lookahead_off：
+    高级别K线收盘（其最后一根图表K线收盘）之后才使用它的趋势值，之前使用上一根高级别K线的值
+    """
+    period, offset = timeframe_ms(timeframe)
+    higher, closes_at = bars.resample(period, offset)
+    if higher is bars:
+        return zero_lag_trend(bars, length, mult)[0]
+    trend = zero_lag_trend(higher, length, mult)[0]
+    index = np.searchsorted(closes_at, bars.ts + bars.interval, side='right') - 1
+    return np.where(index >= 0, trend[np.maximum(index, 0)], 0).astype(np.int8)
+
+
+# ===== 策略与回测 =====
+
+class StrategyParams:
+    """策略参数，默认值与 zero_lag_strategy_webhook.pine 的输入参数相同"""
+
+    __slots__ = ('length', 'mult', 'timeframes', 'mtf_required', 'use_mtf_filter', 'use_stop_loss',
+                 'stop_loss_pct', 'use_take_profit', 'take_profit_pct', 'initial_capital',
+                 'equity_pct', 'commission_pct')
+
+    def __init__(self, length=70, mult=1.2, timeframes=('5', '15', '60', '240', '1D'), mtf_required=3,
+                 use_mtf_filter=True, use_stop_loss=True, stop_loss_pct=2.0, use_take_profit=True,
+                 take_profit_pct=4.0, initial_capital=1000000.0, equity_pct=100.0, commission_pct=0.1):
+        """
+        timeframes/mtf_required: 多时间框架周期，前 mtf_required 个全部同向时才开仓
+        equity_pct: 每次开仓使用的权益百分比（strategy.percent_of_equity）
+        commission_pct: 手续费（成交额百分比）
+        """
+        self.length = length
+        self.mult = mult
+        self.timeframes = tuple(timeframes)
+        self.mtf_required = mtf_required
+        self.use_mtf_filter = use_mtf_filter
+        self.use_stop_loss = use_stop_loss
+        self.stop_loss_pct = stop_loss_pct
+        self.use_take_profit = use_take_profit
+        self.take_profit_pct = take_profit_pct
+        self.initial_capital = initial_capital
+        self.equity_pct = equity_pct
+        self.commission_pct = commission_pct
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def strategy_signals(bars, params):
+    """返回 (long_condition, short_condition, trend)，与Pine脚本的开仓条件相同"""
+    trend, _, _ = zero_lag_trend(bars, params.length, params.mult)
+    zero = np.zeros(len(trend), dtype=np.int8)
+    long_condition = crossover(trend, zero)
+    short_condition = crossunder(trend, zero)
+    if params.use_mtf_filter and params.mtf_required:
+        bullish = np.ones(len(trend), dtype=bool)
+        bearish = np.ones(len(trend), dtype=bool)
+        for timeframe in params.timeframes[:params.mtf_required]:
+            higher = security_trend(bars, timeframe, params.length, params.mult)
+            bullish &= higher > 0
+            bearish &= higher < 0
+        long_condition &= bullish
+        short_condition &= bearish
+    return long_condition, short_condition, trend
+
+
+def _exit_fill(direction, bar, bars, stop_pct, limit_pct):
+    """
+    持仓方向为 direction 时第 bar 根K线的止损/止盈成交价和原因
+    挂单价格按上一根K线的收盘价计算（Pine脚本每根K线按 close 重新挂出 strategy.exit）
+    """
+    reference = bars.close[bar - 1]
+    opened, high, low = bars.open[bar], bars.high[bar], bars.low[bar]
+    stop = reference * (1 - direction * stop_pct)
+    limit = reference * (1 + direction * limit_pct) if limit_pct else None
+    if direction > 0:
+        stop_hit, limit_hit = low <= stop, limit is not None and high >= limit
+        stop_gap, limit_gap = opened <= stop, limit is not None and opened >= limit
+    else:
+        stop_hit, limit_hit = high >= stop, limit is not None and low <= limit
+        stop_gap, limit_gap = opened >= stop, limit is not None and opened <= limit
+    if stop_gap:
+        return opened, 'stop_loss'
+    if limit_gap:
+        return opened, 'take_profit'
+    if stop_hit and limit_hit:
+        # TradingView的K线内路径假设：开盘价离最高价更近时先到最高价，否则先到最低价
+        high_first = high - opened <= opened - low
+        if (direction > 0) == high_first:
+            return limit, 'take_profit'
+        return stop, 'stop_loss'
+    if stop_hit:
+        return stop, 'stop_loss'
+    return limit, 'take_profit'
+
+
+def _exit_hits(bars, direction, stop_pct, limit_pct):
+    """持仓方向为 direction 时会触发止损或止盈的K线序号（递增）"""
+    reference = np.concatenate(([np.nan], bars.close[:-1]))
+    if direction > 0:
+        hit = bars.low <= reference * (1 - stop_pct)
+        if limit_pct:
+            hit |= bars.high >= reference * (1 + limit_pct)
+    else:
+        hit = bars.high >= reference * (1 + stop_pct)
+        if limit_pct:
+            hit |= bars.low <= reference * (1 - limit_pct)
+    return np.flatnonzero(hit)
+
+
+def simulate(bars, long_condition, short_condition, params):
+    """
+    按信号逐笔模拟交易，返回 (交易列表, 每根K线收盘时的权益)
+    交易项：direction, entry_bar, entry_price, exit_bar, exit_price, reason, qty, pnl, commission
+    """
+    n = len(bars)
+    fee = params.commission_pct / 100.0
+    use_exits = params.use_stop_loss
+    stop_pct = params.stop_loss_pct / 100.0
+    limit_pct = params.take_profit_pct / 100.0 if params.use_take_profit else 0.0
+    hits = {direction: _exit_hits(bars, direction, stop_pct, limit_pct) for direction in (1, -1)} if use_exits else {}
+
+    signal_bars = np.flatnonzero(long_condition | short_condition)
+    directions = np.where(long_condition[signal_bars], 1, -1)
+
+    trades = []
+    cash = params.initial_capital
+    position = None   # 当前持仓（交易项）
+
+    def close_position(bar, price, reason):
+        nonlocal cash, position
+        commission = position['qty'] * price * fee
+        pnl = position['direction'] * position['qty'] * (price - position['entry_price'])
+        cash += pnl - commission - position['commission']
+        position.update(exit_bar=int(bar), exit_price=float(price), reason=reason,
+                        pnl=float(pnl - commission - position['commission']),
+                        commission=float(position['commission'] + commission))
+        position = None
+
+    def check_exit(last_bar):
+        """持仓的止损止盈是否在 last_bar（含）之前触发"""
+        if position is None or not use_exits:
+            return
+        indexes = hits[position['direction']]
+        first = position['entry_bar'] + 1   # 开仓K线收盘时才挂出止损止盈
+        found = np.searchsorted(indexes, first)
+        if found < len(indexes) and indexes[found] <= last_bar:
+            bar = indexes[found]
+            price, reason = _exit_fill(position['direction'], bar, bars, stop_pct, limit_pct)
+            close_position(bar, price, reason)
+
+    for signal_bar, direction in zip(signal_bars, directions):
+        fill = signal_bar + 1
+        if fill >= n:
+            break
+        check_exit(fill - 1)
+        if position is not None and position['direction'] == direction:
+            continue   # 同方向已有持仓，strategy.entry 不加仓
+        # 数量在信号K线按当时的权益（含浮动盈亏）和收盘价计算
+        equity = cash
+        if position is not None:
+            equity += position['direction'] * position['qty'] * (bars.close[signal_bar] - position['entry_price'])
+            equity -= position['commission']
+            close_position(fill, bars.open[fill], 'reverse')
+        qty = equity * params.equity_pct / 100.0 / bars.close[signal_bar]
+        if qty <= 0:
+            continue
+        price = bars.open[fill]
+        position = {'direction': int(direction), 'signal_bar': int(signal_bar), 'entry_bar': int(fill),
+                    'entry_price': float(price), 'qty': float(qty), 'commission': float(qty * price * fee)}
+        trades.append(position)
+    check_exit(n - 1)
+
+    return trades, _equity_curve(bars, trades, params)
+
+
+def _equity_curve(bars, trades, params):
+    """每根K线收盘时的权益：已实现盈亏 + 持仓浮动盈亏 - 持仓的开仓手续费"""
+    n = len(bars)
+    fee = params.commission_pct / 100.0
+    equity = np.empty(n)
+    cash = params.initial_capital
+    flat_from = 0
+    for trade in trades:
+        start = trade['entry_bar']
+        end = trade.get('exit_bar', n)
+        equity[flat_from:start] = cash
+        equity[start:end] = cash - trade['qty'] * trade['entry_price'] * fee + trade['direction'] * trade['qty'] * (
+            bars.close[start:end] - trade['entry_price'])
+        if 'exit_bar' in trade:
+            cash += trade['pnl']
+        flat_from = end
+    equity[flat_from:] = cash
+    return equity
+
+
+def summarize(bars, trades, equity, params, elapsed=None, signals=None):
+    """回测统计"""
+    closed = [trade for trade in trades if 'exit_bar' in trade]
+    pnls = np.array([trade['pnl'] for trade in closed]) if closed else np.zeros(0)
+    gross_profit = float(pnls[pnls > 0].sum()) if len(pnls) else 0.0
+    gross_loss = float(-pnls[pnls < 0].sum()) if len(pnls) else 0.0
+    peak = np.maximum.accumulate(equity)
+    drawdown = float(np.max((peak - equity) / peak)) if len(equity) else 0.0
+    in_position = sum(trade.get('exit_bar', len(bars)) - trade['entry_bar'] for trade in trades)
+    reasons = {}
+    for trade in closed:
+        reasons[trade['reason']] = reasons.get(trade['reason'], 0) + 1
+    final = float(equity[-1]) if len(equity) else params.initial_capital
+    summary = {
+        'symbol': bars.symbol,
+        'bars': len(bars),
+        'start': int(bars.ts[0]) if len(bars) else None,
+        'end': int(bars.ts[-1]) if len(bars) else None,
+        'interval_ms': bars.interval,
+        'trades': len(trades),
+        'closed_trades': len(closed),
+        'long_trades': sum(1 for trade in trades if trade['direction'] > 0),
+        'short_trades': sum(1 for trade in trades if trade['direction'] < 0),
+        'win_rate': round(float((pnls > 0).mean()), 4) if len(pnls) else None,
+        'net_profit': round(final - params.initial_capital, 2),
+        'return_pct': round((final / params.initial_capital - 1) * 100, 3),
+        'profit_factor': round(gross_profit / gross_loss, 3) if gross_loss else None,
+        'max_drawdown_pct': round(drawdown * 100, 3),
+        'avg_trade': round(float(pnls.mean()), 2) if len(pnls) else None,
+        'commission': round(sum(trade['commission'] for trade in trades), 2),
+        'exposure': round(in_position / len(bars), 4) if len(bars) else 0.0,
+        'exit_reasons': reasons,
+        'buy_and_hold_pct': round((bars.close[-1] / bars.close[0] - 1) * 100, 3) if len(bars) else None,
+    }
+    if signals is not None:
+        summary['signals'] = signals
+    if elapsed is not None:
+        summary['elapsed_sec'] = round(elapsed, 3)
+    return summary
+
+
+def backtest(bars, params=None, include_trades=False):
+    """回测一个交易对，返回 {'summary': 统计, 'trades': 交易列表（include_trades 时）}"""
+    params = params or StrategyParams()
+    started = time.perf_counter()
+    long_condition, short_condition, _ = strategy_signals(bars, params)
+    trades, equity = simulate(bars, long_condition, short_condition, params)
+    signals = {'long': int(long_condition.sum()), 'short': int(short_condition.sum())}
+    result = {'summary': summarize(bars, trades, equity, params, time.perf_counter() - started, signals)}
+    if include_trades:
+        result['trades'] = [
+            dict(trade, entry_time=int(bars.ts[trade['entry_bar']]),
+                 exit_time=int(bars.ts[trade['exit_bar']]) if 'exit_bar' in trade else None)
+            for trade in trades
+        ]
+    return result
+
+
+def _run_file(path, params, include_trades, cache):
+    started = time.perf_counter()
+    bars = load_bars(path, cache=cache)
+    loaded = time.perf_counter() - started
+    result = backtest(bars, params, include_trades)
+    result['summary']['load_sec'] = round(loaded, 3)
+    return result
+
+
+def backtest_files(paths, params=None, jobs=1, include_trades=False, cache=False):
+    """回测多个K线文件，jobs > 1 时多进程并行，返回结果列表（与 paths 顺序相同）"""
+    params = params or StrategyParams()
+    if jobs <= 1 or len(paths) <= 1:
+        return [_run_file(path, params, include_trades, cache) for path in paths]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(_run_file, paths, [params] * len(paths), [include_trades] * len(paths),
+                             [cache] * len(paths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='零延迟趋势策略回测')
+    parser.add_argument('files', nargs='*', help='K线文件（CSV或.npz）')
+    parser.add_argument('--synthetic', type=int, default=0, help='不读取文件，使用N根1分钟随机K线')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--length', type=int, default=70, help='EMA计算周期')
+    parser.add_argument('--mult', type=float, default=1.2, help='通道宽度倍数')
+    parser.add_argument('--timeframes', default='5,15,60,240,1D', help='多时间框架周期（逗号分隔）')
+    parser.add_argument('--no-mtf', action='store_true', help='关闭多时间框架过滤')
+    parser.add_argument('--stop-loss', type=float, default=2.0, help='止损百分比（0 表示关闭止损止盈）')
+    parser.add_argument('--take-profit', type=float, default=4.0, help='止盈百分比（0 表示关闭止盈）')
+    parser.add_argument('--capital', type=float, default=1000000.0, help='初始资金')
+    parser.add_argument('--equity-pct', type=float, default=100.0, help='每次开仓使用的权益百分比')
+    parser.add_argument('--commission', type=float, default=0.1, help='手续费百分比')
+    parser.add_argument('--jobs', type=int, default=1, help='并行进程数')
+    parser.add_argument('--cache', action='store_true', help='把读取的CSV另存为 .npz')
+    parser.add_argument('--trades', action='store_true', help='报告中包含每笔交易')
+    parser.add_argument('--output', help='JSON报告路径')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    params = StrategyParams(
+        length=args.length, mult=args.mult, timeframes=args.timeframes.split(','),
+        use_mtf_filter=not args.no_mtf, use_stop_loss=args.stop_loss > 0, stop_loss_pct=args.stop_loss,
+        use_take_profit=args.take_profit > 0, take_profit_pct=args.take_profit,
+        initial_capital=args.capital, equity_pct=args.equity_pct, commission_pct=args.commission
+    )
+
+    started = time.perf_counter()
+    if args.synthetic:
+        results = [backtest(synthetic_bars(args.synthetic, seed=args.seed), params, args.trades)]
+    elif args.files:
+        results = backtest_files(args.files, params, args.jobs, args.trades, args.cache)
+    else:
+        parser.error('需要K线文件或 --synthetic')
+    elapsed = time.perf_counter() - started
+
+    print(f"{'交易对':<20}{'K线数':>10}{'交易':>7}{'胜率':>8}{'收益%':>10}{'最大回撤%':>11}{'盈亏比':>8}{'耗时s':>8}")
+    for result in results:
+        summary = result['summary']
+        win_rate = f"{summary['win_rate']:.1%}" if summary['win_rate'] is not None else '-'
+        profit_factor = summary['profit_factor'] if summary['profit_factor'] is not None else '-'
+        print(f"{summary['symbol']:<20}{summary['bars']:>10}{summary['trades']:>7}{win_rate:>8}"
+              f"{summary['return_pct']:>10.2f}{summary['max_drawdown_pct']:>11.2f}{profit_factor:>8}"
+              f"{summary['elapsed_sec']:>8.3f}")
+    print(f"合计 {sum(r['summary']['bars'] for r in results)} 根K线，总耗时 {elapsed:.2f}s")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'params': params.to_dict(), 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"报告已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
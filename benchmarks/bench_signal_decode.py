@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+信号解码微基准 - 对比原webhook解析路径与 trade_signal.decode_signal
+
+原路径（webhook_server 改造前）：
+    json.loads(raw_data.decode('utf-8')) -> 必要字段列表推导检查 -> 多次 float()/int() 转换
+
+运行方法：
+    python benchmarks/bench_signal_decode.py [-n 次数]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trade_signal import decode_signal, orjson  # noqa: E402
+
+# 与 zero_lag_strategy_webhook.pine 发送的消息格式相同
+PAYLOAD = (
+    b'{"action":"buy","symbol":"BINANCEBTCUSDT","price":65012.5,"size":0.01538165,'
+    b'"leverage":10,"stop_loss":63712.25,"take_profit":66312.75,"timestamp":"1718323200000"}'
+)
+
+
+def legacy_decode(raw_data):
+    """改造前的解析路径"""
+    signal_data = json.loads(raw_data.decode('utf-8'))
+    required_fields = ['action', 'symbol', 'price', 'size']
+    missing_fields = [field for field in required_fields if field not in signal_data]
+    if missing_fields:
+        raise ValueError(f'缺少必要字段: {missing_fields}')
+    action = signal_data.get('action')
+    symbol = signal_data.get('symbol')
+    price = float(signal_data.get('price', 0))
+    size = float(signal_data.get('size', 0))
+    leverage = int(signal_data.get('leverage', 10))
+    stop_loss = float(signal_data.get('stop_loss', 0))
+    take_profit = float(signal_data.get('take_profit', 0))
+    return action, symbol, price, size, leverage, stop_loss, take_profit
+
+
+def bench(funcs, number, repeat):
+    """
+    交替运行各实现（减少机器负载波动的影响），返回每个实现最快一轮的单次耗时（微秒）
+    """
+    best = [float('inf')] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            elapsed = timeit.timeit(lambda: func(PAYLOAD), number=number)
+            best[i] = min(best[i], elapsed)
+    return [elapsed / number * 1e6 for elapsed in best]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='信号解码微基准')
+    parser.add_argument('-n', '--number', type=int, default=20000, help='每轮解析次数')
+    parser.add_argument('-r', '--repeat', type=int, default=10, help='轮数')
+    args = parser.parse_args()
+
+    legacy, decoded = bench((legacy_decode, decode_signal), args.number, args.repeat)
+
+    print(f"JSON解析器: {'orjson' if orjson else 'json（标准库）'}")
+    print(f"每轮 {args.number} 次，取{args.repeat}轮最快值")
+    print(f"{'原路径':<16}{legacy:>8.2f} us/次")
+    print(f"{'decode_signal':<16}{decoded:>8.2f} us/次  ({legacy / decoded:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
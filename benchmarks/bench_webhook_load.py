@@ -0,0 +1,680 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Webhook端到端压测 - 按目标速率向 /webhook 发送信号，测量确认延迟和信号到下单的延迟
+
+测试环境：
+    webhook服务器以子进程启动（Flask开发服务器或gunicorn），OKX替换为本进程内的
+    okx_simulator（--okx-latency/--okx-faults 配置交易所延迟和故障），不会连接真实交易所。
+    也可以用 --url 压测已经运行的服务器（此时不测量信号到下单的延迟）。
+
+测量内容：
+1. 确认延迟（ack）：从计划发送时间到收到HTTP响应（开环发送，服务器变慢时不会减少发送量，
+   排队时间计入延迟），p50/p99/p99.9
+2. 信号到下单延迟：从计划发送时间到订单到达模拟交易所。订单的 clOrdId 前缀由信号去重键派生
+   （signal_dedupe.client_order_id），压测脚本按同样的规则把订单对应到信号
+3. 吞吐量（发送/确认/下单每秒次数）、HTTP状态码和错误率
+4. 服务器进程（gunicorn时包含所有worker）的内存（RSS）和线程数变化
+
+信号来源：
+    --profile poisson   泊松到达（平均 --rate 个/秒）
+    --profile burst     每 --burst-interval 秒同时发送 --burst-size 个
+    --profile constant  固定间隔
+    --replay FILE       回放JSONL文件，每行一个webhook消息；行内可用 "_at"（秒）指定发送时间，
+                        没有时按 --rate 固定间隔发送；timestamp 会追加后缀避免被去重
+
+报告与基线：
+    --output 把结果写入JSON报告；--baseline 与保存的报告比较，变差超过 --tolerance 的指标
+    标记为回退，加 --fail-on-regression 时以退出码1结束（用于修改 webhook_server.py /
+    okx_trader.py 前后对比）
+
+运行方法：
+    python benchmarks/bench_webhook_load.py --rate 50 --duration 30 --output benchmarks/baseline.json
+    python benchmarks/bench_webhook_load.py --rate 50 --duration 30 --baseline benchmarks/baseline.json
+    python benchmarks/bench_webhook_load.py --server gunicorn --workers 4 --profile burst --burst-size 40
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import signal as os_signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from okx_simulator import OKXSimulator, SimExchange  # noqa: E402
+from signal_dedupe import client_order_id, signal_key  # noqa: E402
+from trade_signal import decode_signal  # noqa: E402
+
+# clOrdId前缀长度（字母t + 28位十六进制），见 signal_dedupe.client_order_id
+CLIENT_ID_PREFIX = 29
+
+# 报告中参与基线比较的指标：(路径, 越大越好)
+COMPARED_METRICS = (
+    ('ack.p50_ms', False),
+    ('ack.p99_ms', False),
+    ('ack.p999_ms', False),
+    ('signal_to_order.p50_ms', False),
+    ('signal_to_order.p99_ms', False),
+    ('signal_to_order.p999_ms', False),
+    ('throughput.acked_per_sec', True),
+    ('throughput.orders_per_sec', True),
+    ('errors.error_rate', False),
+    ('resources.rss_growth_mb', False),
+    ('resources.threads_growth', False),
+)
+
+# 与基线比较时应该相同的压测配置
+COMPARED_META = ('server', 'workers', 'threads', 'profile', 'replay', 'rate', 'duration', 'okx_latency', 'okx_faults')
+
+# 变化小于该绝对值时不算回退（避免毫秒级抖动被判为回退）
+ABSOLUTE_FLOOR = {'_ms': 1.0, 'error_rate': 0.001, 'rss_growth_mb': 5.0, 'threads_growth': 2}
+
+
+def percentile(sorted_values, fraction):
+    """已排序列表的分位数（最近秩），空列表返回None"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def latency_summary(values):
+    """延迟（秒）列表 -> 毫秒统计"""
+    values = sorted(values)
+    if not values:
+        return {'count': 0, 'p50_ms': None, 'p99_ms': None, 'p999_ms': None, 'mean_ms': None, 'max_ms': None}
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        'p999_ms': round(percentile(values, 0.999) * 1000, 3),
+        'mean_ms': round(sum(values) / len(values) * 1000, 3),
+        'max_ms': round(values[-1] * 1000, 3)
+    }
+
+
+# ===== 信号生成 =====
+
+def arrival_times(profile, rate, duration, burst_size, burst_interval, rng):
+    """各信号相对开始时间的计划发送时间（秒）"""
+    times = []
+    if profile == 'poisson':
+        offset = rng.expovariate(rate)
+        while offset < duration:
+            times.append(offset)
+            offset += rng.expovariate(rate)
+    elif profile == 'burst':
+        offset = 0.0
+        while offset < duration:
+            times.extend([offset] * burst_size)
+            offset += burst_interval
+    else:
+        times = [index / rate for index in range(int(duration * rate))]
+    return times
+
+
+def synthetic_signals(count, symbols, prices, notional, leverage, rng):
+    """随机信号：每个交易对随机开多/开空，单笔名义价值约为 notional USDT"""
+    signals = []
+    for _ in range(count):
+        symbol = rng.choice(symbols)
+        price = prices[symbol]
+        action = rng.choice(('buy', 'sell'))
+        signals.append({
+            'action': action,
+            'symbol': symbol.replace('-SWAP', '').replace('-', ''),
+            'price': price,
+            'size': round(notional / price, 6),
+            'leverage': leverage,
+        })
+    return signals
+
+
+def load_replay(path, rate):
+    """读取回放文件，返回 (计划发送时间列表, 信号列表)"""
+    times, signals = [], []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            payload = json.loads(line)
+            at = payload.pop('_at', None)
+            times.append(float(at) if at is not None else len(signals) / rate)
+            signals.append(payload)
+    return times, signals
+
+
+def unique_payloads(signals, run_id):
+    """为每个信号生成唯一的 timestamp（避免被去重），返回编码后的请求体"""
+    bodies = []
+    for index, payload in enumerate(signals):
+        payload = dict(payload)
+        payload['timestamp'] = f"{payload.get('timestamp', 'bench')}-{run_id}-{index}"
+        bodies.append(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    return bodies
+
+
+def order_prefixes(body, inst_ids):
+    """
+    信号对应订单的 clOrdId 前缀（与 webhook_server 的派生规则相同）
+    交易对由服务器解析，这里对符号中包含的每个候选合约都计算一次，前缀是哈希值不会冲突
+    """
+    try:
+        signal = decode_signal(body)
+    except Exception:
+        return []
+    symbol = (signal.symbol or '').upper()
+    prefixes = []
+    for inst_id in inst_ids:
+        if inst_id.split('-')[0] in symbol:
+            signal.inst_id = inst_id
+            key = signal_key(signal)
+            if key:
+                prefixes.append(client_order_id(key))
+    return prefixes
+
+
+# ===== 服务器进程 =====
+
+def _process_tree(pid):
+    """pid 及其所有子进程（读取 /proc，非Linux返回 [pid]）"""
+    if not os.path.isdir('/proc'):
+        return [pid]
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+
+def _process_usage(pid):
+    """(RSS MB, 线程数)，读取失败返回None"""
+    try:
+        with open(f'/proc/{pid}/status', 'r') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        return int(fields['VmRSS'].split()[0]) / 1024.0, int(fields['Threads'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class ResourceSampler:
+    """后台线程定期采样服务器进程树的内存和线程数"""
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []   # [(相对时间, RSS MB, 线程数, 进程数)]
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        rss = threads = processes = 0
+        for pid in _process_tree(self.pid):
+            usage = _process_usage(pid)
+            if usage is not None:
+                rss += usage[0]
+                threads += usage[1]
+                processes += 1
+        return (rss, threads, processes) if processes else None
+
+    def _run(self):
+        started = time.monotonic()
+        while not self._stop.is_set():
+            usage = self.sample()
+            if usage is not None:
+                self.samples.append((time.monotonic() - started,) + usage)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='bench-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def summary(self):
+        if not self.samples:
+            return {'available': False}
+        first, last = self.samples[0], self.samples[-1]
+        return {
+            'available': True,
+            'processes': last[3],
+            'rss_start_mb': round(first[1], 1),
+            'rss_peak_mb': round(max(sample[1] for sample in self.samples), 1),
+            'rss_end_mb': round(last[1], 1),
+            'rss_growth_mb': round(last[1] - first[1], 1),
+            'threads_start': first[2],
+            'threads_peak': max(sample[2] for sample in self.samples),
+            'threads_end': last[2],
+            'threads_growth': last[2] - first[2]
+        }
+
+
+def start_server(args, rest_url, ws_url, workdir):
+    """以子进程启动webhook服务器，环境指向模拟交易所和临时数据目录"""
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(args.port),
+        'OKX_BASE_URL': rest_url,
+        'OKX_WS_PRIVATE_URL': f"{ws_url}/ws/v5/private",
+        'OKX_API_KEY': 'bench', 'OKX_SECRET_KEY': 'bench', 'OKX_PASSPHRASE': 'bench',
+        'ENABLE_TRADING': 'True',
+        'WEBHOOK_SECRET': '',
+        # 压测不应被风控限额拦截
+        'MAX_POSITION_SIZE': '1000000000',
+        'MAX_TOTAL_POSITION_VALUE': '1000000000',
+        'MAX_DAILY_TRADES': '0',
+        'MAX_SYMBOL_DAILY_NOTIONAL': '0',
+        'MAX_OPEN_ORDERS': '100000',
+        'LOCK_DIR': os.path.join(workdir, 'locks'),
+        'RISK_STORE_PATH': os.path.join(workdir, 'risk.bin'),
+        'DEDUPE_DB_PATH': os.path.join(workdir, 'dedupe.sqlite3'),
+        'JOURNAL_DIR': os.path.join(workdir, 'journal'),
+        'LOG_FILE': os.path.join(workdir, 'trading.log'),
+        'SERVER_WORKERS': str(args.workers),
+        'SERVER_THREADS': str(args.threads),
+        # 服务器在临时目录中运行（webhook.log 等相对路径的文件写在临时目录），从仓库目录导入模块
+        'PYTHONPATH': os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+    })
+    for item in args.server_env:
+        name, _, value = item.partition('=')
+        env[name] = value
+
+    if args.server == 'gunicorn':
+        command = ['gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), 'webhook_server:app']
+    else:
+        command = [sys.executable, os.path.join(ROOT, 'webhook_server.py')]
+    output = open(os.path.join(workdir, 'server.out'), 'wb')
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=output, stderr=subprocess.STDOUT)
+
+    url = f"http://127.0.0.1:{args.port}"
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"webhook服务器启动失败，见 {output.name}")
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"webhook服务器 {args.startup_timeout} 秒内未就绪，见 {output.name}")
+
+
+def stop_server(process, timeout=15):
+    process.send_signal(os_signal.SIGTERM)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# ===== 发送 =====
+
+class OrderRecorder:
+    """模拟交易所的订单推送回调：记录每个 clOrdId 前缀第一笔订单到达的时间"""
+
+    def __init__(self):
+        self.first_order = {}   # 前缀 -> perf_counter
+        self.orders = 0
+        self.last_order = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.first_order.clear()
+            self.orders = 0
+            self.last_order = None
+
+    def __call__(self, channel, data):
+        if channel != 'orders':
+            return
+        now = time.perf_counter()
+        with self._lock:
+            for order in data:
+                if order.get('state') not in ('live', 'filled'):
+                    continue
+                self.orders += 1
+                self.last_order = now
+                prefix = (order.get('clOrdId') or '')[:CLIENT_ID_PREFIX]
+                if prefix and prefix not in self.first_order:
+                    self.first_order[prefix] = now
+
+
+async def send_all(url, bodies, times, concurrency, timeout):
+    """
+    按计划时间开环发送，返回每个信号的 (计划发送时间, 响应时间, HTTP状态码或异常名, 响应状态)
+    """
+    results = [None] * len(bodies)
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def send(index, scheduled):
+            async with semaphore:
+                try:
+                    response = await client.post(url, content=bodies[index],
+                                                 headers={'Content-Type': 'application/json'})
+                    try:
+                        status = response.json().get('status')
+                    except ValueError:
+                        status = None
+                    results[index] = (scheduled, time.perf_counter(), response.status_code, status)
+                except httpx.HTTPError as e:
+                    results[index] = (scheduled, time.perf_counter(), type(e).__name__, None)
+
+        started = time.perf_counter()
+        tasks = []
+        for index, offset in enumerate(times):
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(send(index, started + offset)))
+        await asyncio.gather(*tasks)
+    return results
+
+
+# ===== 报告 =====
+
+def build_report(args, results, prefixes, recorder, elapsed, resources, server_stats, simulator):
+    ack = [ended - scheduled for scheduled, ended, _, _ in results]
+    statuses = {}
+    for _, _, code, status in results:
+        name = str(code) if status is None else f"{code} {status}"
+        statuses[name] = statuses.get(name, 0) + 1
+    # 队列已满时服务器按 DISPATCH_QUEUE_FULL 返回503或200 dropped，两者都计为错误
+    errors = sum(1 for _, _, code, status in results
+                 if not isinstance(code, int) or code >= 500 or status == 'dropped')
+
+    to_order = []
+    for (scheduled, _, code, status), candidates in zip(results, prefixes):
+        if status != 'received':
+            continue
+        arrived = [recorder.first_order[prefix] for prefix in candidates if prefix in recorder.first_order]
+        if arrived:
+            to_order.append(min(arrived) - scheduled)
+
+    received = statuses_with(statuses, 'received')
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'server': args.server if not args.url else 'external',
+            'workers': args.workers if args.server == 'gunicorn' else 1,
+            'threads': args.threads,
+            'profile': 'replay' if args.replay else args.profile,
+            'replay': args.replay,
+            'rate': args.rate,
+            'duration': args.duration,
+            'signals': len(results),
+            'okx_latency': args.okx_latency,
+            'okx_faults': args.okx_faults,
+            'seed': args.seed
+        },
+        'ack': latency_summary(ack),
+        'signal_to_order': dict(latency_summary(to_order), received=received,
+                                with_order=len(to_order)),
+        'throughput': {
+            'elapsed_sec': round(elapsed, 3),
+            'sent_per_sec': round(len(results) / elapsed, 2) if elapsed else None,
+            'acked_per_sec': round(sum(1 for r in results if isinstance(r[2], int)) / elapsed, 2) if elapsed else None,
+            'orders_per_sec': round(recorder.orders / elapsed, 2) if elapsed else None,
+            'orders': recorder.orders
+        },
+        'errors': {
+            'statuses': dict(sorted(statuses.items())),
+            'errors': errors,
+            'error_rate': round(errors / len(results), 5) if results else 0.0
+        },
+        'resources': resources,
+        'server': server_stats
+    }
+    if simulator is not None:
+        stats = simulator.stats()
+        report['exchange'] = {key: stats[key] for key in ('requests', 'rate_limited', 'faults_injected', 'ws_messages')}
+    return report
+
+
+def statuses_with(statuses, status):
+    return sum(count for name, count in statuses.items() if name.endswith(f" {status}"))
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _lookup(report, path):
+    value = report
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def compare(report, baseline, tolerance):
+    """与基线比较，返回 [(指标, 基线值, 当前值, 相对变化, 是否回退)]"""
+    rows = []
+    for path, higher_is_better in COMPARED_METRICS:
+        old, new = _lookup(baseline, path), _lookup(report, path)
+        if old is None or new is None:
+            continue
+        delta = new - old
+        change = delta / old if old else (0.0 if not delta else float('inf'))
+        worse = -delta if higher_is_better else delta
+        floor = next((value for suffix, value in ABSOLUTE_FLOOR.items() if path.endswith(suffix)), 0.0)
+        regressed = worse > floor and (old == 0 or worse / abs(old) > tolerance)
+        rows.append((path, old, new, change, regressed))
+    return rows
+
+
+def print_report(report, comparison=None):
+    meta = report['meta']
+    print(f"\n压测结果（{meta['server']}，{meta['profile']}，{meta['signals']} 个信号，"
+          f"{report['throughput']['elapsed_sec']} 秒）")
+    for name in ('ack', 'signal_to_order'):
+        stats = report[name]
+        if not stats['count']:
+            print(f"  {name:<16}无数据")
+            continue
+        print(f"  {name:<16}p50 {stats['p50_ms']:>9.2f}ms  p99 {stats['p99_ms']:>9.2f}ms  "
+              f"p99.9 {stats['p999_ms']:>9.2f}ms  max {stats['max_ms']:>9.2f}ms  (n={stats['count']})")
+    throughput = report['throughput']
+    print(f"  吞吐量          发送 {throughput['sent_per_sec']}/s  确认 {throughput['acked_per_sec']}/s  "
+          f"下单 {throughput['orders_per_sec']}/s")
+    print(f"  状态码          {report['errors']['statuses']}  错误率 {report['errors']['error_rate']:.3%}")
+    resources = report['resources']
+    if resources.get('available'):
+        print(f"  服务器资源      RSS {resources['rss_start_mb']} -> {resources['rss_end_mb']} MB "
+              f"(峰值 {resources['rss_peak_mb']})  线程 {resources['threads_start']} -> {resources['threads_end']} "
+              f"(峰值 {resources['threads_peak']})")
+    if comparison:
+        print("\n与基线比较：")
+        for path, old, new, change, regressed in comparison:
+            mark = '回退' if regressed else ''
+            print(f"  {path:<28}{old:>12.3f} -> {new:>12.3f}  {change:>+8.1%}  {mark}")
+
+
+# ===== 主流程 =====
+
+def run(args):
+    rng = random.Random(args.seed)
+    run_id = f"{int(time.time())}{rng.randrange(1000):03d}"
+    workdir = tempfile.mkdtemp(prefix='bench-webhook-')
+
+    simulator = recorder = None
+    process = None
+    if args.url:
+        url = args.url.rstrip('/')
+    else:
+        exchange = SimExchange(volatility_bps=args.okx_volatility, rng=random.Random(args.seed))
+        simulator = OKXSimulator(exchange, latency=args.okx_latency, faults=args.okx_faults,
+                                 rate_limit=not args.no_okx_rate_limit, seed=args.seed)
+        recorder = OrderRecorder()
+        exchange.add_listener(recorder)
+        rest_url, ws_url = simulator.start('127.0.0.1', args.okx_port, args.okx_ws_port)
+        process, url = start_server(args, rest_url, ws_url, workdir)
+    print(f"webhook服务器: {url}  工作目录: {workdir}")
+
+    try:
+        if simulator is not None:
+            prices = {inst_id: simulator.exchange.price(inst_id) for inst_id in args.symbols}
+        else:
+            prices = {inst_id: args.price for inst_id in args.symbols}
+        if args.replay:
+            times, signals = load_replay(args.replay, args.rate)
+        else:
+            times = arrival_times(args.profile, args.rate, args.duration, args.burst_size,
+                                  args.burst_interval, rng)
+            signals = synthetic_signals(len(times), args.symbols, prices, args.notional, args.leverage, rng)
+        bodies = unique_payloads(signals, run_id)
+        inst_ids = list(simulator.exchange._instruments) if simulator is not None else []
+        prefixes = [order_prefixes(body, inst_ids) for body in bodies]
+
+        # 预热：建立连接、加载合约和杠杆缓存，结果不计入统计
+        if args.warmup:
+            warm = synthetic_signals(args.warmup, args.symbols, prices, args.notional, args.leverage, rng)
+            asyncio.run(send_all(f"{url}/webhook", unique_payloads(warm, f"{run_id}w"),
+                                 [index * 0.02 for index in range(len(warm))], args.concurrency, args.timeout))
+            time.sleep(1.0)
+
+        if recorder is not None:
+            recorder.reset()
+        sampler = ResourceSampler(process.pid if process else args.pid) if (process or args.pid) else None
+        if sampler is not None:
+            sampler.start()
+        started = time.perf_counter()
+        results = asyncio.run(send_all(f"{url}/webhook", bodies, times, args.concurrency, args.timeout))
+
+        # 等待排队中的信号下单完成：连续1秒没有新订单或超过 --drain 秒
+        if recorder is not None:
+            deadline = time.perf_counter() + args.drain
+            while time.perf_counter() < deadline:
+                idle_since = recorder.last_order or started
+                if time.perf_counter() - idle_since > 1.0:
+                    break
+                time.sleep(0.1)
+        ended = max([r[1] for r in results] + [recorder.last_order or 0.0 if recorder else 0.0])
+        elapsed = ended - started if results else 0.0
+        if sampler is not None:
+            sampler.stop()
+
+        try:
+            server_stats = httpx.get(f"{url}/dispatcher", timeout=5).json()
+        except (httpx.HTTPError, ValueError):
+            server_stats = None
+        report = build_report(args, results, prefixes, recorder or OrderRecorder(), elapsed,
+                              sampler.summary() if sampler else {'available': False}, server_stats, simulator)
+    finally:
+        if process is not None:
+            stop_server(process)
+        if simulator is not None:
+            simulator.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Webhook端到端压测')
+    source = parser.add_argument_group('信号来源')
+    source.add_argument('--profile', choices=('poisson', 'burst', 'constant'), default='poisson')
+    source.add_argument('--rate', type=float, default=20.0, help='平均发送速率（个/秒）')
+    source.add_argument('--duration', type=float, default=20.0, help='发送时长（秒）')
+    source.add_argument('--burst-size', type=int, default=20)
+    source.add_argument('--burst-interval', type=float, default=2.0)
+    source.add_argument('--replay', help='回放JSONL信号文件')
+    source.add_argument('--symbols', nargs='+', default=['BTC-USDT-SWAP', 'ETH-USDT-SWAP', 'XRP-USDT-SWAP'])
+    source.add_argument('--notional', type=float, default=200.0, help='每个信号的名义价值（USDT）')
+    source.add_argument('--leverage', type=int, default=5)
+    source.add_argument('--price', type=float, default=100.0, help='--url 模式下合成信号的价格')
+    source.add_argument('--warmup', type=int, default=20, help='正式发送前的预热信号数')
+    source.add_argument('--seed', type=int, default=1)
+
+    server = parser.add_argument_group('服务器')
+    server.add_argument('--server', choices=('flask', 'gunicorn'), default='flask')
+    server.add_argument('--workers', type=int, default=2, help='gunicorn进程数')
+    server.add_argument('--threads', type=int, default=8, help='gunicorn每个进程的线程数')
+    server.add_argument('--port', type=int, default=18080)
+    server.add_argument('--server-env', action='append', default=[], metavar='NAME=VALUE',
+                        help='传给服务器进程的环境变量（可重复）')
+    server.add_argument('--url', help='压测已运行的服务器（不启动子进程和模拟交易所）')
+    server.add_argument('--pid', type=int, help='--url 模式下采样内存/线程的服务器进程ID')
+    server.add_argument('--startup-timeout', type=float, default=60.0)
+
+    exchange = parser.add_argument_group('模拟交易所')
+    exchange.add_argument('--okx-latency', default='lognormal:20,0.4', help='REST延迟分布（见 okx_simulator）')
+    exchange.add_argument('--okx-faults', default='', help='故障注入（见 okx_simulator）')
+    exchange.add_argument('--okx-volatility', type=float, default=2.0, help='价格每秒波动（基点）')
+    exchange.add_argument('--no-okx-rate-limit', action='store_true')
+    exchange.add_argument('--okx-port', type=int, default=18090)
+    exchange.add_argument('--okx-ws-port', type=int, default=18091)
+
+    output = parser.add_argument_group('报告')
+    output.add_argument('--concurrency', type=int, default=256, help='最大在途请求数')
+    output.add_argument('--timeout', type=float, default=30.0, help='单个请求超时（秒）')
+    output.add_argument('--drain', type=float, default=30.0, help='发送结束后等待下单完成的最长时间（秒）')
+    output.add_argument('--output', help='JSON报告路径')
+    output.add_argument('--baseline', help='基线报告路径')
+    output.add_argument('--tolerance', type=float, default=0.2, help='相对基线变差超过该比例视为回退')
+    output.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    report = run(args)
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        comparison = compare(report, baseline, args.tolerance)
+        # 压测配置不同时结果不可比，只提示不阻止
+        changed = [key for key in COMPARED_META if baseline.get('meta', {}).get(key) != report['meta'].get(key)]
+        if changed:
+            print(f"注意：与基线的压测配置不同: {', '.join(changed)}")
+        report['baseline'] = {
+            'path': args.baseline,
+            'commit': baseline.get('meta', {}).get('commit'),
+            'regressions': [path for path, _, _, _, regressed in comparison if regressed]
+        }
+    print_report(report, comparison)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n报告已保存: {args.output}")
+    if comparison and args.fail_on_regression and report['baseline']['regressions']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
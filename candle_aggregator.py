@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多时间框架K线聚合器 - 一次遍历把1分钟K线（或逐笔成交）合成所有配置的周期
+
+每个交易对、每个周期一个预分配的环形缓冲区，K线按列存放在 array（ts 为 int64，
+open/high/low/close/volume 为 double）中，写满后覆盖最旧的K线。内存在创建交易对时一次分配，
+之后与运行时间无关，几百个交易对也只占用固定的内存（默认每个交易对约0.1MB）。
+
+功能特点：
+1. 单次遍历：每根基础K线按各周期的分组编号合并到当前K线，基础K线收盘到达周期末尾时该周期收盘，
+   与 request.security（lookahead_off）使用高级别K线的时机相同
+2. 未收盘K线：交易所对同一根基础K线的多次推送（累计值）只替换当前基础K线，不重复累加成交量；
+   各周期的未收盘K线 = 已收盘基础K线的合计 + 当前基础K线
+3. 逐笔成交：add_trade 按成交时间合成基础K线，跨周期时自动收盘上一根
+4. 迟到数据：早于最新基础K线的数据插入/修正基础K线缓冲区，并修正各周期中对应的K线
+   （已收盘的K线只修正存储的数据，不再回调，与Pine脚本实时K线不重绘一致）；
+   早于缓冲区窗口的迟到数据丢弃并计数
+5. 可以用交易所的高级别K线预热（seed），预热时间之前的基础K线不再计入该周期
+
+使用方法：
+    aggregator = CandleAggregator(('5', '15', '60', '240', '1D'), capacity=256)
+    for timeframe, bar in aggregator.update('BTC-USDT-SWAP', ts, open_, high, low, close, volume):
+        ...   # bar = (ts, open, high, low, close, volume)，该周期刚收盘的K线
+    aggregator.bars('BTC-USDT-SWAP', '60')['close']
+"""
+
+import logging
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+MINUTE_MS = 60000
+DAY_MS = 86400000
+# 1970-01-01 是星期四，TradingView的周线从星期一 00:00 UTC 开始
+WEEK_OFFSET_MS = 4 * DAY_MS
+
+
+def timeframe_ms(timeframe):
+    """Pine时间周期字符串（"5"、"60"、"1D"、"1W"、"30S"）-> (毫秒, 分组偏移)"""
+    text = str(timeframe).strip().upper()
+    unit = text[-1] if text[-1].isalpha() else ''
+    count = int(text[:-1] or 1) if unit else int(text)
+    if unit == '':
+        return count * MINUTE_MS, 0
+    if unit == 'S':
+        return count * 1000, 0
+    if unit == 'D':
+        return count * DAY_MS, 0
+    if unit == 'W':
+        return count * 7 * DAY_MS, WEEK_OFFSET_MS
+    raise ValueError(f"不支持的时间周期: {timeframe}")
+
+
+COLUMNS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+
+# 基础K线缓冲区最多保留的K线数量（默认按最长周期的K线数量，修正迟到数据时用于重新合成）
+MAX_BASE_CAPACITY = 1440
+
+
+class CandleRing:
+    """定长K线环形缓冲区（按时间递增），每列一个预分配的 array"""
+
+    __slots__ = ('capacity', 'ts', 'open', 'high', 'low', 'close', 'volume', '_start', '_size')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ts = array('q', bytes(8 * capacity))
+        self.open = array('d', bytes(8 * capacity))
+        self.high = array('d', bytes(8 * capacity))
+        self.low = array('d', bytes(8 * capacity))
+        self.close = array('d', bytes(8 * capacity))
+        self.volume = array('d', bytes(8 * capacity))
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _slot(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        return (self._start + index) % self.capacity
+
+    def get(self, index):
+        """第 index 根K线（负数从最新一根倒数）-> (ts, open, high, low, close, volume)"""
+        i = self._slot(index)
+        return self.ts[i], self.open[i], self.high[i], self.low[i], self.close[i], self.volume[i]
+
+    def set(self, index, bar):
+        i = self._slot(index)
+        self.ts[i], self.open[i], self.high[i], self.low[i], self.close[i], self.volume[i] = bar
+
+    def append(self, bar):
+        """追加最新的K线，缓冲区已满时覆盖最旧的一根"""
+        if self._size < self.capacity:
+            i = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            i = self._start
+            self._start = (self._start + 1) % self.capacity
+        self.ts[i], self.open[i], self.high[i], self.low[i], self.close[i], self.volume[i] = bar
+
+    def insert(self, index, bar):
+        """在第 index 根之前插入（迟到的K线，之后的K线依次后移；已满时丢弃最旧的一根）"""
+        if index >= self._size:
+            self.append(bar)
+            return
+        if self._size == self.capacity:
+            if index == 0:
+                return
+            self._start = (self._start + 1) % self.capacity
+            self._size -= 1
+            index -= 1
+        self._size += 1
+        for j in range(self._size - 1, index, -1):
+            self.set(j, self.get(j - 1))
+        self.set(index, bar)
+
+    def find(self, ts):
+        """二分查找开盘时间：找到返回下标，否则返回 -(插入位置) - 1"""
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            value = self.ts[(self._start + middle) % self.capacity]
+            if value < ts:
+                low = middle + 1
+            elif value > ts:
+                high = middle
+            else:
+                return middle
+        return -low - 1
+
+    def column(self, name, count=None):
+        """按时间顺序复制一列（最近 count 根），返回 array"""
+        source = getattr(self, name)
+        count = self._size if count is None else min(count, self._size)
+        first = (self._start + self._size - count) % self.capacity
+        end = first + count
+        if end <= self.capacity:
+            return source[first:end]
+        return source[first:] + source[:end - self.capacity]
+
+
+class _Frame:
+    """一个交易对在一个周期上的状态：已收盘K线缓冲区 + 当前K线（只含已收盘的基础K线）"""
+
+    __slots__ = ('timeframe', 'period', 'offset', 'ring', 'bucket', 'open', 'high', 'low', 'close',
+                 'volume', 'since')
+
+    def __init__(self, timeframe, period, offset, capacity):
+        self.timeframe = timeframe
+        self.period = period
+        self.offset = offset
+        self.ring = CandleRing(capacity)
+        self.bucket = None    # 当前K线的分组编号（None 表示还没有基础K线）
+        self.open = self.high = self.low = self.close = None
+        self.volume = 0.0
+        self.since = None     # 预热截止时间：更早的基础K线已包含在交易所的K线中
+
+    def start(self, bucket):
+        return bucket * self.period + self.offset
+
+    def current(self):
+        return (self.start(self.bucket), self.open, self.high, self.low, self.close, self.volume)
+
+
+class _SymbolCandles:
+    __slots__ = ('base', 'frames', 'partial')
+
+    def __init__(self, base, frames):
+        self.base = base          # 已收盘的基础K线
+        self.frames = frames
+        self.partial = None       # 未收盘的基础K线 [ts, open, high, low, close, volume]
+
+
+def _merge(bar, high, low, close=None, volume=0.0):
+    """把 high/low/volume 合并到K线元组，close 不为None时替换收盘价"""
+    return (bar[0], bar[1], max(bar[2], high), min(bar[3], low), bar[4] if close is None else close,
+            bar[5] + volume)
+
+
+class CandleAggregator:
+    """按交易对把基础K线合成多个周期"""
+
+    def __init__(self, timeframes, interval=MINUTE_MS, capacity=256, base_capacity=None):
+        """
+        timeframes: 合成的周期（Pine周期字符串），必须是基础周期的整数倍
+        interval: 基础K线周期（毫秒）
+        capacity: 每个周期保留的已收盘K线数量
+        base_capacity: 保留的基础K线数量，默认为最长周期包含的基础K线数量（最多1440根）
+        """
+        self.interval = interval
+        self.capacity = capacity
+        self.timeframes = []
+        longest = 1
+        for timeframe in timeframes:
+            period, offset = timeframe_ms(timeframe)
+            if period <= interval or period % interval:
+                raise ValueError(f"周期 {timeframe} 不是基础K线周期的整数倍")
+            self.timeframes.append((timeframe, period, offset))
+            longest = max(longest, period // interval)
+        self.base_capacity = base_capacity or max(capacity, min(longest, MAX_BASE_CAPACITY))
+
+        self._lock = threading.Lock()
+        self._symbols = {}
+
+        # 统计信息
+        self.updates = 0
+        self.closed = 0
+        self.late = 0
+        self.revised = 0
+        self.dropped = 0
+
+    def _symbol(self, inst_id):
+        candles = self._symbols.get(inst_id)
+        if candles is None:
+            frames = [_Frame(tf, period, offset, self.capacity) for tf, period, offset in self.timeframes]
+            candles = self._symbols[inst_id] = _SymbolCandles(CandleRing(self.base_capacity), frames)
+        return candles
+
+    # ===== 写入 =====
+
+    def update(self, inst_id, ts, open_, high, low, close, volume=0.0, confirmed=True):
+        """
+        一根基础K线（开盘时间 ts）；confirmed=False 为未收盘K线的推送（累计值，替换而不累加）
+        返回本次收盘的各周期K线 [(timeframe, (ts, open, high, low, close, volume))]
+        """
+        with self._lock:
+            self.updates += 1
+            candles = self._symbol(inst_id)
+            closed = []
+            partial = candles.partial
+            if partial is not None and ts > partial[0]:
+                # 没有收到收盘推送就开始了下一根K线：上一根按最后的推送收盘
+                candles.partial = None
+                self._commit(candles, tuple(partial), closed)
+                partial = None
+
+            base = candles.base
+            last = base.ts[(base._start + len(base) - 1) % base.capacity] if len(base) else None
+            if last is not None and ts <= last:
+                if confirmed:
+                    self._late(candles, (ts, open_, high, low, close, volume), replace=True)
+                return closed
+
+            if confirmed:
+                candles.partial = None
+                self._commit(candles, (ts, open_, high, low, close, volume), closed)
+            else:
+                candles.partial = [ts, open_, high, low, close, volume]
+            return closed
+
+    def add_trade(self, inst_id, ts, price, size=0.0):
+        """一笔成交（毫秒时间戳），合成基础K线，返回本次收盘的各周期K线"""
+        start = ts // self.interval * self.interval
+        with self._lock:
+            self.updates += 1
+            candles = self._symbol(inst_id)
+            closed = []
+            partial = candles.partial
+            if partial is not None and start > partial[0]:
+                candles.partial = None
+                self._commit(candles, tuple(partial), closed)
+                partial = None
+            if partial is not None and start == partial[0]:
+                partial[2] = max(partial[2], price)
+                partial[3] = min(partial[3], price)
+                partial[4] = price
+                partial[5] += size
+                return closed
+
+            base = candles.base
+            if len(base) and start <= base.get(-1)[0]:
+                # 所属的基础K线已经收盘：只合并最高/最低价和成交量
+                self._late(candles, (start, price, price, price, price, size), replace=False)
+            else:
+                candles.partial = [start, price, price, price, price, size]
+            return closed
+
+    def _commit(self, candles, bar, closed):
+        """一根基础K线收盘：写入基础缓冲区，合并到各周期，到达周期末尾的周期收盘"""
+        ts, open_, high, low, close, volume = bar
+        candles.base.append(bar)
+        end = ts + self.interval
+        for frame in candles.frames:
+            if frame.since is not None and ts < frame.since:
+                continue
+            bucket = (ts - frame.offset) // frame.period
+            if frame.bucket is not None and bucket != frame.bucket:
+                # 上一周期最后几根基础K线缺失，新周期的第一根K线到达时收盘
+                self._close(frame, closed)
+            if frame.bucket is None:
+                frame.bucket = bucket
+                frame.open, frame.high, frame.low, frame.close, frame.volume = open_, high, low, close, volume
+            else:
+                frame.high = max(frame.high, high)
+                frame.low = min(frame.low, low)
+                frame.close = close
+                frame.volume += volume
+            if end >= frame.start(bucket + 1):
+                self._close(frame, closed)
+
+    def _close(self, frame, closed):
+        bar = frame.current()
+        frame.ring.append(bar)
+        frame.bucket = None
+        self.closed += 1
+        closed.append((frame.timeframe, bar))
+
+    def _late(self, candles, bar, replace):
+        """
+        早于最新基础K线的数据：replace=True 为完整的基础K线（插入缺失的K线或修正已有的K线），
+        replace=False 为迟到的成交（合并到已有的K线）
+        """
+        ts = bar[0]
+        base = candles.base
+        index = base.find(ts)
+        previous = None
+        if index >= 0:
+            previous = base.get(index)
+            if replace:
+                base.set(index, bar)
+            else:
+                base.set(index, _merge(previous, bar[2], bar[3], volume=bar[5]))
+        else:
+            index = -index - 1
+            if index == 0 and (not len(base) or len(base) == base.capacity):
+                # 早于缓冲区窗口，无法确定它在各周期中的位置
+                self.dropped += 1
+                return
+            base.insert(index, bar)
+            index = base.find(ts)
+        self.late += 1
+
+        for frame in candles.frames:
+            if frame.since is not None and ts < frame.since:
+                continue
+            bucket = (ts - frame.offset) // frame.period
+            if bucket == frame.bucket:
+                frame.open, frame.high, frame.low, frame.close, frame.volume = self._rebuild(
+                    candles, frame, bucket, frame.current(), bar, previous, replace)[1:]
+                continue
+            position = frame.ring.find(frame.start(bucket))
+            if position < 0:
+                self.dropped += 1
+                continue
+            frame.ring.set(position, self._rebuild(candles, frame, bucket, frame.ring.get(position),
+                                                   bar, previous, replace))
+            self.revised += 1
+
+    def _rebuild(self, candles, frame, bucket, current, bar, previous, replace):
+        """修正包含迟到数据的周期K线：基础缓冲区包含整个周期时重新合成，否则在原K线上合并"""
+        base = candles.base
+        start, end = frame.start(bucket), frame.start(bucket + 1)
+        first = base.find(start)
+        first = first if first >= 0 else -first - 1
+        if len(base) and (first > 0 or base.ts[base._start] == start):
+            result = None
+            for i in range(first, len(base)):
+                item = base.get(i)
+                if item[0] >= end:
+                    break
+                result = item if result is None else _merge(result, item[2], item[3], item[4], item[5])
+            if result is not None:
+                return (start,) + result[1:]
+
+        # 缓冲区不完整：合并到原K线（修正的K线只能调整成交量差值，最高/最低价只扩大不缩小）
+        volume = bar[5] - previous[5] if replace and previous is not None else bar[5]
+        index = base.find(bar[0])
+        later = index + 1 < len(base) and base.get(index + 1)[0] < end
+        merged = _merge(current, bar[2], bar[3], None if later else bar[4], volume)
+        earlier = index > 0 and base.get(index - 1)[0] >= start
+        if not earlier and bar[0] == start:
+            merged = (merged[0], bar[1]) + merged[2:]
+        return merged
+
+    def seed(self, inst_id, timeframe, candles, as_of=None):
+        """
+        用交易所的K线预热一个周期：candles 为 (ts, open, high, low, close, volume, confirmed) 按时间递增，
+        已收盘的K线写入缓冲区，最后一根未收盘的K线作为当前K线
+        as_of: 交易所K线包含的数据截止时间（默认当前分钟的开始），更早的基础K线不再计入该周期
+        （当前这一分钟已有一部分包含在交易所的未收盘K线中，收盘后其成交量会重复计入，只影响成交量）
+        返回写入缓冲区的已收盘K线
+        """
+        with self._lock:
+            frame = next((f for f in self._symbol(inst_id).frames if f.timeframe == timeframe), None)
+            if frame is None:
+                raise ValueError(f"未配置的周期: {timeframe}")
+            seeded = []
+            for ts, open_, high, low, close, volume, confirmed in candles:
+                bucket = (ts - frame.offset) // frame.period
+                if confirmed:
+                    bar = (frame.start(bucket), open_, high, low, close, volume)
+                    frame.ring.append(bar)
+                    seeded.append(bar)
+                    frame.bucket = None
+                else:
+                    frame.bucket = bucket
+                    frame.open, frame.high, frame.low, frame.close, frame.volume = open_, high, low, close, volume
+            if as_of is None:
+                as_of = int(time.time() * 1000) // self.interval * self.interval
+            frame.since = as_of
+            return seeded
+
+    # ===== 读取 =====
+
+    def bars(self, inst_id, timeframe=None, count=None):
+        """
+        已收盘的K线（timeframe 为None时为基础K线），按时间递增：{'ts': array, 'open': array, ...}
+        需要NumPy时可以直接 np.frombuffer(result['close'])
+        """
+        with self._lock:
+            candles = self._symbols.get(inst_id)
+            if candles is None:
+                return None
+            ring = candles.base if timeframe is None else self._frame(candles, timeframe).ring
+            return {name: ring.column(name, count) for name in COLUMNS}
+
+    def partial(self, inst_id, timeframe=None):
+        """当前未收盘的K线（包含未收盘的基础K线），没有则为None"""
+        with self._lock:
+            candles = self._symbols.get(inst_id)
+            if candles is None:
+                return None
+            partial = candles.partial
+            if timeframe is None:
+                return tuple(partial) if partial is not None else None
+            frame = self._frame(candles, timeframe)
+            current = frame.current() if frame.bucket is not None else None
+            if partial is None or (frame.since is not None and partial[0] < frame.since):
+                return current
+            bucket = (partial[0] - frame.offset) // frame.period
+            if current is None or bucket != frame.bucket:
+                return (frame.start(bucket),) + tuple(partial[1:])
+            return _merge(current, partial[2], partial[3], partial[4], partial[5])
+
+    def _frame(self, candles, timeframe):
+        for frame in candles.frames:
+            if frame.timeframe == timeframe:
+                return frame
+        raise ValueError(f"未配置的周期: {timeframe}")
+
+    def memory_bytes(self):
+        """预分配的K线缓冲区大小（字节）"""
+        per_symbol = (self.base_capacity + self.capacity * len(self.timeframes)) * 8 * len(COLUMNS)
+        with self._lock:
+            return per_symbol * len(self._symbols)
+
+    def stats(self):
+        with self._lock:
+            symbols = len(self._symbols)
+            stats = {
+                'symbols': symbols,
+                'timeframes': [tf for tf, _, _ in self.timeframes],
+                'updates': self.updates,
+                'closed': self.closed,
+                'late': self.late,
+                'revised': self.revised,
+                'dropped': self.dropped
+            }
+        stats['memory_bytes'] = self.memory_bytes()
+        return stats
@@ -27,6 +27,15 @@ class Config:
     SERVER_PORT = int(os.getenv('SERVER_PORT', 8080))
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     
+    # 生产模式（gunicorn.conf.py）的worker进程数与每个进程的线程数
+    # 默认单进程：多个worker之间不保证同一交易对信号的到达顺序，也不会合并其他进程中排队的信号。
+    # 不读取 WEB_CONCURRENCY（部署平台会按实例规格自动设置），多进程必须显式配置
+    SERVER_WORKERS = int(os.getenv('SERVER_WORKERS', '1'))
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', '8'))
+    
+    # 跨进程文件锁目录（同一交易对同一时间只由一个worker进程执行）
+    LOCK_DIR = os.getenv('LOCK_DIR', 'data/locks')
+    
     # Webhook安全密钥（可选，用于验证TradingView请求）
     WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
     
@@ -41,6 +50,39 @@ class Config:
     # 正式环境: False (使用正式交易环境)
     OKX_SANDBOX = os.getenv('OKX_SANDBOX', 'True').lower() == 'true'
     
+    # REST接口地址（模拟盘与正式环境使用同一地址，通过请求头区分）
+    OKX_BASE_URL = os.getenv('OKX_BASE_URL', 'https://www.okx.com')
+    
+    # 单个HTTP请求超时时间（秒）
+    OKX_HTTP_TIMEOUT = float(os.getenv('OKX_HTTP_TIMEOUT', '10'))
+    
+    # 是否启用HTTP/2（多个请求复用同一条连接）
+    OKX_HTTP2 = os.getenv('OKX_HTTP2', 'True').lower() == 'true'
+    
+    # 是否订阅私有WebSocket频道，在本地维护持仓/余额快照
+    OKX_WS_ENABLED = os.getenv('OKX_WS_ENABLED', 'True').lower() == 'true'
+    
+    # 私有频道地址（留空则根据OKX_SANDBOX自动选择）
+    OKX_WS_PRIVATE_URL = os.getenv('OKX_WS_PRIVATE_URL', '')
+    
+    # 客户端限速：按OKX接口限速规则排队发送，被限速（50011）的请求等待后重新发送
+    OKX_RATE_LIMIT_ENABLED = os.getenv('OKX_RATE_LIMIT_ENABLED', 'True').lower() == 'true'
+    # 本进程可使用的限速额度比例（gunicorn多进程模式未设置时自动取 1/worker数）
+    OKX_RATE_LIMIT_SHARE = float(os.getenv('OKX_RATE_LIMIT_SHARE') or '1')
+    # 被限速的请求最多重新发送的次数
+    OKX_RATE_LIMIT_RETRIES = int(os.getenv('OKX_RATE_LIMIT_RETRIES', '3'))
+    
+    # 超时/5xx重试：是否启用、单次调用的最长时间（秒，加上OKX_HTTP_TIMEOUT应小于ORDER_TIMEOUT）
+    OKX_RETRY_ENABLED = os.getenv('OKX_RETRY_ENABLED', 'True').lower() == 'true'
+    OKX_RETRY_DEADLINE = float(os.getenv('OKX_RETRY_DEADLINE', '15'))
+    # 按接口覆盖重试次数，格式 "路径=次数,路径=次数"（例如 /api/v5/trade/order=1）
+    OKX_RETRY_BUDGETS = os.getenv('OKX_RETRY_BUDGETS', '')
+    # 每个接口每分钟的重试预算：不超过 max(最少次数, 请求数 × 比例)
+    OKX_RETRY_BUDGET_RATIO = float(os.getenv('OKX_RETRY_BUDGET_RATIO', '0.2'))
+    OKX_RETRY_BUDGET_MIN = int(os.getenv('OKX_RETRY_BUDGET_MIN', '10'))
+    # 下单请求有效期（秒，expTime），过期后交易所不再执行，重试前的订单查询结果是确定的
+    OKX_ORDER_EXPIRY = float(os.getenv('OKX_ORDER_EXPIRY', '3'))
+    
     # ===== 交易风险控制 =====
     # 是否启用实际交易（False=只记录日志，不实际下单）
     ENABLE_TRADING = os.getenv('ENABLE_TRADING', 'False').lower() == 'true'
@@ -51,12 +93,21 @@ class Config:
     # 最大杠杆倍数
     MAX_LEVERAGE = int(os.getenv('MAX_LEVERAGE', '10'))
     
-    # 最大持仓总价值（USDT）
+    # 最大持仓总价值（USDT，所有交易对名义价值合计，0表示不限制）
     MAX_TOTAL_POSITION_VALUE = float(os.getenv('MAX_TOTAL_POSITION_VALUE', '1000'))
     
     # 每日最大交易次数
     MAX_DAILY_TRADES = int(os.getenv('MAX_DAILY_TRADES', '20'))
     
+    # 单个交易对每日最多开仓成交额（USDT，0表示不限制）
+    MAX_SYMBOL_DAILY_NOTIONAL = float(os.getenv('MAX_SYMBOL_DAILY_NOTIONAL', '0'))
+    
+    # 所有worker进程合计的在途订单数上限（已提交、尚未收到交易所确认，0表示不限制）
+    MAX_OPEN_ORDERS = int(os.getenv('MAX_OPEN_ORDERS', '10'))
+    
+    # 风控计数文件（内存映射，多个worker进程共享）
+    RISK_STORE_PATH = os.getenv('RISK_STORE_PATH', 'data/risk.bin')
+    
     # ===== 交易参数 =====
     # 默认订单类型 ('market' 市价单, 'limit' 限价单)
     DEFAULT_ORDER_TYPE = os.getenv('DEFAULT_ORDER_TYPE', 'market')
@@ -67,6 +118,93 @@ class Config:
     # 订单超时时间（秒）
     ORDER_TIMEOUT = int(os.getenv('ORDER_TIMEOUT', '30'))
     
+    # 合约规格（ctVal/lotSz/minSz/tickSz）刷新间隔（秒）
+    INSTRUMENT_REFRESH_INTERVAL = int(os.getenv('INSTRUMENT_REFRESH_INTERVAL', '3600'))
+    
+    # ===== 信号去重 =====
+    # 是否按 (交易对, 动作, timestamp, 策略ID) 丢弃重复投递的信号
+    DEDUPE_ENABLED = os.getenv('DEDUPE_ENABLED', 'True').lower() == 'true'
+    
+    # 去重记录保留时间（秒）
+    DEDUPE_TTL = int(os.getenv('DEDUPE_TTL', '86400'))
+    
+    # 内存中最多保留的去重记录数
+    DEDUPE_MAX_ENTRIES = int(os.getenv('DEDUPE_MAX_ENTRIES', '10000'))
+    
+    # 去重记录持久化文件（SQLite，留空则只在内存中去重，重启后失效）
+    DEDUPE_DB_PATH = os.getenv('DEDUPE_DB_PATH', 'data/dedupe.sqlite3')
+    
+    # ===== 信号日志 =====
+    # 是否把已接收的信号写入预写日志（重启后补执行未完成的信号）
+    JOURNAL_ENABLED = os.getenv('JOURNAL_ENABLED', 'True').lower() == 'true'
+    
+    # 日志目录
+    JOURNAL_DIR = os.getenv('JOURNAL_DIR', 'data/journal')
+    
+    # 单个日志分段大小上限（字节）
+    JOURNAL_SEGMENT_BYTES = int(os.getenv('JOURNAL_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+    
+    # 组提交间隔（毫秒），这段时间内的写入共用一次fsync
+    JOURNAL_FSYNC_INTERVAL_MS = float(os.getenv('JOURNAL_FSYNC_INTERVAL_MS', '5'))
+    
+    # webhook响应前是否等待fsync完成（True=掉电也不丢信号，响应延迟增加一个组提交间隔）
+    JOURNAL_SYNC_ACK = os.getenv('JOURNAL_SYNC_ACK', 'False').lower() == 'true'
+    
+    # 重启后只补执行该时间（秒）内接收的信号，更早的信号已过时，不再执行
+    JOURNAL_REPLAY_MAX_AGE = int(os.getenv('JOURNAL_REPLAY_MAX_AGE', '300'))
+    
+    # ===== 信号追踪 =====
+    # 内存中保留最近完成的trace数量（/traces 查询，超出后淘汰最早的）
+    TRACE_BUFFER_SIZE = int(os.getenv('TRACE_BUFFER_SIZE', '1000'))
+    
+    # ===== 信号调度 =====
+    # 处理交易信号的工作线程数量（不同交易对并行执行，建议不少于同时交易的交易对数量）
+    DISPATCH_WORKERS = int(os.getenv('DISPATCH_WORKERS', '10'))
+    
+    # 待处理信号队列容量（超过后拒绝新信号）
+    DISPATCH_QUEUE_SIZE = int(os.getenv('DISPATCH_QUEUE_SIZE', '256'))
+    
+    # 队列已满时webhook的响应：ack 返回200并丢弃信号（TradingView看到的响应不变，不会重试），
+    # reject 返回503并撤销去重记录（TradingView重试时重新提交）
+    DISPATCH_QUEUE_FULL = os.getenv('DISPATCH_QUEUE_FULL', 'ack').lower()
+    
+    # 同一交易对的信号合并：尚未执行的信号被后到的 buy/sell/close 信号替换（只执行最后的目标仓位）
+    DISPATCH_COALESCE = os.getenv('DISPATCH_COALESCE', 'True').lower() == 'true'
+    # 合并窗口（秒）：交易对空闲时第一个信号先等待该时间再执行，0 表示立即执行（只合并排队中的信号）
+    DISPATCH_COALESCE_WINDOW = float(os.getenv('DISPATCH_COALESCE_WINDOW', '0'))
+    
+    # ===== 服务端信号（K线推送）=====
+    # 是否订阅OKX K线频道，用流式指标引擎在服务端生成信号（不经过TradingView告警）
+    STREAM_SIGNALS_ENABLED = os.getenv('STREAM_SIGNALS_ENABLED', 'False').lower() == 'true'
+    
+    # 生成信号的交易对（OKX合约ID，逗号分隔，留空则为全部支持的交易对）
+    STREAM_SYMBOLS = [s.strip() for s in os.getenv('STREAM_SYMBOLS', '').split(',') if s.strip()]
+    
+    # 策略参数（与 zero_lag_strategy_webhook.pine 的输入参数相同），图表周期为1分钟
+    STREAM_LENGTH = int(os.getenv('STREAM_LENGTH', '70'))
+    STREAM_MULT = float(os.getenv('STREAM_MULT', '1.2'))
+    STREAM_TIMEFRAMES = [s.strip() for s in os.getenv('STREAM_TIMEFRAMES', '5,15,60,240,1D').split(',') if s.strip()]
+    STREAM_MTF_REQUIRED = int(os.getenv('STREAM_MTF_REQUIRED', '3'))
+    STREAM_MTF_FILTER = os.getenv('STREAM_MTF_FILTER', 'True').lower() == 'true'
+    # 止损/止盈百分比（0 表示不设置）
+    STREAM_STOP_LOSS_PCT = float(os.getenv('STREAM_STOP_LOSS_PCT', '2.0'))
+    STREAM_TAKE_PROFIT_PCT = float(os.getenv('STREAM_TAKE_PROFIT_PCT', '4.0'))
+    # 每次开仓的价值（USDT）和杠杆
+    STREAM_POSITION_USDT = float(os.getenv('STREAM_POSITION_USDT', '1000'))
+    STREAM_LEVERAGE = int(os.getenv('STREAM_LEVERAGE', '10'))
+    
+    # 每个周期预热的K线数量（EMA/RMA需要足够长的历史才与TradingView的数值一致）
+    STREAM_WARMUP_BARS = int(os.getenv('STREAM_WARMUP_BARS', '1000'))
+    
+    # 每个交易对每个高级别周期保留的已收盘K线数量（预分配的环形缓冲区，决定每个交易对占用的内存）
+    STREAM_CANDLE_CAPACITY = int(os.getenv('STREAM_CANDLE_CAPACITY', '256'))
+    
+    # K线收盘超过该秒数后才处理到（断线补数据）的信号不再执行
+    STREAM_MAX_SIGNAL_AGE = float(os.getenv('STREAM_MAX_SIGNAL_AGE', '30'))
+    
+    # K线频道地址（business频道，留空则根据OKX_SANDBOX自动选择）
+    OKX_WS_BUSINESS_URL = os.getenv('OKX_WS_BUSINESS_URL', '')
+    
     # ===== 通知设置 =====
     # 微信通知（可选，需要企业微信机器人）
     WECHAT_WEBHOOK_URL = os.getenv('WECHAT_WEBHOOK_URL', '')
@@ -83,8 +221,8 @@ class Config:
     MAX_LOG_SIZE = int(os.getenv('MAX_LOG_SIZE', '10485760'))  # 10MB
     LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
     
-    # ===== 支持的交易对 =====
-    SUPPORTED_SYMBOLS = [
+    # ===== 支持的交易对（OKX合约ID，冻结集合，成员检查为O(1)）=====
+    SUPPORTED_SYMBOLS = frozenset([
         'BTC-USDT-SWAP',
         'ETH-USDT-SWAP',
         'ADA-USDT-SWAP',
@@ -95,7 +233,7 @@ class Config:
         'XRP-USDT-SWAP',
         'EOS-USDT-SWAP',
         'TRX-USDT-SWAP'
-    ]
+    ])
     
     @classmethod
     def validate_config(cls):
@@ -119,6 +257,16 @@ class Config:
         if cls.MAX_LEVERAGE <= 0 or cls.MAX_LEVERAGE > 100:
             errors.append("MAX_LEVERAGE必须在1-100之间")
         
+        if cls.DISPATCH_WORKERS <= 0:
+            errors.append("DISPATCH_WORKERS必须大于0")
+        
+        if cls.DISPATCH_QUEUE_FULL not in ('ack', 'reject'):
+            errors.append("DISPATCH_QUEUE_FULL必须是 ack 或 reject")
+        
+        # 调用方等待 ORDER_TIMEOUT 后放弃，重试必须在此之前结束，否则放弃后仍可能下单
+        if cls.OKX_RETRY_ENABLED and cls.OKX_RETRY_DEADLINE + cls.OKX_HTTP_TIMEOUT >= cls.ORDER_TIMEOUT:
+            errors.append("OKX_RETRY_DEADLINE + OKX_HTTP_TIMEOUT必须小于ORDER_TIMEOUT")
+        
         return errors
     
     @classmethod
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持仓敞口账本 - 增量维护各交易对和账户合计的名义价值
+
+风控检查持仓总价值（MAX_TOTAL_POSITION_VALUE）时不能每个信号都请求一次全部持仓，
+本模块在内存中维护按交易对的持仓张数和缓存价格，合计值随每次变化增量更新。
+
+功能特点：
+1. 数据来源：
+   - 私有WebSocket持仓推送（含REST全量同步），推送中的 markPx 同时更新缓存价格
+   - 下单成功后按目标仓位立即更新（不等推送，连续信号不会因推送延迟超出限额）
+   - 信号价格更新缓存价格
+2. 每次更新只重新计算一个交易对（减去旧值、加上新值），合计值读取为O(1)
+3. check() 只拒绝增加敞口且使合计超过限额的调整，减仓总是允许
+
+多worker进程部署时，其他进程下的单在持仓推送到达后（通常几十毫秒）才计入本进程的账本。
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ExposureLedger:
+    """按交易对的持仓名义价值账本（线程安全）"""
+
+    def __init__(self, instruments):
+        """instruments: InstrumentIndex，用于张数 -> 名义价值换算"""
+        self.instruments = instruments
+        self._lock = threading.Lock()
+        self._sides = {}     # instId -> {posSide: 带符号张数}
+        self._prices = {}    # instId -> 缓存价格
+        self._values = {}    # instId -> (gross, net) 按缓存价格计算的名义价值
+        self.gross = 0.0
+        self.net = 0.0
+
+        # 统计信息
+        self.updates = 0
+        self.rejected = 0
+
+    # ===== 计算 =====
+
+    def _value(self, inst_id, sides, price, fallback=None):
+        """某交易对的 (gross, net) 名义价值（USDT）"""
+        if not sides:
+            return 0.0, 0.0
+        spec = self.instruments.get(inst_id)
+        if spec is None or not price:
+            # 合约规格或价格未知时使用推送中的 notionalUsd（没有时保留原值）
+            return fallback if fallback is not None else (0.0, 0.0)
+        gross = net = 0.0
+        for contracts in sides.values():
+            value = spec.notional(contracts, price)
+            gross += value
+            net += value if contracts > 0 else -value
+        return gross, net
+
+    def _update(self, inst_id, sides=None, price=None, fallback=None):
+        """替换某交易对的持仓和/或价格，增量更新合计（调用方持有锁）"""
+        if sides is not None:
+            if sides:
+                self._sides[inst_id] = sides
+            else:
+                self._sides.pop(inst_id, None)
+        if price:
+            self._prices[inst_id] = price
+
+        old_gross, old_net = old = self._values.get(inst_id, (0.0, 0.0))
+        gross, net = self._value(inst_id, self._sides.get(inst_id), self._prices.get(inst_id),
+                                 fallback if fallback is not None else old)
+        if gross or net:
+            self._values[inst_id] = (gross, net)
+            self.gross += gross - old_gross
+            self.net += net - old_net
+        else:
+            self._values.pop(inst_id, None)
+            if self._values:
+                self.gross -= old_gross
+                self.net -= old_net
+            else:
+                # 没有持仓时归零，避免浮点误差累积
+                self.gross = self.net = 0.0
+        self.updates += 1
+
+    # ===== 更新 =====
+
+    def apply_positions(self, positions, snapshot=False, inst_id=None):
+        """
+        应用OKX持仓数据（WebSocket推送或REST结果）
+        snapshot=True 时替换全部持仓；inst_id 不为空时替换该交易对的全部持仓
+        """
+        grouped = {}     # instId -> {posSide: 带符号张数}（0 表示该方向已平仓）
+        fallbacks = {}
+        prices = {}
+        for position in positions:
+            position_inst = position.get('instId')
+            if not position_inst:
+                continue
+            pos_side = position.get('posSide') or 'net'
+            contracts = _float(position.get('pos'))
+            if pos_side == 'short':
+                contracts = -abs(contracts)
+            grouped.setdefault(position_inst, {})[pos_side] = contracts
+            if contracts:
+                notional = abs(_float(position.get('notionalUsd')))
+                gross, net = fallbacks.get(position_inst, (0.0, 0.0))
+                fallbacks[position_inst] = (gross + notional, net + (notional if contracts > 0 else -notional))
+            price = _float(position.get('markPx')) or _float(position.get('last'))
+            if price:
+                prices[position_inst] = price
+
+        with self._lock:
+            if snapshot:
+                for existing in [key for key in self._sides if key not in grouped]:
+                    self._update(existing, sides={})
+            elif inst_id is not None and inst_id not in grouped:
+                self._update(inst_id, sides={})
+            for position_inst, sides in grouped.items():
+                if snapshot or position_inst == inst_id:
+                    merged = {}
+                else:
+                    # 增量推送只包含有变化的方向，合并到已有持仓
+                    merged = dict(self._sides.get(position_inst, {}))
+                for pos_side, contracts in sides.items():
+                    if contracts:
+                        merged[pos_side] = contracts
+                    else:
+                        merged.pop(pos_side, None)
+                self._update(position_inst, merged, prices.get(position_inst), fallbacks.get(position_inst))
+
+    def set_position(self, inst_id, contracts, pos_mode='net_mode', price=None):
+        """下单成功后按目标仓位（带符号张数）更新，持仓推送到达后以推送为准"""
+        if pos_mode == 'net_mode':
+            sides = {'net': contracts} if contracts else {}
+        elif contracts > 0:
+            sides = {'long': contracts}
+        elif contracts < 0:
+            sides = {'short': contracts}
+        else:
+            sides = {}
+        with self._lock:
+            self._update(inst_id, sides, price)
+
+    def update_price(self, inst_id, price):
+        """更新缓存价格（例如信号价格）"""
+        if not price:
+            return
+        with self._lock:
+            if self._prices.get(inst_id) == price:
+                return
+            self._update(inst_id, price=price)
+
+    # ===== 查询与检查 =====
+
+    def price(self, inst_id):
+        with self._lock:
+            return self._prices.get(inst_id)
+
+    def symbol_value(self, inst_id):
+        """某交易对的 (gross, net) 名义价值"""
+        with self._lock:
+            return self._values.get(inst_id, (0.0, 0.0))
+
+    def check(self, inst_id, notional, limit):
+        """
+        调整后该交易对的名义价值为 notional 时，合计是否超过 limit
+        通过返回None，超限返回原因；只减少敞口的调整总是通过
+        """
+        with self._lock:
+            current = self._values.get(inst_id, (0.0, 0.0))[0]
+            total = self.gross - current + notional
+            if notional <= current or total <= limit:
+                return None
+            self.rejected += 1
+        return f'持仓总价值超过限制: {total:.2f} > {limit} USDT（{inst_id} 调整后 {notional:.2f}）'
+
+    async def seed(self, client):
+        """私有WebSocket未启用时，启动时通过REST加载一次全部持仓"""
+        try:
+            result = await client.get_positions(instType='SWAP')
+        except Exception as e:
+            logger.warning(f"加载持仓敞口失败: {e}")
+            return 0
+        if result.get('code') != '0':
+            logger.warning(f"加载持仓敞口失败: {result.get('msg')}")
+            return 0
+        self.apply_positions(result.get('data', []), snapshot=True)
+        logger.info(f"持仓敞口已加载: {len(self._sides)} 个交易对, 合计 {self.gross:.2f} USDT")
+        return len(self._sides)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'gross': round(self.gross, 2),
+                'net': round(self.net, 2),
+                'symbols': {
+                    inst_id: {'gross': round(gross, 2), 'net': round(net, 2), 'price': self._prices.get(inst_id)}
+                    for inst_id, (gross, net) in self._values.items()
+                }
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'gross': round(self.gross, 2),
+                'net': round(self.net, 2),
+                'symbols': len(self._values),
+                'updates': self.updates,
+                'rejected': self.rejected
+            }
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+gunicorn 生产模式配置
+
+启动方式：
+    gunicorn -c gunicorn.conf.py webhook_server:app
+
+说明：
+1. gthread worker：SERVER_WORKERS 个进程 × SERVER_THREADS 个线程并行处理webhook，默认1个进程，
+   并发由线程和调度器提供
+2. 不使用 preload_app：每个worker进程在fork之后各自导入应用，
+   调度器线程、后台事件循环、WebSocket连接都属于各自的进程（fork不会复制线程）
+3. 进程间共享的状态：
+   - 信号去重：同一个SQLite文件（WAL），检查并登记由一条语句完成
+   - 交易对执行：flock 文件锁（process_locks.SymbolLocks），同一交易对同一时间只由一个进程执行
+   - 信号日志：每个进程独占一个目录，进程重启后由新进程接管并补执行
+   - OKX接口限速：每个进程的限速器使用 1/workers 的额度
+4. worker退出时（重新部署、SIGTERM）等待已入队的信号执行完并落盘信号日志
+
+多进程的限制（SERVER_WORKERS > 1）：
+   文件锁只保证同一交易对不会在两个进程中同时执行，不保证到达顺序：
+   同一交易对的 buy、sell 先后到达不同进程时，可能先执行 sell 再执行 buy。
+   信号合并（DISPATCH_COALESCE）也只作用于本进程的队列，其他进程中排队的信号不会被合并或替换；
+   持仓/余额推送的状态在各进程中各自维护。
+   只有在同一交易对的信号总是路由到同一个进程时（例如按交易对分流的反向代理），才使用多进程。
+"""
+
+import logging
+import os
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', Config.SERVER_PORT)}"
+worker_class = 'gthread'
+workers = max(1, Config.SERVER_WORKERS)
+threads = max(1, Config.SERVER_THREADS)
+
+if workers > 1:
+    logger.warning(f"SERVER_WORKERS={workers}，不同worker进程之间不保证同一交易对信号的执行顺序")
+
+# OKX接口限速额度按API Key计算，各worker进程平分（worker进程在fork时继承该设置）
+if not os.environ.get('OKX_RATE_LIMIT_SHARE'):
+    Config.OKX_RATE_LIMIT_SHARE = 1.0 / workers
+
+# 信号在调度器中异步执行，HTTP请求本身很短；超时只用于回收卡死的worker
+timeout = 60
+# 退出时等待队列中的信号执行完（与 shutdown_server 的等待时间一致）
+graceful_timeout = 15
+keepalive = 5
+
+preload_app = False
+
+accesslog = '-'
+loglevel = Config.LOG_LEVEL.lower()
+
+
+def worker_exit(server, worker):
+    """worker进程退出前：停止调度器、关闭信号日志和去重索引"""
+    import sys
+    webhook_server = sys.modules.get('webhook_server')
+    if webhook_server is not None:
+        webhook_server.shutdown_server(timeout=graceful_timeout - 5)
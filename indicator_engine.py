@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式指标引擎 - 在服务端按K线增量计算零延迟趋势策略的信号
+
+backtest.py 对整段历史数组做向量化计算；这里对每根收盘K线做 O(1) 的增量更新，
+结果与回测（以及 zero_lag_strategy_webhook.pine）逐根一致：
+    zlema      EMA 递推（前 length 个值的简单平均作为初值），lag 用定长 deque 取 close[lag]
+    ATR        RMA 递推 true range（第一根K线为 high - low）
+    volatility ta.highest(atr, length * 3) 用单调队列维护滑动窗口最大值（均摊 O(1)）
+    trend      收盘价上穿 zlema + volatility 转为1，下穿 zlema - volatility 转为-1
+    多时间框架 candle_aggregator 一次遍历合成各周期K线，高级别K线收盘（其最后一根图表K线收盘）后
+               才用它更新该周期的趋势（lookahead_off）
+
+功能特点：
+1. 每个交易对只保存固定大小的状态（lag 个收盘价 + 单调队列 + 聚合器的环形缓冲区），与运行时间无关
+2. trend 上穿/下穿0且多时间框架同向时，生成与Pine脚本 alert 相同格式的信号
+   {"action","symbol","price","size","leverage","stop_loss","take_profit","timestamp"}，
+   timestamp 为K线开盘时间（与Pine的 time 相同），同一根K线的TradingView告警和本地信号去重键相同
+3. 重复/迟到的K线（开盘时间不大于上一根）只修正聚合器中存储的K线；预热（emit=False）和过时的K线只更新状态不出信号
+4. 只依赖标准库，web服务进程不需要加载NumPy
+
+使用方法：
+    engine = SignalEngine(length=70, mult=1.2, timeframes=('5', '15', '60'), mtf_required=3)
+    engine.seed_timeframe('BTC-USDT-SWAP', '60', hourly_candles)
+    signal = engine.on_bar('BTC-USDT-SWAP', ts, open_, high, low, close)
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+from candle_aggregator import CandleAggregator, timeframe_ms, MINUTE_MS
+
+logger = logging.getLogger(__name__)
+
+# ===== 增量指标 =====
+
+class StreamingEMA:
+    """ta.ema（alpha=2/(length+1)）/ ta.rma（alpha=1/length）的增量版本，初值为前 length 个值的简单平均"""
+
+    __slots__ = ('length', 'alpha', 'value', '_count', '_sum')
+
+    def __init__(self, length, alpha=None):
+        self.length = length
+        self.alpha = 2.0 / (length + 1) if alpha is None else alpha
+        self.value = None
+        self._count = 0
+        self._sum = 0.0
+
+    def update(self, x):
+        """加入一个新值，返回当前EMA（不足 length 个值时为None）"""
+        if self.value is None:
+            self._count += 1
+            self._sum += x
+            if self._count == self.length:
+                self.value = self._sum / self.length
+        else:
+            self.value = self.alpha * x + (1.0 - self.alpha) * self.value
+        return self.value
+
+
+class RollingMax:
+    """ta.highest 的增量版本：单调递减队列保存窗口内可能成为最大值的元素"""
+
+    __slots__ = ('window', '_items', '_count')
+
+    def __init__(self, window):
+        self.window = window
+        self._items = deque()   # (序号, 值)，值从队首到队尾递减
+        self._count = 0
+
+    def update(self, value):
+        """加入一个新值，返回最近 window 个值的最大值（不足 window 个时为None）"""
+        self._count += 1
+        items = self._items
+        while items and items[-1][1] <= value:
+            items.pop()
+        items.append((self._count, value))
+        if items[0][0] <= self._count - self.window:
+            items.popleft()
+        return items[0][1] if self._count >= self.window else None
+
+
+class ZeroLagTrend:
+    """一个时间周期上的零延迟趋势状态，与 backtest.zero_lag_trend 逐根一致"""
+
+    __slots__ = ('length', 'mult', 'lag', '_closes', '_zlema', '_atr', '_highest',
+                 '_prev_close', '_prev_upper', '_prev_lower', 'trend', 'zlema', 'volatility', 'bars')
+
+    def __init__(self, length=70, mult=1.2):
+        self.length = length
+        self.mult = mult
+        self.lag = (length - 1) // 2
+        self._closes = deque(maxlen=self.lag + 1)   # 队首即 close[lag]
+        self._zlema = StreamingEMA(length)
+        self._atr = StreamingEMA(length, alpha=1.0 / length)
+        self._highest = RollingMax(length * 3)
+        self._prev_close = None
+        self._prev_upper = None
+        self._prev_lower = None
+        self.trend = 0
+        self.zlema = None
+        self.volatility = None
+        self.bars = 0
+
+    def update(self, high, low, close):
+        """加入一根收盘K线，返回 trend（1/-1/0）"""
+        prev_close = self._prev_close
+        if prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        atr = self._atr.update(tr)
+        highest = self._highest.update(atr) if atr is not None else None
+
+        closes = self._closes
+        closes.append(close)
+        zlema = self._zlema.update(close + (close - closes[0])) if len(closes) > self.lag else None
+        volatility = highest * self.mult if highest is not None else None
+
+        upper = lower = None
+        if zlema is not None and volatility is not None:
+            upper = zlema + volatility
+            lower = zlema - volatility
+            # 上一根K线的上下轨为na时不算穿越；两个条件同时成立时下穿生效（与Pine脚本中 if 的顺序相同）
+            if self._prev_lower is not None and close < lower and prev_close >= self._prev_lower:
+                self.trend = -1
+            elif self._prev_upper is not None and close > upper and prev_close <= self._prev_upper:
+                self.trend = 1
+
+        self._prev_close = close
+        self._prev_upper = upper
+        self._prev_lower = lower
+        self.zlema = zlema
+        self.volatility = volatility
+        self.bars += 1
+        return self.trend
+
+
+class _SymbolState:
+    __slots__ = ('indicator', 'timeframes', 'last_ts', 'last_close', 'partial')
+
+    def __init__(self, indicator, timeframes):
+        self.indicator = indicator
+        self.timeframes = timeframes   # 时间框架 -> ZeroLagTrend（由聚合器收盘的高级别K线驱动）
+        self.last_ts = None
+        self.last_close = None
+        self.partial = None            # 最后一次推送的未收盘K线
+
+
+# ===== 信号引擎 =====
+
+class SignalEngine:
+    """按交易对维护趋势状态，在收盘K线上生成Pine脚本格式的开仓信号"""
+
+    def __init__(self, length=70, mult=1.2, timeframes=('5', '15', '60', '240', '1D'), mtf_required=3,
+                 use_mtf_filter=True, stop_loss_pct=2.0, take_profit_pct=4.0, position_size_usdt=1000.0,
+                 leverage=10, interval=MINUTE_MS, max_signal_age=None, candle_capacity=256):
+        """
+        length/mult/timeframes/mtf_required/use_mtf_filter: 与Pine脚本的输入参数相同
+        stop_loss_pct/take_profit_pct: 止损/止盈百分比，0 表示不设置（信号中对应字段为0）
+        position_size_usdt/leverage: 每次开仓的价值和杠杆，size = position_size_usdt / close
+        interval: 图表K线周期（毫秒），默认1分钟
+        max_signal_age: K线收盘超过该秒数后才处理到的信号不再发出（断线补数据时避免追单）
+        candle_capacity: 每个高级别周期保留的已收盘K线数量（聚合器的环形缓冲区）
+        """
+        self.length = length
+        self.mult = mult
+        self.interval = interval
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.position_size_usdt = position_size_usdt
+        self.leverage = leverage
+        self.max_signal_age = max_signal_age
+        # 只有开仓过滤用到的前 mtf_required 个周期需要计算
+        self.timeframes = tuple(timeframes)[:mtf_required] if use_mtf_filter else ()
+        # 不大于图表周期的时间框架就是图表本身的趋势，其余由聚合器用图表K线合成
+        self.higher = tuple(tf for tf in self.timeframes if timeframe_ms(tf)[0] > interval)
+        self.candles = CandleAggregator(self.higher, interval=interval, capacity=candle_capacity)
+
+        self._lock = threading.Lock()
+        self._states = {}
+
+        # 统计信息
+        self.bars = 0
+        self.signals = 0
+        self.suppressed = 0
+        self.stale = 0
+
+    def _state(self, inst_id):
+        state = self._states.get(inst_id)
+        if state is None:
+            timeframes = {tf: ZeroLagTrend(self.length, self.mult) for tf in self.higher}
+            state = self._states[inst_id] = _SymbolState(ZeroLagTrend(self.length, self.mult), timeframes)
+        return state
+
+    def seed_timeframe(self, inst_id, timeframe, candles, as_of=None):
+        """
+        用交易所的高级别K线预热一个时间框架（timeframe 为Pine周期字符串）
+        candles 为 (ts, open, high, low, close, volume, confirmed) 按时间递增，as_of 见 CandleAggregator.seed
+        """
+        if timeframe not in self.higher:
+            return
+        with self._lock:
+            indicator = self._state(inst_id).timeframes[timeframe]
+            for _, _, high, low, close, _ in self.candles.seed(inst_id, timeframe, candles, as_of):
+                indicator.update(high, low, close)
+
+    def last_bar(self, inst_id):
+        """最后处理的K线开盘时间（毫秒），没有则为None"""
+        with self._lock:
+            state = self._states.get(inst_id)
+            return state.last_ts if state is not None else None
+
+    def on_partial(self, inst_id, ts, open_, high, low, close, volume=0.0):
+        """未收盘K线的推送：只更新聚合器中的当前K线（指标只在K线收盘时计算）"""
+        with self._lock:
+            state = self._state(inst_id)
+            if state.last_ts is None or ts > state.last_ts:
+                state.partial = (ts, open_, high, low, close, volume)
+                self.candles.update(inst_id, ts, open_, high, low, close, volume, confirmed=False)
+
+    def on_bar(self, inst_id, ts, open_, high, low, close, volume=0.0, emit=True):
+        """
+        处理一根收盘K线，满足开仓条件时返回信号dict，否则返回None
+        emit=False 用于预热：只更新状态
+        """
+        with self._lock:
+            state = self._state(inst_id)
+            if state.last_ts is not None and ts <= state.last_ts:
+                # 迟到的K线只修正聚合器中存储的K线，已计算的趋势不重算（与Pine脚本不重绘一致）
+                self.candles.update(inst_id, ts, open_, high, low, close, volume)
+                self.stale += 1
+                return None
+            signal = None
+            partial, state.partial = state.partial, None
+            if partial is not None and partial[0] < ts:
+                # 没有收到上一根K线的收盘推送：按最后一次推送的数据收盘
+                signal = self._advance(state, inst_id, partial, emit)
+            signal = self._advance(state, inst_id, (ts, open_, high, low, close, volume), emit) or signal
+        return signal
+
+    def _advance(self, state, inst_id, bar, emit):
+        ts, open_, high, low, close, volume = bar
+        state.last_ts = ts
+        state.last_close = close
+        self.bars += 1
+
+        previous = state.indicator.trend
+        trend = state.indicator.update(high, low, close)
+        # 一次遍历更新所有高级别周期，刚收盘的高级别K线更新对应时间框架的趋势
+        for timeframe, closed in self.candles.update(inst_id, ts, open_, high, low, close, volume):
+            state.timeframes[timeframe].update(closed[2], closed[3], closed[4])
+
+        if trend > 0 >= previous:
+            action = 'buy'
+            aligned = all(indicator.trend > 0 for indicator in state.timeframes.values())
+        elif trend < 0 <= previous:
+            action = 'sell'
+            aligned = all(indicator.trend < 0 for indicator in state.timeframes.values())
+        else:
+            return None
+        if not aligned or not emit:
+            return None
+        age = time.time() - (ts + self.interval) / 1000
+        if self.max_signal_age is not None and age > self.max_signal_age:
+            self.suppressed += 1
+            logger.warning(f"{inst_id} K线收盘 {age:.0f} 秒后才处理，不再发出信号: {action}")
+            return None
+        self.signals += 1
+        return self.build_signal(action, inst_id, ts, close)
+
+    def build_signal(self, action, inst_id, ts, close):
+        """生成与Pine脚本 long_message/short_message 相同字段的信号"""
+        side = 1 if action == 'buy' else -1
+        stop_loss = close * (1 - side * self.stop_loss_pct / 100) if self.stop_loss_pct else 0
+        take_profit = close * (1 + side * self.take_profit_pct / 100) if self.take_profit_pct else 0
+        return {
+            'action': action,
+            'symbol': inst_id,
+            'price': close,
+            'size': self.position_size_usdt / close,
+            'leverage': self.leverage,
+            'stop_loss': stop_loss,
+            'take_profit': take_profit,
+            'timestamp': str(ts)
+        }
+
+    def trends(self, inst_id):
+        """当前趋势：{'chart': trend, 时间框架: trend}"""
+        with self._lock:
+            state = self._states.get(inst_id)
+            if state is None:
+                return None
+            result = {'chart': state.indicator.trend}
+            result.update((tf, indicator.trend) for tf, indicator in state.timeframes.items())
+            return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'symbols': len(self._states),
+                'bars': self.bars,
+                'signals': self.signals,
+                'suppressed': self.suppressed,
+                'stale': self.stale,
+                'trends': {inst_id: state.indicator.trend for inst_id, state in self._states.items()},
+                'candles': self.candles.stats()
+            }
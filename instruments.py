@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合约元数据索引 - SWAP合约规格与数量/价格量化
+
+OKX永续合约按"张"下单，数量必须是 lotSz 的整数倍且不小于 minSz，
+价格必须是 tickSz 的整数倍。而Pine策略发送的是币的数量
+（position_size_usdt / close），直接作为 sz 提交会被拒单。
+
+本模块：
+1. 启动时加载全部SWAP合约规格，后台定时刷新
+2. 规格在加载时转换为定点整数（单位 + 小数位数）；量化时输入按其最短十进制表示（repr）转换为定点数，
+   取整只做整数运算，0.3 / 0.1 这类浮点误差不会少算一手或错一个tick
+3. 币数量/USDT金额 -> 合法张数，止损止盈价格 -> tickSz 整数倍
+"""
+
+import asyncio
+import logging
+import time
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+def _to_fixed(text):
+    """把OKX的小数字符串转换为定点表示 (units, decimals)，例如 '0.01' -> (1, 2)"""
+    value = Decimal(text).normalize()
+    exponent = value.as_tuple().exponent
+    decimals = max(0, -exponent)
+    units = int(value.scaleb(decimals))
+    return units, decimals
+
+
+def _float_fixed(value):
+    """浮点数按最短十进制表示转换为定点数，例如 0.3 -> (3, 1)（而不是 0.29999999999999998...）"""
+    text = repr(float(value))
+    if 'e' in text:
+        return _to_fixed(text)
+    integer, _, fraction = text.partition('.')
+    fraction = fraction.rstrip('0')
+    return int(integer + fraction), len(fraction)
+
+
+def _ratio(numerator, denominator):
+    """两个定点数之比的分子、分母（整数）：a/10^da ÷ b/10^db = a*10^db / (b*10^da)"""
+    (a, da), (b, db) = numerator, denominator
+    return a * 10 ** db, b * 10 ** da
+
+
+def format_fixed(units, decimals):
+    """把定点数格式化为字符串（不使用浮点，避免 0.30000000000000004）"""
+    if decimals == 0:
+        return str(units)
+    sign = '-' if units < 0 else ''
+    units = abs(units)
+    scale = 10 ** decimals
+    integer, fraction = divmod(units, scale)
+    fraction_text = f"{fraction:0{decimals}d}".rstrip('0')
+    return f"{sign}{integer}.{fraction_text}" if fraction_text else f"{sign}{integer}"
+
+
+class InstrumentSpec:
+    """单个合约的规格（定点表示）"""
+
+    __slots__ = (
+        'inst_id', 'ct_type', 'ct_val', 'ct_val_fixed', 'ct_val_ccy', 'settle_ccy',
+        'lot_units', 'lot_decimals', 'lot_size',
+        'min_units', 'min_size',
+        'tick_units', 'tick_decimals', 'tick_size'
+    )
+
+    def __init__(self, data):
+        self.inst_id = data['instId']
+        self.ct_type = data.get('ctType', 'linear')
+        self.ct_val = float(data['ctVal'])
+        self.ct_val_fixed = _to_fixed(data['ctVal'])
+        self.ct_val_ccy = data.get('ctValCcy', '')
+        self.settle_ccy = data.get('settleCcy', '')
+
+        self.lot_units, self.lot_decimals = _to_fixed(data['lotSz'])
+        self.lot_size = float(data['lotSz'])
+
+        # minSz 换算到 lotSz 的小数位数下
+        min_units, min_decimals = _to_fixed(data.get('minSz') or data['lotSz'])
+        self.min_units = min_units * 10 ** max(0, self.lot_decimals - min_decimals)
+        self.min_size = float(data.get('minSz') or data['lotSz'])
+
+        self.tick_units, self.tick_decimals = _to_fixed(data['tickSz'])
+        self.tick_size = float(data['tickSz'])
+
+    def _quantize_lots(self, numerator, denominator):
+        """张数 = numerator / denominator，向下取整到 lotSz 的整数倍，返回 (units, 字符串)"""
+        # 手数 = 张数 / lotSz = numerator * 10^lot_decimals / (denominator * lot_units)
+        lots = numerator * 10 ** self.lot_decimals // (denominator * self.lot_units)
+        units = lots * self.lot_units
+        if units < self.min_units:
+            return 0, '0'
+        return units, format_fixed(units, self.lot_decimals)
+
+    def quantize_contracts(self, contracts):
+        """
+        把张数向下取整到 lotSz 的整数倍
+        返回 (张数定点值units, 字符串)，小于 minSz 时返回 (0, '0')
+        """
+        units, decimals = _float_fixed(abs(contracts))
+        return self._quantize_lots(units, 10 ** decimals)
+
+    def contracts_from_coin(self, coin_amount):
+        """币数量 -> 张数（线性合约：张数 = 币数量 / ctVal），整数运算"""
+        return self._quantize_lots(*_ratio(_float_fixed(abs(coin_amount)), self.ct_val_fixed))
+
+    def contracts_from_quote(self, quote_amount, price):
+        """
+        计价货币金额（USDT/USD）-> 张数
+        线性合约按价格折算成币数量（一次浮点除法）；反向合约每张面值为 ctVal 美元
+        """
+        if self.ct_type == 'inverse':
+            return self._quantize_lots(*_ratio(_float_fixed(abs(quote_amount)), self.ct_val_fixed))
+        return self.contracts_from_coin(abs(quote_amount) / price)
+
+    def contracts_value(self, units):
+        """定点张数 -> 浮点张数"""
+        return units / 10 ** self.lot_decimals
+
+    def notional(self, contracts, price):
+        """张数 -> 名义价值（USDT/USD）：线性合约按价格折算，反向合约每张面值为 ctVal 美元"""
+        if self.ct_type == 'inverse':
+            return abs(contracts) * self.ct_val
+        return abs(contracts) * self.ct_val * price
+
+    def snap_price(self, price, mode='nearest'):
+        """
+        价格对齐到 tickSz 的整数倍，返回字符串（整数运算）
+        mode: nearest 四舍五入, down 向下, up 向上
+        """
+        # tick数 = price / tickSz = numerator / denominator
+        numerator, denominator = _ratio(_float_fixed(price), (self.tick_units, self.tick_decimals))
+        if mode == 'down':
+            count = numerator // denominator
+        elif mode == 'up':
+            count = -(-numerator // denominator)
+        else:
+            count = (2 * numerator + denominator) // (2 * denominator)
+        return format_fixed(count * self.tick_units, self.tick_decimals)
+
+
+class InstrumentIndex:
+    """SWAP合约规格索引（读取无锁：刷新时整体替换字典）"""
+
+    def __init__(self, client, inst_type='SWAP'):
+        self.client = client
+        self.inst_type = inst_type
+        self._specs = {}
+        self.loaded_at = None
+        self.refreshes = 0
+        self._refresh_future = None
+
+    def __contains__(self, inst_id):
+        return inst_id in self._specs
+
+    def __len__(self):
+        return len(self._specs)
+
+    def get(self, inst_id):
+        return self._specs.get(inst_id)
+
+    def inst_ids(self):
+        return list(self._specs)
+
+    def load(self, instruments):
+        """从 /public/instruments 的 data 构建索引（只保留可交易的合约）"""
+        specs = {}
+        for data in instruments:
+            if data.get('state', 'live') != 'live':
+                continue
+            try:
+                specs[data['instId']] = InstrumentSpec(data)
+            except (KeyError, ValueError, ArithmeticError) as e:
+                logger.warning(f"跳过无法解析的合约规格 {data.get('instId')}: {e}")
+        self._specs = specs
+        self.loaded_at = time.time()
+        self.refreshes += 1
+        return len(specs)
+
+    async def refresh(self):
+        """重新拉取合约列表"""
+        result = await self.client.get_instruments(instType=self.inst_type)
+        if result.get('code') != '0':
+            raise RuntimeError(f"获取合约列表失败: {result.get('msg')}")
+        count = self.load(result.get('data', []))
+        logger.info(f"合约规格已加载: {count} 个{self.inst_type}合约")
+        return count
+
+    async def _refresh_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"刷新合约规格失败: {e}")
+
+    def start(self, loop_thread, interval=3600):
+        """在后台事件循环中定时刷新"""
+        if self._refresh_future is None:
+            self._refresh_future = loop_thread.submit(self._refresh_loop(interval))
+
+    def stats(self):
+        return {
+            'instruments': len(self._specs),
+            'refreshes': self.refreshes,
+            'age_seconds': round(time.time() - self.loaded_at, 1) if self.loaded_at else None
+        }
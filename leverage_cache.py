@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+杠杆状态缓存 - 避免重复调用 set_leverage
+
+Pine策略几乎每次都发送相同的 leverage，而每次 set_leverage 都是一次
+带签名的请求，并占用OKX的限速额度。本模块按 (instId, mgnMode) 记录
+当前已生效的杠杆，只有请求值与缓存不同时才需要真正调用接口。
+
+缓存来源：
+1. 启动时通过 /api/v5/account/leverage-info 批量预热
+2. 每次 set_leverage 成功后更新
+3. set_leverage 或下单失败时作废，下次强制重新设置
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# leverage-info 接口单次最多查询的交易对数量
+SEED_BATCH_SIZE = 20
+
+
+class LeverageCache:
+    """按 (instId, mgnMode) 缓存已生效的杠杆倍数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._levers = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, inst_id, mgn_mode):
+        with self._lock:
+            return self._levers.get((inst_id, mgn_mode))
+
+    def needs_update(self, inst_id, mgn_mode, leverage):
+        """请求的杠杆与缓存不同（或未知）时返回True，同时记录命中统计"""
+        with self._lock:
+            cached = self._levers.get((inst_id, mgn_mode))
+            if cached is not None and cached == float(leverage):
+                self.hits += 1
+                return False
+            self.misses += 1
+            return True
+
+    def set(self, inst_id, mgn_mode, leverage):
+        with self._lock:
+            self._levers[(inst_id, mgn_mode)] = float(leverage)
+
+    def invalidate(self, inst_id=None, mgn_mode=None):
+        """作废缓存；不传参数时清空全部"""
+        with self._lock:
+            if inst_id is None:
+                self._levers.clear()
+            else:
+                for key in [k for k in self._levers if k[0] == inst_id and (mgn_mode is None or k[1] == mgn_mode)]:
+                    del self._levers[key]
+            self.invalidations += 1
+
+    def load(self, entries):
+        """
+        从 leverage-info 返回的 data 加载缓存
+        同一交易对的多个方向（long/short）杠杆不一致时不缓存，交由 set_leverage 统一
+        """
+        grouped = {}
+        for entry in entries:
+            key = (entry.get('instId'), entry.get('mgnMode'))
+            try:
+                grouped.setdefault(key, set()).add(float(entry.get('lever')))
+            except (TypeError, ValueError):
+                continue
+
+        loaded = 0
+        with self._lock:
+            for key, levers in grouped.items():
+                if len(levers) == 1 and key[0]:
+                    self._levers[key] = levers.pop()
+                    loaded += 1
+        return loaded
+
+    async def seed(self, client, inst_ids, mgn_mode='cross'):
+        """启动时通过 leverage-info 接口预热缓存"""
+        inst_ids = list(inst_ids)
+        loaded = 0
+        for i in range(0, len(inst_ids), SEED_BATCH_SIZE):
+            batch = ','.join(inst_ids[i:i + SEED_BATCH_SIZE])
+            try:
+                result = await client.get_leverage(instId=batch, mgnMode=mgn_mode)
+            except Exception as e:
+                logger.warning(f"预热杠杆缓存失败: {e}")
+                continue
+            if result.get('code') == '0':
+                loaded += self.load(result.get('data', []))
+            else:
+                logger.warning(f"预热杠杆缓存失败: {result.get('msg')}")
+        logger.info(f"杠杆缓存已预热: {loaded} 个交易对")
+        return loaded
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._levers),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
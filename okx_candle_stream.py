@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OKX K线推送 - 把公共K线频道接入流式指标引擎，在服务端直接生成交易信号
+
+功能特点：
+1. 后台订阅OKX business 频道 candle1m（可配置周期），已收盘（confirm=1）的K线驱动指标，
+   未收盘K线的推送只更新聚合器中的当前K线
+2. 启动时用REST预热：图表周期K线和每个多时间框架周期的K线（高级别K线直接取交易所数据，
+   不需要用几百天的1分钟K线合成），未收盘的高级别K线作为当前周期的起点
+3. 每次重连后用REST补齐断线期间收盘的K线，引擎自动忽略重复的K线
+4. 产生的信号在线程池中交给回调（写信号日志、入队），不阻塞共享的IO事件循环
+5. WebSocket地址和连接函数都可以替换，方便用本地WebSocket服务测试
+
+使用方法：
+    stream = CandleStream(engine, client, loop_thread, ['BTC-USDT-SWAP'], on_signal=submit)
+    stream.start()
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+import websockets
+
+from candle_aggregator import timeframe_ms, MINUTE_MS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUSINESS_URL = 'wss://ws.okx.com:8443/ws/v5/business'
+DEMO_BUSINESS_URL = 'wss://wspap.okx.com:8443/ws/v5/business?brokerId=9999'
+
+# OKX要求30秒内有数据往来，否则断开
+PING_INTERVAL = 20
+
+# /market/candles 每次最多返回300根（只能查最近1440根），/market/history-candles 每次最多100根
+CANDLES_PAGE = 300
+HISTORY_PAGE = 100
+
+
+def okx_bar(timeframe):
+    """
+    Pine时间周期 -> OKX K线周期（"5" -> 5m，"60" -> 1H，"1D" -> 1Dutc）
+    6小时及以上的K线默认按UTC+8对齐，使用 utc 后缀与TradingView的UTC对齐一致
+    """
+    period, offset = timeframe_ms(timeframe)
+    if period % 1000 or period < MINUTE_MS:
+        raise ValueError(f"OKX没有该周期的K线: {timeframe}")
+    minutes = period // MINUTE_MS
+    if minutes % (7 * 1440) == 0:
+        return f"{minutes // (7 * 1440)}Wutc"
+    if minutes % 1440 == 0:
+        return f"{minutes // 1440}Dutc"
+    if minutes % 60 == 0:
+        hours = minutes // 60
+        return f"{hours}H" if hours < 6 else f"{hours}Hutc"
+    return f"{minutes}m"
+
+
+def parse_candle(row):
+    """[ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm] -> (ts, open, high, low, close, volume, confirmed)"""
+    return (int(row[0]), float(row[1]), float(row[2]), float(row[3]), float(row[4]),
+            float(row[5]) if len(row) > 5 else 0.0, len(row) < 9 or row[8] == '1')
+
+
+class CandleStream:
+    """K线频道订阅，驱动 SignalEngine"""
+
+    def __init__(self, engine, client, loop_thread, symbols, on_signal=None, timeframe='1',
+                 url=None, connect=None, warmup_bars=1000):
+        """
+        engine: indicator_engine.SignalEngine
+        client: OKXAsyncClient，用于REST预热和补数据
+        loop_thread: AsyncLoopThread，订阅协程运行在该事件循环上
+        symbols: OKX合约ID列表
+        on_signal: 信号回调 callback(signal_dict)，在线程池中调用
+        timeframe: 图表周期（Pine周期字符串），需与引擎的 interval 一致
+        warmup_bars: 每个周期预热的K线数量（EMA/RMA需要足够长的历史才与TradingView收敛）
+        """
+        self.engine = engine
+        self.client = client
+        self.loop_thread = loop_thread
+        self.symbols = list(symbols)
+        self.on_signal = on_signal
+        self.timeframe = timeframe
+        self.bar = okx_bar(timeframe)
+        self.url = url or (DEMO_BUSINESS_URL if client.flag == '1' else DEFAULT_BUSINESS_URL)
+        self._connect = connect or websockets.connect
+        self.warmup_bars = warmup_bars
+
+        self._lock = threading.Lock()
+        self._warm = set()
+        self._future = None
+        self._stopping = False
+
+        # 统计信息
+        self.reconnects = 0
+        self.messages = 0
+        self.candles = 0
+        self.backfilled = 0
+        self.signals = 0
+        self.callback_errors = 0
+
+    # ===== REST =====
+
+    async def fetch_candles(self, inst_id, bar, count):
+        """最近 count 根K线（含未收盘的最后一根），按时间递增"""
+        rows = []
+        after = None
+        fetch, page = self.client.get_candles, CANDLES_PAGE
+        while len(rows) < count:
+            result = await fetch(inst_id, bar=bar, after=after, limit=str(min(page, count - len(rows))))
+            if result.get('code') != '0':
+                raise RuntimeError(f"获取K线失败 {inst_id} {bar}: {result.get('msg')}")
+            data = result.get('data') or []
+            if not data:
+                if fetch == self.client.get_history_candles:
+                    break
+                # 最近的K线接口只保留1440根，更早的改用历史K线接口
+                fetch, page = self.client.get_history_candles, HISTORY_PAGE
+                continue
+            rows.extend(data)
+            after = data[-1][0]
+        return [parse_candle(row) for row in reversed(rows)]
+
+    async def warmup(self, inst_id):
+        """预热一个交易对：先高级别周期，再图表周期（图表K线按顺序送入引擎，不出信号）"""
+        for timeframe in self.engine.timeframes:
+            try:
+                bar = okx_bar(timeframe)
+            except ValueError as e:
+                logger.warning(f"{e}，{timeframe} 周期只用图表K线合成")
+                continue
+            if timeframe_ms(timeframe)[0] <= self.engine.interval:
+                continue
+            as_of = int(time.time() * 1000) // self.engine.interval * self.engine.interval
+            candles = await self.fetch_candles(inst_id, bar, self.warmup_bars)
+            self.engine.seed_timeframe(inst_id, timeframe, candles, as_of)
+
+        candles = await self.fetch_candles(inst_id, self.bar, self.warmup_bars)
+        for ts, open_, high, low, close, volume, confirmed in candles:
+            if confirmed:
+                self.engine.on_bar(inst_id, ts, open_, high, low, close, volume, emit=False)
+        with self._lock:
+            self._warm.add(inst_id)
+        logger.info(f"{inst_id} 指标预热完成: {len(candles)} 根K线，趋势 {self.engine.trends(inst_id)}")
+
+    async def backfill(self, inst_id):
+        """补齐断线期间收盘的K线（可能产生信号，过时的信号由引擎丢弃）"""
+        last = self.engine.last_bar(inst_id)
+        missed = (int(time.time() * 1000) - last) // self.engine.interval if last else CANDLES_PAGE
+        if missed <= 1:
+            return
+        candles = await self.fetch_candles(inst_id, self.bar, min(missed + 1, CANDLES_PAGE))
+        for candle in candles:
+            if candle[6] and self._process(inst_id, candle):
+                self.backfilled += 1
+
+    # ===== 推送处理 =====
+
+    def _process(self, inst_id, candle):
+        """收盘K线送入引擎，返回是否是新K线"""
+        ts, open_, high, low, close, volume, _ = candle
+        last = self.engine.last_bar(inst_id)
+        if last is not None and ts <= last:
+            return False
+        signal = self.engine.on_bar(inst_id, ts, open_, high, low, close, volume)
+        if signal is not None:
+            self.signals += 1
+            logger.info(f"K线信号: {signal}")
+            if self.on_signal is not None:
+                asyncio.get_running_loop().run_in_executor(None, self._deliver, signal)
+        return True
+
+    def _deliver(self, signal):
+        try:
+            self.on_signal(signal)
+        except Exception as e:
+            self.callback_errors += 1
+            logger.error(f"K线信号处理失败: {signal} {e}")
+
+    def handle_message(self, message):
+        """处理一条WebSocket推送（需在事件循环中调用）"""
+        self.messages += 1
+        if message == 'pong':
+            return
+        data = json.loads(message)
+        if 'event' in data:
+            if data['event'] == 'error':
+                logger.error(f"OKX K线频道错误: {data}")
+            return
+
+        inst_id = data.get('arg', {}).get('instId')
+        with self._lock:
+            warm = inst_id in self._warm
+        if not warm:
+            return
+        for row in data.get('data', []):
+            candle = parse_candle(row)
+            if not candle[6]:
+                self.engine.on_partial(inst_id, *candle[:6])
+            elif self._process(inst_id, candle):
+                self.candles += 1
+
+    # ===== 订阅循环 =====
+
+    async def _session(self):
+        async with self._connect(self.url, ping_interval=None) as ws:
+            await ws.send(json.dumps({
+                'op': 'subscribe',
+                'args': [{'channel': f"candle{self.bar}", 'instId': inst_id} for inst_id in self.symbols]
+            }))
+            # 订阅之后再补数据，之后的推送不会遗漏（重复的K线由引擎忽略）
+            for inst_id in self.symbols:
+                try:
+                    await self.backfill(inst_id)
+                except Exception as e:
+                    logger.warning(f"{inst_id} 补齐K线失败: {e}")
+
+            while not self._stopping:
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    await ws.send('ping')
+                    continue
+                self.handle_message(message)
+
+    async def _run(self):
+        # 预热在连接之前完成（可能需要几十个REST请求），失败的交易对稍后重试
+        backoff = 1
+        while not self._stopping:
+            pending = [inst_id for inst_id in self.symbols if inst_id not in self._warm]
+            results = await asyncio.gather(*(self.warmup(inst_id) for inst_id in pending), return_exceptions=True)
+            failed = [(inst_id, e) for inst_id, e in zip(pending, results) if isinstance(e, Exception)]
+            for inst_id, e in failed:
+                logger.warning(f"{inst_id} 指标预热失败: {e}")
+            if not failed:
+                break
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+        backoff = 1
+        while not self._stopping:
+            try:
+                await self._session()
+                backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"K线频道连接断开: {e}，{backoff}秒后重连")
+            if self._stopping:
+                break
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def start(self):
+        """在后台事件循环中启动预热和订阅"""
+        if self._future is None:
+            self._stopping = False
+            self._future = self.loop_thread.submit(self._run())
+            logger.info(f"启动OKX K线频道订阅: {self.url} {self.bar} {len(self.symbols)} 个交易对")
+
+    def stop(self):
+        self._stopping = True
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+
+    def stats(self):
+        with self._lock:
+            warm = len(self._warm)
+        return {
+            'url': self.url,
+            'bar': self.bar,
+            'symbols': len(self.symbols),
+            'warm': warm,
+            'reconnects': self.reconnects,
+            'messages': self.messages,
+            'candles': self.candles,
+            'backfilled': self.backfilled,
+            'signals': self.signals,
+            'callback_errors': self.callback_errors,
+            'engine': self.engine.stats()
+        }
@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OKX REST客户端 - 基于asyncio的原生实现
+
+功能特点：
+1. 自行完成OKX v5接口签名，不依赖官方SDK
+2. 每个主机维护一个长连接池（keep-alive，支持HTTP/2），交易路径不再重复TLS握手
+3. 一个客户端可以被多个协程同时使用，多个交易所请求可以并发进行
+4. 方法名与参数与官方SDK保持一致，OKXTrader可直接替换使用
+5. AsyncLoopThread/SyncOKXClient 供同步代码（Flask、工作线程）调用
+6. 可选的限速器（rate_limiter.RateLimiter）：发送前按接口限速排队，
+   被交易所限速（50011）的请求等待后重新发送，而不是直接返回失败
+7. 可选的重试策略（okx_retry.RetryPolicies）：超时/5xx按退避重试，行情查询对冲，
+   下单请求带 expTime 有效期，重试前按 clOrdId 确认订单是否已存在，同一订单不会提交两次
+
+签名规则：
+sign = Base64(HMAC_SHA256(secret, timestamp + method + requestPath + body))
+"""
+
+import asyncio
+import base64
+import concurrent.futures
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+import httpx
+
+from metrics import metrics
+from okx_retry import RETRYABLE_CODES
+from tracing import record_span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = 'https://www.okx.com'
+
+# 请求确定没有发出的网络错误（重新发送不会重复执行）
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# 按 clOrdId 查询订单时"订单不存在"的错误码
+ORDER_NOT_FOUND = '51603'
+
+
+class OKXAPIError(Exception):
+    """OKX接口返回了非JSON响应或网络层错误"""
+
+    def __init__(self, message, status_code=None, sent=True):
+        """sent: 请求是否可能已经到达交易所（连接失败时为False，重新发送是安全的）"""
+        super().__init__(message)
+        self.status_code = status_code
+        self.sent = sent
+
+    @property
+    def retryable(self):
+        """网络层错误和5xx可以重试，其他HTTP错误不重试"""
+        return self.status_code is None or self.status_code >= 500
+
+
+def _timestamp():
+    """OKX要求的ISO8601毫秒时间戳"""
+    now = datetime.now(timezone.utc)
+    return now.strftime('%Y-%m-%dT%H:%M:%S.') + f"{now.microsecond // 1000:03d}Z"
+
+
+def _count_result(path, result):
+    """统计OKX返回码：批量/部分失败时按每笔订单的 sCode 计数"""
+    code = str(result.get('code', ''))
+    if code == '0':
+        metrics.count_okx_result(path)
+        return
+    codes = [
+        str(item['sCode']) for item in result.get('data') or []
+        if isinstance(item, dict) and item.get('sCode') not in (None, '', '0')
+    ]
+    metrics.count_okx_result(path, codes or [code])
+
+
+def _clean(params):
+    """去掉值为None的参数（SDK会把None当空值处理）"""
+    return {k: v for k, v in params.items() if v is not None}
+
+
+def _client_ids(body, id_field):
+    """下单请求中每笔订单的客户端ID，有订单没有ID时返回None（不能安全重试）"""
+    orders = body if isinstance(body, list) else [body or {}]
+    ids = [order.get(id_field) if isinstance(order, dict) else None for order in orders]
+    return ids if ids and all(ids) else None
+
+
+def _merge_orders(body, id_field, confirmed, result):
+    """
+    合并批量下单的结果：confirmed 为重试前已确认存在的订单（clOrdId -> 结果项），
+    result 为最后一次发送（只包含剩余订单）的响应；返回顺序与原始请求一致
+    """
+    latest = {}
+    for item in (result or {}).get('data') or []:
+        if isinstance(item, dict) and item.get(id_field):
+            latest[item[id_field]] = item
+    data = []
+    for order in body:
+        client_id = order[id_field]
+        item = confirmed.get(client_id) or latest.get(client_id)
+        if item is None:
+            item = {id_field: client_id, 'ordId': '', 'sCode': str((result or {}).get('code') or '50004'),
+                    'sMsg': (result or {}).get('msg') or '订单状态未知'}
+        data.append(item)
+    failed = sum(1 for item in data if item.get('sCode') != '0')
+    code = '0' if not failed else ('1' if failed == len(data) else '2')
+    return {'code': code, 'msg': '' if code == '0' else (result or {}).get('msg', ''), 'data': data}
+
+
+class OKXAsyncClient:
+    """OKX v5 REST异步客户端"""
+
+    def __init__(self, api_key='', secret_key='', passphrase='', flag='1',
+                 base_url=DEFAULT_BASE_URL, timeout=10.0, http2=True, max_connections=20,
+                 rate_limiter=None, rate_limit_retries=3, retry=None, order_expiry=3.0):
+        """
+        flag: "0" 正式环境, "1" 模拟盘（会带上 x-simulated-trading 头）
+        base_url: REST接口地址
+        rate_limiter: RateLimiter，None 表示不限速
+        rate_limit_retries: 被交易所限速的请求最多重新发送的次数
+        retry: okx_retry.RetryPolicies，None 表示失败时不重试
+        order_expiry: 可重试的下单请求的有效期（秒，expTime请求头），
+                      超过有效期交易所不再执行，之后按 clOrdId 查询的结果是确定的
+        """
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.flag = flag
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.http2 = http2
+        self.max_connections = max_connections
+        self.rate_limiter = rate_limiter
+        self.rate_limit_retries = rate_limit_retries
+        self.retry = retry
+        self.order_expiry = order_expiry
+        self._sessions = {}
+
+    def _session(self, host):
+        """获取（或创建）某个主机的长连接池"""
+        session = self._sessions.get(host)
+        if session is None:
+            session = httpx.AsyncClient(
+                base_url=host,
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60.0
+                ),
+                headers={'Content-Type': 'application/json'}
+            )
+            self._sessions[host] = session
+        return session
+
+    def _sign(self, timestamp, method, request_path, body):
+        message = f"{timestamp}{method}{request_path}{body}"
+        digest = hmac.new(
+            self.secret_key.encode('utf-8'),
+            message.encode('utf-8'),
+            hashlib.sha256
+        ).digest()
+        return base64.b64encode(digest).decode('ascii')
+
+    async def request(self, method, path, params=None, body=None, auth=True):
+        """
+        发送请求并返回OKX响应JSON（dict）
+        method: GET 或 POST
+        path: 例如 /api/v5/account/balance
+        失败时按 self.retry 的策略重试，重试用尽后返回最后一次的响应（或抛出最后一次的异常）
+        每次发送、重试前的订单查询都限制在 self.retry.deadline 之内，超过后不再发送
+        """
+        method = method.upper()
+        if params:
+            params = _clean(params)
+        if self.retry is None:
+            return await self._paced(method, path, params, body, auth)
+
+        policy = self.retry.policy(method, path)
+        client_ids = _client_ids(body, policy.id_field) if method == 'POST' and policy.id_field else None
+        original = body
+        confirmed = {}   # 重试前按 clOrdId 确认已存在的订单
+        deadline = time.monotonic() + self.retry.deadline
+        self.retry.record_request(path)
+
+        attempt = 0
+        while True:
+            remaining_time = deadline - time.monotonic()
+            # 带 clOrdId 的下单请求设置有效期（不晚于截止时间），过期后交易所不会再执行这次请求
+            expires = time.time() + min(self.order_expiry, remaining_time) if client_ids else None
+            error = result = None
+            try:
+                if method == 'GET' and policy.hedge_after:
+                    sending = self._hedged(path, params, auth, policy.hedge_after)
+                else:
+                    sending = self._paced(method, path, params, body, auth, expires)
+                result = await asyncio.wait_for(sending, max(0.0, remaining_time))
+                if str(result.get('code')) not in RETRYABLE_CODES:
+                    break
+            except asyncio.TimeoutError:
+                error = OKXAPIError(f"请求OKX超过截止时间 {self.retry.deadline}秒: {method} {path}")
+                break
+            except OKXAPIError as e:
+                if not e.retryable:
+                    raise
+                error = e
+            # 写接口：请求可能已经被执行，只有能确认结果（clOrdId）或幂等时才重试
+            sent = error is None or error.sent
+            if method == 'POST' and sent and not (client_ids or policy.idempotent):
+                break
+            if attempt >= policy.retries:
+                break
+            delay = policy.backoff(attempt)
+            if client_ids and sent:
+                delay = max(delay, expires - time.time() + 0.1)
+            if time.monotonic() + delay > deadline or not self.retry.allow_retry(path):
+                break
+            reason = error or f"code={result.get('code')} {result.get('msg', '')}"
+            logger.warning(f"OKX请求失败，{delay:.2f}秒后重试({attempt + 1}/{policy.retries}): {method} {path}: {reason}")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+            if client_ids and sent:
+                try:
+                    remaining = await asyncio.wait_for(
+                        self._unconfirmed_orders(original, policy.id_field, confirmed),
+                        max(0.0, deadline - time.monotonic())
+                    )
+                except asyncio.TimeoutError:
+                    logger.error(f"确认订单状态超过截止时间，放弃重试: {method} {path}")
+                    remaining = None
+                if remaining is None:
+                    # 无法确认上一次请求的结果，不能重新发送
+                    break
+                if not remaining:
+                    break
+                body = remaining if isinstance(original, list) else remaining[0]
+            if deadline - time.monotonic() <= 0:
+                break
+
+        if confirmed:
+            self.retry.count(path, 'recovered')
+            if isinstance(original, list):
+                return _merge_orders(original, policy.id_field, confirmed, result)
+            return {'code': '0', 'msg': '', 'data': [confirmed[client_ids[0]]]}
+        if error is not None:
+            raise error
+        return result
+
+    async def _unconfirmed_orders(self, orders, id_field, confirmed):
+        """
+        按 clOrdId 查询上一次请求中的订单，已存在的记入 confirmed
+        返回仍需要发送的订单列表；有订单无法确认状态时返回None
+        """
+        orders = orders if isinstance(orders, list) else [orders]
+        pending = [order for order in orders if order[id_field] not in confirmed]
+
+        async def lookup(order):
+            try:
+                return await self._paced('GET', '/api/v5/trade/order',
+                                         {'instId': order['instId'], id_field: order[id_field]}, None, True)
+            except OKXAPIError as e:
+                return {'code': 'error', 'msg': str(e)}
+
+        remaining = []
+        for order, found in zip(pending, await asyncio.gather(*(lookup(order) for order in pending))):
+            code = str(found.get('code'))
+            if code == '0' and found.get('data'):
+                item = found['data'][0]
+                confirmed[order[id_field]] = {
+                    'ordId': item.get('ordId', ''), id_field: order[id_field],
+                    'tag': item.get('tag', ''), 'sCode': '0', 'sMsg': 'Order already exists'
+                }
+                logger.info(f"订单已存在，不再重复提交: {order[id_field]} ordId={item.get('ordId')}")
+            elif code == ORDER_NOT_FOUND:
+                remaining.append(order)
+            else:
+                logger.error(f"无法确认订单 {order[id_field]} 是否已提交，放弃重试: {found.get('msg')}")
+                return None
+        return remaining
+
+    async def _hedged(self, path, params, auth, hedge_after):
+        """对冲查询：hedge_after 秒内未返回则再发一个相同请求，先返回的结果生效"""
+        first = asyncio.ensure_future(self._paced('GET', path, params, None, auth))
+        pending = {first}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=hedge_after)
+            if done:
+                return first.result()
+
+            self.retry.count(path, 'hedged')
+            second = asyncio.ensure_future(self._paced('GET', path, params, None, auth))
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None or not pending:
+                        if task is second:
+                            self.retry.count(path, 'hedge_won')
+                        return task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _paced(self, method, path, params, body, auth, expires=None):
+        """经过限速器发送请求，被交易所限速时排队后重新发送"""
+        request_path = f"{path}?{urlencode(params)}" if params else path
+        body_text = ''
+        if method == 'POST':
+            if isinstance(body, list):
+                body_text = json.dumps([_clean(item) for item in body])
+            else:
+                body_text = json.dumps(_clean(body or {}))
+
+        url = f"{self.base_url}{request_path}"
+        host = '{0.scheme}://{0.netloc}'.format(urlsplit(url))
+        attempt = 0
+        while True:
+            buckets = []
+            if self.rate_limiter is not None:
+                queued = time.perf_counter()
+                buckets, delay = await self.rate_limiter.acquire(method, path, params, body)
+                if delay > 0:
+                    metrics.histogram('okx_rate_limit_wait_seconds', (('endpoint', path),)).record(delay)
+                    record_span(f"rate_limit {path}", queued, time.perf_counter())
+
+            # 签名时间戳必须在排队之后生成（OKX要求与服务器时间相差30秒以内）
+            response, result = await self._send(host, method, path, request_path, body_text, auth, expires)
+            if not self.rate_limiter or not self.rate_limiter.feedback(
+                    buckets, response.headers, response.status_code, result.get('code')):
+                return result
+            # 被限速的请求交易所没有处理，重新排队发送是安全的（包括下单）
+            metrics.inc('okx_rate_limited_total', (('endpoint', path),))
+            if attempt >= self.rate_limit_retries:
+                return result
+            attempt += 1
+
+    async def _send(self, host, method, path, request_path, body_text, auth, expires=None):
+        """签名并发送一次请求，返回 (响应, 响应JSON)"""
+        headers = {}
+        if expires is not None:
+            headers['expTime'] = str(int(expires * 1000))
+        if auth:
+            timestamp = _timestamp()
+            headers.update({
+                'OK-ACCESS-KEY': self.api_key,
+                'OK-ACCESS-SIGN': self._sign(timestamp, method, request_path, body_text),
+                'OK-ACCESS-TIMESTAMP': timestamp,
+                'OK-ACCESS-PASSPHRASE': self.passphrase
+            })
+        if self.flag == '1':
+            headers['x-simulated-trading'] = '1'
+
+        span_name = f"okx {method} {path}"
+        started = time.perf_counter()
+        try:
+            response = await self._session(host).request(
+                method,
+                request_path,
+                content=body_text if method == 'POST' else None,
+                headers=headers
+            )
+        except httpx.HTTPError as e:
+            metrics.count_okx_result(path, ['transport'])
+            record_span(span_name, started, time.perf_counter(), error=f"{type(e).__name__}: {e}")
+            raise OKXAPIError(f"请求OKX失败: {method} {path}: {e}",
+                              sent=not isinstance(e, NOT_SENT_ERRORS)) from e
+        finally:
+            metrics.observe_request(path, time.perf_counter() - started)
+        ended = time.perf_counter()
+
+        try:
+            result = response.json()
+        except ValueError:
+            metrics.count_okx_result(path, [f"http_{response.status_code}"])
+            record_span(span_name, started, ended, error='non-JSON response', http_status=response.status_code)
+            if response.status_code == 429 and self.rate_limiter is not None:
+                # 限速响应可能不是JSON，交给限速器处理
+                return response, {'code': '50011', 'msg': 'Too Many Requests', 'data': []}
+            raise OKXAPIError(
+                f"OKX返回非JSON响应: HTTP {response.status_code} {response.text[:200]}",
+                status_code=response.status_code
+            )
+        _count_result(path, result)
+        record_span(span_name, started, ended, http_status=response.status_code, code=result.get('code'))
+        return response, result
+
+    async def warmup(self):
+        """预先建立连接（TLS握手在启动时完成，而不是在第一笔交易时）"""
+        try:
+            await self.get_system_time()
+        except Exception as e:
+            logger.warning(f"OKX连接预热失败: {e}")
+
+    async def aclose(self):
+        """关闭所有连接池"""
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        for session in sessions:
+            await session.aclose()
+
+    # ===== 公共接口 =====
+
+    async def get_system_time(self):
+        return await self.request('GET', '/api/v5/public/time', auth=False)
+
+    async def get_ticker(self, instId):
+        return await self.request('GET', '/api/v5/market/ticker', {'instId': instId}, auth=False)
+
+    async def get_tickers(self, instType, uly=None, instFamily=None):
+        params = {'instType': instType, 'uly': uly, 'instFamily': instFamily}
+        return await self.request('GET', '/api/v5/market/tickers', params, auth=False)
+
+    async def get_candles(self, instId, bar='1m', after=None, before=None, limit=None):
+        params = {'instId': instId, 'bar': bar, 'after': after, 'before': before, 'limit': limit}
+        return await self.request('GET', '/api/v5/market/candles', params, auth=False)
+
+    async def get_history_candles(self, instId, bar='1m', after=None, before=None, limit=None):
+        params = {'instId': instId, 'bar': bar, 'after': after, 'before': before, 'limit': limit}
+        return await self.request('GET', '/api/v5/market/history-candles', params, auth=False)
+
+    async def get_instruments(self, instType, uly=None, instFamily=None, instId=None):
+        params = {'instType': instType, 'uly': uly, 'instFamily': instFamily, 'instId': instId}
+        return await self.request('GET', '/api/v5/public/instruments', params, auth=False)
+
+    # ===== 账户接口 =====
+
+    async def get_account_balance(self, ccy=None):
+        return await self.request('GET', '/api/v5/account/balance', {'ccy': ccy})
+
+    async def get_positions(self, instType=None, instId=None):
+        return await self.request('GET', '/api/v5/account/positions', {'instType': instType, 'instId': instId})
+
+    async def set_leverage(self, lever, mgnMode, instId=None, ccy=None, posSide=None):
+        body = {'lever': lever, 'mgnMode': mgnMode, 'instId': instId, 'ccy': ccy, 'posSide': posSide}
+        return await self.request('POST', '/api/v5/account/set-leverage', body=body)
+
+    async def get_account_config(self):
+        return await self.request('GET', '/api/v5/account/config')
+
+    async def get_leverage(self, instId, mgnMode):
+        return await self.request('GET', '/api/v5/account/leverage-info', {'instId': instId, 'mgnMode': mgnMode})
+
+    # ===== 交易接口 =====
+
+    async def place_order(self, instId, tdMode, side, ordType, sz, ccy=None, clOrdId=None, tag=None,
+                          posSide=None, px=None, reduceOnly=None, tgtCcy=None, **kwargs):
+        body = {
+            'instId': instId, 'tdMode': tdMode, 'side': side, 'ordType': ordType, 'sz': sz,
+            'ccy': ccy, 'clOrdId': clOrdId, 'tag': tag, 'posSide': posSide, 'px': px,
+            'reduceOnly': reduceOnly, 'tgtCcy': tgtCcy
+        }
+        body.update(kwargs)
+        return await self.request('POST', '/api/v5/trade/order', body=body)
+
+    async def place_multiple_orders(self, orders_data):
+        """批量下单，orders_data 为下单参数列表（最多20笔）"""
+        return await self.request('POST', '/api/v5/trade/batch-orders', body=orders_data)
+
+    async def get_order(self, instId, ordId=None, clOrdId=None):
+        return await self.request('GET', '/api/v5/trade/order', {'instId': instId, 'ordId': ordId, 'clOrdId': clOrdId})
+
+    async def place_algo_order(self, instId, tdMode, side, ordType, sz, ccy=None, posSide=None,
+                               reduceOnly=None, tpTriggerPx=None, tpOrdPx=None, slTriggerPx=None,
+                               slOrdPx=None, triggerPx=None, orderPx=None, **kwargs):
+        body = {
+            'instId': instId, 'tdMode': tdMode, 'side': side, 'ordType': ordType, 'sz': sz,
+            'ccy': ccy, 'posSide': posSide, 'reduceOnly': reduceOnly,
+            'tpTriggerPx': tpTriggerPx, 'tpOrdPx': tpOrdPx,
+            'slTriggerPx': slTriggerPx, 'slOrdPx': slOrdPx,
+            'triggerPx': triggerPx, 'orderPx': orderPx
+        }
+        body.update(kwargs)
+        return await self.request('POST', '/api/v5/trade/order-algo', body=body)
+
+
+class AsyncLoopThread:
+    """在后台线程中运行的事件循环，供同步代码提交协程"""
+
+    def __init__(self, name='okx-io'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """提交协程，返回 concurrent.futures.Future（不阻塞）"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """提交协程并等待结果，超时后取消协程（调用方已放弃，不应再继续发送请求）"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class SyncOKXClient:
+    """
+    OKXAsyncClient的同步包装
+    调用方式与官方SDK相同，例如 client.get_positions()，内部在共享事件循环上执行
+    """
+
+    def __init__(self, client, loop_thread, timeout=None):
+        self.client = client
+        self.loop_thread = loop_thread
+        self.timeout = timeout
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+        if not asyncio.iscoroutinefunction(method):
+            return method
+
+        def call(*args, **kwargs):
+            return self.loop_thread.run(method(*args, **kwargs), self.timeout)
+
+        call.__name__ = name
+        return call
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OKX请求重试策略 - 按接口配置的重试次数、退避和重试预算
+
+单次网络超时或交易所5xx不应该直接变成一次错过的交易。OKXAsyncClient.request
+按本模块的策略决定一个失败的请求是否可以、以及何时重新发送。
+
+功能特点：
+1. 查询接口（GET）：超时、连接错误、5xx 和系统繁忙类错误码按指数退避重试（全抖动）
+2. 延迟敏感的查询（get_ticker）：超过 hedge_after 秒未返回时再发一个相同的请求，
+   先返回的结果生效，另一个取消（对冲请求）
+3. 下单接口：只有每笔订单都带 clOrdId 时才重试。重新发送之前先按 clOrdId 查询订单，
+   已经存在的订单不再发送，同一个 clOrdId 不会成交两次（见 OKXAsyncClient.request）
+4. 设置杠杆等幂等的写接口直接重试；其他写接口只在请求确定没有发出（连接失败）时重试
+5. 重试预算：每个接口在一分钟内的重试次数不超过 max(最少次数, 请求数 × 比例)，
+   交易所故障时不会因为重试把请求量放大数倍
+6. 每个接口的重试次数可以通过配置覆盖，例如 OKX_RETRY_BUDGETS="/api/v5/trade/order=1,/api/v5/market/ticker=3"
+"""
+
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 可以重试的OKX错误码（服务暂时不可用、接口请求超时、系统繁忙、系统错误）
+# 其中 50004 表示交易所不确定请求是否成功，写接口必须先确认结果再重试
+RETRYABLE_CODES = ('50001', '50004', '50013', '50026')
+
+# 重试预算的统计周期（秒）
+BUDGET_PERIOD = 60
+
+
+class RetryPolicy:
+    """单个接口的重试策略"""
+
+    __slots__ = ('retries', 'base_delay', 'max_delay', 'hedge_after', 'id_field', 'idempotent')
+
+    def __init__(self, retries=0, base_delay=0.2, max_delay=2.0, hedge_after=None,
+                 id_field=None, idempotent=False):
+        """
+        retries: 一次调用最多重试的次数
+        base_delay/max_delay: 指数退避的初始与最大等待时间（秒）
+        hedge_after: 查询超过该秒数未返回时发出对冲请求（None 表示不对冲）
+        id_field: 写接口用于确认订单是否已存在的客户端ID字段（clOrdId）
+        idempotent: 写接口重复执行是否没有副作用（例如设置杠杆）
+        """
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_after = hedge_after
+        self.id_field = id_field
+        self.idempotent = idempotent
+
+    def backoff(self, attempt):
+        """第 attempt 次重试前的等待时间：指数退避 + 全抖动"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# (请求方法, 接口路径) -> 重试策略；没有列出的查询接口使用 DEFAULT_READ_POLICY，
+# 没有列出的写接口只在连接失败时重试
+DEFAULT_POLICIES = {
+    ('GET', '/api/v5/market/ticker'): RetryPolicy(retries=2, base_delay=0.05, max_delay=0.5, hedge_after=0.25),
+    ('POST', '/api/v5/trade/order'): RetryPolicy(retries=2, id_field='clOrdId'),
+    ('POST', '/api/v5/trade/batch-orders'): RetryPolicy(retries=2, id_field='clOrdId'),
+    ('POST', '/api/v5/account/set-leverage'): RetryPolicy(retries=2, idempotent=True),
+}
+DEFAULT_READ_POLICY = RetryPolicy(retries=3)
+DEFAULT_WRITE_POLICY = RetryPolicy(retries=1)
+
+
+def parse_budgets(text):
+    """解析 "路径=次数,路径=次数" 格式的重试次数配置"""
+    budgets = {}
+    for item in (text or '').split(','):
+        if '=' not in item:
+            continue
+        path, retries = item.split('=', 1)
+        try:
+            budgets[path.strip()] = max(0, int(retries))
+        except ValueError:
+            logger.warning(f"忽略无效的重试次数配置: {item}")
+    return budgets
+
+
+class RetryPolicies:
+    """所有接口的重试策略和重试预算（线程安全）"""
+
+    def __init__(self, policies=None, budgets=None, budget_ratio=0.2, budget_minimum=10, deadline=20.0):
+        """
+        policies: 接口策略表，默认 DEFAULT_POLICIES
+        budgets: {接口路径: 重试次数}，覆盖策略表中的次数
+        budget_ratio/budget_minimum: 每个接口每分钟的重试预算
+        deadline: 一次调用（含所有重试和重试前的订单查询）的最长时间（秒），加上HTTP超时应小于 ORDER_TIMEOUT
+        """
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.budgets = budgets or {}
+        self.budget_ratio = budget_ratio
+        self.budget_minimum = budget_minimum
+        self.deadline = deadline
+
+        self._lock = threading.Lock()
+        self._windows = {}   # 接口路径 -> [周期开始时间, 请求数, 重试数]
+        self._counts = {}    # 接口路径 -> {统计项: 次数}
+
+    def policy(self, method, path):
+        policy = self.policies.get((method, path))
+        if policy is None:
+            policy = DEFAULT_READ_POLICY if method == 'GET' else DEFAULT_WRITE_POLICY
+        retries = self.budgets.get(path)
+        if retries is not None and retries != policy.retries:
+            policy = RetryPolicy(**dict(policy.to_dict(), retries=retries))
+        return policy
+
+    def _window(self, path, now):
+        window = self._windows.get(path)
+        if window is None or now - window[0] >= BUDGET_PERIOD:
+            window = self._windows[path] = [now, 0, 0]
+        return window
+
+    def record_request(self, path):
+        with self._lock:
+            self._window(path, time.monotonic())[1] += 1
+
+    def allow_retry(self, path):
+        """是否还有重试预算，有则占用一次"""
+        with self._lock:
+            window = self._window(path, time.monotonic())
+            if window[2] >= max(self.budget_minimum, window[1] * self.budget_ratio):
+                self._count(path, 'budget_exhausted')
+                return False
+            window[2] += 1
+            self._count(path, 'retries')
+            return True
+
+    def count(self, path, name):
+        with self._lock:
+            self._count(path, name)
+
+    def _count(self, path, name):
+        counts = self._counts.setdefault(path, {})
+        counts[name] = counts.get(name, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'deadline': self.deadline,
+                'budget_ratio': self.budget_ratio,
+                'budget_minimum': self.budget_minimum,
+                'budgets': dict(self.budgets),
+                'endpoints': {path: dict(counts) for path, counts in sorted(self._counts.items())}
+            }
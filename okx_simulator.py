@@ -0,0 +1,1279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OKX交易所本地模拟器 - 离线压测和延迟测试用的 OKX v5 REST/WebSocket 替身
+
+OKX模拟盘（flag="1"）有自己的限速和故障，压测时不能反复请求。本模块在本地提供
+OKXTrader 用到的 REST 接口和公共/私有 WebSocket 频道，OKXTrader 只需要修改地址即可使用。
+
+功能特点：
+1. REST接口：余额、持仓、行情、K线（由1分钟K线合成任意周期）、合约列表、账户配置、杠杆（设置/查询）、下单、批量下单、
+   策略委托（条件单/OCO/计划委托）、订单查询；返回格式与OKX一致（字符串数值、code/msg/data）
+2. 撮合引擎：永续合约（USDT本位），市价单按买一/卖一成交，限价单挂单等待价格穿越，
+   附带止盈止损和策略委托按最新价触发；单向/双向持仓、只减仓、手续费、保证金检查
+3. 价格：每个合约一个随机游走价格（可设置波动率和买卖价差），也可以通过 /sim/price 直接设置
+4. 延迟分布：REST和WebSocket推送分别配置（fixed/uniform/normal/lognormal）
+5. 故障注入：按概率返回HTTP错误、OKX错误码或超时（超时的下单请求会被执行，用于测试 clOrdId 重试）
+6. 限速模拟：使用与客户端限速器相同的规则（rate_limiter.OKX_LIMITS），超限返回 HTTP 429 / 50011
+7. WebSocket：公共频道 tickers、candle1m（1分钟K线收盘时推送）；私有频道登录、positions/account/orders 快照和增量推送
+8. 管理接口：/sim/state 查看状态，/sim/price 设置价格，/sim/config 修改延迟/故障配置，/sim/reset 重置账户
+
+使用方法：
+    python okx_simulator.py --port 8090 --ws-port 8091 --latency lognormal:20,0.5 --faults 50013:0.01,timeout:0.002
+
+    OKXTrader 使用模拟器：
+    OKX_BASE_URL=http://127.0.0.1:8090
+    OKX_WS_PRIVATE_URL=ws://127.0.0.1:8091/ws/v5/private
+    OKX_WS_BUSINESS_URL=ws://127.0.0.1:8091/ws/v5/business
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import itertools
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+
+import websockets
+from flask import Flask, Response, request
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from okx_client import AsyncLoopThread
+from rate_limiter import RateLimiter, WINDOW_MARGIN
+
+logger = logging.getLogger(__name__)
+
+# 默认合约（包含 Config.SUPPORTED_SYMBOLS，规格参照OKX正式环境，px 为初始价格）
+DEFAULT_INSTRUMENTS = [
+    {'instId': 'BTC-USDT-SWAP', 'ctVal': '0.01', 'lotSz': '0.01', 'minSz': '0.01', 'tickSz': '0.1', 'px': 65000.0},
+    {'instId': 'ETH-USDT-SWAP', 'ctVal': '0.1', 'lotSz': '0.01', 'minSz': '0.01', 'tickSz': '0.01', 'px': 3500.0},
+    {'instId': 'ADA-USDT-SWAP', 'ctVal': '100', 'lotSz': '0.1', 'minSz': '0.1', 'tickSz': '0.0001', 'px': 0.45},
+    {'instId': 'DOT-USDT-SWAP', 'ctVal': '1', 'lotSz': '1', 'minSz': '1', 'tickSz': '0.001', 'px': 6.5},
+    {'instId': 'LINK-USDT-SWAP', 'ctVal': '1', 'lotSz': '1', 'minSz': '1', 'tickSz': '0.001', 'px': 14.0},
+    {'instId': 'LTC-USDT-SWAP', 'ctVal': '1', 'lotSz': '1', 'minSz': '1', 'tickSz': '0.01', 'px': 80.0},
+    {'instId': 'BCH-USDT-SWAP', 'ctVal': '0.1', 'lotSz': '1', 'minSz': '1', 'tickSz': '0.1', 'px': 380.0},
+    {'instId': 'XRP-USDT-SWAP', 'ctVal': '100', 'lotSz': '1', 'minSz': '1', 'tickSz': '0.0001', 'px': 0.6},
+    {'instId': 'EOS-USDT-SWAP', 'ctVal': '10', 'lotSz': '1', 'minSz': '1', 'tickSz': '0.001', 'px': 0.7},
+    {'instId': 'TRX-USDT-SWAP', 'ctVal': '1000', 'lotSz': '1', 'minSz': '1', 'tickSz': '0.00001', 'px': 0.12},
+    {'instId': 'SOL-USDT-SWAP', 'ctVal': '1', 'lotSz': '0.01', 'minSz': '0.01', 'tickSz': '0.01', 'px': 150.0},
+    {'instId': 'DOGE-USDT-SWAP', 'ctVal': '1000', 'lotSz': '0.01', 'minSz': '0.01', 'tickSz': '0.00001', 'px': 0.15},
+]
+
+TAKER_FEE = 0.0005
+MAKER_FEE = 0.0002
+
+MINUTE_MS = 60000
+# 每个合约保留的1分钟K线数量
+CANDLE_HISTORY = 20000
+
+
+def _now_ms():
+    return str(int(time.time() * 1000))
+
+
+def _fmt(value):
+    """数值转为OKX格式的字符串（去掉多余的0）"""
+    if value is None or value == '':
+        return ''
+    text = f"{float(value):.10f}".rstrip('0').rstrip('.')
+    return text if text not in ('', '-0') else '0'
+
+
+def _float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class SimError(Exception):
+    """订单被拒绝（sCode/sMsg）"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+# ===== 延迟、故障、限速 =====
+
+class LatencyModel:
+    """
+    延迟分布（毫秒）：
+        fixed:20            固定20ms
+        uniform:5,50        5~50ms均匀分布
+        normal:20,5         均值20ms、标准差5ms（小于0按0）
+        lognormal:20,0.5    中位数20ms、对数标准差0.5（长尾）
+    """
+
+    def __init__(self, spec='fixed:0', rng=None):
+        self.spec = spec or 'fixed:0'
+        self._rng = rng or random.Random()
+        kind, _, args = self.spec.partition(':')
+        self.kind = kind.strip().lower()
+        self.args = [float(arg) for arg in args.split(',') if arg.strip()] or [0.0]
+        if self.kind not in ('fixed', 'uniform', 'normal', 'lognormal'):
+            raise ValueError(f"不支持的延迟分布: {self.spec}")
+
+    def sample(self):
+        """返回一次延迟（秒）"""
+        a = self.args[0]
+        b = self.args[1] if len(self.args) > 1 else 0.0
+        if self.kind == 'fixed':
+            ms = a
+        elif self.kind == 'uniform':
+            ms = self._rng.uniform(a, b)
+        elif self.kind == 'normal':
+            ms = self._rng.gauss(a, b)
+        else:
+            ms = a * math.exp(self._rng.gauss(0.0, b)) if a > 0 else 0.0
+        return max(0.0, ms) / 1000.0
+
+
+class FaultInjector:
+    """
+    按概率注入故障，配置格式 "故障:概率,故障:概率"，故障前可以加 "[请求方法 ]接口路径@" 只作用于该接口：
+        503:0.01                    1% 的请求返回 HTTP 503（请求未执行）
+        50013:0.02                  2% 的请求返回 OKX 错误码 50013（请求未执行）
+        timeout:0.001               0.1% 的请求执行后不返回（等待 timeout_delay 秒后才响应）
+        POST /api/v5/trade/order@timeout:0.05
+    """
+
+    def __init__(self, spec='', rng=None, timeout_delay=15.0):
+        self.spec = spec or ''
+        self.timeout_delay = timeout_delay
+        self._rng = rng or random.Random()
+        self.rules = []   # [(接口路径或None, 故障, 概率)]
+        for item in self.spec.split(','):
+            if ':' not in item:
+                continue
+            kind, probability = item.rsplit(':', 1)
+            path = None
+            if '@' in kind:
+                path, kind = kind.split('@', 1)
+            self.rules.append((path.strip() if path else None, kind.strip().lower(), float(probability)))
+        self.injected = {}
+
+    def pick(self, method, path):
+        """为一个请求选择故障，没有故障返回None"""
+        for rule_path, kind, probability in self.rules:
+            if rule_path is not None and rule_path not in (path, f"{method} {path}"):
+                continue
+            if self._rng.random() < probability:
+                self.injected[kind] = self.injected.get(kind, 0) + 1
+                return kind
+        return None
+
+
+class RateLimitEmulator:
+    """按OKX限速规则统计请求（与客户端限速器使用同一份规则和分组），超限的请求被拒绝"""
+
+    def __init__(self):
+        self._rules = RateLimiter()   # 只用于计算请求所属的分组和令牌数
+        self._windows = {}            # 分组名 -> deque(请求时间)
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def allow(self, method, path, params=None, body=None):
+        now = time.monotonic()
+        with self._lock:
+            required = self._rules.buckets_for(method, path, params, body)
+            for bucket, cost in required:
+                window = self._windows.setdefault(bucket.name, deque())
+                horizon = now - (bucket.window - WINDOW_MARGIN)
+                while window and window[0] <= horizon:
+                    window.popleft()
+                if len(window) + cost > bucket.capacity:
+                    self.limited += 1
+                    return False
+            for bucket, cost in required:
+                self._windows[bucket.name].extend([now] * cost)
+            return True
+
+
+# ===== 撮合引擎 =====
+
+class SimExchange:
+    """模拟交易所：合约、价格、账户、持仓、订单和策略委托（线程安全）"""
+
+    def __init__(self, instruments=None, balance=100000.0, pos_mode='net_mode', volatility_bps=5.0,
+                 spread_bps=1.0, default_leverage=10, rng=None):
+        """
+        balance: 初始USDT余额
+        pos_mode: net_mode 单向持仓 / long_short_mode 双向持仓
+        volatility_bps: 价格每秒的波动（基点，随机游走的标准差）
+        spread_bps: 买卖价差（基点）
+        """
+        self._lock = threading.RLock()
+        self._rng = rng or random.Random()
+        self.volatility_bps = volatility_bps
+        self.spread_bps = spread_bps
+        self.default_leverage = default_leverage
+        self._instruments = {}
+        self._initial = []
+        for item in instruments or DEFAULT_INSTRUMENTS:
+            self._initial.append(dict(item))
+        self._ids = itertools.count(int(time.time()) * 1000)
+        self._listeners = []   # callback(channel, data)
+        self.reset(balance, pos_mode)
+
+    def reset(self, balance=None, pos_mode=None):
+        with self._lock:
+            self.initial_balance = balance if balance is not None else self.initial_balance
+            self.pos_mode = pos_mode or self.pos_mode
+            self.cash = float(self.initial_balance)
+            self._instruments = {}
+            self._prices = {}
+            for item in self._initial:
+                spec = {
+                    'instId': item['instId'], 'instType': 'SWAP', 'instFamily': item['instId'][:-5],
+                    'uly': item['instId'][:-5], 'ctType': 'linear', 'ctVal': item['ctVal'],
+                    'ctValCcy': item['instId'].split('-')[0], 'settleCcy': 'USDT',
+                    'lotSz': item['lotSz'], 'minSz': item['minSz'], 'tickSz': item['tickSz'],
+                    'lever': '100', 'state': 'live', 'maxMktSz': '100000', 'maxLmtSz': '100000'
+                }
+                self._instruments[item['instId']] = spec
+                self._prices[item['instId']] = float(item['px'])
+            self._leverage = {}      # (instId, mgnMode, posSide) -> 杠杆
+            self._positions = {}     # instId -> {posSide: {'pos', 'avgPx', 'cTime', 'posId'}}
+            self._orders = {}        # ordId -> 订单
+            self._client_ids = {}    # clOrdId -> ordId
+            self._algos = {}         # algoId -> 策略委托
+            self._candles = {}       # instId -> deque([ts, o, h, l, c])，1分钟K线，最后一根未收盘
+            self._last_tick = time.monotonic()
+            self.fills = 0
+            self.fees = 0.0
+
+    def add_listener(self, callback):
+        """注册推送回调 callback(channel, data)，channel 为 positions/account/orders/tickers/candle1m"""
+        self._listeners.append(callback)
+
+    def _emit(self, channel, data):
+        for callback in self._listeners:
+            try:
+                callback(channel, data)
+            except Exception as e:
+                logger.error(f"模拟器推送回调异常: {e}")
+
+    def _next_id(self):
+        return str(next(self._ids))
+
+    # ----- 价格 -----
+
+    def price(self, inst_id):
+        return self._prices.get(inst_id)
+
+    def _quote(self, inst_id):
+        """(买一, 卖一, 最新价)"""
+        last = self._prices[inst_id]
+        half = last * self.spread_bps / 20000.0
+        tick = float(self._instruments[inst_id]['tickSz'])
+        bid = math.floor((last - half) / tick) * tick
+        ask = math.ceil((last + half) / tick) * tick
+        if ask <= bid:
+            ask = bid + tick
+        return bid, ask, last
+
+    def tick(self):
+        """随机游走更新所有价格，并检查限价单和策略委托"""
+        with self._lock:
+            now = time.monotonic()
+            elapsed = max(0.0, now - self._last_tick)
+            self._last_tick = now
+            if self.volatility_bps > 0 and elapsed > 0:
+                sigma = self.volatility_bps / 10000.0 * math.sqrt(elapsed)
+                for inst_id, last in self._prices.items():
+                    tick = float(self._instruments[inst_id]['tickSz'])
+                    moved = last * math.exp(self._rng.gauss(0.0, sigma))
+                    self._prices[inst_id] = max(tick, round(moved / tick) * tick)
+            closed = []
+            for inst_id in self._prices:
+                self._match(inst_id)
+                closed.extend(self._update_candle(inst_id))
+            tickers = [self.ticker(inst_id) for inst_id in self._prices]
+        self._emit('tickers', tickers)
+        if closed:
+            self._emit('candle1m', closed)
+
+    def set_price(self, inst_id, price):
+        """直接设置价格（测试止盈止损触发）"""
+        with self._lock:
+            if inst_id not in self._instruments:
+                raise SimError('51001', f'Instrument ID {inst_id} does not exist')
+            self._prices[inst_id] = float(price)
+            self._match(inst_id)
+            closed = self._update_candle(inst_id)
+            ticker = self.ticker(inst_id)
+        self._emit('tickers', [ticker])
+        if closed:
+            self._emit('candle1m', closed)
+
+    # ----- K线 -----
+
+    def _update_candle(self, inst_id, now=None):
+        """用最新价更新当前1分钟K线，跨分钟时返回刚收盘的K线推送（[{'instId', 'row'}]）"""
+        last = self._prices[inst_id]
+        ts = (now or int(time.time() * 1000)) // MINUTE_MS * MINUTE_MS
+        candles = self._candles.setdefault(inst_id, deque(maxlen=CANDLE_HISTORY))
+        if candles and candles[-1][0] >= ts:
+            bar = candles[-1]
+            bar[2] = max(bar[2], last)
+            bar[3] = min(bar[3], last)
+            bar[4] = last
+            return []
+        closed = [{'instId': inst_id, 'row': _candle_row(candles[-1], True)}] if candles else []
+        candles.append([ts, last, last, last, last])
+        return closed
+
+    def load_candles(self, inst_id, candles):
+        """导入历史1分钟K线 [[ts, o, h, l, c], ...]（按时间递增），最新价设为最后一根的收盘价"""
+        with self._lock:
+            if inst_id not in self._instruments:
+                raise SimError('51001', f'Instrument ID {inst_id} does not exist')
+            self._candles[inst_id] = deque(([int(c[0])] + [float(x) for x in c[1:5]] for c in candles),
+                                           maxlen=CANDLE_HISTORY)
+            if candles:
+                self._prices[inst_id] = float(candles[-1][4])
+
+    def candles(self, inst_id, period=MINUTE_MS, offset=0, now=None):
+        """由1分钟K线合成的K线（按时间递减，与OKX接口相同），返回 [(row, confirmed)]"""
+        now = now or int(time.time() * 1000)
+        with self._lock:
+            source = list(self._candles.get(inst_id, ()))
+        bars = []
+        for ts, open_, high, low, close in source:
+            start = (ts - offset) // period * period + offset
+            if bars and bars[-1][0] == start:
+                bar = bars[-1]
+                bar[2] = max(bar[2], high)
+                bar[3] = min(bar[3], low)
+                bar[4] = close
+            else:
+                bars.append([start, open_, high, low, close])
+        return [(bar, bar[0] + period <= now) for bar in reversed(bars)]
+
+    def ticker(self, inst_id):
+        bid, ask, last = self._quote(inst_id)
+        return {
+            'instType': 'SWAP', 'instId': inst_id, 'last': _fmt(last), 'lastSz': '1',
+            'askPx': _fmt(ask), 'askSz': '100', 'bidPx': _fmt(bid), 'bidSz': '100',
+            'open24h': _fmt(last), 'high24h': _fmt(last), 'low24h': _fmt(last),
+            'vol24h': '0', 'volCcy24h': '0', 'ts': _now_ms()
+        }
+
+    # ----- 账户 -----
+
+    def _contract_value(self, inst_id):
+        return float(self._instruments[inst_id]['ctVal'])
+
+    def lever(self, inst_id, mgn_mode='cross', pos_side='net'):
+        key = (inst_id, mgn_mode, pos_side if self.pos_mode == 'long_short_mode' else 'net')
+        return self._leverage.get(key, self.default_leverage)
+
+    def _upl_and_margin(self):
+        upl = margin = 0.0
+        for inst_id, sides in self._positions.items():
+            last = self._prices[inst_id]
+            ct_val = self._contract_value(inst_id)
+            for pos_side, position in sides.items():
+                contracts = position['pos']
+                direction = -1 if pos_side == 'short' else 1
+                upl += direction * contracts * ct_val * (last - position['avgPx'])
+                margin += abs(contracts) * ct_val * last / self.lever(inst_id, 'cross', pos_side)
+        return upl, margin
+
+    def balance(self):
+        with self._lock:
+            upl, margin = self._upl_and_margin()
+            equity = self.cash + upl
+            available = max(0.0, equity - margin)
+            return [{
+                'totalEq': _fmt(equity), 'isoEq': '0', 'adjEq': _fmt(equity), 'imr': _fmt(margin),
+                'mgnRatio': _fmt(equity / margin) if margin else '', 'upl': _fmt(upl), 'uTime': _now_ms(),
+                'details': [{
+                    'ccy': 'USDT', 'eq': _fmt(equity), 'cashBal': _fmt(self.cash), 'availBal': _fmt(available),
+                    'availEq': _fmt(available), 'frozenBal': _fmt(margin), 'imr': _fmt(margin),
+                    'upl': _fmt(upl), 'eqUsd': _fmt(equity), 'uTime': _now_ms()
+                }]
+            }]
+
+    def _position_view(self, inst_id, pos_side, position):
+        last = self._prices[inst_id]
+        ct_val = self._contract_value(inst_id)
+        contracts = position['pos'] if position else 0.0
+        avg = position['avgPx'] if position else 0.0
+        direction = -1 if pos_side == 'short' else 1
+        lever = self.lever(inst_id, 'cross', pos_side)
+        notional = abs(contracts) * ct_val * last
+        upl = direction * contracts * ct_val * (last - avg) if position else 0.0
+        margin = notional / lever if lever else 0.0
+        return {
+            'instType': 'SWAP', 'instId': inst_id, 'mgnMode': 'cross', 'posSide': pos_side,
+            'pos': _fmt(contracts), 'posCcy': '', 'availPos': _fmt(abs(contracts)), 'avgPx': _fmt(avg) if position else '',
+            'markPx': _fmt(last), 'last': _fmt(last), 'upl': _fmt(upl),
+            'uplRatio': _fmt(upl / margin) if margin else '0', 'lever': str(lever),
+            'notionalUsd': _fmt(notional), 'imr': _fmt(margin), 'margin': _fmt(margin), 'liqPx': '',
+            'ccy': 'USDT', 'posId': position['posId'] if position else '',
+            'cTime': position['cTime'] if position else '', 'uTime': _now_ms()
+        }
+
+    def positions(self, inst_id=None):
+        with self._lock:
+            inst_ids = [i for i in inst_id.split(',') if i] if inst_id else list(self._positions)
+            return [
+                self._position_view(item, pos_side, position)
+                for item in inst_ids
+                for pos_side, position in self._positions.get(item, {}).items()
+            ]
+
+    def set_leverage(self, inst_id, lever, mgn_mode='cross', pos_side=None):
+        with self._lock:
+            if inst_id not in self._instruments:
+                raise SimError('51001', f'Instrument ID {inst_id} does not exist')
+            lever = int(float(lever))
+            if not 1 <= lever <= 100:
+                raise SimError('51000', 'Parameter lever error')
+            sides = [pos_side] if self.pos_mode == 'long_short_mode' and pos_side else (
+                ['long', 'short'] if self.pos_mode == 'long_short_mode' else ['net'])
+            for side in sides:
+                self._leverage[(inst_id, mgn_mode, side)] = lever
+            return [{'instId': inst_id, 'lever': str(lever), 'mgnMode': mgn_mode, 'posSide': pos_side or ''}]
+
+    def leverage_info(self, inst_ids, mgn_mode='cross'):
+        with self._lock:
+            data = []
+            sides = ['long', 'short'] if self.pos_mode == 'long_short_mode' else ['net']
+            for inst_id in inst_ids.split(','):
+                if inst_id not in self._instruments:
+                    raise SimError('51001', f'Instrument ID {inst_id} does not exist')
+                for side in sides:
+                    data.append({'instId': inst_id, 'mgnMode': mgn_mode, 'posSide': side,
+                                 'lever': str(self.lever(inst_id, mgn_mode, side))})
+            return data
+
+    # ----- 下单与成交 -----
+
+    def _check_size(self, inst_id, size):
+        spec = self._instruments.get(inst_id)
+        if spec is None:
+            raise SimError('51001', f'Instrument ID {inst_id} does not exist')
+        contracts = _float(size, -1)
+        lot = float(spec['lotSz'])
+        if contracts <= 0 or contracts < float(spec['minSz']):
+            raise SimError('51020' if contracts > 0 else '51000', 'Order amount should be greater than the min available amount')
+        if abs(round(contracts / lot) * lot - contracts) > lot * 1e-6:
+            raise SimError('51121', f'Order quantity must be a multiple of the lot size {lot}')
+        return contracts
+
+    def _side_key(self, side, pos_side):
+        """订单作用的持仓方向，以及该订单是否增加持仓"""
+        if self.pos_mode == 'long_short_mode':
+            if pos_side not in ('long', 'short'):
+                raise SimError('51000', 'Parameter posSide error')
+            opening = (pos_side == 'long') == (side == 'buy')
+            return pos_side, opening
+        return 'net', None
+
+    def _reducible(self, inst_id, side, pos_side):
+        """只减仓订单最多可成交的张数"""
+        position = self._positions.get(inst_id, {}).get(pos_side)
+        if not position:
+            return 0.0
+        if pos_side == 'net':
+            contracts = position['pos']
+            return abs(contracts) if (contracts > 0) == (side == 'sell') else 0.0
+        return position['pos']
+
+    def _fill(self, inst_id, side, pos_side, contracts, price, fee_rate=TAKER_FEE):
+        """成交：更新持仓均价、已实现盈亏和手续费"""
+        ct_val = self._contract_value(inst_id)
+        sides = self._positions.setdefault(inst_id, {})
+        position = sides.get(pos_side)
+        realized = 0.0
+        if pos_side == 'net':
+            delta = contracts if side == 'buy' else -contracts
+            current = position['pos'] if position else 0.0
+            updated = current + delta
+            if current == 0 or (current > 0) == (delta > 0):
+                avg = ((abs(current) * position['avgPx'] if position else 0.0) + contracts * price) / abs(updated)
+            else:
+                closed = min(abs(current), contracts)
+                realized = closed * ct_val * (price - position['avgPx']) * (1 if current > 0 else -1)
+                avg = position['avgPx'] if abs(delta) <= abs(current) else price
+        else:
+            current = position['pos'] if position else 0.0
+            opening = (pos_side == 'long') == (side == 'buy')
+            updated = current + contracts if opening else current - contracts
+            if opening:
+                avg = ((current * position['avgPx'] if position else 0.0) + contracts * price) / updated
+            else:
+                realized = contracts * ct_val * (price - position['avgPx']) * (1 if pos_side == 'long' else -1)
+                avg = position['avgPx']
+
+        if abs(updated) < 1e-9:
+            sides.pop(pos_side, None)
+            if not sides:
+                del self._positions[inst_id]
+        elif position is None:
+            sides[pos_side] = {'pos': updated, 'avgPx': avg, 'cTime': _now_ms(), 'posId': self._next_id()}
+        else:
+            position['pos'] = updated
+            position['avgPx'] = avg
+
+        fee = contracts * ct_val * price * fee_rate
+        self.cash += realized - fee
+        self.fees += fee
+        self.fills += 1
+        return realized, fee
+
+    def place_order(self, params):
+        """下单，返回OKX下单结果项（sCode/sMsg），失败时抛出 SimError"""
+        with self._lock:
+            inst_id = params.get('instId')
+            contracts = self._check_size(inst_id, params.get('sz'))
+            side = params.get('side')
+            if side not in ('buy', 'sell'):
+                raise SimError('51000', 'Parameter side error')
+            ord_type = params.get('ordType')
+            if ord_type not in ('market', 'limit', 'ioc', 'fok', 'post_only'):
+                raise SimError('51000', 'Parameter ordType error')
+            client_id = params.get('clOrdId') or ''
+            if client_id and client_id in self._client_ids:
+                existing = self._orders[self._client_ids[client_id]]
+                if existing['state'] == 'live':
+                    raise SimError('51016', 'Duplicated clOrdId')
+            pos_side, opening = self._side_key(side, params.get('posSide'))
+            reduce_only = str(params.get('reduceOnly', '')).lower() == 'true'
+            if reduce_only or opening is False:
+                reducible = self._reducible(inst_id, side, pos_side)
+                if reducible <= 0:
+                    raise SimError('51169', "Order failed because you don't have any positions "
+                                            "in this direction for this contract to reduce or close")
+                if reduce_only:
+                    contracts = min(contracts, reducible)
+
+            bid, ask, last = self._quote(inst_id)
+            price = ask if side == 'buy' else bid
+            limit_price = _float(params.get('px'), None) if ord_type != 'market' else None
+            if ord_type != 'market' and not limit_price:
+                raise SimError('51000', 'Parameter px error')
+
+            # 保证金检查：只计算增加的敞口
+            increase = self._increase(inst_id, side, pos_side, contracts)
+            if increase > 0:
+                upl, margin = self._upl_and_margin()
+                needed = increase * self._contract_value(inst_id) * (limit_price or price) / self.lever(
+                    inst_id, 'cross', pos_side)
+                if needed > self.cash + upl - margin:
+                    raise SimError('51008', 'Order failed. Insufficient USDT margin in account')
+
+            order = {
+                'ordId': self._next_id(), 'clOrdId': client_id, 'tag': params.get('tag', ''),
+                'instType': 'SWAP', 'instId': inst_id, 'side': side, 'posSide': pos_side,
+                'ordType': ord_type, 'sz': _fmt(contracts), 'px': _fmt(limit_price) if limit_price else '',
+                'tdMode': params.get('tdMode', 'cross'), 'reduceOnly': 'true' if reduce_only else 'false',
+                'state': 'live', 'accFillSz': '0', 'fillSz': '0', 'fillPx': '', 'avgPx': '', 'fee': '0',
+                'pnl': '0', 'lever': str(self.lever(inst_id, 'cross', pos_side)),
+                'attachAlgoOrds': params.get('attachAlgoOrds') or [],
+                'cTime': _now_ms(), 'uTime': _now_ms()
+            }
+            self._orders[order['ordId']] = order
+            if client_id:
+                self._client_ids[client_id] = order['ordId']
+
+            crossed = ord_type == 'market' or (side == 'buy' and ask <= limit_price) or (
+                side == 'sell' and bid >= limit_price)
+            if ord_type == 'post_only' and crossed:
+                order['state'] = 'canceled'
+                raise SimError('51019', 'Post only order canceled')
+            if crossed:
+                fill_price = price if ord_type == 'market' else (min(ask, limit_price) if side == 'buy'
+                                                                 else max(bid, limit_price))
+                self._execute(order, contracts, fill_price, TAKER_FEE)
+            elif ord_type in ('ioc', 'fok'):
+                order['state'] = 'canceled'
+                self._emit_order(order)
+            else:
+                self._emit_order(order)
+            return {'ordId': order['ordId'], 'clOrdId': client_id, 'tag': order['tag'], 'ts': _now_ms(),
+                    'sCode': '0', 'sMsg': 'Order placed'}
+
+    def _increase(self, inst_id, side, pos_side, contracts):
+        """订单增加的持仓张数（反手时只计算新方向部分）"""
+        position = self._positions.get(inst_id, {}).get(pos_side)
+        current = position['pos'] if position else 0.0
+        if pos_side == 'net':
+            delta = contracts if side == 'buy' else -contracts
+            return max(0.0, abs(current + delta) - abs(current))
+        opening = (pos_side == 'long') == (side == 'buy')
+        return contracts if opening else 0.0
+
+    def _execute(self, order, contracts, price, fee_rate):
+        """订单成交，推送订单/持仓/余额，挂出附带的止盈止损"""
+        realized, fee = self._fill(order['instId'], order['side'], order['posSide'], contracts, price, fee_rate)
+        order.update({
+            'state': 'filled', 'accFillSz': _fmt(contracts), 'fillSz': _fmt(contracts), 'fillPx': _fmt(price),
+            'avgPx': _fmt(price), 'fee': _fmt(-fee), 'pnl': _fmt(realized), 'fillTime': _now_ms(), 'uTime': _now_ms()
+        })
+        for attached in order.get('attachAlgoOrds') or []:
+            self._place_algo({
+                'instId': order['instId'], 'side': 'sell' if order['side'] == 'buy' else 'buy',
+                'posSide': order['posSide'], 'ordType': 'oco' if attached.get('tpTriggerPx') and attached.get(
+                    'slTriggerPx') else 'conditional', 'sz': _fmt(contracts), 'reduceOnly': 'true',
+                'tpTriggerPx': attached.get('tpTriggerPx'), 'tpOrdPx': attached.get('tpOrdPx'),
+                'slTriggerPx': attached.get('slTriggerPx'), 'slOrdPx': attached.get('slOrdPx'),
+                'attachedTo': order['ordId']
+            })
+        if order['posSide'] not in self._positions.get(order['instId'], {}):
+            # 持仓已平：该方向的只减仓策略委托随之撤销
+            for algo in self._algos.values():
+                if (algo['state'] == 'live' and algo['reduceOnly'] and algo['instId'] == order['instId']
+                        and algo['posSide'] == order['posSide']):
+                    algo['state'] = 'canceled'
+        self._emit_order(order)
+        self._emit('positions', [self._position_view(order['instId'], order['posSide'],
+                                                     self._positions.get(order['instId'], {}).get(order['posSide']))])
+        self._emit('account', self.balance())
+
+    def _emit_order(self, order):
+        self._emit('orders', [{key: value for key, value in order.items() if key != 'attachAlgoOrds'}])
+
+    def get_order(self, inst_id, ord_id=None, client_id=None):
+        with self._lock:
+            if not ord_id and client_id:
+                ord_id = self._client_ids.get(client_id)
+            order = self._orders.get(ord_id) if ord_id else None
+            if order is None or order['instId'] != inst_id:
+                raise SimError('51603', 'Order does not exist')
+            return {key: value for key, value in order.items() if key != 'attachAlgoOrds'}
+
+    # ----- 策略委托 -----
+
+    def place_algo(self, params):
+        with self._lock:
+            return self._place_algo(params)
+
+    def _place_algo(self, params):
+        inst_id = params.get('instId')
+        contracts = self._check_size(inst_id, params.get('sz'))
+        side = params.get('side')
+        if side not in ('buy', 'sell'):
+            raise SimError('51000', 'Parameter side error')
+        ord_type = params.get('ordType')
+        pos_side, _ = self._side_key(side, params.get('posSide'))
+        tp = _float(params.get('tpTriggerPx'), None)
+        sl = _float(params.get('slTriggerPx'), None)
+        trigger = _float(params.get('triggerPx'), None)
+        if ord_type in ('conditional', 'oco'):
+            if trigger and not (tp or sl):
+                # 兼容只给出 triggerPx 的条件单（按止损处理）
+                sl, params = trigger, dict(params, slOrdPx=params.get('orderPx') or '-1')
+            if not (tp or sl) or (ord_type == 'oco' and not (tp and sl)):
+                raise SimError('51000', 'Parameter tpTriggerPx/slTriggerPx error')
+        elif ord_type == 'trigger':
+            if not trigger:
+                raise SimError('51000', 'Parameter triggerPx error')
+        else:
+            raise SimError('51000', 'Parameter ordType error')
+
+        last = self._prices[inst_id]
+        algo = {
+            'algoId': self._next_id(), 'algoClOrdId': params.get('algoClOrdId') or '', 'instType': 'SWAP',
+            'instId': inst_id, 'side': side, 'posSide': pos_side, 'ordType': ord_type, 'sz': _fmt(contracts),
+            'reduceOnly': str(params.get('reduceOnly', '')).lower() == 'true' or ord_type in ('conditional', 'oco'),
+            'tpTriggerPx': tp, 'tpOrdPx': params.get('tpOrdPx') or '-1',
+            'slTriggerPx': sl, 'slOrdPx': params.get('slOrdPx') or '-1',
+            'triggerPx': trigger, 'orderPx': params.get('orderPx') or '-1',
+            # 计划委托按下单时价格与触发价的关系决定触发方向
+            'triggerAbove': trigger is not None and trigger >= last,
+            'attachedTo': params.get('attachedTo', ''), 'state': 'live', 'ordId': '', 'cTime': _now_ms()
+        }
+        self._algos[algo['algoId']] = algo
+        return {'algoId': algo['algoId'], 'algoClOrdId': algo['algoClOrdId'], 'sCode': '0', 'sMsg': ''}
+
+    def _algo_trigger(self, algo, last):
+        """策略委托是否触发，触发时返回 (委托价格字符串)"""
+        closing_long = algo['side'] == 'sell'
+        if algo['ordType'] == 'trigger':
+            hit = last >= algo['triggerPx'] if algo['triggerAbove'] else last <= algo['triggerPx']
+            return algo['orderPx'] if hit else None
+        tp, sl = algo['tpTriggerPx'], algo['slTriggerPx']
+        if tp and (last >= tp if closing_long else last <= tp):
+            return algo['tpOrdPx']
+        if sl and (last <= sl if closing_long else last >= sl):
+            return algo['slOrdPx']
+        return None
+
+    def _match(self, inst_id):
+        """检查某个合约的限价单和策略委托（调用方持有锁）"""
+        bid, ask, last = self._quote(inst_id)
+        for order in [o for o in self._orders.values() if o['state'] == 'live' and o['instId'] == inst_id]:
+            price = float(order['px'])
+            if order['side'] == 'buy' and ask <= price or order['side'] == 'sell' and bid >= price:
+                contracts = float(order['sz'])
+                if order['reduceOnly'] == 'true':
+                    contracts = min(contracts, self._reducible(inst_id, order['side'], order['posSide']))
+                    if contracts <= 0:
+                        order['state'] = 'canceled'
+                        self._emit_order(order)
+                        continue
+                self._execute(order, contracts, price, MAKER_FEE)
+
+        for algo in [a for a in self._algos.values() if a['state'] == 'live' and a['instId'] == inst_id]:
+            order_price = self._algo_trigger(algo, last)
+            if order_price is None:
+                continue
+            algo['state'] = 'effective'
+            params = {
+                'instId': inst_id, 'side': algo['side'], 'sz': algo['sz'], 'tdMode': 'cross',
+                'posSide': algo['posSide'] if algo['posSide'] != 'net' else None,
+                'ordType': 'market' if str(order_price) == '-1' else 'limit',
+                'px': None if str(order_price) == '-1' else order_price,
+                'reduceOnly': 'true' if algo['reduceOnly'] else None
+            }
+            try:
+                algo['ordId'] = self.place_order(params)['ordId']
+            except SimError as e:
+                algo['state'] = 'order_failed'
+                logger.info(f"策略委托 {algo['algoId']} 触发后下单失败: {e.message}")
+
+    def algo_orders(self, state='live'):
+        with self._lock:
+            return [dict(a) for a in self._algos.values() if state is None or a['state'] == state]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pos_mode': self.pos_mode,
+                'prices': {inst_id: price for inst_id, price in self._prices.items()},
+                'balance': self.balance()[0]['details'][0],
+                'positions': self.positions(),
+                'orders': len(self._orders),
+                'live_orders': sum(1 for o in self._orders.values() if o['state'] == 'live'),
+                'algo_orders': self.algo_orders('live'),
+                'fills': self.fills,
+                'fees': round(self.fees, 4)
+            }
+
+
+# ===== REST服务 =====
+
+class _QuietHandler(WSGIRequestHandler):
+    """HTTP/1.1 keep-alive，不输出每个请求的访问日志"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, code='-', size='-'):
+        pass
+
+
+def _candle_row(bar, confirmed):
+    """[ts, o, h, l, c] -> OKX K线格式（成交量不模拟，固定为0）"""
+    return [str(bar[0])] + [_fmt(x) for x in bar[1:5]] + ['0', '0', '0', '1' if confirmed else '0']
+
+
+def _bar_period(bar):
+    """OKX K线周期（1m/5m/1H/4H/1D/1Dutc/1W）-> (毫秒, 分组偏移)，不带utc后缀的6H及以上周期按UTC+8对齐"""
+    text = str(bar or '1m')
+    utc = text.endswith('utc')
+    text = text[:-3] if utc else text
+    units = {'m': MINUTE_MS, 'H': 60 * MINUTE_MS, 'D': 1440 * MINUTE_MS, 'W': 7 * 1440 * MINUTE_MS}
+    if text[-1:] not in units or not text[:-1].isdigit():
+        raise SimError('51000', f'Parameter bar error: {bar}')
+    period = int(text[:-1]) * units[text[-1]]
+    offset = 4 * 1440 * MINUTE_MS if text[-1] == 'W' else 0
+    if not utc and period >= 6 * 60 * MINUTE_MS:
+        offset -= 8 * 60 * MINUTE_MS
+    return period, offset
+
+
+def _ok(data):
+    return {'code': '0', 'msg': '', 'data': data}
+
+
+def _fail(code, message, data=None):
+    return {'code': code, 'msg': message, 'data': data or []}
+
+
+class OKXSimulator:
+    """模拟器服务：REST（Flask）+ WebSocket（websockets，后台事件循环）"""
+
+    def __init__(self, exchange=None, latency='fixed:0', ws_latency=None, faults='', rate_limit=True,
+                 api_key='', secret_key='', passphrase='', tick_interval=0.2, timeout_delay=15.0, seed=None):
+        """
+        latency/ws_latency: REST响应和WebSocket推送的延迟分布（见 LatencyModel）
+        faults: 故障注入配置（见 FaultInjector）
+        rate_limit: 是否模拟OKX接口限速
+        secret_key: 不为空时校验请求签名（与真实OKX一样使用 OK-ACCESS-SIGN）
+        tick_interval: 价格更新间隔（秒）
+        """
+        self._rng = random.Random(seed)
+        self.exchange = exchange or SimExchange(rng=self._rng)
+        self.latency = LatencyModel(latency, self._rng)
+        self.ws_latency = LatencyModel(ws_latency or latency, self._rng)
+        self.faults = FaultInjector(faults, self._rng, timeout_delay)
+        self.rate_limits = RateLimitEmulator() if rate_limit else None
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.tick_interval = tick_interval
+
+        self.app = self._create_app()
+        self._http = None
+        self._http_thread = None
+        self._io = None
+        self._ws_server = None
+        self._ticker_future = None
+        self._subscribers = {}   # websocket -> {'channels': set, 'queue': asyncio.Queue, 'due': float}
+        self.exchange.add_listener(self._publish)
+
+        # 统计信息
+        self.requests = 0
+        self.ws_messages = 0
+        self._stats_lock = threading.Lock()
+
+        self._routes = {
+            ('GET', '/api/v5/public/time'): self._public_time,
+            ('GET', '/api/v5/public/instruments'): self._instruments,
+            ('GET', '/api/v5/market/ticker'): self._ticker,
+            ('GET', '/api/v5/market/tickers'): self._tickers,
+            ('GET', '/api/v5/market/candles'): lambda params, body: self._candles(params, 300),
+            ('GET', '/api/v5/market/history-candles'): lambda params, body: self._candles(params, 100),
+            ('GET', '/api/v5/account/balance'): lambda params, body: _ok(self.exchange.balance()),
+            ('GET', '/api/v5/account/positions'): lambda params, body: _ok(
+                self.exchange.positions(params.get('instId'))),
+            ('GET', '/api/v5/account/config'): self._account_config,
+            ('GET', '/api/v5/account/leverage-info'): lambda params, body: _ok(
+                self.exchange.leverage_info(params.get('instId', ''), params.get('mgnMode', 'cross'))),
+            ('POST', '/api/v5/account/set-leverage'): lambda params, body: _ok(self.exchange.set_leverage(
+                body.get('instId'), body.get('lever'), body.get('mgnMode', 'cross'), body.get('posSide'))),
+            ('POST', '/api/v5/trade/order'): self._place_order,
+            ('POST', '/api/v5/trade/batch-orders'): self._place_batch,
+            ('POST', '/api/v5/trade/order-algo'): self._place_algo,
+            ('GET', '/api/v5/trade/order'): lambda params, body: _ok([self.exchange.get_order(
+                params.get('instId'), params.get('ordId'), params.get('clOrdId'))]),
+        }
+
+    # ----- REST接口实现 -----
+
+    def _public_time(self, params, body):
+        return _ok([{'ts': _now_ms()}])
+
+    def _instruments(self, params, body):
+        inst_type = params.get('instType')
+        if inst_type and inst_type != 'SWAP':
+            return _ok([])
+        data = list(self.exchange._instruments.values())
+        if params.get('instId'):
+            data = [item for item in data if item['instId'] == params['instId']]
+        return _ok([dict(item) for item in data])
+
+    def _ticker(self, params, body):
+        inst_id = params.get('instId')
+        if self.exchange.price(inst_id) is None:
+            raise SimError('51001', f'Instrument ID {inst_id} does not exist')
+        return _ok([self.exchange.ticker(inst_id)])
+
+    def _tickers(self, params, body):
+        if params.get('instType') not in (None, 'SWAP'):
+            return _ok([])
+        return _ok([self.exchange.ticker(inst_id) for inst_id in self.exchange._prices])
+
+    def _candles(self, params, max_limit):
+        inst_id = params.get('instId')
+        if self.exchange.price(inst_id) is None:
+            raise SimError('51001', f'Instrument ID {inst_id} does not exist')
+        period, offset = _bar_period(params.get('bar'))
+        after = int(params['after']) if params.get('after') else None
+        before = int(params['before']) if params.get('before') else None
+        limit = min(int(params.get('limit') or 100), max_limit)
+        data = []
+        for bar, confirmed in self.exchange.candles(inst_id, period, offset):
+            if (after is not None and bar[0] >= after) or (before is not None and bar[0] <= before):
+                continue
+            data.append(_candle_row(bar, confirmed))
+            if len(data) >= limit:
+                break
+        return _ok(data)
+
+    def _account_config(self, params, body):
+        return _ok([{'uid': '1', 'acctLv': '2', 'posMode': self.exchange.pos_mode,
+                     'autoLoan': False, 'greeksType': 'PA', 'level': 'Lv1', 'ctIsoMode': 'automatic',
+                     'mgnIsoMode': 'automatic'}])
+
+    def _place_order(self, params, body):
+        try:
+            return _ok([self.exchange.place_order(body)])
+        except SimError as e:
+            return _fail('1', 'Operation failed.', [{'ordId': '', 'clOrdId': body.get('clOrdId', ''),
+                                                     'tag': '', 'sCode': e.code, 'sMsg': e.message}])
+
+    def _place_batch(self, params, body):
+        if not isinstance(body, list) or not 0 < len(body) <= 20:
+            raise SimError('51000', 'Parameter error: 1 to 20 orders')
+        data = []
+        for order in body:
+            try:
+                data.append(self.exchange.place_order(order))
+            except SimError as e:
+                data.append({'ordId': '', 'clOrdId': order.get('clOrdId', ''), 'tag': '',
+                             'sCode': e.code, 'sMsg': e.message})
+        failed = sum(1 for item in data if item['sCode'] != '0')
+        if not failed:
+            return _ok(data)
+        return _fail('1' if failed == len(data) else '2', 'Operation failed.' if failed == len(data)
+                     else 'Bulk operation partially succeeded.', data)
+
+    def _place_algo(self, params, body):
+        try:
+            return _ok([self.exchange.place_algo(body)])
+        except SimError as e:
+            return _fail('1', 'Operation failed.', [{'algoId': '', 'algoClOrdId': body.get('algoClOrdId', ''),
+                                                     'sCode': e.code, 'sMsg': e.message}])
+
+    # ----- 请求处理 -----
+
+    def _verify(self, method, request_path, body_text, headers):
+        """校验签名，通过返回None，否则返回错误响应"""
+        if not self.secret_key:
+            return None
+        timestamp = headers.get('OK-ACCESS-TIMESTAMP', '')
+        expected = base64.b64encode(hmac.new(
+            self.secret_key.encode('utf-8'), f"{timestamp}{method}{request_path}{body_text}".encode('utf-8'),
+            hashlib.sha256
+        ).digest()).decode('ascii')
+        if headers.get('OK-ACCESS-KEY') != self.api_key:
+            return _fail('50111', 'Invalid OK-ACCESS-KEY')
+        if headers.get('OK-ACCESS-PASSPHRASE') != self.passphrase:
+            return _fail('50105', 'Invalid OK-ACCESS-PASSPHRASE')
+        if not hmac.compare_digest(headers.get('OK-ACCESS-SIGN', ''), expected):
+            return _fail('50113', 'Invalid Sign')
+        return None
+
+    def handle(self, method, path, query, params, body_text, headers):
+        """处理一个REST请求，返回 (HTTP状态码, 响应JSON)"""
+        with self._stats_lock:
+            self.requests += 1
+        delay = self.latency.sample()
+        time.sleep(delay / 2)
+
+        try:
+            body = json.loads(body_text) if body_text else {}
+        except ValueError:
+            return 400, _fail('50002', 'JSON syntax error')
+
+        status, result = 200, None
+        if not path.startswith(('/api/v5/public/', '/api/v5/market/')):
+            request_path = f"{path}?{query}" if query else path
+            result = self._verify(method, request_path, body_text, headers)
+            if result is not None:
+                status = 401
+        expires = headers.get('expTime')
+        if result is None and expires and int(expires) < int(time.time() * 1000):
+            result = _fail('50102', 'Request expired (expTime)')
+        if result is None and self.rate_limits is not None and not self.rate_limits.allow(method, path, params, body):
+            status, result = 429, _fail('50011', 'Too Many Requests')
+
+        fault = self.faults.pick(method, path) if result is None else None
+        if fault is not None and fault != 'timeout':
+            time.sleep(delay / 2)
+            if fault.isdigit() and len(fault) == 3:
+                return int(fault), f'<html><body>{fault}</body></html>'
+            return 200, _fail(fault, 'Injected fault')
+
+        if result is None:
+            handler = self._routes.get((method, path))
+            if handler is None:
+                status, result = 404, _fail('50014', f'Endpoint {method} {path} not supported by simulator')
+            else:
+                try:
+                    result = handler(params, body)
+                except SimError as e:
+                    result = _fail(e.code, e.message)
+        if fault == 'timeout':
+            # 请求已执行，但响应迟迟不返回（客户端超时后结果未知）
+            time.sleep(self.faults.timeout_delay)
+        time.sleep(delay / 2)
+        return status, result
+
+    def _create_app(self):
+        app = Flask('okx_simulator')
+
+        @app.route('/api/v5/<path:endpoint>', methods=['GET', 'POST'])
+        def okx_api(endpoint):
+            status, result = self.handle(
+                request.method, f"/api/v5/{endpoint}", request.query_string.decode('utf-8'),
+                request.args.to_dict(), request.get_data(as_text=True), request.headers
+            )
+            if isinstance(result, str):
+                return Response(result, status=status, mimetype='text/html')
+            return Response(json.dumps(result), status=status, mimetype='application/json')
+
+        @app.route('/sim/state', methods=['GET'])
+        def sim_state():
+            return self.stats()
+
+        @app.route('/sim/price', methods=['POST'])
+        def sim_price():
+            data = request.get_json(force=True)
+            try:
+                self.exchange.set_price(data['instId'], float(data['price']))
+            except SimError as e:
+                return _fail(e.code, e.message), 400
+            return _ok([self.exchange.ticker(data['instId'])])
+
+        @app.route('/sim/config', methods=['POST'])
+        def sim_config():
+            data = request.get_json(force=True)
+            self.configure(**data)
+            return self.stats()['config']
+
+        @app.route('/sim/reset', methods=['POST'])
+        def sim_reset():
+            data = request.get_json(silent=True) or {}
+            self.exchange.reset(data.get('balance'), data.get('pos_mode'))
+            return self.stats()
+
+        return app
+
+    def configure(self, latency=None, ws_latency=None, faults=None, rate_limit=None,
+                  volatility_bps=None, spread_bps=None):
+        """运行中修改配置"""
+        if latency is not None:
+            self.latency = LatencyModel(latency, self._rng)
+        if ws_latency is not None:
+            self.ws_latency = LatencyModel(ws_latency, self._rng)
+        if faults is not None:
+            self.faults = FaultInjector(faults, self._rng, self.faults.timeout_delay)
+        if rate_limit is not None:
+            self.rate_limits = RateLimitEmulator() if rate_limit else None
+        if volatility_bps is not None:
+            self.exchange.volatility_bps = float(volatility_bps)
+        if spread_bps is not None:
+            self.exchange.spread_bps = float(spread_bps)
+
+    # ----- WebSocket -----
+
+    def _publish(self, channel, data):
+        """撮合引擎的推送（可能在任意线程调用）转到WebSocket事件循环"""
+        if self._io is not None and self._subscribers:
+            self._io.loop.call_soon_threadsafe(self._broadcast, channel, data)
+
+    def _broadcast(self, channel, data):
+        for subscriber in list(self._subscribers.values()):
+            for arg in subscriber['channels'].get(channel, ()):
+                items = [item for item in data if not arg.get('instId') or item.get('instId') == arg['instId']]
+                if not items:
+                    continue
+                if channel.startswith('candle'):
+                    items = [item['row'] for item in items]
+                message = {'arg': arg, 'data': items}
+                if channel == 'positions':
+                    message['eventType'] = 'event_update'
+                self._enqueue(subscriber, message)
+
+    def _enqueue(self, subscriber, message):
+        """按推送延迟排队发送（同一连接内保持顺序）"""
+        due = max(time.monotonic() + self.ws_latency.sample(), subscriber['due'])
+        subscriber['due'] = due
+        subscriber['queue'].put_nowait((due, json.dumps(message)))
+
+    async def _writer(self, websocket, subscriber):
+        while True:
+            due, text = await subscriber['queue'].get()
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await websocket.send(text)
+            self.ws_messages += 1
+
+    def _snapshot(self, channel):
+        if channel == 'positions':
+            return self.exchange.positions()
+        if channel == 'account':
+            return self.exchange.balance()
+        if channel == 'tickers':
+            return [self.exchange.ticker(inst_id) for inst_id in self.exchange._prices]
+        return []
+
+    async def _ws_handler(self, websocket, path=None):
+        request_path = path or getattr(getattr(websocket, 'request', None), 'path', '') or ''
+        private = request_path.rstrip('/').endswith('/private')
+        subscriber = {'channels': {}, 'queue': asyncio.Queue(), 'due': 0.0}
+        self._subscribers[websocket] = subscriber
+        writer = asyncio.ensure_future(self._writer(websocket, subscriber))
+        logged_in = not private
+        try:
+            async for text in websocket:
+                if text == 'ping':
+                    await websocket.send('pong')
+                    continue
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    await websocket.send(json.dumps({'event': 'error', 'code': '60004', 'msg': 'Invalid request'}))
+                    continue
+                op = message.get('op')
+                if op == 'login':
+                    arg = (message.get('args') or [{}])[0]
+                    error = self._verify_login(arg)
+                    if error:
+                        await websocket.send(json.dumps({'event': 'error', 'code': '60009', 'msg': error}))
+                        continue
+                    logged_in = True
+                    await websocket.send(json.dumps({'event': 'login', 'code': '0', 'msg': '', 'connId': 'sim'}))
+                elif op == 'subscribe':
+                    for arg in message.get('args') or []:
+                        channel = arg.get('channel')
+                        if private and not logged_in:
+                            await websocket.send(json.dumps({'event': 'error', 'code': '60011',
+                                                             'msg': 'Please log in'}))
+                            continue
+                        subscriber['channels'].setdefault(channel, []).append(arg)
+                        await websocket.send(json.dumps({'event': 'subscribe', 'arg': arg, 'connId': 'sim'}))
+                        snapshot = self._snapshot(channel)
+                        if channel in ('positions', 'account') or snapshot:
+                            reply = {'arg': arg, 'data': [item for item in snapshot if not arg.get('instId')
+                                                          or item.get('instId') == arg['instId']]}
+                            if channel == 'positions':
+                                reply['eventType'] = 'snapshot'
+                            self._enqueue(subscriber, reply)
+                elif op == 'unsubscribe':
+                    for arg in message.get('args') or []:
+                        subscriber['channels'].pop(arg.get('channel'), None)
+                        await websocket.send(json.dumps({'event': 'unsubscribe', 'arg': arg}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            writer.cancel()
+            self._subscribers.pop(websocket, None)
+
+    def _verify_login(self, arg):
+        if not self.secret_key:
+            return None
+        expected = base64.b64encode(hmac.new(
+            self.secret_key.encode('utf-8'), f"{arg.get('timestamp')}GET/users/self/verify".encode('utf-8'),
+            hashlib.sha256
+        ).digest()).decode('ascii')
+        if arg.get('apiKey') != self.api_key or arg.get('passphrase') != self.passphrase:
+            return 'Invalid apiKey or passphrase'
+        if not hmac.compare_digest(arg.get('sign', ''), expected):
+            return 'Invalid sign'
+        return None
+
+    async def _ticker_loop(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                self.exchange.tick()
+            except Exception as e:
+                logger.error(f"模拟器价格更新异常: {e}")
+
+    # ----- 启动与停止 -----
+
+    async def _serve_ws(self, host, port):
+        return await websockets.serve(self._ws_handler, host, port, ping_interval=None)
+
+    async def _close_ws(self):
+        self._ws_server.close()
+        await self._ws_server.wait_closed()
+
+    def start(self, host='127.0.0.1', port=8090, ws_port=8091):
+        """在后台线程启动REST和WebSocket服务，返回 (REST地址, WebSocket地址)"""
+        self._io = AsyncLoopThread(name='okx-sim-ws')
+        self._ws_server = self._io.run(self._serve_ws(host, ws_port))
+        self._ticker_future = self._io.submit(self._ticker_loop())
+
+        self._http = make_server(host, port, self.app, threaded=True, request_handler=_QuietHandler)
+        self._http_thread = threading.Thread(target=self._http.serve_forever, name='okx-sim-http', daemon=True)
+        self._http_thread.start()
+        rest_url = f"http://{host}:{self._http.server_port}"
+        ws_url = f"ws://{host}:{ws_port}"
+        logger.info(f"OKX模拟器已启动: REST {rest_url}  WebSocket {ws_url}/ws/v5/public | /ws/v5/business | /ws/v5/private")
+        return rest_url, ws_url
+
+    def stop(self):
+        if self._http is not None:
+            self._http.shutdown()
+            self._http = None
+        if self._io is not None:
+            if self._ticker_future is not None:
+                self._ticker_future.cancel()
+            if self._ws_server is not None:
+                try:
+                    self._io.run(self._close_ws(), timeout=5)
+                except Exception as e:
+                    logger.warning(f"关闭模拟器WebSocket服务失败: {e}")
+            self._io.stop()
+            self._io = None
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'ws_connections': len(self._subscribers),
+            'ws_messages': self.ws_messages,
+            'rate_limited': self.rate_limits.limited if self.rate_limits is not None else None,
+            'faults_injected': dict(self.faults.injected),
+            'config': {
+                'latency': self.latency.spec,
+                'ws_latency': self.ws_latency.spec,
+                'faults': self.faults.spec,
+                'rate_limit': self.rate_limits is not None,
+                'volatility_bps': self.exchange.volatility_bps,
+                'spread_bps': self.exchange.spread_bps,
+                'verify_signature': bool(self.secret_key)
+            },
+            'exchange': self.exchange.snapshot()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OKX交易所本地模拟器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090, help='REST端口')
+    parser.add_argument('--ws-port', type=int, default=8091, help='WebSocket端口')
+    parser.add_argument('--latency', default='fixed:0', help='REST延迟分布，例如 lognormal:20,0.5')
+    parser.add_argument('--ws-latency', default=None, help='WebSocket推送延迟分布（默认与REST相同）')
+    parser.add_argument('--faults', default='', help='故障注入，例如 503:0.01,50013:0.01,timeout:0.002')
+    parser.add_argument('--timeout-delay', type=float, default=15.0, help='timeout 故障的响应延迟（秒）')
+    parser.add_argument('--no-rate-limit', action='store_true', help='不模拟OKX接口限速')
+    parser.add_argument('--balance', type=float, default=100000.0, help='初始USDT余额')
+    parser.add_argument('--pos-mode', default='net_mode', choices=['net_mode', 'long_short_mode'])
+    parser.add_argument('--volatility', type=float, default=5.0, help='价格每秒波动（基点）')
+    parser.add_argument('--spread', type=float, default=1.0, help='买卖价差（基点）')
+    parser.add_argument('--tick', type=float, default=0.2, help='价格更新间隔（秒）')
+    parser.add_argument('--seed', type=int, default=None, help='随机数种子（可复现的价格和故障序列）')
+    parser.add_argument('--api-key', default='')
+    parser.add_argument('--secret-key', default='', help='设置后校验请求签名')
+    parser.add_argument('--passphrase', default='')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    rng = random.Random(args.seed)
+    exchange = SimExchange(balance=args.balance, pos_mode=args.pos_mode, volatility_bps=args.volatility,
+                           spread_bps=args.spread, rng=rng)
+    simulator = OKXSimulator(
+        exchange, latency=args.latency, ws_latency=args.ws_latency, faults=args.faults,
+        rate_limit=not args.no_rate_limit, api_key=args.api_key, secret_key=args.secret_key,
+        passphrase=args.passphrase, tick_interval=args.tick, timeout_delay=args.timeout_delay, seed=args.seed
+    )
+    rest_url, ws_url = simulator.start(args.host, args.port, args.ws_port)
+    print(f"OKX_BASE_URL={rest_url}")
+    print(f"OKX_WS_PRIVATE_URL={ws_url}/ws/v5/private")
+    print(f"OKX_WS_BUSINESS_URL={ws_url}/ws/v5/business")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,17 +15,32 @@ OKX交易模块 - 处理合约交易操作
 - 使用前请仔细检查所有参数设置
 """
 
-import okx.Account as Account
-import okx.Trade as Trade
-import okx.MarketData as MarketData
-import json
 import time
 import logging
-from datetime import datetime, timedelta
 from config import Config
+from okx_client import OKXAsyncClient, AsyncLoopThread, SyncOKXClient
+from rate_limiter import RateLimiter
+from okx_retry import RetryPolicies, parse_budgets
+from okx_ws_state import AccountStateMirror
+from leverage_cache import LeverageCache
+from instruments import InstrumentIndex
+from symbol_resolver import SymbolResolver
+from risk_store import RiskStore
+from exposure_ledger import ExposureLedger
+from metrics import metrics
+from tracing import traced
+from position_engine import (
+    NET_MODE, current_exposure, net_exposure, plan_orders, plan_close, order_params, format_size
+)
 
 logger = logging.getLogger(__name__)
 
+
+def _positive(value):
+    """止损止盈价格是否有效（兼容浮点数和已按tickSz对齐的字符串）"""
+    return value is not None and value != '' and float(value) > 0
+
+
 class OKXTrader:
     """OKX合约交易器"""
     
@@ -37,29 +52,75 @@ class OKXTrader:
             
             logger.info(f"初始化OKX交易接口，环境: {'测试环境' if self.flag == '1' else '正式环境'}")
             
-            # 初始化各个API接口 - 使用正确的SDK用法
-            self.account_api = Account.AccountAPI(
+            # 异步REST客户端：自行签名，按主机保持长连接池，可被多个线程/协程共享
+            self.client = OKXAsyncClient(
                 api_key=Config.OKX_API_KEY,
-                api_secret_key=Config.OKX_SECRET_KEY,  # 注意这里使用正确的参数名
+                secret_key=Config.OKX_SECRET_KEY,
                 passphrase=Config.OKX_PASSPHRASE,
-                use_server_time=False,
-                flag=self.flag
+                flag=self.flag,
+                base_url=Config.OKX_BASE_URL,
+                timeout=Config.OKX_HTTP_TIMEOUT,
+                http2=Config.OKX_HTTP2,
+                rate_limiter=RateLimiter(share=Config.OKX_RATE_LIMIT_SHARE) if Config.OKX_RATE_LIMIT_ENABLED else None,
+                rate_limit_retries=Config.OKX_RATE_LIMIT_RETRIES,
+                retry=RetryPolicies(
+                    budgets=parse_budgets(Config.OKX_RETRY_BUDGETS),
+                    budget_ratio=Config.OKX_RETRY_BUDGET_RATIO,
+                    budget_minimum=Config.OKX_RETRY_BUDGET_MIN,
+                    deadline=Config.OKX_RETRY_DEADLINE
+                ) if Config.OKX_RETRY_ENABLED else None,
+                order_expiry=Config.OKX_ORDER_EXPIRY
             )
             
-            self.trade_api = Trade.TradeAPI(
-                api_key=Config.OKX_API_KEY,
-                api_secret_key=Config.OKX_SECRET_KEY,  # 注意这里使用正确的参数名
-                passphrase=Config.OKX_PASSPHRASE,
-                use_server_time=False,
-                flag=self.flag
+            # 后台事件循环，同步代码通过它调用异步客户端
+            self.io = AsyncLoopThread()
+            self.api = SyncOKXClient(self.client, self.io, timeout=Config.ORDER_TIMEOUT)
+            
+            # 兼容原SDK的接口属性名（账户/交易/行情共用同一个连接池）
+            self.account_api = self.api
+            self.trade_api = self.api
+            self.market_api = self.api
+            
+            # 启动时预热连接，避免第一笔交易承担TLS握手
+            self.io.submit(self.client.warmup())
+            
+            # 持仓/余额本地镜像（私有WebSocket推送），REST仅用于断线重连后的全量同步
+            self.state = AccountStateMirror(
+                self.client,
+                self.io,
+                url=Config.OKX_WS_PRIVATE_URL or None
             )
             
-            # MarketData不需要认证
-            self.market_api = MarketData.MarketAPI(flag=self.flag)
+            # 杠杆缓存：只有请求值与当前杠杆不同时才调用 set_leverage
+            self.leverage_cache = LeverageCache()
+            self.io.submit(self.leverage_cache.seed(self.client, Config.SUPPORTED_SYMBOLS, mgn_mode='cross'))
             
-            # 交易状态跟踪
-            self.daily_trade_count = 0
-            self.last_trade_date = None
+            # SWAP合约规格索引：启动时加载，后台定时刷新
+            self.instruments = InstrumentIndex(self.client)
+            self.io.submit(self.instruments.refresh())
+            self.instruments.start(self.io, Config.INSTRUMENT_REFRESH_INTERVAL)
+            
+            # 交易对解析器：别名字典与支持列表基于同一份合约索引，合约刷新后自动重建
+            self.symbols = SymbolResolver(self.instruments, Config.SUPPORTED_SYMBOLS)
+            
+            # 持仓敞口账本：持仓推送和下单结果增量更新，检查持仓总价值时不请求交易所
+            self.exposure = ExposureLedger(self.instruments)
+            self.state.add_listener(self.exposure.apply_positions)
+            if Config.OKX_WS_ENABLED:
+                self.state.start()
+            else:
+                self.io.submit(self.exposure.seed(self.client))
+            
+            # 账户持仓模式（单向/双向），首次使用时查询并缓存
+            self._pos_mode = None
+            
+            # 风控计数（日交易次数、单币种成交额、在途订单数），多个worker进程共享同一个文件
+            self.risk = RiskStore(
+                Config.RISK_STORE_PATH,
+                max_daily_trades=Config.MAX_DAILY_TRADES,
+                max_symbol_notional=Config.MAX_SYMBOL_DAILY_NOTIONAL,
+                max_open_orders=Config.MAX_OPEN_ORDERS
+            )
             
             logger.info("OKX交易接口初始化成功")
             
@@ -74,8 +135,8 @@ class OKXTrader:
             logger.info(f"使用环境: {'测试环境' if self.flag == '1' else '正式环境'}")
             logger.info(f"API Key前4位: {Config.OKX_API_KEY[:4]}****")
             
-            # 使用正确的方法名 - 测试市场数据获取
-            result = self.market_api.get_tickers(instType="SPOT")
+            # 测试市场数据获取
+            result = self.api.get_tickers(instType="SPOT")
             logger.info(f"API响应: {result}")
             
             if result.get('code') == '0':
@@ -91,10 +152,16 @@ class OKXTrader:
             return False
     
     def get_balance(self):
-        """获取账户余额"""
+        """获取账户余额（镜像可用时直接读取本地快照）"""
+        if self.state.is_live():
+            return {
+                'success': True,
+                'data': self.state.balance(),
+                'source': 'websocket'
+            }
+        
         try:
-            # 使用正确的方法名
-            result = self.account_api.get_account_balance()
+            result = self.api.get_account_balance()
             if result.get('code') == '0':
                 logger.info("获取余额成功")
                 return {
@@ -115,14 +182,20 @@ class OKXTrader:
             }
     
     def get_positions(self):
-        """获取当前持仓"""
+        """获取当前持仓（镜像可用时直接读取本地快照）"""
+        if self.state.is_live():
+            return {
+                'success': True,
+                'data': self.state.positions(),
+                'source': 'websocket'
+            }
+        
         try:
             logger.info("正在获取持仓信息...")
-            logger.info(f"使用API环境: {'测试环境' if self.flag == '1' else '正式环境'}")
+            logger.debug(f"使用API环境: {'测试环境' if self.flag == '1' else '正式环境'}")
             
-            result = self.account_api.get_positions()
-            logger.info(f"持仓API原始响应: {result}")
-            logger.info(f"响应类型: {type(result)}")
+            result = self.api.get_positions()
+            logger.debug(f"持仓API原始响应: {result}")
             
             if result.get('code') == '0':
                 logger.info("获取持仓成功")
@@ -152,7 +225,7 @@ class OKXTrader:
     def get_market_price(self, symbol):
         """获取市场价格"""
         try:
-            result = self.market_api.get_ticker(instId=symbol)
+            result = self.api.get_ticker(instId=symbol)
             if result.get('code') == '0' and result.get('data'):
                 price = float(result['data'][0]['last'])
                 return {
@@ -173,45 +246,71 @@ class OKXTrader:
     
     def set_leverage(self, symbol, leverage):
         """设置杠杆倍数"""
+        return self.io.run(self._set_leverage_async(symbol, leverage), Config.ORDER_TIMEOUT)
+    
+    async def _set_leverage_async(self, symbol, leverage):
+        """设置杠杆倍数（协程版本，可与其他请求并发）"""
+        # 杠杆未变化时跳过请求
+        if not self.leverage_cache.needs_update(symbol, 'cross', leverage):
+            logger.debug(f"杠杆未变化，跳过设置 {symbol}: {leverage}x")
+            return {'success': True, 'cached': True}
+        
+        started = time.perf_counter()
         try:
             logger.info(f"设置杠杆 {symbol}: {leverage}x")
             
-            # 使用正确的方法名
-            result = self.account_api.set_leverage(
+            result = await self.client.set_leverage(
                 instId=symbol,
                 lever=str(leverage),
                 mgnMode="cross"  # 全仓模式
             )
+            metrics.observe('set_leverage', time.perf_counter() - started)
             
             if result.get('code') == '0':
                 logger.info(f"设置杠杆成功: {leverage}x")
+                self.leverage_cache.set(symbol, 'cross', leverage)
                 return {'success': True}
             else:
                 logger.error(f"设置杠杆失败: {result}")
+                self.leverage_cache.invalidate(symbol, 'cross')
                 return {
                     'success': False,
                     'error': result.get('msg', '设置杠杆失败')
                 }
         except Exception as e:
             logger.error(f"设置杠杆异常: {e}")
+            self.leverage_cache.invalidate(symbol, 'cross')
             return {
                 'success': False,
                 'error': str(e)
             }
 
-    def place_order(self, symbol, side, amount, order_type='market', price=None):
-        """下单"""
+    @traced('place_order')
+    def place_order(self, symbol, side, amount, order_type='market', price=None,
+                    stop_loss=None, take_profit=None, pos_side=None, reduce_only=None, client_order_id=None):
+        """
+        下单
+        stop_loss/take_profit: 触发价，随开仓单一起提交（附带止盈止损），成交后由OKX自动挂出
+        pos_side: 双向持仓模式下的持仓方向（long/short）
+        reduce_only: 只减仓
+        client_order_id: 自定义订单ID（clOrdId），同一信号的订单ID固定
+        """
         try:
             logger.info(f"准备下单: {symbol} {side} {amount}")
             
-            # 使用正确的方法名
-            result = self.trade_api.place_order(
+            attach_algo_ords = self._build_attached_tp_sl(stop_loss, take_profit)
+            
+            result = self.api.place_order(
                 instId=symbol,
                 tdMode="cross",  # 全仓模式
                 side=side,  # buy 或 sell
                 ordType=order_type,  # market 或 limit
                 sz=str(amount),
-                px=str(price) if price else None
+                px=str(price) if price else None,
+                posSide=pos_side,
+                reduceOnly=reduce_only,
+                clOrdId=client_order_id,
+                attachAlgoOrds=attach_algo_ords
             )
             
             if result.get('code') == '0':
@@ -226,7 +325,7 @@ class OKXTrader:
                 logger.error(f"下单失败: {result}")
                 return {
                     'success': False,
-                    'error': result.get('msg', '下单失败')
+                    'error': self._order_error(result, '下单失败')
                 }
         except Exception as e:
             logger.error(f"下单异常: {e}")
@@ -234,51 +333,314 @@ class OKXTrader:
                 'success': False,
                 'error': str(e)
             }
+    
+    @traced('place_batch_orders')
+    def place_batch_orders(self, orders):
+        """
+        批量下单（一次请求最多20笔），用于需要同时发出的多笔订单
+        orders: OKX下单参数列表，例如 [{'instId': ..., 'tdMode': 'cross', 'side': 'buy', 'ordType': 'market', 'sz': '1'}]
+        返回每笔订单的结果，顺序与请求一致
+        """
+        try:
+            if not orders:
+                return {'success': True, 'orders': []}
+            if len(orders) > 20:
+                return {
+                    'success': False,
+                    'error': f'批量下单最多20笔: {len(orders)}'
+                }
+            
+            logger.info(f"准备批量下单: {len(orders)} 笔")
+            result = self.api.place_multiple_orders(orders)
+            
+            order_results = []
+            for item in result.get('data', []):
+                if item.get('sCode') == '0':
+                    order_results.append({'success': True, 'order_id': item.get('ordId'), 'data': item})
+                else:
+                    order_results.append({'success': False, 'error': item.get('sMsg', '下单失败'), 'data': item})
+            
+            if result.get('code') == '0':
+                logger.info(f"批量下单成功: {[r['order_id'] for r in order_results]}")
+                return {'success': True, 'orders': order_results}
+            else:
+                logger.error(f"批量下单部分或全部失败: {result}")
+                return {
+                    'success': False,
+                    'error': self._order_error(result, '批量下单失败'),
+                    'orders': order_results
+                }
+        except Exception as e:
+            logger.error(f"批量下单异常: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    @staticmethod
+    def _build_attached_tp_sl(stop_loss=None, take_profit=None):
+        """构造开仓单附带的止盈止损（触发后市价执行），没有则返回None"""
+        attached = {}
+        if _positive(stop_loss):
+            attached['slTriggerPx'] = str(stop_loss)
+            attached['slOrdPx'] = '-1'
+            attached['slTriggerPxType'] = 'last'
+        if _positive(take_profit):
+            attached['tpTriggerPx'] = str(take_profit)
+            attached['tpOrdPx'] = '-1'
+            attached['tpTriggerPxType'] = 'last'
+        return [attached] if attached else None
+    
+    @staticmethod
+    def _order_error(result, default):
+        """提取下单失败原因（优先使用单笔订单的sMsg）"""
+        for item in result.get('data') or []:
+            if item.get('sCode') not in (None, '0') and item.get('sMsg'):
+                return item['sMsg']
+        return result.get('msg') or default
 
-    def close_position(self, symbol, side):
-        """平仓"""
+    def get_position_mode(self):
+        """获取账户持仓模式（net_mode 单向 / long_short_mode 双向），首次查询后缓存"""
+        if self._pos_mode is None:
+            result = self.api.get_account_config()
+            if result.get('code') != '0' or not result.get('data'):
+                raise RuntimeError(f"获取持仓模式失败: {result.get('msg')}")
+            self._pos_mode = result['data'][0].get('posMode', NET_MODE)
+            logger.info(f"账户持仓模式: {self._pos_mode}")
+        return self._pos_mode
+    
+    def get_instrument(self, symbol):
+        """获取合约规格，索引尚未加载时同步加载一次"""
+        spec = self.instruments.get(symbol)
+        if spec is None and len(self.instruments) == 0:
+            self.io.run(self.instruments.refresh(), Config.ORDER_TIMEOUT)
+            spec = self.instruments.get(symbol)
+        if spec is None:
+            raise ValueError(f"未知合约: {symbol}")
+        return spec
+    
+    def _current_exposure(self, symbol, pos_mode):
+        """获取某交易对的当前仓位：优先读本地镜像，镜像不可用时只查询该交易对"""
+        if self.state.is_live():
+            positions = self.state.get_symbol_positions(symbol)
+        else:
+            result = self.api.get_positions(instType='SWAP', instId=symbol)
+            if result.get('code') != '0':
+                raise RuntimeError(f"获取持仓失败: {result.get('msg')}")
+            positions = result.get('data', [])
+            self.exposure.apply_positions(positions, inst_id=symbol)
+        return current_exposure(positions, pos_mode)
+    
+    def _execute_orders(self, symbol, orders, stop_loss=None, take_profit=None, client_id=None):
+        """
+        提交仓位调整订单：一笔时直接下单，多笔时一次批量请求
+        止损止盈附带在开仓单上；反手单的止损止盈在成交后按新仓位数量单独挂出
+        client_id: clOrdId前缀（由信号去重键派生），第i笔订单的 clOrdId 为 前缀+i
+        """
+        if client_id:
+            for index, order in enumerate(orders):
+                order['clOrdId'] = f"{client_id}{index}"
+        
+        if len(orders) == 1:
+            params = order_params(orders[0])
+            result = self.place_order(
+                symbol=symbol,
+                side=params['side'],
+                amount=params['sz'],
+                order_type=params['ordType'],
+                stop_loss=stop_loss if orders[0]['role'] == 'open' else None,
+                take_profit=take_profit if orders[0]['role'] == 'open' else None,
+                pos_side=params.get('posSide'),
+                reduce_only=params.get('reduceOnly'),
+                client_order_id=params.get('clOrdId')
+            )
+            result = dict(result, orders=[result])
+        else:
+            params_list = []
+            for order in orders:
+                params = order_params(order)
+                if order['role'] == 'open':
+                    attached = self._build_attached_tp_sl(stop_loss, take_profit)
+                    if attached:
+                        params['attachAlgoOrds'] = attached
+                params_list.append(params)
+            result = self.place_batch_orders(params_list)
+        
+        if not result['success']:
+            return result
+        
+        # 反手单：新仓位的止损止盈单独挂出（数量为新仓位而不是整笔订单）
+        for order in orders:
+            if order['role'] == 'flip' and (_positive(stop_loss) or _positive(take_profit)):
+                protect_side = 'sell' if order['side'] == 'buy' else 'buy'
+                result['protection'] = self.place_tp_sl_order(
+                    symbol=symbol,
+                    side=protect_side,
+                    size=format_size(order['open_size']),
+                    stop_loss=stop_loss,
+                    take_profit=take_profit,
+                    client_order_id=f"{client_id}p" if client_id else None
+                )
+        return result
+    
+    def _opening_notional(self, symbol, orders, price=None):
+        """开仓/反手订单新开部分的名义价值（USDT），用于单币种成交额限额"""
+        contracts = sum(order['open_size'] for order in orders)
+        if not contracts:
+            return 0.0
+        if not _positive(price):
+            if not Config.MAX_SYMBOL_DAILY_NOTIONAL:
+                return 0.0
+            ticker = self.get_market_price(symbol)
+            if not ticker['success']:
+                raise RuntimeError(f"无法计算成交额: {ticker.get('error')}")
+            price = ticker['price']
+        return self.get_instrument(symbol).notional(contracts, float(price))
+    
+    @traced('set_target_position')
+    def set_target_position(self, symbol, target, leverage=10, stop_loss=None, take_profit=None, client_id=None,
+                            price=None):
+        """
+        把仓位调整到目标带符号数量（多头为正、空头为负、0为平仓）
+        target 为币的数量，按合约规格换算成合法张数；止损止盈价格对齐到 tickSz
+        与当前仓位比较后只发送必要的订单，单向模式下反手只需一笔订单
+        client_id: clOrdId前缀，见 _execute_orders
+        price: 信号价格，用于计算成交额（不传时按需查询行情）
+        """
         try:
-            logger.info(f"准备平仓: {symbol} {side}")
+            logger.info(f"调整目标仓位: {symbol} -> {target}, 杠杆: {leverage}x")
+            
+            leverage_future = None
+            contracts = 0.0
+            if target != 0:
+                # 风险检查
+                risk_check = self._risk_check(symbol, abs(target), leverage, price)
+                if not risk_check['success']:
+                    return risk_check
+                
+                # 币数量 -> 张数（lotSz整数倍，不小于minSz）
+                spec = self.get_instrument(symbol)
+                units, contracts_text = spec.contracts_from_coin(target)
+                if units == 0:
+                    return {
+                        'success': False,
+                        'error': f'数量小于最小下单量: {abs(target)} < {spec.min_size}张 x {spec.ct_val}'
+                    }
+                contracts = spec.contracts_value(units) if target > 0 else -spec.contracts_value(units)
+                logger.info(f"数量换算: {abs(target)} -> {contracts_text}张")
+                
+                # 止损止盈价格对齐到 tickSz
+                stop_loss = spec.snap_price(float(stop_loss)) if _positive(stop_loss) else None
+                take_profit = spec.snap_price(float(take_profit)) if _positive(take_profit) else None
+                
+                # 设置杠杆与查询仓位互不依赖，先发出杠杆请求
+                leverage_future = self.io.submit(self._set_leverage_async(symbol, leverage))
+            
+            pos_mode = self.get_position_mode()
+            exposure = self._current_exposure(symbol, pos_mode)
+            previous = net_exposure(exposure)
+            orders = plan_orders(symbol, pos_mode, exposure, contracts)
+            
+            # 等待杠杆设置完成后再下单
+            if leverage_future is not None:
+                leverage_result = leverage_future.result(Config.ORDER_TIMEOUT)
+                if not leverage_result['success']:
+                    logger.warning(f"设置杠杆失败: {leverage_result}")
+            
+            if not orders:
+                logger.info(f"仓位已在目标，无需下单: {symbol} {previous}")
+                return {
+                    'success': True,
+                    'symbol': symbol,
+                    'size': abs(target),
+                    'target': contracts,
+                    'previous': previous,
+                    'leverage': leverage,
+                    'order_id': None,
+                    'orders': [],
+                    'stop_loss_take_profit': [],
+                    'message': f'仓位已在目标: {contracts}张 {symbol}'
+                }
             
-            # 获取持仓信息
-            positions = self.get_positions()
-            if not positions['success']:
-                return positions
+            logger.info(f"仓位调整: {symbol} {previous} -> {contracts}, 订单: {[(o['side'], o['sz'], o['role']) for o in orders]}")
+            
+            # 增加敞口的调整计入风控限额（检查并计数一次完成，所有worker进程共享），只减仓不受限制
+            notional = None
+            if any(order['role'] != 'reduce' for order in orders):
+                notional = self._opening_notional(symbol, orders, price)
+                risk_day = self.risk.current_day()
+                error = self.risk.reserve(symbol, notional, len(orders))
+                if error:
+                    logger.warning(f"风控拒绝: {error}")
+                    return {'success': False, 'error': error}
+            
+            result = {'success': False}
+            order_ts = int(time.time() * 1000)
+            try:
+                result = self._execute_orders(symbol, orders, stop_loss, take_profit, client_id)
+            finally:
+                if notional is not None:
+                    self.risk.finish(symbol, notional, len(orders), result['success'], risk_day)
+            if not result['success']:
+                # 下单失败时不再信任缓存的杠杆，下次重新设置
+                self.leverage_cache.invalidate(symbol, 'cross')
+                return result
+            
+            # 持仓推送到达前先按目标仓位更新持仓镜像和敞口账本，
+            # 同一交易对紧接着的信号按新仓位计算，不会按成交前的仓位重复下单
+            self.state.expect_position(symbol, contracts, pos_mode, order_ts)
+            self.exposure.set_position(symbol, contracts, pos_mode, price)
+            
+            order_results = result.get('orders', [])
+            opening = [r for o, r in zip(orders, order_results) if o['role'] != 'reduce']
+            order_id = (opening or order_results)[0].get('order_id') if order_results else None
             
-            target_position = None
-            for pos in positions['data']:
-                if pos['instId'] == symbol and pos['posSide'] == side:
-                    target_position = pos
-                    break
+            return {
+                'success': True,
+                'symbol': symbol,
+                'size': abs(target),
+                'target': contracts,
+                'previous': previous,
+                'leverage': leverage,
+                'order_id': order_id,
+                'orders': order_results,
+                'stop_loss_take_profit': self._attached_tp_sl_summary(stop_loss, take_profit) if target != 0 else [],
+                'message': f'仓位调整成功: {previous} -> {contracts}张 {symbol}'
+            }
             
-            if not target_position:
-                logger.info("没有找到需要平仓的持仓")
-                return {'success': True, 'message': '无持仓需要平仓'}
+        except Exception as e:
+            logger.error(f"调整仓位异常: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    @traced('close_position')
+    def close_position(self, symbol, side, client_id=None):
+        """平仓（只平 side 方向的仓位）"""
+        try:
+            logger.info(f"准备平仓: {symbol} {side}")
             
-            pos_size = abs(float(target_position['pos']))
-            close_side = 'sell' if side == 'long' else 'buy'
+            pos_mode = self.get_position_mode()
+            exposure = self._current_exposure(symbol, pos_mode)
+            orders = plan_close(symbol, pos_mode, exposure, side)
             
-            # 使用正确的方法名
-            result = self.trade_api.place_order(
-                instId=symbol,
-                tdMode="cross",
-                side=close_side,
-                ordType="market",
-                sz=str(pos_size),
-                reduceOnly=True  # 只减仓
-            )
+            if not orders:
+                logger.info("没有找到需要平仓的持仓")
+                return {'success': True, 'message': '无持仓需要平仓'}
             
-            if result.get('code') == '0':
+            result = self._execute_orders(symbol, orders, client_id=client_id)
+            if result['success']:
                 logger.info("平仓成功")
                 return {
                     'success': True,
-                    'order_id': result['data'][0]['ordId']
+                    'order_id': result.get('order_id') or result['orders'][0].get('order_id')
                 }
             else:
                 logger.error(f"平仓失败: {result}")
                 return {
                     'success': False,
-                    'error': result.get('msg', '平仓失败')
+                    'error': result.get('error', '平仓失败')
                 }
                 
         except Exception as e:
@@ -288,186 +650,91 @@ class OKXTrader:
                 'error': str(e)
             }
     
-    def place_stop_order(self, symbol, side, size, trigger_price, order_price=None):
-        """下止损止盈单"""
+    @traced('place_tp_sl_order')
+    def place_tp_sl_order(self, symbol, side, size, stop_loss=None, take_profit=None, pos_side=None,
+                          client_order_id=None):
+        """
+        为已有持仓下止盈止损单（只减仓，触发后市价执行）
+        同时给出止损和止盈时使用OCO（一个触发后另一个自动撤销），否则使用单向条件单
+        """
         try:
-            logger.info(f"设置止损单: {symbol} {side} {size} @ {trigger_price}")
+            has_sl = _positive(stop_loss)
+            has_tp = _positive(take_profit)
+            if not has_sl and not has_tp:
+                return {'success': True, 'message': '无止盈止损'}
+            
+            logger.info(f"设置止盈止损: {symbol} {side} {size} SL@{stop_loss} TP@{take_profit}")
             
-            # 使用正确的方法名
-            result = self.trade_api.place_algo_order(
+            result = self.api.place_algo_order(
                 instId=symbol,
                 tdMode="cross",
                 side=side,
-                ordType="conditional",  # 条件单
+                ordType="oco" if has_sl and has_tp else "conditional",
                 sz=str(size),
-                triggerPx=str(trigger_price),
-                orderPx=str(order_price) if order_price else str(trigger_price)
+                posSide=pos_side,
+                reduceOnly=True if pos_side is None else None,
+                slTriggerPx=str(stop_loss) if has_sl else None,
+                slOrdPx='-1' if has_sl else None,
+                tpTriggerPx=str(take_profit) if has_tp else None,
+                tpOrdPx='-1' if has_tp else None,
+                algoClOrdId=client_order_id
             )
             
             if result.get('code') == '0':
-                logger.info("止损单设置成功")
+                logger.info("止盈止损设置成功")
                 return {
                     'success': True,
                     'order_id': result['data'][0]['algoId']
                 }
             else:
-                logger.error(f"止损单设置失败: {result}")
+                logger.error(f"止盈止损设置失败: {result}")
                 return {
                     'success': False,
-                    'error': result.get('msg', '止损单设置失败')
+                    'error': self._order_error(result, '止盈止损设置失败')
                 }
         except Exception as e:
-            logger.error(f"止损单设置异常: {e}")
+            logger.error(f"止盈止损设置异常: {e}")
             return {
                 'success': False,
                 'error': str(e)
             }
 
-    def open_long_position(self, symbol, size, leverage=10, stop_loss=None, take_profit=None):
-        """开多仓"""
-        try:
-            logger.info(f"准备开多仓: {symbol}, 数量: {size}, 杠杆: {leverage}x")
-            
-            # 风险检查
-            risk_check = self._risk_check(symbol, size, leverage)
-            if not risk_check['success']:
-                return risk_check
-            
-            # 平掉现有仓位
-            close_result = self.close_position(symbol, 'long')
-            if not close_result['success']:
-                logger.warning(f"平仓失败，继续开仓: {close_result}")
-            
-            # 设置杠杆
-            leverage_result = self.set_leverage(symbol, leverage)
-            if not leverage_result['success']:
-                logger.warning(f"设置杠杆失败: {leverage_result}")
-            
-            # 开多仓
-            order_result = self.place_order(
-                symbol=symbol,
-                side="buy",
-                amount=size,
-                order_type="market"
-            )
-            
-            if not order_result['success']:
-                return order_result
-            
-            # 设置止损止盈
-            sl_tp_results = []
-            
-            if stop_loss and stop_loss > 0:
-                sl_result = self.place_stop_order(
-                    symbol=symbol,
-                    side="sell",
-                    size=size,
-                    trigger_price=stop_loss
-                )
-                sl_tp_results.append(('止损', sl_result))
-            
-            if take_profit and take_profit > 0:
-                tp_result = self.place_stop_order(
-                    symbol=symbol,
-                    side="sell",
-                    size=size,
-                    trigger_price=take_profit
-                )
-                sl_tp_results.append(('止盈', tp_result))
-            
-            return {
-                'success': True,
-                'action': 'open_long',
-                'symbol': symbol,
-                'size': size,
-                'leverage': leverage,
-                'order_id': order_result['order_id'],
-                'stop_loss_take_profit': sl_tp_results,
-                'message': f'开多仓成功: {size} {symbol}'
-            }
-            
-        except Exception as e:
-            logger.error(f"开多仓异常: {e}")
-            return {
-                'success': False,
-                'error': str(e)
-            }
+    def open_long_position(self, symbol, size, leverage=10, stop_loss=None, take_profit=None, client_id=None,
+                           price=None):
+        """开多仓（目标仓位 +size；持有空仓时直接反手）"""
+        logger.info(f"准备开多仓: {symbol}, 数量: {size}, 杠杆: {leverage}x")
+        result = self.set_target_position(symbol, abs(size), leverage, stop_loss, take_profit, client_id, price)
+        if result.get('success'):
+            result['action'] = 'open_long'
+            result['message'] = f'开多仓成功: {size} {symbol}'
+        return result
     
-    def open_short_position(self, symbol, size, leverage=10, stop_loss=None, take_profit=None):
-        """开空仓"""
-        try:
-            logger.info(f"准备开空仓: {symbol}, 数量: {size}, 杠杆: {leverage}x")
-            
-            # 风险检查
-            risk_check = self._risk_check(symbol, size, leverage)
-            if not risk_check['success']:
-                return risk_check
-            
-            # 平掉现有仓位
-            close_result = self.close_position(symbol, 'short')
-            if not close_result['success']:
-                logger.warning(f"平仓失败，继续开仓: {close_result}")
-            
-            # 设置杠杆
-            leverage_result = self.set_leverage(symbol, leverage)
-            if not leverage_result['success']:
-                logger.warning(f"设置杠杆失败: {leverage_result}")
-            
-            # 开空仓
-            order_result = self.place_order(
-                symbol=symbol,
-                side="sell",
-                amount=size,
-                order_type="market"
-            )
-            
-            if not order_result['success']:
-                return order_result
-            
-            # 设置止损止盈
-            sl_tp_results = []
-            
-            if stop_loss and stop_loss > 0:
-                sl_result = self.place_stop_order(
-                    symbol=symbol,
-                    side="buy",
-                    size=size,
-                    trigger_price=stop_loss
-                )
-                sl_tp_results.append(('止损', sl_result))
-            
-            if take_profit and take_profit > 0:
-                tp_result = self.place_stop_order(
-                    symbol=symbol,
-                    side="buy",
-                    size=size,
-                    trigger_price=take_profit
-                )
-                sl_tp_results.append(('止盈', tp_result))
-            
-            return {
-                'success': True,
-                'action': 'open_short',
-                'symbol': symbol,
-                'size': size,
-                'leverage': leverage,
-                'order_id': order_result['order_id'],
-                'stop_loss_take_profit': sl_tp_results,
-                'message': f'开空仓成功: {size} {symbol}'
-            }
-            
-        except Exception as e:
-            logger.error(f"开空仓异常: {e}")
-            return {
-                'success': False,
-                'error': str(e)
-            }
+    def open_short_position(self, symbol, size, leverage=10, stop_loss=None, take_profit=None, client_id=None,
+                            price=None):
+        """开空仓（目标仓位 -size；持有多仓时直接反手）"""
+        logger.info(f"准备开空仓: {symbol}, 数量: {size}, 杠杆: {leverage}x")
+        result = self.set_target_position(symbol, -abs(size), leverage, stop_loss, take_profit, client_id, price)
+        if result.get('success'):
+            result['action'] = 'open_short'
+            result['message'] = f'开空仓成功: {size} {symbol}'
+        return result
+    
+    @staticmethod
+    def _attached_tp_sl_summary(stop_loss, take_profit):
+        """开仓结果中的止损止盈说明（已随开仓单附带提交）"""
+        results = []
+        if _positive(stop_loss):
+            results.append(('止损', {'success': True, 'attached': True, 'trigger_price': stop_loss}))
+        if _positive(take_profit):
+            results.append(('止盈', {'success': True, 'attached': True, 'trigger_price': take_profit}))
+        return results
     
-    def _risk_check(self, symbol, size, leverage):
-        """风险检查"""
+    @traced('risk_check')
+    def _risk_check(self, symbol, size, leverage, price=None):
+        """风险检查（price 为信号价格，用于估算调整后的持仓价值）"""
         try:
             # 检查交易对
-            if symbol not in Config.SUPPORTED_SYMBOLS:
+            if not self.symbols.is_supported(symbol):
                 return {
                     'success': False,
                     'error': f'不支持的交易对: {symbol}'
@@ -487,6 +754,27 @@ class OKXTrader:
                     'error': f'杠杆超过限制: {leverage} > {Config.MAX_LEVERAGE}'
                 }
             
+            # 检查可用保证金（读取本地余额快照，不请求REST）
+            if self.state.is_live():
+                available = self.state.available_balance('USDT')
+                if available is not None and available <= 0:
+                    return {
+                        'success': False,
+                        'error': f'可用保证金不足: {available} USDT'
+                    }
+            
+            # 检查持仓总价值（本地敞口账本，O(1)，不请求交易所）
+            if Config.MAX_TOTAL_POSITION_VALUE:
+                self.exposure.update_price(symbol, price)
+                mark = price or self.exposure.price(symbol)
+                if mark:
+                    error = self.exposure.check(symbol, size * mark, Config.MAX_TOTAL_POSITION_VALUE)
+                    if error:
+                        return {
+                            'success': False,
+                            'error': error
+                        }
+            
             # 检查日交易次数
             if self._check_daily_trade_limit():
                 return {
@@ -504,26 +792,8 @@ class OKXTrader:
             }
     
     def _check_daily_trade_limit(self):
-        """检查日交易次数限制"""
-        today = datetime.now().date()
-        
-        if self.last_trade_date != today:
-            self.daily_trade_count = 0
-            self.last_trade_date = today
-        
-        return self.daily_trade_count >= Config.MAX_DAILY_TRADES
-    
-    def _update_trade_count(self):
-        """更新交易计数"""
-        today = datetime.now().date()
-        
-        if self.last_trade_date != today:
-            self.daily_trade_count = 1
-            self.last_trade_date = today
-        else:
-            self.daily_trade_count += 1
-        
-        logger.info(f"今日交易次数: {self.daily_trade_count}/{Config.MAX_DAILY_TRADES}")
+        """检查日交易次数限制：读取风控计数文件中的当日次数（只读预检查，下单前由 risk.reserve 原子地检查并计数）"""
+        return bool(Config.MAX_DAILY_TRADES) and self.risk.daily_trades() >= Config.MAX_DAILY_TRADES
 
 # 测试函数
 if __name__ == '__main__':
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OKX私有WebSocket状态镜像 - 持仓和余额的本地快照
+
+功能特点：
+1. 后台订阅OKX私有频道 positions（SWAP）和 account
+2. 在内存中按交易对索引持仓，平仓/风控/查询接口直接读取，不再请求REST
+3. 每次（重新）连接后用REST做一次全量同步，弥补断线期间丢失的推送
+4. WebSocket地址和连接函数都可以替换，方便用本地WebSocket服务测试
+5. 下单成功后立即按目标仓位更新镜像（expect_position），同一交易对紧接着的信号不会按成交前的仓位计算；
+   成交推送到达前，该交易对早于下单时间的推送（uTime）不会把镜像改回旧仓位
+
+使用方法：
+    mirror = AccountStateMirror(client, loop_thread)
+    mirror.start()
+    mirror.get_position('BTC-USDT-SWAP', 'long')
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRIVATE_URL = 'wss://ws.okx.com:8443/ws/v5/private'
+DEMO_PRIVATE_URL = 'wss://wspap.okx.com:8443/ws/v5/private?brokerId=9999'
+
+# OKX要求30秒内有数据往来，否则断开
+PING_INTERVAL = 20
+
+# 下单后等待成交推送的最长时间（秒），超过后恢复按推送更新（例如交易所时钟偏差导致 uTime 偏小）
+EXPECT_HOLD = 10.0
+
+
+def login_message(api_key, secret_key, passphrase):
+    """构造私有频道登录消息"""
+    timestamp = str(int(time.time()))
+    digest = hmac.new(
+        secret_key.encode('utf-8'),
+        f"{timestamp}GET/users/self/verify".encode('utf-8'),
+        hashlib.sha256
+    ).digest()
+    return {
+        'op': 'login',
+        'args': [{
+            'apiKey': api_key,
+            'passphrase': passphrase,
+            'timestamp': timestamp,
+            'sign': base64.b64encode(digest).decode('ascii')
+        }]
+    }
+
+
+class AccountStateMirror:
+    """持仓/余额本地镜像"""
+
+    def __init__(self, client, loop_thread, url=None, connect=None, max_staleness=None):
+        """
+        client: OKXAsyncClient，用于登录签名和REST全量同步
+        loop_thread: AsyncLoopThread，订阅协程运行在该事件循环上
+        url: 私有频道地址，默认根据 client.flag 选择正式/模拟盘
+        connect: WebSocket连接函数，默认 websockets.connect（测试时可替换）
+        max_staleness: 超过该秒数没有任何推送/心跳则认为镜像不可用
+        """
+        self.client = client
+        self.loop_thread = loop_thread
+        self.url = url or (DEMO_PRIVATE_URL if client.flag == '1' else DEFAULT_PRIVATE_URL)
+        self._connect = connect or websockets.connect
+        self.max_staleness = max_staleness if max_staleness is not None else PING_INTERVAL * 3
+
+        self._lock = threading.Lock()
+        self._positions = {}   # instId -> {posSide: position}
+        self._balance = []     # 与 REST /account/balance 的 data 字段格式相同
+        self._synced = False
+        self._last_message = 0.0
+        self._future = None
+        self._stopping = False
+        self._listeners = []   # 持仓更新回调: callback(positions, snapshot)
+        self._expected = {}    # instId -> (下单后的 {posSide: 张数}, 下单时间ms, 截止时间)
+
+        # 统计信息
+        self.reconnects = 0
+        self.resyncs = 0
+        self.messages = 0
+
+    # ===== 读取接口（线程安全，无网络请求）=====
+
+    def is_live(self):
+        """镜像是否已完成同步并且在持续接收推送"""
+        with self._lock:
+            if not self._synced:
+                return False
+            return time.monotonic() - self._last_message <= self.max_staleness
+
+    def get_position(self, inst_id, pos_side):
+        """按交易对和持仓方向获取持仓，没有持仓返回None"""
+        with self._lock:
+            position = self._positions.get(inst_id, {}).get(pos_side)
+            return dict(position) if position else None
+
+    def get_symbol_positions(self, inst_id):
+        """获取某个交易对的所有方向持仓"""
+        with self._lock:
+            return [dict(p) for p in self._positions.get(inst_id, {}).values()]
+
+    def positions(self):
+        """全部持仓（与 REST /account/positions 的 data 字段格式相同）"""
+        with self._lock:
+            return [dict(p) for sides in self._positions.values() for p in sides.values()]
+
+    def balance(self):
+        """账户余额（与 REST /account/balance 的 data 字段格式相同）"""
+        with self._lock:
+            return [dict(item) for item in self._balance]
+
+    def available_balance(self, ccy='USDT'):
+        """某币种的可用余额，未知时返回None"""
+        with self._lock:
+            for account in self._balance:
+                for detail in account.get('details', []):
+                    if detail.get('ccy') == ccy:
+                        value = detail.get('availBal') or detail.get('availEq')
+                        return float(value) if value not in (None, '') else None
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'live': self._synced and time.monotonic() - self._last_message <= self.max_staleness,
+                'symbols': len(self._positions),
+                'positions': sum(len(sides) for sides in self._positions.values()),
+                'messages': self.messages,
+                'reconnects': self.reconnects,
+                'resyncs': self.resyncs,
+                'last_message_age': round(time.monotonic() - self._last_message, 3) if self._last_message else None
+            }
+
+    # ===== 状态更新 =====
+
+    def add_listener(self, callback):
+        """注册持仓更新回调 callback(positions, snapshot)，在后台事件循环线程中调用"""
+        self._listeners.append(callback)
+
+    def expect_position(self, inst_id, contracts, pos_mode='net_mode', order_ts=None):
+        """
+        下单成功后按目标仓位（带符号张数）更新镜像，成交推送到达后以推送为准
+        order_ts: 下单时间（毫秒），uTime 早于该时间的推送是成交前的仓位，在 EXPECT_HOLD 内忽略
+        """
+        if pos_mode == 'net_mode':
+            sides = {'net': contracts} if contracts else {}
+        elif contracts > 0:
+            sides = {'long': contracts}
+        elif contracts < 0:
+            sides = {'short': -contracts}
+        else:
+            sides = {}
+        with self._lock:
+            self._positions.pop(inst_id, None)
+            for pos_side, size in sides.items():
+                self._positions.setdefault(inst_id, {})[pos_side] = {
+                    'instId': inst_id, 'posSide': pos_side, 'pos': f"{size:.12g}"
+                }
+            self._expected[inst_id] = (
+                sides, int(order_ts if order_ts is not None else time.time() * 1000), time.monotonic() + EXPECT_HOLD
+            )
+
+    def _is_stale(self, position):
+        """
+        推送的持仓是否早于尚未确认的下单（调用方持有锁）
+        uTime 不早于下单时间（成交后的推送）或等待超时后清除等待记录；与目标仓位一致的推送照常应用
+        """
+        inst_id = position.get('instId')
+        expected = self._expected.get(inst_id)
+        if expected is None:
+            return False
+        sides, order_ts, deadline = expected
+        try:
+            size = abs(float(position.get('pos') or 0))
+            updated = int(position.get('uTime') or 0)
+        except ValueError:
+            size, updated = 0.0, 0
+        if time.monotonic() > deadline or updated >= order_ts:
+            del self._expected[inst_id]
+            return False
+        return size != abs(sides.get(position.get('posSide', 'net'), 0.0))
+
+    def _apply_positions(self, positions, snapshot=False):
+        positions = self._update_positions(positions, snapshot)
+        for callback in self._listeners:
+            try:
+                callback(positions, snapshot)
+            except Exception as e:
+                logger.error(f"持仓更新回调异常: {e}")
+
+    def _update_positions(self, positions, snapshot):
+        """更新持仓索引，返回实际应用的持仓（跳过早于下单的推送）"""
+        applied = []
+        with self._lock:
+            if snapshot:
+                # 全量快照（REST同步或推送快照）以交易所为准
+                self._positions = {}
+                self._expected.clear()
+            for position in positions:
+                inst_id = position.get('instId')
+                pos_side = position.get('posSide', 'net')
+                if not inst_id:
+                    continue
+                if not snapshot and self._is_stale(position):
+                    continue
+                applied.append(position)
+                try:
+                    size = float(position.get('pos') or 0)
+                except ValueError:
+                    size = 0.0
+                sides = self._positions.setdefault(inst_id, {})
+                if size == 0:
+                    sides.pop(pos_side, None)
+                    if not sides:
+                        del self._positions[inst_id]
+                else:
+                    sides[pos_side] = position
+        return applied
+
+    def _apply_balance(self, accounts):
+        with self._lock:
+            for account in accounts:
+                if not self._balance:
+                    self._balance = [account]
+                    continue
+                # account频道的增量推送只包含有变化的币种，按币种合并到已有快照
+                current = self._balance[0]
+                details = {d.get('ccy'): d for d in current.get('details', [])}
+                for detail in account.get('details', []):
+                    details[detail.get('ccy')] = detail
+                merged = dict(current)
+                merged.update(account)
+                merged['details'] = list(details.values())
+                self._balance = [merged]
+
+    def handle_message(self, message):
+        """处理一条WebSocket推送（公开以便测试直接喂数据）"""
+        with self._lock:
+            self._last_message = time.monotonic()
+            self.messages += 1
+
+        if message == 'pong':
+            return
+        data = json.loads(message)
+
+        if 'event' in data:
+            if data['event'] == 'error':
+                logger.error(f"OKX私有频道错误: {data}")
+            return
+
+        channel = data.get('arg', {}).get('channel')
+        if channel == 'positions':
+            self._apply_positions(data.get('data', []), snapshot=data.get('eventType') == 'snapshot')
+        elif channel == 'account':
+            self._apply_balance(data.get('data', []))
+
+    async def resync(self):
+        """通过REST做一次全量同步（仅在连接/重连时使用）"""
+        positions = await self.client.get_positions(instType='SWAP')
+        balance = await self.client.get_account_balance()
+        if positions.get('code') != '0' or balance.get('code') != '0':
+            raise RuntimeError(f"REST全量同步失败: {positions.get('msg')} {balance.get('msg')}")
+
+        self._apply_positions(positions.get('data', []), snapshot=True)
+        with self._lock:
+            self._balance = list(balance.get('data', []))
+            self._synced = True
+            self._last_message = time.monotonic()
+            self.resyncs += 1
+        logger.info(f"持仓/余额快照已同步: {len(positions.get('data', []))} 个持仓")
+
+    # ===== 订阅循环 =====
+
+    async def _session(self):
+        async with self._connect(self.url, ping_interval=None) as ws:
+            await ws.send(json.dumps(login_message(
+                self.client.api_key, self.client.secret_key, self.client.passphrase
+            )))
+            reply = json.loads(await asyncio.wait_for(ws.recv(), timeout=10))
+            if reply.get('event') != 'login' or reply.get('code') != '0':
+                raise RuntimeError(f"私有频道登录失败: {reply}")
+
+            await ws.send(json.dumps({
+                'op': 'subscribe',
+                'args': [
+                    {'channel': 'positions', 'instType': 'SWAP'},
+                    {'channel': 'account'}
+                ]
+            }))
+            # 订阅成功后再做REST同步，之后的增量推送都不会丢失
+            await self.resync()
+
+            while not self._stopping:
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    await ws.send('ping')
+                    continue
+                self.handle_message(message)
+
+    async def _run(self):
+        backoff = 1
+        while not self._stopping:
+            try:
+                await self._session()
+                backoff = 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"私有频道连接断开: {e}，{backoff}秒后重连")
+            with self._lock:
+                self._synced = False
+            if self._stopping:
+                break
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def start(self):
+        """在后台事件循环中启动订阅"""
+        if self._future is None:
+            self._stopping = False
+            self._future = self.loop_thread.submit(self._run())
+            logger.info(f"启动OKX私有频道订阅: {self.url}")
+
+    def stop(self):
+        self._stopping = True
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+目标仓位引擎 - 根据目标敞口计算最少的下单操作
+
+信号不再被翻译成"先平仓再开仓"的固定步骤，而是转换为目标带符号仓位
+（多头为正、空头为负、平仓为0），与当前仓位比较后只下必要的订单：
+
+单向持仓模式（net_mode）：
+    当前 -1 → 目标 +1：一笔 buy 2（反手一次完成）
+    当前 +1 → 目标 +1：不下单
+    当前 +2 → 目标 +1：一笔 sell 1（reduceOnly）
+
+双向持仓模式（long_short_mode）：
+    当前 空1 → 目标 +1：平空 buy 1 (posSide=short) + 开多 buy 1 (posSide=long)，一次批量请求
+
+本模块只做计算，不访问网络，方便单独测试。
+"""
+
+NET_MODE = 'net_mode'
+LONG_SHORT_MODE = 'long_short_mode'
+
+# 仓位数量比较精度（避免浮点误差产生极小的订单）
+SIZE_EPSILON = 1e-12
+
+
+def format_size(value):
+    """把数量格式化为OKX接受的字符串（去掉浮点误差和多余的0）"""
+    text = f"{round(value, 12):.12f}".rstrip('0').rstrip('.')
+    return text or '0'
+
+
+def signal_target(action, size):
+    """
+    把信号动作转换为目标带符号仓位
+    buy -> +size, sell -> -size，无法识别返回None
+    """
+    action = (action or '').lower()
+    if action == 'buy':
+        return abs(size)
+    if action == 'sell':
+        return -abs(size)
+    return None
+
+
+def current_exposure(positions, pos_mode):
+    """
+    从持仓列表（OKX positions 数据）提取当前仓位
+    单向模式返回 {'net': 带符号数量}
+    双向模式返回 {'long': 多头数量, 'short': 空头数量}（均为正数）
+    """
+    if pos_mode == NET_MODE:
+        net = 0.0
+        for position in positions:
+            if position.get('posSide', 'net') == 'net':
+                net += float(position.get('pos') or 0)
+        return {'net': net}
+
+    exposure = {'long': 0.0, 'short': 0.0}
+    for position in positions:
+        side = position.get('posSide')
+        if side in exposure:
+            exposure[side] += abs(float(position.get('pos') or 0))
+    return exposure
+
+
+def net_exposure(exposure):
+    """当前仓位的净敞口（带符号）"""
+    if 'net' in exposure:
+        return exposure['net']
+    return exposure['long'] - exposure['short']
+
+
+def _order(inst_id, td_mode, side, size, role, pos_side=None, reduce_only=False):
+    order = {
+        'instId': inst_id,
+        'tdMode': td_mode,
+        'side': side,
+        'ordType': 'market',
+        'sz': format_size(size),
+        'role': role,           # open: 新开/增加敞口，reduce: 只减少敞口，flip: 反手（先减后开）
+        'open_size': size if role == 'open' else 0.0
+    }
+    if pos_side:
+        order['posSide'] = pos_side
+    if reduce_only:
+        order['reduceOnly'] = True
+    return order
+
+
+def plan_orders(inst_id, pos_mode, exposure, target, td_mode='cross'):
+    """
+    计算从当前仓位到目标仓位需要的最少订单
+    返回订单列表（OKX下单参数 + role/open_size 说明字段），空列表表示已在目标仓位
+    """
+    orders = []
+
+    if pos_mode == NET_MODE:
+        current = exposure['net']
+        delta = target - current
+        if abs(delta) <= SIZE_EPSILON:
+            return orders
+
+        side = 'buy' if delta > 0 else 'sell'
+        if abs(target) <= SIZE_EPSILON or (current * target > 0 and abs(target) < abs(current)):
+            # 平仓或同方向减仓
+            orders.append(_order(inst_id, td_mode, side, abs(delta), 'reduce', reduce_only=True))
+        elif current * target < 0:
+            # 反手：一笔订单完成平旧仓和开新仓
+            order = _order(inst_id, td_mode, side, abs(delta), 'flip')
+            order['open_size'] = abs(target)
+            orders.append(order)
+        else:
+            # 从空仓开仓或同方向加仓
+            orders.append(_order(inst_id, td_mode, side, abs(delta), 'open'))
+        return orders
+
+    # 双向持仓：多空两条腿分别调整
+    legs = (
+        ('long', max(target, 0.0), 'sell', 'buy'),
+        ('short', max(-target, 0.0), 'buy', 'sell'),
+    )
+
+    # 先减仓（释放保证金），再开仓
+    for pos_side, leg_target, close_side, _ in legs:
+        delta = leg_target - exposure[pos_side]
+        if delta < -SIZE_EPSILON:
+            orders.append(_order(inst_id, td_mode, close_side, -delta, 'reduce', pos_side=pos_side))
+
+    for pos_side, leg_target, _, open_side in legs:
+        delta = leg_target - exposure[pos_side]
+        if delta > SIZE_EPSILON:
+            orders.append(_order(inst_id, td_mode, open_side, delta, 'open', pos_side=pos_side))
+
+    return orders
+
+
+def plan_close(inst_id, pos_mode, exposure, side, td_mode='cross'):
+    """
+    只平掉某一方向（long/short）的仓位
+    单向模式下只有净仓位方向与 side 一致时才下单
+    """
+    if pos_mode == NET_MODE:
+        current = exposure['net']
+        if (side == 'long' and current > SIZE_EPSILON) or (side == 'short' and current < -SIZE_EPSILON):
+            return plan_orders(inst_id, pos_mode, exposure, 0.0, td_mode)
+        return []
+
+    size = exposure.get(side, 0.0)
+    if size <= SIZE_EPSILON:
+        return []
+    close_side = 'sell' if side == 'long' else 'buy'
+    return [_order(inst_id, td_mode, close_side, size, 'reduce', pos_side=side)]
+
+
+def order_params(order):
+    """去掉说明字段，得到可直接提交给OKX的下单参数"""
+    return {k: v for k, v in order.items() if k not in ('role', 'open_size')}
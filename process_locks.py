@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨进程锁 - gunicorn多进程部署时协调各worker进程
+
+每个worker进程都有自己的调度器、信号日志和缓存。进程内的调度器只能保证
+同一交易对在本进程内按顺序执行，多个进程之间需要文件锁（flock）协调：
+
+功能特点：
+1. SymbolLocks: 按交易对加排他锁，同一交易对同一时间只有一个进程在执行信号
+   （目标仓位引擎读持仓、下单的过程不能被其他进程打断）
+2. 锁文件中记录最后一次持有锁的进程，换了进程执行时提示调用方作废本进程的缓存
+   （例如杠杆缓存：另一个进程可能已经修改了杠杆）
+3. claim_directory: 每个进程独占一个信号日志目录（slot 0 为原目录，其余为 worker-N 子目录），
+   进程退出后锁自动释放，新启动的进程接管该目录并补执行其中未完成的信号
+4. claim_singleton: 只需要一个进程运行的后台任务（例如K线订阅），抢到锁的进程负责运行
+
+flock 由内核维护，进程崩溃时自动释放，不会留下死锁。
+注意：flock 只保证互斥，不保证先后：同一交易对先后到达两个进程的信号，执行顺序可能与到达顺序相反，
+多进程部署需要按交易对把信号路由到固定进程（见 gunicorn.conf.py）。
+不支持 fcntl 的平台（Windows）上退化为进程内锁，只能单进程运行。
+"""
+
+import contextlib
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows 只支持单进程运行
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = '.lock'
+
+
+def _lock_name(key):
+    """交易对 -> 锁文件名（只保留文件名安全的字符）"""
+    return ''.join(ch if ch.isalnum() or ch in '-_' else '_' for ch in key) + '.lock'
+
+
+class SymbolLocks:
+    """按交易对的跨进程排他锁"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # 本进程的唯一标识（pid可能被重启后的进程复用，加上启动时间）
+        self.owner = f"{os.getpid()}-{time.time_ns()}".encode('ascii')
+        self._lock = threading.Lock()
+        self._fds = {}            # 交易对 -> 锁文件描述符（进程内复用）
+        self._local = {}          # 交易对 -> 进程内锁（flock 对同一进程的不同线程不互斥）
+
+        # 统计信息
+        self.acquired = 0
+        self.handoffs = 0
+        self.wait_seconds = 0.0
+
+    def _get(self, key):
+        with self._lock:
+            local = self._local.get(key)
+            if local is None:
+                local = self._local[key] = threading.Lock()
+                if fcntl is not None:
+                    path = os.path.join(self.directory, _lock_name(key))
+                    self._fds[key] = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            return local, self._fds.get(key)
+
+    @contextlib.contextmanager
+    def hold(self, key):
+        """
+        持有交易对的锁：with locks.hold('BTC-USDT-SWAP') as handoff: ...
+        handoff 为True表示上一次持有该锁的是另一个进程
+        """
+        local, fd = self._get(key)
+        started = time.perf_counter()
+        with local:
+            if fd is None:
+                yield False
+                return
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                previous = os.pread(fd, 64, 0)
+                handoff = previous != self.owner
+                if handoff:
+                    os.ftruncate(fd, 0)
+                    os.pwrite(fd, self.owner, 0)
+                with self._lock:
+                    self.acquired += 1
+                    self.handoffs += handoff
+                    self.wait_seconds += time.perf_counter() - started
+                yield handoff
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
+            self._local.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'symbols': len(self._local),
+                'acquired': self.acquired,
+                'handoffs': self.handoffs,
+                'avg_wait_ms': round(self.wait_seconds / self.acquired * 1000, 3) if self.acquired else 0.0,
+                'cross_process': fcntl is not None
+            }
+
+
+# 已占用的目录锁（进程退出前一直持有）
+_claimed = {}
+
+
+def claim_directory(base):
+    """
+    为本进程独占一个目录：依次尝试 base、base/worker-1、base/worker-2 ...
+    返回第一个成功加锁的目录（锁在进程退出时释放）
+    """
+    if base in _claimed:
+        return _claimed[base][0]
+    if fcntl is None:
+        os.makedirs(base, exist_ok=True)
+        _claimed[base] = (base, None)
+        return base
+
+    slot = 0
+    while True:
+        directory = base if slot == 0 else os.path.join(base, f"worker-{slot}")
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            slot += 1
+            continue
+        _claimed[base] = (directory, fd)
+        if slot:
+            logger.info(f"本进程使用目录: {directory}")
+        return directory
+
+
+def claim_singleton(directory, name):
+    """
+    抢占一个只能由一个进程持有的锁（不阻塞），成功返回True（锁在进程退出时释放）
+    持有锁的进程退出后，由之后启动的进程接管
+    """
+    key = ('singleton', directory, name)
+    if key in _claimed:
+        return True
+    if fcntl is None:
+        _claimed[key] = (directory, None)
+        return True
+    os.makedirs(directory, exist_ok=True)
+    fd = os.open(os.path.join(directory, _lock_name(name)), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    _claimed[key] = (directory, fd)
+    return True
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OKX REST限速器 - 按OKX接口限速规则在客户端排队，请求不再因 50011 失败
+
+多个交易对同时来信号时，下单、策略委托、设置杠杆、查询持仓等请求很容易超过
+OKX的接口限速，超限的请求会直接返回 50011（请求过于频繁）。
+本模块在 OKXAsyncClient.request 发送请求之前按规则排队等待，把请求速率控制在限额以内。
+
+功能特点：
+1. 每个接口（按交易对限速的接口再按 instId 区分）一个令牌桶，规则见 OKX_LIMITS
+2. 令牌在使用一个窗口之后归还，任意窗口内的请求数不超过限额，持续负载下按限额满速发送
+3. 令牌按预约方式分配：令牌不足时计算发送时间并在协程中等待，
+   先到的请求先发送（FIFO），不会出现多个请求同时被唤醒再次争抢
+4. 下单类接口同时占用账户级的下单总额度（所有交易对合计）
+5. 批量下单按订单数扣减令牌（每个交易对分别计算）
+6. 响应头带有剩余额度（x-ratelimit-remaining）时以交易所为准下调令牌数；
+   仍然被限速（50011/HTTP 429）时暂停该接口半个窗口，由客户端重新发送
+7. 多worker进程部署时每个进程只使用 share 比例的额度
+
+令牌桶只在OKX后台事件循环线程中读写，不需要加锁。
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# (请求方法, 接口路径) -> (窗口内次数, 窗口秒数, 是否按交易对限速)
+# 来自OKX v5 API文档的限速说明
+OKX_LIMITS = {
+    ('POST', '/api/v5/trade/order'): (60, 2, True),
+    ('POST', '/api/v5/trade/batch-orders'): (300, 2, True),
+    ('POST', '/api/v5/trade/order-algo'): (20, 2, True),
+    ('GET', '/api/v5/trade/order'): (60, 2, True),
+    ('POST', '/api/v5/account/set-leverage'): (20, 2, False),
+    ('GET', '/api/v5/account/positions'): (10, 2, False),
+    ('GET', '/api/v5/account/balance'): (10, 2, False),
+    ('GET', '/api/v5/account/config'): (5, 2, False),
+    ('GET', '/api/v5/account/leverage-info'): (20, 2, False),
+    ('GET', '/api/v5/market/ticker'): (20, 2, False),
+    ('GET', '/api/v5/market/tickers'): (20, 2, False),
+    ('GET', '/api/v5/market/candles'): (40, 2, False),
+    ('GET', '/api/v5/market/history-candles'): (20, 2, False),
+    ('GET', '/api/v5/public/instruments'): (20, 2, False),
+    ('GET', '/api/v5/public/time'): (10, 2, False),
+}
+
+# 账户级下单总额度（所有交易对的下单/批量下单合计，按订单数计算）
+ACCOUNT_ORDER_LIMIT = (1000, 2)
+ORDER_PATHS = ('/api/v5/trade/order', '/api/v5/trade/batch-orders')
+
+# 交易所判定请求过于频繁的错误码（请求未被处理，可以安全地重新发送）
+RATE_LIMIT_CODES = ('50011', '50061')
+ACCOUNT_LIMIT_CODE = '50061'
+ACCOUNT_BUCKET = 'account orders'
+
+# 窗口额外的余量（秒）
+WINDOW_MARGIN = 0.05
+
+
+class TokenBucket:
+    """
+    令牌桶：窗口内最多 limit 个令牌，每个令牌在使用一个窗口之后才归还
+    （与交易所"每2秒最多N次"的计数方式一致，任意一个窗口内都不会超过限额）
+    令牌按预约方式分配：记录每个令牌的发送时间，后来的请求排在已预约的请求之后（FIFO）
+    """
+
+    __slots__ = ('name', 'capacity', 'window', '_sent', '_last', '_blocked_until',
+                 'acquired', 'delayed', 'wait_total', 'throttled')
+
+    def __init__(self, name, limit, window, share=1.0):
+        self.name = name
+        self.capacity = max(1, int(limit * share))
+        # 留出网络延迟抖动的余量，避免到达交易所时两个窗口重叠
+        self.window = window + WINDOW_MARGIN
+        self._sent = deque(maxlen=self.capacity)   # 最近 capacity 个令牌的发送时间（递增）
+        self._last = 0.0
+        self._blocked_until = 0.0
+
+        # 统计信息
+        self.acquired = 0
+        self.delayed = 0
+        self.wait_total = 0.0
+        self.throttled = 0
+
+    def earliest(self, cost, now):
+        """cost 个令牌最早可以发送的时间"""
+        slot = max(now, self._last, self._blocked_until)
+        index = self.capacity - min(cost, self.capacity)   # 需要先归还的那个令牌
+        if len(self._sent) > index:
+            slot = max(slot, self._sent[-(index + 1)] + self.window)
+        return slot
+
+    def commit(self, slot, cost, now):
+        """在 slot 时刻使用 cost 个令牌"""
+        self._sent.extend([slot] * min(cost, self.capacity))
+        self._last = slot
+        self.acquired += 1
+        if slot > now:
+            self.delayed += 1
+            self.wait_total += slot - now
+
+    def sync_remaining(self, remaining, now):
+        """按响应头中交易所给出的剩余次数补记已使用的令牌"""
+        used = sum(1 for sent in self._sent if sent > now - self.window)
+        missing = self.capacity - int(remaining) - used
+        if missing > 0:
+            self._sent.extend([now] * missing)
+            self._last = max(self._last, now)
+
+    def penalize(self, now, delay=None):
+        """交易所返回限速错误：delay 秒内（默认半个窗口）不再发送，多次限速不会叠加"""
+        delay = self.window / 2 if delay is None else delay
+        self._blocked_until = max(self._blocked_until, now + delay)
+        self.throttled += 1
+
+    def stats(self, now):
+        return {
+            'capacity': self.capacity,
+            'window': round(self.window, 3),
+            'queued_for': round(max(0.0, self._last - now), 3),
+            'blocked_for': round(max(0.0, self._blocked_until - now), 3),
+            'acquired': self.acquired,
+            'delayed': self.delayed,
+            'wait_total': round(self.wait_total, 3),
+            'throttled': self.throttled
+        }
+
+
+def _header_number(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value not in (None, ''):
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+class RateLimiter:
+    """按接口/交易对分组的令牌桶集合"""
+
+    def __init__(self, share=1.0, limits=None, clock=time.monotonic):
+        """
+        share: 本进程可使用的额度比例（多worker进程部署时为 1/进程数）
+        limits: 限速规则，默认 OKX_LIMITS
+        clock: 单调时钟（秒），测试时替换
+        """
+        self.share = min(1.0, max(0.01, share))
+        self.limits = OKX_LIMITS if limits is None else limits
+        self.clock = clock
+        self._buckets = {}   # 桶名 -> TokenBucket
+
+        # 统计信息
+        self.waits = 0
+        self.wait_total = 0.0
+        self.max_wait = 0.0
+
+    def _bucket(self, name, limit, window):
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            bucket = self._buckets[name] = TokenBucket(name, limit, window, self.share)
+        return bucket
+
+    def buckets_for(self, method, path, params=None, body=None):
+        """某个请求需要占用的 [(令牌桶, 令牌数)]，没有限速规则的接口返回空列表"""
+        rule = self.limits.get((method, path))
+        if rule is None:
+            return []
+        limit, window, per_instrument = rule
+
+        # 批量下单按交易对分组、按订单数计算
+        if isinstance(body, list):
+            groups = {}
+            for item in body:
+                inst_id = item.get('instId', '') if isinstance(item, dict) else ''
+                groups[inst_id] = groups.get(inst_id, 0) + 1
+        else:
+            inst_id = (body or {}).get('instId') or (params or {}).get('instId') or ''
+            groups = {inst_id: 1}
+
+        required = []
+        for inst_id, cost in groups.items():
+            name = f"{method} {path} {inst_id}" if per_instrument and inst_id else f"{method} {path}"
+            required.append((self._bucket(name, limit, window), cost))
+        if path in ORDER_PATHS:
+            limit, window = ACCOUNT_ORDER_LIMIT
+            required.append((self._bucket(ACCOUNT_BUCKET, limit, window), sum(groups.values())))
+        return required
+
+    async def acquire(self, method, path, params=None, body=None):
+        """
+        预约令牌并等待到可以发送为止
+        返回 (占用的令牌桶列表, 等待秒数)
+        """
+        required = self.buckets_for(method, path, params, body)
+        if not required:
+            return [], 0.0
+        # 所有令牌桶都有令牌的时刻才能发送，各桶按同一个发送时间记录
+        now = self.clock()
+        slot = max(bucket.earliest(cost, now) for bucket, cost in required)
+        for bucket, cost in required:
+            bucket.commit(slot, cost, now)
+        delay = slot - now
+        if delay > 0:
+            self.waits += 1
+            self.wait_total += delay
+            self.max_wait = max(self.max_wait, delay)
+            logger.debug(f"OKX限速排队 {method} {path}: 等待 {delay * 1000:.0f}ms")
+            await asyncio.sleep(delay)
+        return [bucket for bucket, _ in required], delay
+
+    def feedback(self, buckets, headers=None, status_code=None, code=None):
+        """
+        根据响应调整令牌桶，返回该请求是否被交易所限速（需要重新发送）
+        headers: 响应头（支持 x-ratelimit-remaining / Retry-After）
+        """
+        if not buckets:
+            return False
+        now = self.clock()
+        headers = headers or {}
+        # 响应头和 50011 针对的是接口本身，50061 针对的是账户级下单总额度
+        endpoint = [bucket for bucket in buckets if bucket.name != ACCOUNT_BUCKET]
+        account = [bucket for bucket in buckets if bucket.name == ACCOUNT_BUCKET]
+
+        remaining = _header_number(headers, 'x-ratelimit-remaining', 'ratelimit-remaining')
+        if remaining is not None:
+            # 剩余额度是整个API Key的，多个进程时按比例折算
+            for bucket in endpoint:
+                bucket.sync_remaining(remaining * self.share, now)
+
+        code = str(code) if code is not None else ''
+        limited = status_code == 429 or code in RATE_LIMIT_CODES
+        if limited:
+            retry_after = _header_number(headers, 'retry-after')
+            penalized = account if code == ACCOUNT_LIMIT_CODE and account else endpoint
+            for bucket in penalized:
+                bucket.penalize(now, retry_after)
+            logger.warning(f"OKX接口被限速（{code or status_code}），暂停 {penalized[0].name}")
+        return limited
+
+    def stats(self):
+        now = self.clock()
+        return {
+            'share': round(self.share, 3),
+            'waits': self.waits,
+            'wait_total': round(self.wait_total, 3),
+            'max_wait': round(self.max_wait, 3),
+            'buckets': {name: bucket.stats(now) for name, bucket in sorted(list(self._buckets.items()))}
+        }
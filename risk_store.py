@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+风控计数器 - 多个worker进程共享的日交易次数、单币种成交额和在途订单数
+
+计数保存在一个内存映射文件中（mmap，固定布局），所有进程映射同一个文件，
+读写直接访问共享内存，不经过数据库也不做系统调用之外的IO。
+
+功能特点：
+1. reserve() 一次完成"检查所有限额并增加计数"，多个进程同时下单时不会超过限额
+2. finish() 在订单提交后结算：在途订单数减少，下单失败时退回交易次数和成交额
+3. 按本地日期自动换日：新的一天第一次访问时清零日交易次数和成交额
+4. 交易对按 crc32 哈希定位槽位（线性探测），所有进程得到相同的槽位
+
+Python没有跨进程的原子比较交换，检查并增加放在一个很短的 flock 临界区内完成
+（只包含几次 struct 读写），单次操作为微秒级。
+不支持 fcntl 的平台（Windows）上只在进程内加锁。
+
+文件布局（小端）：
+    头部   magic(8s) day(q) daily_trades(q) open_orders(q)
+    槽位   inst_id(24s) trades(q) notional(d) open_orders(q)   x SLOT_COUNT
+"""
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows 只支持单进程运行
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'OKXRISK1'
+HEADER = struct.Struct('<8sqqq')
+KEY_BYTES = 24
+SLOT = struct.Struct(f'<{KEY_BYTES}sqdq')
+SLOT_COUNT = 512
+FILE_SIZE = HEADER.size + SLOT.size * SLOT_COUNT
+
+
+def _today():
+    """本地日期（yyyymmdd整数），与原日交易次数统计一致"""
+    now = time.localtime()
+    return now.tm_year * 10000 + now.tm_mon * 100 + now.tm_mday
+
+
+class RiskStore:
+    """共享内存中的风控计数器（线程安全、进程安全）"""
+
+    def __init__(self, path, max_daily_trades=0, max_symbol_notional=0.0, max_open_orders=0):
+        """
+        path: 计数文件路径（所有worker进程使用同一个文件）
+        max_daily_trades: 每日最多交易次数（0 表示不限制，下同）
+        max_symbol_notional: 单个交易对每日最多成交额（USDT）
+        max_open_orders: 所有进程合计的在途订单数（已提交、尚未收到交易所确认）
+        """
+        self.path = path
+        self.max_daily_trades = max_daily_trades
+        self.max_symbol_notional = max_symbol_notional
+        self.max_open_orders = max_open_orders
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock = threading.Lock()
+        self._slots = {}   # inst_id -> 槽位偏移（本进程缓存，槽位一旦分配不会改变）
+
+        with self._locked():
+            if os.fstat(self._fd).st_size < FILE_SIZE:
+                os.ftruncate(self._fd, FILE_SIZE)
+            self._map = mmap.mmap(self._fd, FILE_SIZE)
+            magic = HEADER.unpack_from(self._map, 0)[0]
+            if magic != MAGIC:
+                self._map[:FILE_SIZE] = bytes(FILE_SIZE)
+                HEADER.pack_into(self._map, 0, MAGIC, _today(), 0, 0)
+
+        # 统计信息（本进程）
+        self.reserved = 0
+        self.rejected = 0
+
+    # ===== 加锁与槽位 =====
+
+    def _locked(self):
+        return _FileLock(self._lock, self._fd)
+
+    def _slot(self, inst_id, create=True):
+        """交易对 -> 槽位偏移（调用方持有锁），槽位已满时返回None"""
+        offset = self._slots.get(inst_id)
+        if offset is not None:
+            return offset
+        key = inst_id.encode('utf-8')[:KEY_BYTES]
+        start = zlib.crc32(key) % SLOT_COUNT
+        for probe in range(SLOT_COUNT):
+            offset = HEADER.size + ((start + probe) % SLOT_COUNT) * SLOT.size
+            stored = self._map[offset:offset + KEY_BYTES].rstrip(b'\0')
+            if stored == key:
+                self._slots[inst_id] = offset
+                return offset
+            if not stored:
+                if not create:
+                    return None
+                SLOT.pack_into(self._map, offset, key, 0, 0.0, 0)
+                self._slots[inst_id] = offset
+                return offset
+        logger.error(f"风控计数槽位已满，{inst_id} 不计入单币种限额")
+        return None
+
+    def _rollover(self):
+        """换日：清零日交易次数和各交易对的成交额（在途订单数保留）"""
+        magic, day, daily_trades, open_orders = HEADER.unpack_from(self._map, 0)
+        today = _today()
+        if day == today:
+            return daily_trades, open_orders
+        for index in range(SLOT_COUNT):
+            offset = HEADER.size + index * SLOT.size
+            key, _, _, slot_orders = SLOT.unpack_from(self._map, offset)
+            if key[0]:
+                SLOT.pack_into(self._map, offset, key, 0, 0.0, slot_orders)
+        HEADER.pack_into(self._map, 0, magic, today, 0, open_orders)
+        logger.info(f"风控计数换日: {day} -> {today}，昨日交易次数 {daily_trades}")
+        return 0, open_orders
+
+    # ===== 检查与计数 =====
+
+    def reserve(self, inst_id, notional=0.0, orders=1):
+        """
+        检查限额并登记一次交易：通过返回None，超限返回原因（不修改任何计数）
+        notional: 本次开仓成交额（USDT）；orders: 本次提交的订单数
+        """
+        with self._locked():
+            daily_trades, open_orders = self._rollover()
+            offset = self._slot(inst_id)
+            if offset is not None:
+                key, trades, traded, slot_orders = SLOT.unpack_from(self._map, offset)
+            else:
+                key, trades, traded, slot_orders = b'', 0, 0.0, 0
+
+            error = None
+            if self.max_daily_trades and daily_trades >= self.max_daily_trades:
+                error = f'今日交易次数已达上限: {self.max_daily_trades}'
+            elif self.max_symbol_notional and traded + notional > self.max_symbol_notional:
+                error = (f'{inst_id} 今日成交额超过限制: '
+                         f'{traded:.2f} + {notional:.2f} > {self.max_symbol_notional} USDT')
+            elif self.max_open_orders and open_orders + orders > self.max_open_orders:
+                error = f'在途订单数超过限制: {open_orders} + {orders} > {self.max_open_orders}'
+            if error:
+                self.rejected += 1
+                return error
+
+            HEADER.pack_into(self._map, 0, MAGIC, _today(), daily_trades + 1, open_orders + orders)
+            if offset is not None:
+                SLOT.pack_into(self._map, offset, key, trades + 1, traded + notional, slot_orders + orders)
+            self.reserved += 1
+            return None
+
+    def current_day(self):
+        """当前计数日期（yyyymmdd），reserve 之前取得，结算时传给 finish"""
+        return _today()
+
+    def finish(self, inst_id, notional=0.0, orders=1, success=True, day=None):
+        """
+        订单提交完成：减少在途订单数；下单失败时退回交易次数和成交额
+        day: reserve 之前 current_day() 的返回值，计数已换到另一天时不退回（退回的是新一天的计数）
+        """
+        with self._locked():
+            magic, stored, daily_trades, open_orders = HEADER.unpack_from(self._map, 0)
+            reserved = stored if day is None else day
+            refund = 0 if success or stored != _today() or reserved != stored else 1
+            HEADER.pack_into(self._map, 0, magic, stored, max(0, daily_trades - refund), max(0, open_orders - orders))
+            offset = self._slot(inst_id, create=False)
+            if offset is not None:
+                key, trades, traded, slot_orders = SLOT.unpack_from(self._map, offset)
+                SLOT.pack_into(self._map, offset, key, max(0, trades - refund),
+                               max(0.0, traded - notional * refund), max(0, slot_orders - orders))
+
+    def daily_trades(self):
+        """今日交易次数（只读，不加锁）"""
+        _, day, daily_trades, _ = HEADER.unpack_from(self._map, 0)
+        return daily_trades if day == _today() else 0
+
+    def snapshot(self):
+        """所有计数（JSON）"""
+        with self._locked():
+            _, day, daily_trades, open_orders = HEADER.unpack_from(self._map, 0)
+            symbols = {}
+            for index in range(SLOT_COUNT):
+                key, trades, traded, slot_orders = SLOT.unpack_from(self._map, HEADER.size + index * SLOT.size)
+                if key[0]:
+                    symbols[key.rstrip(b'\0').decode('utf-8')] = {
+                        'trades': trades, 'notional': round(traded, 2), 'open_orders': slot_orders
+                    }
+        return {'day': day, 'daily_trades': daily_trades, 'open_orders': open_orders, 'symbols': symbols}
+
+    def stats(self):
+        _, day, daily_trades, open_orders = HEADER.unpack_from(self._map, 0)
+        return {
+            'day': day,
+            'daily_trades': daily_trades,
+            'open_orders': open_orders,
+            'max_daily_trades': self.max_daily_trades,
+            'max_symbol_notional': self.max_symbol_notional,
+            'max_open_orders': self.max_open_orders,
+            'reserved': self.reserved,
+            'rejected': self.rejected,
+            'cross_process': fcntl is not None
+        }
+
+    def close(self):
+        with self._lock:
+            self._map.close()
+            os.close(self._fd)
+
+
+class _FileLock:
+    """进程内锁 + flock（同一进程的不同线程共用一个文件描述符，flock 不互斥）"""
+
+    __slots__ = ('_lock', '_fd')
+
+    def __init__(self, lock, fd):
+        self._lock = lock
+        self._fd = fd
+
+    def __enter__(self):
+        self._lock.acquire()
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._lock.release()
+                raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._lock.release()
+        return False
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+信号去重索引 - 重复投递的信号在入口直接丢弃
+
+TradingView在请求超时时会重新投递告警，calc_on_every_tick=true 时
+alert.freq_once_per_bar 也可能重复触发。同一信号执行两次就是双倍仓位。
+
+功能特点：
+1. 按 (交易对, 动作, Pine timestamp, 策略ID) 去重，内存中为按登记顺序排列的 TTL 有序字典，查询为O(1)
+2. 新信号同时写入本地SQLite（WAL模式），重启后加载未过期的记录
+   启用SQLite时以数据库为准（一条条件UPSERT完成"检查并登记"），多个worker进程共用同一个文件也不会重复执行
+3. 由同一个键派生确定性的 clOrdId，同一信号无论投递多少次都对应相同的订单ID
+
+没有 timestamp 的信号无法区分"重复投递"和"新信号"，不做去重。
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 86400
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def signal_key(signal):
+    """信号的去重键，没有 timestamp 时返回None"""
+    if not signal.timestamp:
+        return None
+    return '|'.join((signal.inst_id or signal.symbol, signal.action, signal.timestamp, signal.strategy))
+
+
+def client_order_id(key):
+    """
+    由去重键派生 clOrdId 前缀（29位：字母t + 28位十六进制）
+    OKX要求 clOrdId 为字母开头的1-32位字母数字，下单时再追加订单序号
+    """
+    return 't' + hashlib.blake2b(key.encode('utf-8'), digest_size=14).hexdigest()
+
+
+class SignalDedupe:
+    """TTL 去重索引（线程安全），可选SQLite持久化"""
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        path: SQLite文件路径，为空时只在内存中去重
+        ttl: 记录保留时间（秒）
+        max_entries: 内存中最多保留的记录数，超过后淘汰最早登记的记录
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()   # key -> 过期时间，按登记顺序（即过期时间）排列
+        self._db = None
+
+        # 统计信息
+        self.accepted = 0
+        self.duplicates = 0
+        self.unkeyed = 0
+
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # timeout: 其他进程正在写入时等待（多worker部署共用同一个文件）
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, expires REAL NOT NULL)')
+
+        now = time.time()
+        self._db.execute('DELETE FROM seen WHERE expires <= ?', (now,))
+        rows = self._db.execute(
+            'SELECT key, expires FROM seen ORDER BY expires DESC LIMIT ?', (self.max_entries,)
+        ).fetchall()
+        for key, expires in reversed(rows):
+            self._seen[key] = expires
+        logger.info(f"信号去重索引已加载: {len(rows)} 条记录 ({path})")
+
+    def _expire(self, now):
+        """淘汰过期记录（最早写入的在前，遇到未过期的即停止）"""
+        while self._seen:
+            key, expires = next(iter(self._seen.items()))
+            if expires > now:
+                break
+            del self._seen[key]
+
+    def check(self, key):
+        """
+        登记一个信号键：新信号返回True，重复信号返回False
+        key 为None（无法去重）时始终返回True
+        """
+        if key is None:
+            with self._lock:
+                self.unkeyed += 1
+            return True
+
+        now = time.time()
+        with self._lock:
+            # 启用SQLite时以数据库为准（其他进程可能已登记或已删除该键），数据库不可用时退回内存
+            new = self._claim(key, now) if self._db is not None else None
+            if new is None:
+                expires = self._seen.get(key)
+                new = expires is None or expires <= now
+            if not new:
+                # 重复信号不调整顺序：过期时间未变，移到末尾会让 _expire 在它前面提前停止
+                self.duplicates += 1
+                return False
+
+            self._remember(key, now)
+            self.accepted += 1
+            return True
+
+    def _remember(self, key, now):
+        self._expire(now)
+        self._seen[key] = now + self.ttl
+        self._seen.move_to_end(key)
+        if len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+    def _claim(self, key, now):
+        """
+        在数据库中登记键：不存在或已过期时写入并返回True，未过期时返回False，出错返回None
+        一条语句完成，多个进程同时登记同一个键时只有一个成功
+        """
+        try:
+            cursor = self._db.execute(
+                'INSERT INTO seen (key, expires) VALUES (?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET expires = excluded.expires WHERE seen.expires <= ?',
+                (key, now + self.ttl, now)
+            )
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            logger.warning(f"写入去重记录失败: {e}")
+            return None
+
+    def forget(self, key):
+        """删除某个键（信号未能进入队列时调用，允许TradingView重试）"""
+        if key is None:
+            return
+        with self._lock:
+            if self._seen.pop(key, None) is not None:
+                self.accepted -= 1
+            if self._db is not None:
+                try:
+                    self._db.execute('DELETE FROM seen WHERE key = ?', (key,))
+                except sqlite3.Error as e:
+                    logger.warning(f"删除去重记录失败: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.execute('DELETE FROM seen WHERE expires <= ?', (time.time(),))
+                self._db.close()
+                self._db = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._seen),
+                'accepted': self.accepted,
+                'duplicates': self.duplicates,
+                'unkeyed': self.unkeyed,
+                'persistent': self._db is not None
+            }
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+信号调度模块 - 固定大小的工作线程池 + 有界优先级队列
+
+功能特点：
+1. 固定数量的工作线程，避免每个webhook都新建线程
+2. 有界队列，突发信号超过容量时直接拒绝，保护内存和OKX接口
+3. 平仓/减仓信号优先于开仓信号执行
+4. 按交易对分通道: 同一交易对严格按到达顺序串行执行，不同交易对并行执行
+5. 统计队列深度、排队等待时间和线程利用率
+6. 同一交易对的信号合并：新信号给出完整目标仓位时（supersedes 判断），
+   该通道中尚未开始执行的信号直接被替换，buy/sell/buy 连发只执行最后一个；
+   coalesce_window > 0 时通道空闲后的第一个信号也先等待该时间，以便后续信号合并
+"""
+
+import itertools
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 优先级（数值越小越先执行）
+PRIORITY_CLOSE = 0   # 平仓/减仓
+PRIORITY_OPEN = 1    # 开仓
+_PRIORITY_STOP = 99  # 内部停止标记，排在所有信号之后
+
+# 视为平仓/减仓的信号动作（只决定排队优先级；webhook目前只接收 buy/sell，减仓信号用 reduce_only 标记）
+CLOSE_ACTIONS = ('close', 'close_long', 'close_short', 'exit', 'reduce')
+
+# 给出完整目标仓位的信号动作（开多/开空），可以替换同一交易对之前未执行的信号
+TARGET_ACTIONS = ('buy', 'sell')
+
+_STOP = object()
+
+
+def signal_priority(signal_data):
+    """根据信号内容计算优先级"""
+    action = str(signal_data.get('action', '')).lower()
+    if action in CLOSE_ACTIONS or signal_data.get('reduce_only'):
+        return PRIORITY_CLOSE
+    return PRIORITY_OPEN
+
+
+class SignalDispatcher:
+    """交易信号调度器"""
+
+    def __init__(self, handler, workers=4, max_queue=256, name='signal-worker', wait_observer=None,
+                 supersedes=None, on_coalesced=None, coalesce_window=0.0):
+        """
+        handler: 处理单个信号的函数，签名为 handler(signal_data)
+        workers: 工作线程数量
+        max_queue: 待处理信号总数上限（含各通道积压），超过后 submit 返回 False
+        wait_observer: 可选，每个信号开始执行时以排队时间（秒）调用，用于外部指标
+        supersedes: 可选，supersedes(signal_data) 为True时该信号替换同一通道中尚未执行的信号
+        on_coalesced: 可选，信号被替换时调用 on_coalesced(被替换的信号, 新信号)
+        coalesce_window: 通道空闲时第一个可合并信号的等待时间（秒），0 表示立即执行
+        """
+        self._handler = handler
+        self._wait_observer = wait_observer
+        self._supersedes = supersedes
+        self._on_coalesced = on_coalesced
+        self._coalesce_window = max(0.0, float(coalesce_window))
+        self._workers = max(1, int(workers))
+        self._name = name
+        self._capacity = max(1, int(max_queue))
+        # 就绪队列：每个通道同一时刻最多只有一个信号在这里或在执行中
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._threads = []
+        self._lock = threading.Lock()
+
+        # 通道状态: lane -> 等待中的信号（FIFO）；在 _active_lanes 中表示该通道已有信号就绪或在执行
+        self._lanes = {}
+        self._active_lanes = set()
+        self._pending = 0
+        self._holds = {}   # lane -> 合并窗口计时器（窗口结束后通道中的信号才开始执行）
+
+        # 统计信息
+        self._started_at = None
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._max_depth = 0
+        self._max_lane_backlog = 0
+        self._busy_workers = 0
+        self._busy_seconds = 0.0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits = deque(maxlen=1024)
+        self._coalesced = 0
+        self._lane_counts = {}   # lane -> [提交数, 被合并数]
+
+    def start(self):
+        """启动工作线程"""
+        with self._lock:
+            if self._threads:
+                return
+            self._started_at = time.monotonic()
+            for i in range(self._workers):
+                thread = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"{self._name}-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"信号调度器已启动: {self._workers} 个工作线程, 队列容量 {self._capacity}")
+
+    def submit(self, signal_data, priority=None, lane=None):
+        """
+        提交信号到队列，立即返回
+        lane: 执行通道（通常是OKX交易对），同一通道内的信号按提交顺序串行执行；
+              为None时不做顺序约束
+        返回 True 表示已入队，False 表示队列已满被拒绝
+        """
+        if priority is None:
+            priority = signal_priority(signal_data)
+
+        item = (priority, next(self._seq), time.monotonic(), lane, signal_data)
+        coalescible = lane is not None and self._supersedes is not None and self._supersedes(signal_data)
+        replaced = []
+        with self._lock:
+            if lane is not None and coalescible and self._lanes.get(lane):
+                # 通道中尚未开始执行的信号被新信号的目标仓位替换
+                replaced = list(self._lanes[lane])
+                self._lanes[lane].clear()
+                self._pending -= len(replaced)
+
+            if self._pending >= self._capacity:
+                self._rejected += 1
+                logger.warning(f"信号队列已满({self._capacity})，拒绝信号: {signal_data.get('symbol')}")
+                return False
+
+            self._pending += 1
+            self._submitted += 1
+            if self._pending > self._max_depth:
+                self._max_depth = self._pending
+            if lane is not None:
+                counts = self._lane_counts.setdefault(lane, [0, 0])
+                counts[0] += 1
+                counts[1] += len(replaced)
+                self._coalesced += len(replaced)
+
+            hold = False
+            if lane is not None and lane in self._active_lanes:
+                # 该交易对已有信号在处理（或在合并窗口中），排到通道末尾等待
+                backlog = self._lanes.setdefault(lane, deque())
+                backlog.append(item)
+                if len(backlog) > self._max_lane_backlog:
+                    self._max_lane_backlog = len(backlog)
+            elif lane is not None:
+                self._active_lanes.add(lane)
+                if coalescible and self._coalesce_window > 0:
+                    # 通道空闲：先在通道中等待合并窗口结束再执行
+                    self._lanes.setdefault(lane, deque()).append(item)
+                    timer = threading.Timer(self._coalesce_window, self._release_hold, (lane,))
+                    timer.daemon = True
+                    self._holds[lane] = timer
+                    hold = True
+                else:
+                    self._queue.put(item)
+            else:
+                self._queue.put(item)
+            if hold:
+                timer.start()
+
+        for old in replaced:
+            logger.info(f"信号已合并: {old[4]} -> {signal_data}")
+            if self._on_coalesced is not None:
+                try:
+                    self._on_coalesced(old[4], signal_data)
+                except Exception as e:
+                    logger.error(f"信号合并回调异常: {e}")
+        return True
+
+    def _release_hold(self, lane):
+        """合并窗口结束，通道中的第一个信号开始执行"""
+        with self._lock:
+            if self._holds.pop(lane, None) is None:
+                return
+        self._release_lane(lane)
+
+    def _release_lane(self, lane):
+        """通道当前信号处理完毕，把该通道的下一个信号放入就绪队列"""
+        if lane is None:
+            return
+        next_item = None
+        with self._lock:
+            backlog = self._lanes.get(lane)
+            if backlog:
+                next_item = backlog.popleft()
+                if not backlog:
+                    del self._lanes[lane]
+            else:
+                self._active_lanes.discard(lane)
+        if next_item is not None:
+            self._queue.put(next_item)
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        while True:
+            _, _, enqueued_at, lane, signal_data = self._queue.get()
+            try:
+                if signal_data is _STOP:
+                    return
+
+                started = time.monotonic()
+                wait = started - enqueued_at
+                with self._lock:
+                    self._busy_workers += 1
+                    self._wait_total += wait
+                    self._recent_waits.append(wait)
+                    if wait > self._wait_max:
+                        self._wait_max = wait
+                if self._wait_observer is not None:
+                    self._wait_observer(wait)
+
+                failed = False
+                try:
+                    self._handler(signal_data)
+                except Exception as e:
+                    failed = True
+                    logger.error(f"信号处理线程异常: {e}")
+                finally:
+                    elapsed = time.monotonic() - started
+                    with self._lock:
+                        self._pending -= 1
+                        self._busy_workers -= 1
+                        self._busy_seconds += elapsed
+                        self._completed += 1
+                        if failed:
+                            self._failed += 1
+                    self._release_lane(lane)
+            finally:
+                self._queue.task_done()
+
+    def shutdown(self, wait=True, timeout=None):
+        """停止工作线程（已入队的信号会先处理完）"""
+        with self._lock:
+            threads = list(self._threads)
+            self._threads = []
+            holds = list(self._holds.items())
+            self._holds.clear()
+        # 合并窗口中的信号立即执行，不再等待
+        for lane, timer in holds:
+            timer.cancel()
+            self._release_lane(lane)
+        for _ in threads:
+            self._queue.put((_PRIORITY_STOP, next(self._seq), time.monotonic(), None, _STOP))
+        if wait:
+            for thread in threads:
+                thread.join(timeout)
+        logger.info("信号调度器已停止")
+
+    def stats(self):
+        """返回调度器运行统计"""
+        with self._lock:
+            uptime = time.monotonic() - self._started_at if self._started_at else 0.0
+            started_count = self._completed + self._busy_workers
+            waits = sorted(self._recent_waits)
+            capacity = uptime * self._workers
+
+            return {
+                'workers': self._workers,
+                'busy_workers': self._busy_workers,
+                'queue_depth': self._pending - self._busy_workers,
+                'queue_capacity': self._capacity,
+                'max_queue_depth': self._max_depth,
+                'active_lanes': len(self._active_lanes),
+                'lane_backlog': sum(len(backlog) for backlog in self._lanes.values()),
+                'max_lane_backlog': self._max_lane_backlog,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'wait_ms': {
+                    'avg': round(self._wait_total / started_count * 1000, 3) if started_count else 0.0,
+                    'max': round(self._wait_max * 1000, 3),
+                    'p50': round(_percentile(waits, 0.50) * 1000, 3),
+                    'p99': round(_percentile(waits, 0.99) * 1000, 3)
+                },
+                'coalescing': {
+                    'window_ms': round(self._coalesce_window * 1000, 1),
+                    'coalesced': self._coalesced,
+                    'ratio': round(self._coalesced / self._submitted, 4) if self._submitted else 0.0,
+                    'lanes': {
+                        lane: {'submitted': submitted, 'coalesced': coalesced,
+                               'ratio': round(coalesced / submitted, 4)}
+                        for lane, (submitted, coalesced) in self._lane_counts.items() if coalesced
+                    }
+                },
+                'utilization': round(self._busy_seconds / capacity, 4) if capacity > 0 else 0.0,
+                'uptime_seconds': round(uptime, 1)
+            }
+
+
+def _percentile(sorted_values, q):
+    """计算已排序列表的分位数"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
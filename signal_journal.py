@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+信号日志 - 已接收信号的预写日志（WAL），重启后补执行
+
+webhook在信号执行前就返回了响应，信号只存在于调度器的内存队列中，
+进程重启（Render重新部署、SIGTERM）会丢失尚未执行完的信号。
+
+功能特点：
+1. 只追加写入，按大小分段（journal-000001.log ...），每行一条记录：
+       <crc32> {"t":"a","id":1,"ts":...,"signal":{...}}   已接收
+       <crc32> {"t":"s","id":1}                            开始执行
+       <crc32> {"t":"d","id":1,"status":"done"}            执行结束（done/rejected/expired）
+2. 接收路径只做一次 write() 系统调用（数据进入内核页缓存，进程崩溃不会丢失），
+   fsync 由后台线程批量完成（组提交），多条记录共用一次 fsync
+3. 需要掉电级别的持久性时可设置 sync_ack=True：写入后等待下一次组提交完成再返回
+4. 启动时读取全部分段，返回尚未结束的信号供重新提交；CRC不匹配的记录（写入一半）被忽略
+5. 分段只从最旧的一端删除：结束记录写在当前分段，可能与接收记录不在同一个分段，
+   一个分段及其之前的所有分段中的信号都结束后才删除该分段
+
+重新执行是安全的：目标仓位引擎按"调整到目标仓位"下单，已经到位的信号不会重复下单，
+且同一信号的 clOrdId 固定。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024
+DEFAULT_FSYNC_INTERVAL = 0.005
+
+SEGMENT_PREFIX = 'journal-'
+SEGMENT_SUFFIX = '.log'
+
+
+def _encode(record):
+    line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+    return f"{zlib.crc32(line.encode('utf-8')):08x} {line}\n".encode('utf-8')
+
+
+def _decode(line):
+    """解析一行记录，损坏时返回None"""
+    try:
+        text = line.decode('utf-8').rstrip('\n')
+        crc, _, payload = text.partition(' ')
+        if int(crc, 16) != zlib.crc32(payload.encode('utf-8')):
+            return None
+        return json.loads(payload)
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+class SignalJournal:
+    """分段追加写入的信号日志（线程安全）"""
+
+    def __init__(self, directory, segment_bytes=DEFAULT_SEGMENT_BYTES,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL, sync_ack=False):
+        """
+        directory: 日志目录
+        segment_bytes: 单个分段的大小上限，超过后切换到新分段
+        fsync_interval: 组提交间隔（秒），这段时间内的写入共用一次 fsync
+        sync_ack: append 是否等待 fsync 完成
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.sync_ack = sync_ack
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._entries = {}        # 未结束的信号: id -> {'segment', 'ts', 'signal', 'started'}
+        self._segment_open = {}   # 分段编号 -> 未结束的信号数量
+        self._next_id = 1
+        self._segment = 0
+        self._fd = None
+        self._segment_size = 0
+        self._retired = []        # 已切换掉、等待最后一次 fsync 的文件描述符
+        self._written = 0         # 已写入的记录数
+        self._flushed = 0         # 已 fsync 的记录数
+        self._stopping = False
+
+        # 统计信息
+        self.appended = 0
+        self.completed = 0
+        self.fsyncs = 0
+        self.fsync_seconds = 0.0
+        self.corrupt = 0
+
+        self._load()
+        self._roll()
+        # 已全部结束的旧分段不再需要
+        self._prune()
+        self._flusher = threading.Thread(target=self._flush_loop, name='journal-flush', daemon=True)
+        self._flusher.start()
+
+    # ===== 启动时加载 =====
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}")
+
+    def _segment_numbers(self):
+        numbers = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                try:
+                    numbers.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        return sorted(numbers)
+
+    def _load(self):
+        """读取全部分段，重建未结束信号的索引；新的写入总是从新分段开始"""
+        numbers = self._segment_numbers()
+        for number in numbers:
+            self._segment_open.setdefault(number, 0)
+            with open(self._segment_path(number), 'rb') as f:
+                for line in f:
+                    record = _decode(line)
+                    if record is None:
+                        # 进程在写入中途退出留下的半行，跳过
+                        self.corrupt += 1
+                        continue
+                    self._apply(number, record)
+            self._segment = max(self._segment, number)
+
+        if self._entries or numbers:
+            logger.info(f"信号日志已加载: {len(numbers)} 个分段, {len(self._entries)} 个未完成信号"
+                        + (f", {self.corrupt} 条损坏记录已忽略" if self.corrupt else ''))
+
+    def _apply(self, segment, record):
+        entry_id = record.get('id', 0)
+        kind = record.get('t')
+        # 结束记录可能属于已删除分段中的信号，新信号的ID也不能与其重复
+        self._next_id = max(self._next_id, entry_id + 1)
+        if kind == 'a':
+            self._entries[entry_id] = {
+                'segment': segment, 'ts': record.get('ts'), 'signal': record.get('signal'), 'started': False
+            }
+            self._segment_open[segment] = self._segment_open.get(segment, 0) + 1
+        elif kind == 's':
+            entry = self._entries.get(entry_id)
+            if entry is not None:
+                entry['started'] = True
+        elif kind == 'd':
+            entry = self._entries.pop(entry_id, None)
+            if entry is not None:
+                self._segment_open[entry['segment']] -= 1
+
+    def pending(self):
+        """
+        尚未结束的信号（按接收顺序）
+        返回 [{'id', 'ts', 'signal', 'started'}]，started=True 表示执行过程中进程退出
+        """
+        with self._lock:
+            return [
+                {'id': entry_id, 'ts': entry['ts'], 'signal': entry['signal'], 'started': entry['started']}
+                for entry_id, entry in sorted(self._entries.items())
+            ]
+
+    # ===== 写入 =====
+
+    def _roll(self):
+        """切换到新分段（调用方持有锁或处于初始化阶段）"""
+        if self._fd is not None:
+            self._retired.append(self._fd)
+        self._segment += 1
+        self._fd = os.open(self._segment_path(self._segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segment_size = 0
+        self._segment_open.setdefault(self._segment, 0)
+        self._prune()
+
+    def _prune(self):
+        """
+        从最旧的一端删除信号都已结束的分段
+        信号的结束记录写在当前分段：若先删除较新的分段，较旧分段中信号的结束记录会随之丢失，
+        重启后这些已执行的信号会被重新提交
+        """
+        for number in sorted(self._segment_open):
+            if number == self._segment or self._segment_open[number] > 0:
+                break
+            self._remove_segment(number)
+
+    def _remove_segment(self, number):
+        if number == self._segment:
+            return
+        self._segment_open.pop(number, None)
+        try:
+            os.remove(self._segment_path(number))
+        except OSError as e:
+            logger.warning(f"删除信号日志分段失败: {e}")
+
+    def _write(self, record):
+        """写入一条记录，返回其写入序号（调用方持有锁）"""
+        data = _encode(record)
+        os.write(self._fd, data)
+        self._segment_size += len(data)
+        self._written += 1
+        self._synced.notify_all()
+        return self._written
+
+    def _maybe_roll(self):
+        """当前分段写满后切换（在记录的索引更新之后调用，避免删除刚写入的分段）"""
+        if self._segment_size >= self.segment_bytes:
+            self._roll()
+
+    def _wait_flushed(self, sequence, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while self._flushed < sequence and not self._stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning("等待信号日志落盘超时")
+                return
+            self._synced.wait(remaining)
+
+    def append(self, signal):
+        """记录一个已接收的信号（signal 为可JSON序列化的dict），返回日志ID"""
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            ts = time.time()
+            segment = self._segment
+            sequence = self._write({'t': 'a', 'id': entry_id, 'ts': ts, 'signal': signal})
+            self._entries[entry_id] = {'segment': segment, 'ts': ts, 'signal': signal, 'started': False}
+            self._segment_open[segment] = self._segment_open.get(segment, 0) + 1
+            self.appended += 1
+            self._maybe_roll()
+            if self.sync_ack:
+                self._wait_flushed(sequence)
+        return entry_id
+
+    def start(self, entry_id):
+        """记录信号开始执行"""
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                return
+            entry['started'] = True
+            self._write({'t': 's', 'id': entry_id})
+            self._maybe_roll()
+
+    def complete(self, entry_id, status='done'):
+        """记录信号执行结束（done 已执行 / rejected 未能入队 / expired 过期未执行 / coalesced 被后续信号合并）"""
+        with self._lock:
+            entry = self._entries.pop(entry_id, None)
+            if entry is None:
+                return
+            self._write({'t': 'd', 'id': entry_id, 'status': status})
+            self.completed += 1
+            segment = entry['segment']
+            self._segment_open[segment] -= 1
+            if self._segment_open[segment] == 0:
+                self._prune()
+            self._maybe_roll()
+
+    # ===== 组提交 =====
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while self._flushed >= self._written and not self._retired and not self._stopping:
+                    self._synced.wait()
+                if self._stopping and self._flushed >= self._written and not self._retired:
+                    return
+
+            # 等待一个提交间隔，让这段时间内的写入合并到同一次 fsync
+            if self.fsync_interval > 0 and not self._stopping:
+                time.sleep(self.fsync_interval)
+
+            with self._lock:
+                target = self._written
+                fd = self._fd
+                retired, self._retired = self._retired, []
+
+            started = time.monotonic()
+            try:
+                for old_fd in retired:
+                    os.fsync(old_fd)
+                    os.close(old_fd)
+                os.fsync(fd)
+            except OSError as e:
+                logger.error(f"信号日志 fsync 失败: {e}")
+            elapsed = time.monotonic() - started
+
+            with self._lock:
+                self._flushed = max(self._flushed, target)
+                self.fsyncs += 1
+                self.fsync_seconds += elapsed
+                self._synced.notify_all()
+
+    def close(self):
+        """等待最后一次组提交完成并关闭文件"""
+        with self._lock:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._synced.notify_all()
+        self._flusher.join(timeout=5)
+        with self._lock:
+            for fd in self._retired + [self._fd]:
+                try:
+                    os.fsync(fd)
+                    os.close(fd)
+                except OSError:
+                    pass
+            self._retired = []
+        logger.info(f"信号日志已关闭: {len(self._entries)} 个未完成信号")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._entries),
+                'segments': len(self._segment_open),
+                'appended': self.appended,
+                'completed': self.completed,
+                'unflushed': self._written - self._flushed,
+                'fsyncs': self.fsyncs,
+                'records_per_fsync': round(self._flushed / self.fsyncs, 2) if self.fsyncs else 0.0,
+                'avg_fsync_ms': round(self.fsync_seconds / self.fsyncs * 1000, 3) if self.fsyncs else 0.0,
+                'sync_ack': self.sync_ack
+            }
@@ -21,7 +21,7 @@ import logging
 from datetime import datetime
 from config import Config
 from okx_trader import OKXTrader
-from webhook_server import app
+from webhook_server import app, shutdown_server
 
 # 设置日志
 logging.basicConfig(
@@ -99,7 +99,7 @@ def check_dependencies():
     
     required_packages = [
         'flask',
-        'okx',
+        'httpx',
         'python-dotenv',
         'requests'
     ]
@@ -203,6 +203,8 @@ def print_next_steps():
 def signal_handler(sig, frame):
     """处理退出信号"""
     print("\n\n👋 正在关闭系统...")
+    # 等待进行中的信号执行完并落盘信号日志，未完成的信号下次启动时补执行
+    shutdown_server()
     print("感谢使用TradingView Webhook自动交易系统！")
     sys.exit(0)
 
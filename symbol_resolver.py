@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+交易对解析器 - TradingView符号 -> OKX合约ID
+
+TradingView发送的符号格式很多：
+    BTCUSDT、BINANCE:BTCUSDT、BINANCEBTCUSDT（Pine中 str.replace(syminfo.tickerid, ":", "")）、
+    BTCUSDT.P、BTCUSDTPERP、BTC/USDT、BTCUSD ……
+
+功能特点：
+1. 根据实时合约列表（InstrumentIndex）一次性生成全部别名 -> instId 的字典，查询为O(1)
+2. 带交易所前缀等不在字典中的写法只规范化一次，结果（包括无法识别）放入LRU缓存
+3. 支持的交易对（Config.SUPPORTED_SYMBOLS）与别名字典在同一次构建中冻结，
+   解析和风控检查使用同一份索引
+4. 合约列表刷新后自动重建；合约列表尚未加载时使用 SUPPORTED_SYMBOLS 构建
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 1024
+
+# TradingView上常见的加密货币交易所前缀
+EXCHANGE_PREFIXES = (
+    'BINANCEUS', 'BINANCE', 'BYBIT', 'OKX', 'OKEX', 'BITGET', 'COINBASE', 'KRAKEN',
+    'BITSTAMP', 'BITFINEX', 'HUOBI', 'HTX', 'KUCOIN', 'MEXC', 'GATEIO', 'BINGX',
+    'PHEMEX', 'BITMEX', 'POLONIEX', 'GEMINI', 'DERIBIT', 'CRYPTOCOM', 'COINEX', 'PIONEX'
+)
+
+# 永续合约后缀（BTCUSDT.P 等）
+PERP_SUFFIXES = ('.P', '.PERP', 'PERP', '-PERP', '_PERP')
+
+# 近似计价货币：BTCUSD 在没有可交易的 BTC-USD-SWAP 时解析为 BTC-USDT-SWAP
+LOOSE_QUOTES = {'USDT': ('USD',)}
+
+
+def _split_inst_id(inst_id):
+    """BTC-USDT-SWAP -> ('BTC', 'USDT')，不是永续合约返回None"""
+    parts = inst_id.split('-')
+    if len(parts) != 3 or parts[2] != 'SWAP':
+        return None
+    return parts[0], parts[1]
+
+
+def _alias_forms(base, quote):
+    """某个币对的全部写法（不含交易所前缀）"""
+    compact = f"{base}{quote}"
+    forms = [compact, f"{base}-{quote}", f"{base}/{quote}", f"{base}_{quote}"]
+    forms.extend(compact + suffix for suffix in PERP_SUFFIXES)
+    return forms
+
+
+class SymbolResolver:
+    """别名字典 + LRU 的交易对解析器（线程安全）"""
+
+    def __init__(self, instruments, supported, cache_size=DEFAULT_CACHE_SIZE):
+        """
+        instruments: InstrumentIndex，别名字典根据其中的合约生成
+        supported: 允许交易的instId列表（Config.SUPPORTED_SYMBOLS）
+        """
+        self.instruments = instruments
+        self.configured = frozenset(supported)
+        self.cache_size = cache_size
+        self._prefix_re = re.compile(
+            '^(?:' + '|'.join(sorted(EXCHANGE_PREFIXES, key=len, reverse=True)) + ')'
+        )
+
+        self._lock = threading.Lock()
+        self._aliases = {}
+        self._cache = OrderedDict()
+        self._version = None
+        self.supported = frozenset()
+
+        # 统计信息
+        self.hits = 0
+        self.cache_hits = 0
+        self.misses = 0
+        self.rejections = 0
+
+        self._rebuild()
+
+    def _rebuild(self):
+        """根据当前合约列表重新生成别名字典（调用方持有锁或处于初始化阶段）"""
+        version = self.instruments.refreshes
+        inst_ids = self.instruments.inst_ids() or sorted(self.configured)
+        supported = self.configured & frozenset(inst_ids)
+
+        # 同一别名对应多个合约时：可交易优先，其次计价货币完全一致优先
+        ranked = {}
+        for inst_id in inst_ids:
+            pair = _split_inst_id(inst_id)
+            if pair is None:
+                continue
+            base, quote = pair
+            rank = 2 if inst_id in supported else 0
+            candidates = [(alias, rank + 1) for alias in [inst_id] + _alias_forms(base, quote)]
+            for loose_quote in LOOSE_QUOTES.get(quote, ()):
+                candidates.extend((alias, rank) for alias in _alias_forms(base, loose_quote))
+            for alias, alias_rank in candidates:
+                current = ranked.get(alias)
+                if current is None or alias_rank > current[1]:
+                    ranked[alias] = (inst_id, alias_rank)
+
+        self._aliases = {alias: inst_id for alias, (inst_id, _) in ranked.items()}
+        self.supported = supported
+        self._cache.clear()
+        self._version = version
+        logger.info(f"交易对解析索引已构建: {len(inst_ids)} 个合约, {len(self._aliases)} 个别名, "
+                    f"{len(supported)} 个可交易")
+
+    def _normalize(self, symbol):
+        """处理字典中没有的写法：大小写、空白、交易所前缀"""
+        text = str(symbol).strip().upper()
+        if ':' in text:
+            text = text.rsplit(':', 1)[1]
+        inst_id = self._aliases.get(text)
+        if inst_id is None:
+            match = self._prefix_re.match(text)
+            if match:
+                inst_id = self._aliases.get(text[match.end():])
+        return inst_id
+
+    def resolve(self, symbol):
+        """
+        解析为OKX合约ID（例如 BINANCEBTCUSDT -> BTC-USDT-SWAP）
+        无法识别返回None
+        """
+        with self._lock:
+            if self._version != self.instruments.refreshes:
+                self._rebuild()
+
+            inst_id = self._aliases.get(symbol)
+            if inst_id is not None:
+                self.hits += 1
+                return inst_id
+
+            if symbol in self._cache:
+                self._cache.move_to_end(symbol)
+                self.cache_hits += 1
+                inst_id = self._cache[symbol]
+            else:
+                self.misses += 1
+                inst_id = self._normalize(symbol)
+                self._cache[symbol] = inst_id
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+            if inst_id is None:
+                self.rejections += 1
+            return inst_id
+
+    def is_supported(self, inst_id):
+        """合约是否在允许交易的列表中（且当前可交易）"""
+        with self._lock:
+            if self._version != self.instruments.refreshes:
+                self._rebuild()
+            return inst_id in self.supported
+
+    def stats(self):
+        with self._lock:
+            return {
+                'aliases': len(self._aliases),
+                'supported': len(self.supported),
+                'cached': len(self._cache),
+                'hits': self.hits,
+                'cache_hits': self.cache_hits,
+                'misses': self.misses,
+                'rejections': self.rejections
+            }
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""测试共用设置：项目模块都在仓库根目录"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
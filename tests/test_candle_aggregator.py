@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""多周期K线聚合：与 Bars.resample 一致、缺失K线、重复/迟到K线的修正"""
+
+import numpy as np
+import pytest
+
+from backtest import Bars, synthetic_bars
+from candle_aggregator import COLUMNS, MINUTE_MS, CandleAggregator, timeframe_ms
+
+INST_ID = 'BTC-USDT-SWAP'
+TIMEFRAMES = ('5', '15', '60', '240')
+
+
+def _rows(bars, indices=None):
+    indices = range(len(bars)) if indices is None else indices
+    return [(int(bars.ts[i]), bars.open[i], bars.high[i], bars.low[i], bars.close[i], bars.volume[i])
+            for i in indices]
+
+
+def _feed(aggregator, rows):
+    closed = []
+    for row in rows:
+        closed.extend(aggregator.update(INST_ID, *row))
+    return closed
+
+
+def _resampled(rows, timeframe):
+    """
+    Bars.resample 合成的高级别K线 [(ts, open, high, low, close, volume)]
+    ts 取周期开始时间（resample 用周期内第一根K线的时间，周期开头缺失K线时两者不同）
+    """
+    bars = Bars(*zip(*rows), interval=MINUTE_MS)
+    period, offset = timeframe_ms(timeframe)
+    higher, closes_at = bars.resample(period, offset)
+    return [(int(end - period),) + row[1:] for end, row in zip(closes_at, _rows(higher))]
+
+
+def _stored(aggregator, timeframe):
+    columns = aggregator.bars(INST_ID, timeframe)
+    return list(zip(*(columns[name] for name in COLUMNS)))
+
+
+def _assert_bars(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a[0] == e[0]
+        assert a[1:] == pytest.approx(e[1:], rel=1e-12)
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return _rows(synthetic_bars(2400, seed=3))    # 40小时，最后一根K线结束所有周期
+
+
+@pytest.mark.parametrize('timeframe', TIMEFRAMES)
+def test_matches_resample(rows, timeframe):
+    aggregator = CandleAggregator(TIMEFRAMES, capacity=4096)
+    closed = _feed(aggregator, rows)
+    expected = _resampled(rows, timeframe)
+    _assert_bars(_stored(aggregator, timeframe), expected)
+    _assert_bars([bar for tf, bar in closed if tf == timeframe], expected)
+
+
+@pytest.mark.parametrize('timeframe', TIMEFRAMES)
+def test_gaps(rows, timeframe):
+    """缺失的K线（包括周期的最后一根和整个周期）：下一个周期的第一根K线到达时收盘"""
+    rng = np.random.default_rng(7)
+    missing = set(rng.choice(len(rows) - 1, 200, replace=False).tolist())
+    missing.update(range(299, 360))               # 第5个小时的最后一分钟和整个第6个小时
+    kept = [row for i, row in enumerate(rows) if i not in missing]
+
+    aggregator = CandleAggregator(TIMEFRAMES, capacity=4096)
+    _feed(aggregator, kept)
+    _assert_bars(_stored(aggregator, timeframe), _resampled(kept, timeframe))
+
+
+def test_closes_with_last_base_bar(rows):
+    """周期的最后一根基础K线收盘时该周期收盘（lookahead_off 的使用时机），不等下一根"""
+    aggregator = CandleAggregator(('60',))
+    assert _feed(aggregator, rows[:59]) == []
+    closed = aggregator.update(INST_ID, *rows[59])
+    assert [(tf, bar[0]) for tf, bar in closed] == [('60', rows[0][0])]
+
+
+def test_duplicate_bar_not_double_counted(rows):
+    aggregator = CandleAggregator(TIMEFRAMES, capacity=4096)
+    _feed(aggregator, rows[:130])
+    assert aggregator.update(INST_ID, *rows[129]) == []       # 重复的收盘推送
+    assert aggregator.update(INST_ID, *rows[100]) == []       # 已收盘周期中的重复K线
+    _feed(aggregator, rows[130:])
+    for timeframe in TIMEFRAMES:
+        _assert_bars(_stored(aggregator, timeframe), _resampled(rows, timeframe))
+    assert aggregator.stats()['late'] == 2
+
+
+@pytest.mark.parametrize('late_index', [62, 107, 178])
+def test_late_bar_revises_periods(rows, late_index):
+    """迟到的K线插入基础缓冲区并修正各周期中的对应K线（已收盘的和当前的），不再回调"""
+    aggregator = CandleAggregator(TIMEFRAMES, capacity=4096)
+    _feed(aggregator, rows[:late_index] + rows[late_index + 1:180])
+    assert aggregator.update(INST_ID, *rows[late_index]) == []
+    _feed(aggregator, rows[180:])
+    for timeframe in TIMEFRAMES:
+        _assert_bars(_stored(aggregator, timeframe), _resampled(rows, timeframe))
+    assert aggregator.stats()['late'] == 1
+
+
+def test_corrected_bar_replaces_values(rows):
+    """同一根K线的修正数据替换原值（成交量不累加），已收盘的周期K线重新合成"""
+    aggregator = CandleAggregator(('5', '15'), capacity=4096)
+    _feed(aggregator, rows[:30])
+    ts, open_, high, low, close, volume = rows[7]
+    corrected = (ts, open_, high * 1.01, low, close, volume + 5)
+    aggregator.update(INST_ID, *corrected)
+    expected = rows[:7] + [corrected] + rows[8:30]
+    for timeframe in ('5', '15'):
+        _assert_bars(_stored(aggregator, timeframe), _resampled(expected, timeframe))
+    assert aggregator.stats()['revised'] == 2
+
+
+def test_late_bar_before_window_dropped(rows):
+    aggregator = CandleAggregator(('5',), capacity=8, base_capacity=8)
+    _feed(aggregator, rows[1:40])
+    before = _stored(aggregator, '5')
+    aggregator.update(INST_ID, *rows[0])
+    assert _stored(aggregator, '5') == before
+    assert aggregator.stats()['dropped'] == 1
+
+
+def test_unconfirmed_updates_replaced(rows):
+    """同一根基础K线的多次未收盘推送是累计值：只替换，不重复累加成交量"""
+    aggregator = CandleAggregator(('5',), capacity=4096)
+    _feed(aggregator, rows[:3])
+    ts, open_, high, low, close, volume = rows[3]
+    aggregator.update(INST_ID, ts, open_, open_, open_, open_, volume / 2, confirmed=False)
+    aggregator.update(INST_ID, ts, open_, high, low, close, volume, confirmed=False)
+    assert aggregator.partial(INST_ID, '5') == pytest.approx(_resampled(rows[:4], '5')[0])
+    # 没有收盘推送，下一根K线到达时按最后一次推送收盘
+    closed = aggregator.update(INST_ID, *rows[4])
+    _assert_bars([bar for _, bar in closed], _resampled(rows[:5], '5'))
+
+
+def test_trades_build_base_bars():
+    aggregator = CandleAggregator(('5',))
+    start = 1577836800000
+    for minute in range(5):
+        for second, price in ((1, 100.0 + minute), (20, 103.0 + minute), (40, 99.0 + minute), (59, 101.0 + minute)):
+            aggregator.add_trade(INST_ID, start + minute * MINUTE_MS + second * 1000, price, 1.0)
+    closed = aggregator.add_trade(INST_ID, start + 5 * MINUTE_MS, 110.0, 1.0)
+    assert closed == [('5', (start, 100.0, 107.0, 99.0, 105.0, 20.0))]
+
+
+def test_ring_buffer_keeps_latest(rows):
+    aggregator = CandleAggregator(('5',), capacity=16)
+    _feed(aggregator, rows)
+    _assert_bars(_stored(aggregator, '5'), _resampled(rows, '5')[-16:])
+    assert aggregator.bars(INST_ID, '5', count=4)['ts'].tolist() == [bar[0] for bar in _resampled(rows, '5')[-4:]]
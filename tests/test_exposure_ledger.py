@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""持仓敞口账本：限额检查、推送替换下单后的乐观仓位、增量合计"""
+
+import pytest
+
+from config import Config
+from exposure_ledger import ExposureLedger
+from instruments import InstrumentIndex
+
+LIMIT = 1000.0
+
+
+@pytest.fixture(autouse=True)
+def limit(monkeypatch):
+    """持仓总价值限额，风控检查时以 Config.MAX_TOTAL_POSITION_VALUE 传入"""
+    monkeypatch.setattr(Config, 'MAX_TOTAL_POSITION_VALUE', Config.MAX_TOTAL_POSITION_VALUE)
+
+
+@pytest.fixture
+def ledger():
+    instruments = InstrumentIndex(None)
+    instruments.load([
+        {'instId': 'BTC-USDT-SWAP', 'ctVal': '0.01', 'lotSz': '0.01', 'minSz': '0.01', 'tickSz': '0.1'},
+        {'instId': 'ETH-USDT-SWAP', 'ctVal': '0.1', 'lotSz': '0.01', 'minSz': '0.01', 'tickSz': '0.01'},
+    ])
+    return ExposureLedger(instruments)
+
+
+def _position(inst_id, pos, mark, pos_side='net', **fields):
+    return dict(instId=inst_id, posSide=pos_side, pos=str(pos), markPx=str(mark), **fields)
+
+
+def test_check_against_limit(ledger):
+    ledger.set_position('BTC-USDT-SWAP', 1, price=60000)      # 600 USDT
+    ledger.set_position('ETH-USDT-SWAP', 1, price=3000)       # 300 USDT
+    assert ledger.gross == pytest.approx(900)
+
+    assert ledger.check('ETH-USDT-SWAP', 400, Config.MAX_TOTAL_POSITION_VALUE) is None   # 600 + 400 = 1000，不超过
+    error = ledger.check('ETH-USDT-SWAP', 500, Config.MAX_TOTAL_POSITION_VALUE)
+    assert error == '持仓总价值超过限制: 1100.00 > 1000.0 USDT（ETH-USDT-SWAP 调整后 500.00）'
+    assert ledger.stats()['rejected'] == 1
+
+
+def test_check_always_allows_reducing(ledger):
+    ledger.set_position('BTC-USDT-SWAP', 3, price=60000)      # 1800 USDT，已超过限额
+    assert ledger.check('BTC-USDT-SWAP', 1200, Config.MAX_TOTAL_POSITION_VALUE) is None
+    assert ledger.check('BTC-USDT-SWAP', 1800, Config.MAX_TOTAL_POSITION_VALUE) is None
+    assert ledger.check('ETH-USDT-SWAP', 1, Config.MAX_TOTAL_POSITION_VALUE) is not None
+
+
+def test_push_replaces_optimistic_position(ledger):
+    # 下单成功后按目标仓位乐观更新
+    ledger.set_position('BTC-USDT-SWAP', 1, price=60000)
+    assert ledger.symbol_value('BTC-USDT-SWAP') == pytest.approx((600, 600))
+
+    # 推送到达：部分成交 0.5 张，标记价格 62000，以推送为准
+    ledger.apply_positions([_position('BTC-USDT-SWAP', 0.5, 62000)])
+    assert ledger.symbol_value('BTC-USDT-SWAP') == pytest.approx((310, 310))
+    assert ledger.price('BTC-USDT-SWAP') == 62000
+    assert ledger.gross == pytest.approx(310)
+
+
+def test_hedge_sides_merged_and_closed(ledger):
+    ledger.set_position('BTC-USDT-SWAP', -1, pos_mode='long_short_mode', price=60000)
+    assert ledger.symbol_value('BTC-USDT-SWAP') == pytest.approx((600, -600))
+
+    # 增量推送只包含多头方向，与已有的空头合并
+    ledger.apply_positions([_position('BTC-USDT-SWAP', 2, 60000, pos_side='long')])
+    assert ledger.symbol_value('BTC-USDT-SWAP') == pytest.approx((1800, 600))
+
+    ledger.apply_positions([_position('BTC-USDT-SWAP', 0, 60000, pos_side='short')])
+    assert ledger.symbol_value('BTC-USDT-SWAP') == pytest.approx((1200, 1200))
+
+
+def test_snapshot_drops_missing_symbols(ledger):
+    ledger.set_position('BTC-USDT-SWAP', 1, price=60000)
+    ledger.set_position('ETH-USDT-SWAP', 1, price=3000)
+    ledger.apply_positions([_position('ETH-USDT-SWAP', 2, 3000)], snapshot=True)
+    assert ledger.symbol_value('BTC-USDT-SWAP') == (0.0, 0.0)
+    assert ledger.gross == pytest.approx(600)
+
+
+def test_symbol_replacement(ledger):
+    """inst_id 指定时，该交易对不在结果中表示已无持仓"""
+    ledger.set_position('BTC-USDT-SWAP', 1, price=60000)
+    ledger.set_position('ETH-USDT-SWAP', 1, price=3000)
+    ledger.apply_positions([], inst_id='BTC-USDT-SWAP')
+    assert ledger.symbol_value('BTC-USDT-SWAP') == (0.0, 0.0)
+    assert ledger.gross == pytest.approx(300)
+
+
+def test_price_update_revalues(ledger):
+    ledger.set_position('BTC-USDT-SWAP', 1, price=60000)
+    ledger.update_price('BTC-USDT-SWAP', 50000)
+    assert ledger.gross == pytest.approx(500)
+
+
+def test_unknown_instrument_uses_notional_usd(ledger):
+    ledger.apply_positions([_position('PEPE-USDT-SWAP', -100, 0.00001, notionalUsd='250')])
+    assert ledger.symbol_value('PEPE-USDT-SWAP') == pytest.approx((250, -250))
+    assert ledger.gross == pytest.approx(250)
+
+
+def test_closing_everything_resets_totals(ledger):
+    ledger.set_position('BTC-USDT-SWAP', 0.37, price=61234.5)
+    ledger.set_position('ETH-USDT-SWAP', -1.3, price=3123.4)
+    ledger.set_position('BTC-USDT-SWAP', 0)
+    ledger.set_position('ETH-USDT-SWAP', 0)
+    assert (ledger.gross, ledger.net) == (0.0, 0.0)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""流式信号引擎与 backtest.strategy_signals 逐根一致，预热后的高级别趋势按 lookahead_off 对齐"""
+
+import numpy as np
+import pytest
+
+from backtest import Bars, StrategyParams, security_trend, strategy_signals, synthetic_bars, zero_lag_trend
+from candle_aggregator import MINUTE_MS
+from indicator_engine import SignalEngine
+
+INST_ID = 'BTC-USDT-SWAP'
+# 较小的 length/mult 让6000根合成K线上有足够多的多周期同向信号
+PARAMS = dict(length=10, mult=0.3, timeframes=('5', '15', '60'), mtf_required=3)
+
+
+@pytest.fixture(scope='module')
+def bars():
+    return synthetic_bars(6000, seed=1)
+
+
+def _run(engine, bars, start=0):
+    """逐根输入收盘K线，返回 (信号K线下标 -> 动作, 各K线之后的趋势)"""
+    signals, trends = {}, []
+    for i in range(start, len(bars)):
+        signal = engine.on_bar(INST_ID, int(bars.ts[i]), bars.open[i], bars.high[i], bars.low[i],
+                               bars.close[i], bars.volume[i])
+        if signal is not None:
+            signals[i] = signal['action']
+        trends.append(engine.trends(INST_ID))
+    return signals, trends
+
+
+def _expected(bars, use_mtf_filter):
+    long_condition, short_condition, _ = strategy_signals(bars, StrategyParams(use_mtf_filter=use_mtf_filter, **PARAMS))
+    expected = {int(i): 'buy' for i in np.flatnonzero(long_condition)}
+    expected.update((int(i), 'sell') for i in np.flatnonzero(short_condition))
+    return expected
+
+
+@pytest.mark.parametrize('use_mtf_filter', [False, True])
+def test_signals_match_backtest(bars, use_mtf_filter):
+    engine = SignalEngine(use_mtf_filter=use_mtf_filter, **PARAMS)
+    signals, trends = _run(engine, bars)
+    expected = _expected(bars, use_mtf_filter)
+    assert len(expected) > 10
+    assert signals == expected
+
+    chart = zero_lag_trend(bars, PARAMS['length'], PARAMS['mult'])[0]
+    assert [t['chart'] for t in trends] == chart.tolist()
+    if use_mtf_filter:
+        for timeframe in ('15', '60'):
+            higher = security_trend(bars, timeframe, PARAMS['length'], PARAMS['mult'])
+            assert [t[timeframe] for t in trends] == higher.tolist()
+
+
+def test_signal_fields(bars):
+    engine = SignalEngine(use_mtf_filter=False, stop_loss_pct=2.0, take_profit_pct=4.0,
+                          position_size_usdt=1000.0, leverage=5, **PARAMS)
+    index, action = next(iter(_expected(bars, False).items()))
+    for i in range(index + 1):
+        signal = engine.on_bar(INST_ID, int(bars.ts[i]), bars.open[i], bars.high[i], bars.low[i], bars.close[i])
+    close = bars.close[index]
+    side = 1 if action == 'buy' else -1
+    assert signal == {
+        'action': action, 'symbol': INST_ID, 'price': close, 'size': 1000.0 / close, 'leverage': 5,
+        'stop_loss': close * (1 - side * 0.02), 'take_profit': close * (1 + side * 0.04),
+        'timestamp': str(int(bars.ts[index]))
+    }
+
+
+def test_late_and_duplicate_bars_ignored(bars):
+    engine = SignalEngine(**PARAMS)
+    _run(engine, Bars(bars.ts[:100], bars.open[:100], bars.high[:100], bars.low[:100], bars.close[:100]))
+    before = engine.trends(INST_ID)
+    for i in (99, 50):
+        assert engine.on_bar(INST_ID, int(bars.ts[i]), bars.open[i], bars.high[i] * 2, bars.low[i],
+                             bars.close[i] * 2) is None
+    assert engine.trends(INST_ID) == before
+    assert engine.last_bar(INST_ID) == int(bars.ts[99])
+    assert engine.stats()['stale'] == 2
+
+
+def test_unconfirmed_bar_closed_by_next_bar(bars):
+    """没有收到收盘推送时，下一根K线到达后按最后一次推送的数据收盘"""
+    reference = SignalEngine(**PARAMS)
+    engine = SignalEngine(**PARAMS)
+    for i in range(400):
+        row = (int(bars.ts[i]), bars.open[i], bars.high[i], bars.low[i], bars.close[i], bars.volume[i])
+        reference.on_bar(INST_ID, *row)
+        if i % 7 == 3:
+            engine.on_partial(INST_ID, *row)
+        else:
+            engine.on_bar(INST_ID, *row)
+    assert engine.trends(INST_ID) == reference.trends(INST_ID)
+    assert engine.candles.bars(INST_ID, '60') == reference.candles.bars(INST_ID, '60')
+
+
+def test_stale_signal_suppressed(bars):
+    engine = SignalEngine(use_mtf_filter=False, max_signal_age=60, **PARAMS)
+    signals, _ = _run(engine, bars)
+    assert signals == {}
+    assert engine.stats()['suppressed'] == len(_expected(bars, False))
+
+
+def test_seeded_timeframe_follows_lookahead_off(bars):
+    """
+    交易所小时K线预热到 as_of（最后一根未收盘），之后的1分钟K线继续合成：
+    小时趋势与从头输入全部1分钟K线的 security_trend 逐根相同，未收盘的小时K线收盘前不参与计算
+    """
+    hour = 60 * MINUTE_MS
+    hourly, closes_at = bars.resample(hour)
+    as_of_index = 45 * 60 + 23                     # 第45个小时的第23分钟开始实时输入
+    as_of = int(bars.ts[as_of_index])
+    open_hour = int(np.searchsorted(hourly.ts, as_of, side='right') - 1)
+
+    candles = [(int(hourly.ts[i]), hourly.open[i], hourly.high[i], hourly.low[i], hourly.close[i],
+                hourly.volume[i], True) for i in range(open_hour)]
+    start = int(hourly.ts[open_hour])
+    head = slice(int(np.searchsorted(bars.ts, start)), as_of_index)
+    # 交易所的未收盘小时K线只包含 as_of 之前的分钟
+    candles.append((start, bars.open[head][0], bars.high[head].max(), bars.low[head].min(), bars.close[head][-1],
+                    bars.volume[head].sum(), False))
+
+    engine = SignalEngine(length=PARAMS['length'], mult=PARAMS['mult'], timeframes=('60',), mtf_required=1)
+    engine.seed_timeframe(INST_ID, '60', candles, as_of=as_of)
+    _, trends = _run(engine, bars, start=as_of_index)
+
+    expected = security_trend(bars, '60', PARAMS['length'], PARAMS['mult'])[as_of_index:]
+    assert [t['60'] for t in trends] == expected.tolist()
+
+    # 预热的未收盘小时K线在其最后一分钟收盘时才收盘，内容与完整数据合成的小时K线相同
+    stored = engine.candles.bars(INST_ID, '60')
+    position = list(stored['ts']).index(start)
+    assert closes_at[open_hour] == start + hour
+    assert stored['close'][position] == hourly.close[open_hour]
+    assert stored['high'][position] == hourly.high[open_hour]
+    assert stored['low'][position] == hourly.low[open_hour]
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""合约规格量化：币数量 -> 合法张数，价格 -> tickSz 整数倍"""
+
+import pytest
+
+from instruments import InstrumentIndex, InstrumentSpec, format_fixed
+
+
+def _spec(**overrides):
+    data = {'instId': 'TEST-USDT-SWAP', 'ctVal': '0.001', 'lotSz': '0.01', 'minSz': '0.1', 'tickSz': '0.1'}
+    data.update(overrides)
+    return InstrumentSpec(data)
+
+
+@pytest.mark.parametrize('coin, expected', [
+    (0.3, '300'),           # 0.3 / 0.001 在浮点中为 299.99999999999994
+    (0.0123, '12.3'),
+    (0.000129, '0.12'),     # 0.129张 向下取整到 lotSz 0.01
+    (0.0001, '0.1'),        # 正好等于 minSz
+    (0.000099, '0'),        # 0.099张 < minSz 0.1
+    (-0.0123, '12.3'),      # 数量取绝对值，方向由调用方决定
+])
+def test_contracts_from_coin(coin, expected):
+    units, text = _spec().contracts_from_coin(coin)
+    assert text == expected
+    assert format_fixed(units, 2) == expected
+
+
+def test_min_size_rounding_with_coarser_min():
+    # minSz 比 lotSz 粗：0.95张 合法手数但小于 minSz 1
+    spec = _spec(ctVal='0.01', lotSz='0.05', minSz='1')
+    assert spec.contracts_from_coin(0.0095) == (0, '0')
+    assert spec.contracts_from_coin(0.0104)[1] == '1'
+    assert spec.contracts_from_coin(0.0107)[1] == '1.05'
+
+
+def test_integer_lots():
+    spec = _spec(ctVal='0.01', lotSz='1', minSz='1')
+    assert spec.contracts_from_coin(0.07) == (7, '7')   # 0.07 / 0.01 = 7.000000000000001
+    assert spec.contracts_from_coin(0.0299) == (2, '2')
+    assert spec.contracts_value(7) == 7.0
+
+
+@pytest.mark.parametrize('price, mode, expected', [
+    (65000.05, 'nearest', '65000.1'),
+    (65000.04, 'nearest', '65000'),
+    (65000.09, 'down', '65000'),
+    (65000.01, 'up', '65000.1'),
+    (0.3, 'down', '0.3'),          # 0.3 / 0.1 = 2.9999999999999996
+    (0.7, 'up', '0.7'),            # 0.7 / 0.1 = 6.999999999999999
+])
+def test_snap_price(price, mode, expected):
+    assert _spec().snap_price(price, mode) == expected
+
+
+def test_snap_price_fine_tick():
+    spec = _spec(tickSz='0.0001')
+    assert spec.snap_price(1.23456) == '1.2346'
+    assert spec.snap_price(1.23456, 'down') == '1.2345'
+    assert spec.snap_price(1e-05, 'up') == '0.0001'
+
+
+def test_contracts_from_quote():
+    linear = _spec(ctVal='0.01', lotSz='1', minSz='1')
+    assert linear.contracts_from_quote(1300, 65000)[1] == '2'
+    inverse = _spec(ctType='inverse', ctVal='100', lotSz='1', minSz='1')
+    assert inverse.contracts_from_quote(1050, 65000)[1] == '10'
+
+
+def test_notional():
+    assert _spec(ctVal='0.01').notional(5, 60000) == pytest.approx(3000.0)
+    assert _spec(ctType='inverse', ctVal='100').notional(-3, 60000) == 300.0
+
+
+def test_index_skips_unparseable_and_suspended():
+    index = InstrumentIndex(client=None)
+    count = index.load([
+        {'instId': 'BTC-USDT-SWAP', 'ctVal': '0.01', 'lotSz': '0.01', 'minSz': '0.01', 'tickSz': '0.1'},
+        {'instId': 'OLD-USDT-SWAP', 'ctVal': '1', 'lotSz': '1', 'minSz': '1', 'tickSz': '0.1', 'state': 'suspend'},
+        {'instId': 'BAD-USDT-SWAP', 'ctVal': 'x', 'lotSz': '1', 'tickSz': '0.1'},
+    ])
+    assert count == 1
+    assert 'BTC-USDT-SWAP' in index and 'OLD-USDT-SWAP' not in index
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""OKX客户端重试截止时间：订单查询或重新发送卡住时，调用在截止时间内结束"""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+import types
+
+import pytest
+
+from okx_client import AsyncLoopThread, OKXAPIError, OKXAsyncClient
+from okx_retry import RetryPolicies
+
+DEADLINE = 1.0
+ORDER = {'instId': 'BTC-USDT-SWAP', 'tdMode': 'cross', 'side': 'buy', 'ordType': 'market', 'sz': '1',
+         'clOrdId': 'tabc0'}
+
+
+class StubTransport:
+    """替换 OKXAsyncClient._send：按 (方法, 路径) 依次返回预设的响应，'stall' 表示一直不返回"""
+
+    def __init__(self, responses):
+        self.responses = {key: list(values) for key, values in responses.items()}
+        self.sent = []
+
+    async def __call__(self, host, method, path, request_path, body_text, auth, expires=None):
+        self.sent.append((method, path, expires))
+        result = self.responses[(method, path)].pop(0)
+        if result == 'stall':
+            await asyncio.sleep(3600)
+        return types.SimpleNamespace(headers={}, status_code=200), result
+
+
+def _client(responses):
+    client = OKXAsyncClient(retry=RetryPolicies(deadline=DEADLINE), order_expiry=0.1)
+    client._send = StubTransport(responses)
+    return client
+
+
+def _place(client):
+    async def place():
+        started = time.monotonic()
+        try:
+            return await client.place_order(**ORDER), time.monotonic() - started
+        except OKXAPIError as e:
+            return e, time.monotonic() - started
+
+    return asyncio.run(place())
+
+
+def _posts(client):
+    return [sent for sent in client._send.sent if sent[0] == 'POST']
+
+
+def test_stalled_lookup_does_not_resend():
+    client = _client({
+        ('POST', '/api/v5/trade/order'): [{'code': '50004', 'msg': 'timeout', 'data': []}],
+        ('GET', '/api/v5/trade/order'): ['stall'],
+    })
+    result, elapsed = _place(client)
+    assert elapsed < DEADLINE + 0.5
+    # 无法确认上一次请求的结果，不能重新发送
+    assert result['code'] == '50004'
+    assert len(_posts(client)) == 1
+
+
+def test_stalled_resend_bounded_by_deadline():
+    client = _client({
+        ('POST', '/api/v5/trade/order'): [{'code': '50004', 'msg': 'timeout', 'data': []}, 'stall'],
+        ('GET', '/api/v5/trade/order'): [{'code': '51603', 'msg': 'Order does not exist', 'data': []}],
+    })
+    started = time.time()
+    error, elapsed = _place(client)
+    assert isinstance(error, OKXAPIError) and '截止时间' in str(error)
+    assert elapsed < DEADLINE + 0.5
+    posts = _posts(client)
+    assert len(posts) == 2
+    # 重新发送的请求有效期不晚于截止时间，调用方放弃之后交易所也不会再执行
+    assert posts[1][2] <= started + DEADLINE + 0.05
+
+
+def test_order_confirmed_by_lookup():
+    client = _client({
+        ('POST', '/api/v5/trade/order'): [{'code': '50004', 'msg': 'timeout', 'data': []}],
+        ('GET', '/api/v5/trade/order'): [{'code': '0', 'data': [{'ordId': '42', 'tag': ''}]}],
+    })
+    result, _ = _place(client)
+    assert result['code'] == '0'
+    assert result['data'][0]['ordId'] == '42'
+    assert len(_posts(client)) == 1
+
+
+def test_loop_thread_cancels_on_timeout():
+    loop_thread = AsyncLoopThread(name='test-okx-io')
+    cancelled = threading.Event()
+
+    async def stalled():
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    try:
+        with pytest.raises(concurrent.futures.TimeoutError):
+            loop_thread.run(stalled(), timeout=0.05)
+        assert cancelled.wait(1)
+    finally:
+        loop_thread.stop()
+        loop_thread.loop.close()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""私有WebSocket持仓/余额镜像：推送帧、REST全量同步和过期判断"""
+
+import asyncio
+import json
+import time
+
+from okx_ws_state import AccountStateMirror
+
+
+class StubClient:
+    """REST全量同步用的 OKXAsyncClient 替身"""
+
+    flag = '1'
+
+    def __init__(self, positions, balance):
+        self._positions = positions
+        self._balance = balance
+
+    async def get_positions(self, instType=None):
+        return {'code': '0', 'data': self._positions}
+
+    async def get_account_balance(self):
+        return {'code': '0', 'data': self._balance}
+
+
+def _position(inst_id, pos, pos_side='net', u_time='1718323200000'):
+    return {'instId': inst_id, 'posSide': pos_side, 'pos': pos, 'instType': 'SWAP',
+            'mgnMode': 'cross', 'avgPx': '65000', 'markPx': '65010', 'uTime': u_time}
+
+
+def _balance(avail, ccy='USDT', total='1000'):
+    return [{'totalEq': total, 'details': [{'ccy': ccy, 'availBal': avail, 'eq': total}]}]
+
+
+def _frame(channel, data, event_type=None):
+    frame = {'arg': {'channel': channel, 'instType': 'SWAP'} if channel == 'positions' else {'channel': channel},
+             'data': data}
+    if event_type:
+        frame['eventType'] = event_type
+    return json.dumps(frame)
+
+
+def _synced_mirror(positions=(), balance=None, max_staleness=60):
+    mirror = AccountStateMirror(StubClient(list(positions), balance or _balance('500')), loop_thread=None,
+                                max_staleness=max_staleness)
+    asyncio.run(mirror.resync())
+    return mirror
+
+
+def test_not_live_before_resync():
+    mirror = AccountStateMirror(StubClient([], []), loop_thread=None)
+    assert not mirror.is_live()
+    assert mirror.available_balance() is None
+
+
+def test_resync_loads_snapshot():
+    mirror = _synced_mirror([_position('BTC-USDT-SWAP', '3'), _position('ETH-USDT-SWAP', '0')])
+    assert mirror.is_live()
+    assert [p['pos'] for p in mirror.get_symbol_positions('BTC-USDT-SWAP')] == ['3']
+    # pos 为0的持仓不保存
+    assert mirror.get_symbol_positions('ETH-USDT-SWAP') == []
+    assert mirror.available_balance('USDT') == 500.0
+
+
+def test_incremental_push_updates_and_closes():
+    mirror = _synced_mirror([_position('BTC-USDT-SWAP', '3')])
+    mirror.handle_message(_frame('positions', [_position('ETH-USDT-SWAP', '-2')]))
+    assert mirror.get_position('ETH-USDT-SWAP', 'net')['pos'] == '-2'
+    # 增量推送不影响其他交易对
+    assert mirror.get_position('BTC-USDT-SWAP', 'net')['pos'] == '3'
+
+    mirror.handle_message(_frame('positions', [_position('BTC-USDT-SWAP', '0')]))
+    assert mirror.get_symbol_positions('BTC-USDT-SWAP') == []
+    assert len(mirror.positions()) == 1
+
+
+def test_snapshot_push_replaces_all():
+    mirror = _synced_mirror([_position('BTC-USDT-SWAP', '3'), _position('ETH-USDT-SWAP', '1')])
+    mirror.handle_message(_frame('positions', [_position('SOL-USDT-SWAP', '5')], event_type='snapshot'))
+    assert [p['instId'] for p in mirror.positions()] == ['SOL-USDT-SWAP']
+
+
+def test_hedge_mode_sides_indexed_separately():
+    mirror = _synced_mirror()
+    mirror.handle_message(_frame('positions', [
+        _position('BTC-USDT-SWAP', '2', 'long'), _position('BTC-USDT-SWAP', '1', 'short')
+    ]))
+    assert mirror.get_position('BTC-USDT-SWAP', 'long')['pos'] == '2'
+    assert mirror.get_position('BTC-USDT-SWAP', 'short')['pos'] == '1'
+    mirror.handle_message(_frame('positions', [_position('BTC-USDT-SWAP', '0', 'short')]))
+    assert mirror.get_position('BTC-USDT-SWAP', 'short') is None
+    assert mirror.get_position('BTC-USDT-SWAP', 'long')['pos'] == '2'
+
+
+def test_account_push_merges_currencies():
+    mirror = _synced_mirror(balance=[{'totalEq': '1000', 'details': [
+        {'ccy': 'USDT', 'availBal': '500'}, {'ccy': 'BTC', 'availBal': '0.1'}
+    ]}])
+    # account 频道的增量推送只包含有变化的币种
+    mirror.handle_message(_frame('account', _balance('420', total='990')))
+    assert mirror.available_balance('USDT') == 420.0
+    assert mirror.available_balance('BTC') == 0.1
+    assert mirror.balance()[0]['totalEq'] == '990'
+
+
+def test_listener_receives_pushes():
+    mirror = _synced_mirror()
+    received = []
+    mirror.add_listener(lambda positions, snapshot: received.append((len(positions), snapshot)))
+    mirror.handle_message(_frame('positions', [_position('BTC-USDT-SWAP', '1')]))
+    asyncio.run(mirror.resync())
+    assert received == [(1, False), (0, True)]
+
+
+def test_event_and_pong_messages_only_refresh_liveness():
+    mirror = _synced_mirror([_position('BTC-USDT-SWAP', '3')])
+    mirror.handle_message('pong')
+    mirror.handle_message(json.dumps({'event': 'subscribe', 'arg': {'channel': 'positions'}}))
+    assert mirror.stats()['messages'] == 2
+    assert mirror.get_position('BTC-USDT-SWAP', 'net')['pos'] == '3'
+
+
+def test_stale_mirror_not_live_until_next_message():
+    mirror = _synced_mirror(max_staleness=0.05)
+    assert mirror.is_live()
+    time.sleep(0.1)
+    # 超过 max_staleness 没有任何推送，调用方改用REST
+    assert not mirror.is_live()
+    assert not mirror.stats()['live']
+    mirror.handle_message('pong')
+    assert mirror.is_live()
+
+
+def test_expected_position_survives_stale_push():
+    mirror = _synced_mirror([_position('BTC-USDT-SWAP', '3')])
+    order_ts = int(time.time() * 1000)
+    mirror.expect_position('BTC-USDT-SWAP', -2.0, order_ts=order_ts)
+    mirror.handle_message(_frame('positions', [_position('BTC-USDT-SWAP', '3', u_time=str(order_ts - 1000))]))
+    assert mirror.get_position('BTC-USDT-SWAP', 'net')['pos'] == '-2'
+    mirror.handle_message(_frame('positions', [_position('BTC-USDT-SWAP', '-2', u_time=str(order_ts + 5))]))
+    mirror.handle_message(_frame('positions', [_position('BTC-USDT-SWAP', '1', u_time=str(order_ts + 9))]))
+    assert mirror.get_position('BTC-USDT-SWAP', 'net')['pos'] == '1'
+
+
+class FakeSocket:
+    """本地WebSocket替身：登录成功后依次返回预先录制的推送"""
+
+    def __init__(self, frames):
+        self.sent = []
+        self._frames = asyncio.Queue()
+        for frame in [json.dumps({'event': 'login', 'code': '0'})] + frames:
+            self._frames.put_nowait(frame)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def recv(self):
+        return await self._frames.get()
+
+
+def test_session_logs_in_subscribes_and_applies_pushes():
+    from okx_client import AsyncLoopThread
+
+    client = StubClient([_position('BTC-USDT-SWAP', '3')], _balance('500'))
+    client.api_key, client.secret_key, client.passphrase = 'key', 'secret', 'pass'
+    socket = FakeSocket([
+        _frame('positions', [_position('BTC-USDT-SWAP', '4')]),
+        _frame('account', _balance('450')),
+    ])
+    loop_thread = AsyncLoopThread(name='test-ws')
+    mirror = AccountStateMirror(client, loop_thread, url='ws://local', connect=lambda url, **kwargs: socket)
+    try:
+        mirror.start()
+        deadline = time.monotonic() + 5
+        while mirror.stats()['messages'] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert mirror.is_live()
+        assert mirror.get_position('BTC-USDT-SWAP', 'net')['pos'] == '4'
+        assert mirror.available_balance() == 450.0
+        login, subscribe = (json.loads(message) for message in socket.sent[:2])
+        assert login['op'] == 'login' and login['args'][0]['apiKey'] == 'key'
+        assert {arg['channel'] for arg in subscribe['args']} == {'positions', 'account'}
+    finally:
+        mirror.stop()
+        # 等待订阅协程处理完取消后再停止事件循环
+        loop_thread.run(asyncio.sleep(0.01), timeout=5)
+        loop_thread.stop()
+        loop_thread.loop.close()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""跨进程锁：两个进程交替执行同一交易对"""
+
+import multiprocessing
+import time
+
+import pytest
+
+import process_locks
+from process_locks import SymbolLocks
+
+pytestmark = pytest.mark.skipif(process_locks.fcntl is None, reason='需要 fcntl（flock）')
+
+SYMBOL = 'BTC-USDT-SWAP'
+
+
+def _worker(directory, name, rounds, hold_seconds, events):
+    locks = SymbolLocks(directory)
+    for _ in range(rounds):
+        with locks.hold(SYMBOL) as handoff:
+            events.put((name, 'enter', time.monotonic(), handoff))
+            time.sleep(hold_seconds)
+            events.put((name, 'exit', time.monotonic(), handoff))
+        # 让出锁，另一个进程有机会拿到
+        time.sleep(hold_seconds / 2)
+    locks.close()
+
+
+def _run(directory, rounds=10, hold_seconds=0.01):
+    context = multiprocessing.get_context('fork')
+    events = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(directory, name, rounds, hold_seconds, events))
+        for name in ('a', 'b')
+    ]
+    for process in processes:
+        process.start()
+    collected = [events.get(timeout=10) for _ in range(len(processes) * rounds * 2)]
+    for process in processes:
+        process.join(timeout=10)
+        assert process.exitcode == 0
+    return sorted(collected, key=lambda event: event[2])
+
+
+def test_two_processes_mutually_exclusive(tmp_path):
+    events = _run(str(tmp_path))
+    holder = None
+    for name, kind, _, _ in events:
+        if kind == 'enter':
+            assert holder is None, '两个进程同时持有同一交易对的锁'
+            holder = name
+        else:
+            assert holder == name
+            holder = None
+
+
+def test_handoff_reported_when_other_process_held_last(tmp_path):
+    events = _run(str(tmp_path))
+    entries = [(name, handoff) for name, kind, _, handoff in events if kind == 'enter']
+    previous = None
+    for name, handoff in entries:
+        # 第一次加锁时锁文件为空，也视为换了进程
+        assert handoff == (name != previous)
+        previous = name
+    assert len({name for name, _ in entries}) == 2
+
+
+def test_same_process_threads_serialized(tmp_path):
+    import threading
+
+    locks = SymbolLocks(str(tmp_path))
+    active = []
+    overlaps = []
+
+    def run():
+        for _ in range(20):
+            with locks.hold(SYMBOL):
+                active.append(1)
+                if len(active) > 1:
+                    overlaps.append(1)
+                time.sleep(0.001)
+                active.pop()
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not overlaps
+    assert locks.stats()['handoffs'] == 1
+    locks.close()
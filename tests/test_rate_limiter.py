@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""OKX REST限速器：令牌按窗口归还、突发额度、FIFO预约与交易所限速反馈"""
+
+import asyncio
+import types
+
+import pytest
+
+import rate_limiter
+from rate_limiter import ACCOUNT_BUCKET, WINDOW_MARGIN, RateLimiter
+
+ORDER = ('POST', '/api/v5/trade/order')
+BATCH = ('POST', '/api/v5/trade/batch-orders')
+LIMITS = {ORDER: (5, 2, True), BATCH: (300, 2, True), ('GET', '/api/v5/account/positions'): (10, 2, False)}
+WINDOW = 2 + WINDOW_MARGIN
+
+
+class FakeClock:
+    """可控的单调时钟，sleep 直接推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'asyncio', types.SimpleNamespace(sleep=clock.sleep))
+    return clock
+
+
+@pytest.fixture
+def limiter(clock):
+    return RateLimiter(limits=LIMITS, clock=clock)
+
+
+def _acquire(limiter, method_path=ORDER, inst_id='BTC-USDT-SWAP', body=None):
+    method, path = method_path
+    return asyncio.run(limiter.acquire(method, path, body={'instId': inst_id} if body is None else body))
+
+
+def test_burst_then_wait_one_window(limiter, clock):
+    delays = [_acquire(limiter)[1] for _ in range(5)]
+    assert delays == [0.0] * 5
+    start = clock.now
+    assert _acquire(limiter)[1] == pytest.approx(WINDOW)
+    assert clock.now == pytest.approx(start + WINDOW)
+
+
+def test_tokens_return_one_window_after_use(limiter, clock):
+    for _ in range(5):
+        _acquire(limiter)
+        clock.now += 0.2
+    # 第一个令牌在 1000 + WINDOW 归还，此时只有它可用
+    clock.now = 1000.0 + WINDOW
+    assert _acquire(limiter)[1] == 0.0
+    assert _acquire(limiter)[1] == pytest.approx(0.2)
+
+
+def test_full_refill_after_idle(limiter, clock):
+    for _ in range(5):
+        _acquire(limiter)
+    clock.now += WINDOW
+    assert [_acquire(limiter)[1] for _ in range(5)] == [0.0] * 5
+
+
+def test_reservations_are_fifo(limiter, clock, monkeypatch):
+    """令牌不足时同时到达的请求按到达顺序预约发送时间，不会同时醒来再次争抢"""
+    async def yield_only(delay):
+        await asyncio.sleep(0)
+
+    monkeypatch.setattr(rate_limiter, 'asyncio', types.SimpleNamespace(sleep=yield_only))
+
+    async def burst():
+        return await asyncio.gather(*(limiter.acquire(*ORDER, body={'instId': 'BTC-USDT-SWAP'}) for _ in range(8)))
+
+    delays = [delay for _, delay in asyncio.run(burst())]
+    assert delays == [0.0] * 5 + [pytest.approx(WINDOW)] * 3
+    # 第9个请求排在已预约的请求之后
+    assert _acquire(limiter)[1] == pytest.approx(WINDOW)
+
+
+def test_per_instrument_buckets(limiter):
+    for _ in range(5):
+        _acquire(limiter, inst_id='BTC-USDT-SWAP')
+    assert _acquire(limiter, inst_id='ETH-USDT-SWAP')[1] == 0.0
+
+
+def test_batch_costs_per_order(limiter):
+    body = [{'instId': 'BTC-USDT-SWAP'}] * 3 + [{'instId': 'ETH-USDT-SWAP'}] * 2
+    buckets = limiter.buckets_for(*BATCH, body=body)
+    costs = {bucket.name: cost for bucket, cost in buckets}
+    assert costs == {
+        'POST /api/v5/trade/batch-orders BTC-USDT-SWAP': 3,
+        'POST /api/v5/trade/batch-orders ETH-USDT-SWAP': 2,
+        ACCOUNT_BUCKET: 5,
+    }
+
+
+def test_unlimited_path(limiter):
+    assert asyncio.run(limiter.acquire('GET', '/api/v5/unknown')) == ([], 0.0)
+
+
+def test_share_scales_capacity(clock):
+    limiter = RateLimiter(share=0.4, limits=LIMITS, clock=clock)
+    assert [_acquire(limiter)[1] for _ in range(2)] == [0.0, 0.0]
+    assert _acquire(limiter)[1] == pytest.approx(WINDOW)
+
+
+def test_rate_limited_response_pauses_endpoint(limiter, clock):
+    buckets, _ = _acquire(limiter)
+    assert limiter.feedback(buckets, code='50011') is True
+    assert _acquire(limiter)[1] == pytest.approx(WINDOW / 2)
+
+
+def test_retry_after_header(limiter):
+    buckets, _ = _acquire(limiter)
+    assert limiter.feedback(buckets, headers={'retry-after': '3'}, status_code=429) is True
+    assert _acquire(limiter)[1] == pytest.approx(3)
+
+
+def test_account_limit_pauses_account_bucket(limiter):
+    buckets, _ = _acquire(limiter, inst_id='BTC-USDT-SWAP')
+    limiter.feedback(buckets, code='50061')
+    # 其他交易对的接口桶未受影响，但账户级下单额度暂停
+    assert _acquire(limiter, inst_id='ETH-USDT-SWAP')[1] == pytest.approx(1.0, abs=0.05)
+
+
+def test_remaining_header_syncs_tokens(limiter):
+    buckets, _ = _acquire(limiter)
+    assert limiter.feedback(buckets, headers={'x-ratelimit-remaining': '1'}) is False
+    assert _acquire(limiter)[1] == 0.0
+    assert _acquire(limiter)[1] == pytest.approx(WINDOW)
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""风控计数器：reserve/finish 结算、换日清零、多进程共用同一个文件"""
+
+import multiprocessing
+import re
+
+import pytest
+
+import risk_store
+from risk_store import RiskStore
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'risk' / 'counters.bin')
+
+
+def _counts(store):
+    """计数快照（忽略已分配但没有计数的槽位）"""
+    snapshot = store.snapshot()
+    snapshot['symbols'] = {k: v for k, v in snapshot['symbols'].items() if any(v.values())}
+    return snapshot
+
+
+@pytest.fixture
+def day(monkeypatch):
+    """可控的本地日期"""
+    current = [20240614]
+    monkeypatch.setattr(risk_store, '_today', lambda: current[0])
+    return current
+
+
+def test_reserve_and_finish(path, day):
+    store = RiskStore(path)
+    assert store.reserve('BTC-USDT-SWAP', notional=100.0, orders=2) is None
+    snapshot = store.snapshot()
+    assert (snapshot['daily_trades'], snapshot['open_orders']) == (1, 2)
+    assert snapshot['symbols']['BTC-USDT-SWAP'] == {'trades': 1, 'notional': 100.0, 'open_orders': 2}
+
+    store.finish('BTC-USDT-SWAP', notional=100.0, orders=2)
+    snapshot = store.snapshot()
+    assert (snapshot['daily_trades'], snapshot['open_orders']) == (1, 0)
+    assert snapshot['symbols']['BTC-USDT-SWAP'] == {'trades': 1, 'notional': 100.0, 'open_orders': 0}
+    store.close()
+
+
+def test_failed_order_refunded(path, day):
+    store = RiskStore(path, max_daily_trades=1)
+    assert store.reserve('BTC-USDT-SWAP', notional=100.0) is None
+    store.finish('BTC-USDT-SWAP', notional=100.0, success=False)
+    snapshot = store.snapshot()
+    assert (snapshot['daily_trades'], snapshot['open_orders']) == (0, 0)
+    assert snapshot['symbols']['BTC-USDT-SWAP'] == {'trades': 0, 'notional': 0.0, 'open_orders': 0}
+    assert store.reserve('BTC-USDT-SWAP') is None
+    store.close()
+
+
+@pytest.mark.parametrize('limits, calls, message', [
+    ({'max_daily_trades': 2}, [('A', 0.0, 1), ('B', 0.0, 1), ('C', 0.0, 1)], '今日交易次数已达上限'),
+    ({'max_symbol_notional': 150.0}, [('A', 100.0, 1), ('B', 100.0, 1), ('A', 60.0, 1)], 'A 今日成交额超过限制'),
+    ({'max_open_orders': 3}, [('A', 0.0, 2), ('B', 0.0, 2)], '在途订单数超过限制: 2 \\+ 2 > 3'),
+])
+def test_limits(path, day, limits, calls, message):
+    store = RiskStore(path, **limits)
+    *accepted, rejected = calls
+    for inst_id, notional, orders in accepted:
+        assert store.reserve(inst_id, notional, orders) is None
+    before = _counts(store)
+    error = store.reserve(*rejected)
+    assert error is not None and re.search(message, error)
+    assert _counts(store) == before          # 超限时不修改任何计数
+    assert store.stats()['rejected'] == 1
+    store.close()
+
+
+def test_daily_rollover(path, day):
+    store = RiskStore(path, max_daily_trades=1, max_symbol_notional=100.0)
+    assert store.reserve('BTC-USDT-SWAP', notional=100.0) is None
+    assert store.reserve('BTC-USDT-SWAP') is not None
+
+    day[0] = 20240615
+    assert store.daily_trades() == 0
+    assert store.reserve('BTC-USDT-SWAP', notional=100.0) is None
+    snapshot = store.snapshot()
+    assert (snapshot['day'], snapshot['daily_trades'], snapshot['open_orders']) == (20240615, 1, 2)
+    assert snapshot['symbols']['BTC-USDT-SWAP'] == {'trades': 1, 'notional': 100.0, 'open_orders': 2}
+    store.close()
+
+
+def test_failure_after_rollover_not_refunded(path, day):
+    """跨日结算的失败订单不退回新一天的计数"""
+    store = RiskStore(path)
+    reserved = store.current_day()
+    store.reserve('BTC-USDT-SWAP', notional=100.0)
+    day[0] = 20240615
+    store.reserve('ETH-USDT-SWAP', notional=50.0)
+    store.finish('BTC-USDT-SWAP', notional=100.0, success=False, day=reserved)
+    snapshot = store.snapshot()
+    assert (snapshot['daily_trades'], snapshot['open_orders']) == (1, 1)
+    assert snapshot['symbols']['BTC-USDT-SWAP']['open_orders'] == 0
+    store.close()
+
+
+def test_counters_survive_reopen(path, day):
+    store = RiskStore(path)
+    store.reserve('BTC-USDT-SWAP', notional=100.0)
+    store.close()
+    store = RiskStore(path)
+    assert store.snapshot()['symbols']['BTC-USDT-SWAP']['trades'] == 1
+    store.close()
+
+
+def _reserve_many(path, max_daily_trades, attempts, results):
+    store = RiskStore(path, max_daily_trades=max_daily_trades)
+    accepted = sum(store.reserve('BTC-USDT-SWAP', notional=1.0) is None for _ in range(attempts))
+    store.close()
+    results.put(accepted)
+
+
+@pytest.mark.skipif(risk_store.fcntl is None, reason='需要 fcntl.flock')
+def test_two_processes_share_limit(path):
+    RiskStore(path).close()
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=_reserve_many, args=(path, 300, 200, results)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    accepted = [results.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+
+    # 两个进程合计400次尝试，恰好300次通过，计数没有丢失更新
+    assert sum(accepted) == 300
+    store = RiskStore(path)
+    snapshot = store.snapshot()
+    assert snapshot['daily_trades'] == 300
+    assert snapshot['symbols']['BTC-USDT-SWAP'] == {'trades': 300, 'notional': 300.0, 'open_orders': 300}
+    store.close()
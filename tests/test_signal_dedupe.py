@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""信号去重：TTL过期、重启加载与确定性 clOrdId"""
+
+import re
+
+import pytest
+
+import signal_dedupe
+from signal_dedupe import SignalDedupe, client_order_id, signal_key
+from trade_signal import Signal
+
+
+class FakeClock:
+    """替换 signal_dedupe 模块中的 time，time() 返回可控的时间"""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(signal_dedupe, 'time', clock)
+    return clock
+
+
+def _signal(**fields):
+    data = dict(action='buy', symbol='BINANCEBTCUSDT', price=65000.0, size=0.015, timestamp='1718323200000')
+    data.update(fields)
+    return Signal(**data)
+
+
+def test_signal_key():
+    signal = _signal()
+    assert signal_key(signal) == 'BINANCEBTCUSDT|buy|1718323200000|'
+    signal.inst_id = 'BTC-USDT-SWAP'
+    assert signal_key(signal) == 'BTC-USDT-SWAP|buy|1718323200000|'
+    assert signal_key(_signal(timestamp='')) is None
+
+
+def test_duplicate_within_ttl(clock):
+    dedupe = SignalDedupe(ttl=60)
+    key = signal_key(_signal())
+    assert dedupe.check(key) is True
+    clock.now += 59
+    assert dedupe.check(key) is False
+    assert dedupe.check(signal_key(_signal(action='sell'))) is True
+    assert dedupe.stats()['duplicates'] == 1
+
+
+def test_accepted_again_after_expiry(clock):
+    dedupe = SignalDedupe(ttl=60)
+    assert dedupe.check('a') is True
+    clock.now += 60
+    assert dedupe.check('a') is True
+    assert dedupe.stats()['accepted'] == 2
+
+
+def test_unkeyed_always_accepted():
+    dedupe = SignalDedupe()
+    assert dedupe.check(None) is True
+    assert dedupe.check(None) is True
+    assert dedupe.stats()['unkeyed'] == 2
+
+
+def test_duplicate_hit_does_not_delay_expiry(clock):
+    dedupe = SignalDedupe(ttl=60)
+    dedupe.check('a')
+    clock.now += 10
+    dedupe.check('b')
+    assert dedupe.check('a') is False          # 重复命中不改变 'a' 的位置
+    clock.now += 55                            # 'a' 已过期，'b' 未过期
+    dedupe.check('c')
+    assert list(dedupe._seen) == ['b', 'c']
+
+
+def test_capacity_evicts_oldest(clock):
+    dedupe = SignalDedupe(ttl=60, max_entries=2)
+    for key in ('a', 'b', 'c'):
+        dedupe.check(key)
+        clock.now += 1
+    assert list(dedupe._seen) == ['b', 'c']
+    assert dedupe.check('a') is True
+
+
+def test_forget_allows_retry(clock):
+    dedupe = SignalDedupe(ttl=60)
+    dedupe.check('a')
+    dedupe.forget('a')
+    assert dedupe.check('a') is True
+
+
+def test_persisted_across_restart(tmp_path, clock):
+    path = str(tmp_path / 'dedupe' / 'seen.db')
+    dedupe = SignalDedupe(path, ttl=60)
+    dedupe.check('a')
+    clock.now += 30
+    dedupe.check('b')
+    dedupe.close()
+
+    clock.now += 40                            # 'a' 已过期
+    dedupe = SignalDedupe(path, ttl=60)
+    assert dedupe.stats()['persistent'] is True
+    assert list(dedupe._seen) == ['b']
+    assert dedupe.check('b') is False
+    assert dedupe.check('a') is True
+    dedupe.close()
+
+
+def test_shared_database(tmp_path, clock):
+    """两个实例（相当于两个worker进程）共用同一个文件，只有一个登记成功"""
+    path = str(tmp_path / 'seen.db')
+    first, second = SignalDedupe(path), SignalDedupe(path)
+    assert first.check('a') is True
+    assert second.check('a') is False
+    first.forget('a')
+    assert second.check('a') is True
+    first.close()
+    second.close()
+
+
+def test_client_order_id():
+    key = signal_key(_signal())
+    order_id = client_order_id(key)
+    assert order_id == client_order_id(key)
+    assert order_id != client_order_id(signal_key(_signal(action='sell')))
+    assert re.fullmatch(r'[a-zA-Z][a-zA-Z0-9]*', order_id)
+    # 下单时追加订单序号，仍在OKX的32位限制以内
+    assert len(order_id) + 3 <= 32
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""信号调度器：同一交易对的顺序、平仓优先和排队信号合并"""
+
+import threading
+import time
+
+import pytest
+
+from signal_dispatcher import SignalDispatcher, TARGET_ACTIONS
+
+LANE = 'BTC-USDT-SWAP'
+
+
+class Recorder:
+    """记录执行顺序；gate 未打开前第一个信号阻塞在执行中，后续信号留在队列里"""
+
+    def __init__(self):
+        self.executed = []
+        self.coalesced = []
+        self.gate = threading.Event()
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    def handle(self, signal):
+        self.started.set()
+        self.gate.wait(5)
+        with self._lock:
+            self.executed.append(signal['id'])
+
+    def on_coalesced(self, replaced, signal):
+        self.coalesced.append((replaced['id'], signal['id']))
+
+
+def _supersedes(signal):
+    return signal['action'] in TARGET_ACTIONS
+
+
+def _dispatcher(recorder, **kwargs):
+    kwargs.setdefault('workers', 2)
+    dispatcher = SignalDispatcher(recorder.handle, supersedes=_supersedes,
+                                  on_coalesced=recorder.on_coalesced, **kwargs)
+    dispatcher.start()
+    return dispatcher
+
+
+def _signal(index, action, symbol='BTCUSDT'):
+    return {'id': index, 'action': action, 'symbol': symbol}
+
+
+def _drain(dispatcher, recorder):
+    recorder.gate.set()
+    dispatcher.shutdown(wait=True, timeout=5)
+
+
+@pytest.fixture
+def recorder():
+    return Recorder()
+
+
+def test_burst_collapses_into_latest_target(recorder):
+    dispatcher = _dispatcher(recorder)
+    dispatcher.submit(_signal(0, 'buy'), lane=LANE)
+    assert recorder.started.wait(5)
+    for index, action in enumerate(['sell', 'buy', 'sell', 'buy'], start=1):
+        assert dispatcher.submit(_signal(index, action), lane=LANE)
+    _drain(dispatcher, recorder)
+
+    # 执行中的信号不被替换，排队中的只执行最后一个
+    assert recorder.executed == [0, 4]
+    assert recorder.coalesced == [(1, 2), (2, 3), (3, 4)]
+    stats = dispatcher.stats()
+    assert stats['coalescing']['coalesced'] == 3
+    assert stats['coalescing']['lanes'][LANE] == {'submitted': 5, 'coalesced': 3, 'ratio': 0.6}
+
+
+def test_directional_close_not_coalesced(recorder):
+    dispatcher = _dispatcher(recorder)
+    dispatcher.submit(_signal(0, 'buy'), lane=LANE)
+    assert recorder.started.wait(5)
+    dispatcher.submit(_signal(1, 'close_long'), lane=LANE)
+    dispatcher.submit(_signal(2, 'close_short'), lane=LANE)
+    _drain(dispatcher, recorder)
+
+    assert recorder.executed == [0, 1, 2]
+    assert recorder.coalesced == []
+
+
+def test_target_replaces_pending_directional_close(recorder):
+    dispatcher = _dispatcher(recorder)
+    dispatcher.submit(_signal(0, 'buy'), lane=LANE)
+    assert recorder.started.wait(5)
+    dispatcher.submit(_signal(1, 'close_long'), lane=LANE)
+    dispatcher.submit(_signal(2, 'sell'), lane=LANE)
+    _drain(dispatcher, recorder)
+
+    assert recorder.executed == [0, 2]
+    assert recorder.coalesced == [(1, 2)]
+
+
+def test_lanes_independent(recorder):
+    dispatcher = _dispatcher(recorder, workers=1)
+    dispatcher.submit(_signal(0, 'buy'), lane=LANE)
+    assert recorder.started.wait(5)
+    dispatcher.submit(_signal(1, 'buy', 'ETHUSDT'), lane='ETH-USDT-SWAP')
+    dispatcher.submit(_signal(2, 'sell'), lane=LANE)
+    _drain(dispatcher, recorder)
+
+    assert sorted(recorder.executed) == [0, 1, 2]
+    assert recorder.coalesced == []
+
+
+def test_close_runs_before_open(recorder):
+    dispatcher = _dispatcher(recorder, workers=1)
+    dispatcher.submit(_signal(0, 'buy'), lane=LANE)
+    assert recorder.started.wait(5)
+    dispatcher.submit(_signal(1, 'buy', 'ETHUSDT'), lane='ETH-USDT-SWAP')
+    dispatcher.submit(_signal(2, 'close', 'SOLUSDT'), lane='SOL-USDT-SWAP')
+    _drain(dispatcher, recorder)
+
+    assert recorder.executed == [0, 2, 1]
+
+
+def test_coalesce_window_merges_first_signal(recorder):
+    recorder.gate.set()
+    dispatcher = _dispatcher(recorder, coalesce_window=0.2)
+    dispatcher.submit(_signal(0, 'buy'), lane=LANE)
+    dispatcher.submit(_signal(1, 'sell'), lane=LANE)
+    dispatcher.submit(_signal(2, 'buy'), lane=LANE)
+    time.sleep(0.05)
+    assert recorder.executed == []
+
+    deadline = time.monotonic() + 5
+    while not recorder.executed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    dispatcher.shutdown(wait=True, timeout=5)
+    assert recorder.executed == [2]
+    assert recorder.coalesced == [(0, 1), (1, 2)]
+
+
+def test_full_queue_rejects_after_coalescing(recorder):
+    dispatcher = _dispatcher(recorder, workers=1, max_queue=2)
+    dispatcher.submit(_signal(0, 'buy'), lane=LANE)
+    assert recorder.started.wait(5)
+    assert dispatcher.submit(_signal(1, 'close_long'), lane=LANE)
+    assert not dispatcher.submit(_signal(2, 'close_short'), lane=LANE)
+    # 替换排队中的信号后不占用额外容量
+    assert dispatcher.submit(_signal(3, 'sell'), lane=LANE)
+    _drain(dispatcher, recorder)
+
+    assert recorder.executed == [0, 3]
+    assert dispatcher.stats()['rejected'] == 1
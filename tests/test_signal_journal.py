@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""信号日志：分段切换后的重启补执行"""
+
+import os
+
+import pytest
+
+from signal_journal import SignalJournal, SEGMENT_PREFIX
+
+
+def _roll(journal):
+    """强制切换到新分段"""
+    with journal._lock:
+        journal._roll()
+
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith(SEGMENT_PREFIX))
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / 'journal')
+
+
+def _reopen(journal, directory):
+    journal.close()
+    return SignalJournal(directory, fsync_interval=0)
+
+
+def test_completed_across_segments_not_replayed(directory):
+    journal = SignalJournal(directory, fsync_interval=0)
+    a = journal.append({'symbol': 'A'})
+    _roll(journal)
+    b = journal.append({'symbol': 'B'})
+    journal.complete(a)
+    journal.complete(b)
+
+    journal = _reopen(journal, directory)
+    assert journal.pending() == []
+    journal.close()
+
+
+def test_newer_segment_kept_while_older_has_pending(directory):
+    """较新分段中保存着较旧分段信号的结束记录，不能先于较旧分段删除"""
+    journal = SignalJournal(directory, fsync_interval=0)
+    a = journal.append({'symbol': 'A'})
+    c = journal.append({'symbol': 'C'})
+    _roll(journal)
+    journal.complete(a)
+    _roll(journal)
+    assert len(_segments(directory)) == 3
+
+    journal = _reopen(journal, directory)
+    assert [entry['id'] for entry in journal.pending()] == [c]
+    journal.complete(c)
+
+    journal = _reopen(journal, directory)
+    assert journal.pending() == []
+    # 全部结束后只保留当前分段
+    assert len(_segments(directory)) == 1
+    journal.close()
+
+
+def test_replay_keeps_arrival_order(directory):
+    journal = SignalJournal(directory, fsync_interval=0)
+    ids = []
+    for index in range(6):
+        ids.append(journal.append({'n': index}))
+        journal.start(ids[-1])
+        _roll(journal)
+    for entry_id in ids[::2]:
+        journal.complete(entry_id)
+
+    journal = _reopen(journal, directory)
+    pending = journal.pending()
+    assert [entry['signal']['n'] for entry in pending] == [1, 3, 5]
+    assert all(entry['started'] for entry in pending)
+    journal.close()
+
+
+def test_ids_not_reused_after_old_segments_removed(directory):
+    journal = SignalJournal(directory, fsync_interval=0)
+    a = journal.append({'symbol': 'A'})
+    _roll(journal)
+    journal.complete(a)
+
+    journal = _reopen(journal, directory)
+    b = journal.append({'symbol': 'B'})
+    assert b > a
+
+    journal = _reopen(journal, directory)
+    assert [entry['signal'] for entry in journal.pending()] == [{'symbol': 'B'}]
+    journal.close()
+
+
+def test_size_based_roll(directory):
+    journal = SignalJournal(directory, segment_bytes=1, fsync_interval=0)
+    ids = [journal.append({'n': index}) for index in range(5)]
+    for entry_id in reversed(ids[1:]):
+        journal.complete(entry_id)
+
+    journal = _reopen(journal, directory)
+    assert [entry['signal']['n'] for entry in journal.pending()] == [0]
+    journal.close()
+
+
+def test_torn_record_ignored(directory):
+    journal = SignalJournal(directory, fsync_interval=0)
+    journal.append({'symbol': 'A'})
+    journal.close()
+    path = os.path.join(directory, _segments(directory)[-1])
+    with open(path, 'ab') as f:
+        f.write(b'deadbeef {"t":"d","id":1')
+
+    journal = SignalJournal(directory, fsync_interval=0)
+    assert journal.corrupt == 1
+    assert [entry['signal'] for entry in journal.pending()] == [{'symbol': 'A'}]
+    journal.close()
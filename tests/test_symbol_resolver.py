@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""交易对解析：TradingView的各种写法 -> OKX合约ID"""
+
+import pytest
+
+from instruments import InstrumentIndex
+from symbol_resolver import SymbolResolver
+
+INST_IDS = ('BTC-USDT-SWAP', 'ETH-USDT-SWAP', 'BTC-USD-SWAP', 'SOL-USDT-SWAP', 'PEPE-USDT-SWAP')
+
+
+def _index(inst_ids=INST_IDS):
+    index = InstrumentIndex(client=None)
+    index.load([{'instId': inst_id, 'ctVal': '1', 'lotSz': '1', 'minSz': '1', 'tickSz': '0.1'}
+                for inst_id in inst_ids])
+    return index
+
+
+@pytest.fixture
+def resolver():
+    return SymbolResolver(_index(), ['BTC-USDT-SWAP', 'ETH-USDT-SWAP', 'SOL-USDT-SWAP'])
+
+
+@pytest.mark.parametrize('symbol, expected', [
+    ('BTCUSDT', 'BTC-USDT-SWAP'),
+    ('BINANCE:BTCUSDT', 'BTC-USDT-SWAP'),
+    ('BINANCEBTCUSDT', 'BTC-USDT-SWAP'),   # Pine 中去掉冒号的 tickerid
+    ('BTCUSDT.P', 'BTC-USDT-SWAP'),
+    ('BYBIT:ETHUSDT.P', 'ETH-USDT-SWAP'),
+    ('ETH/USDT', 'ETH-USDT-SWAP'),
+    (' solusdtperp ', 'SOL-USDT-SWAP'),
+    ('BTC-USDT-SWAP', 'BTC-USDT-SWAP'),
+    ('BTCUSD', 'BTC-USDT-SWAP'),           # BTC-USD-SWAP 不可交易：可交易的合约优先
+    ('BTC-USD', 'BTC-USDT-SWAP'),
+    ('ETHUSD', 'ETH-USDT-SWAP'),           # 没有 ETH-USD-SWAP 时近似为 USDT
+])
+def test_resolve(resolver, symbol, expected):
+    assert resolver.resolve(symbol) == expected
+
+
+@pytest.mark.parametrize('symbol', ['DOGEUSDT', 'NASDAQ:AAPL', 'BINANCE:', ''])
+def test_unknown_symbol_rejected(resolver, symbol):
+    assert resolver.resolve(symbol) is None
+    assert resolver.stats()['rejections'] == 1
+
+
+def test_exact_quote_preferred_when_both_supported():
+    resolver = SymbolResolver(_index(), ['BTC-USDT-SWAP', 'BTC-USD-SWAP'])
+    assert resolver.resolve('BTCUSD') == 'BTC-USD-SWAP'
+    assert resolver.resolve('BTCUSDT') == 'BTC-USDT-SWAP'
+
+
+def test_resolvable_but_not_supported(resolver):
+    # 合约存在但不在 SUPPORTED_SYMBOLS 中：可以解析，风控检查不允许交易
+    assert resolver.resolve('PEPEUSDT') == 'PEPE-USDT-SWAP'
+    assert not resolver.is_supported('PEPE-USDT-SWAP')
+    assert resolver.is_supported('BTC-USDT-SWAP')
+
+
+def test_normalized_results_cached(resolver):
+    resolver.resolve('BINANCE:BTCUSDT')
+    resolver.resolve('BINANCE:BTCUSDT')
+    resolver.resolve('BTCUSDT')
+    stats = resolver.stats()
+    assert (stats['misses'], stats['cache_hits'], stats['hits']) == (1, 1, 1)
+
+
+def test_cache_bounded():
+    resolver = SymbolResolver(_index(), ['BTC-USDT-SWAP'], cache_size=2)
+    for symbol in ('X1', 'X2', 'X3'):
+        resolver.resolve(symbol)
+    assert resolver.stats()['cached'] == 2
+
+
+def test_rebuilt_after_instrument_refresh():
+    index = _index(('BTC-USDT-SWAP',))
+    resolver = SymbolResolver(index, ['BTC-USDT-SWAP', 'ETH-USDT-SWAP'])
+    assert resolver.resolve('ETHUSDT') is None
+    index.load([{'instId': inst_id, 'ctVal': '1', 'lotSz': '1', 'minSz': '1', 'tickSz': '0.1'}
+                for inst_id in ('BTC-USDT-SWAP', 'ETH-USDT-SWAP')])
+    # 刷新后缓存中的"无法识别"结果作废
+    assert resolver.resolve('ETHUSDT') == 'ETH-USDT-SWAP'
+    assert resolver.is_supported('ETH-USDT-SWAP')
+
+
+def test_supported_list_used_before_instruments_load():
+    resolver = SymbolResolver(InstrumentIndex(client=None), ['BTC-USDT-SWAP'])
+    assert resolver.resolve('BINANCE:BTCUSDT') == 'BTC-USDT-SWAP'
+    assert resolver.is_supported('BTC-USDT-SWAP')
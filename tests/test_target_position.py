@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""目标仓位：同一交易对连续的反向信号按下单后的仓位计算"""
+
+import json
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from exposure_ledger import ExposureLedger
+from instruments import InstrumentIndex
+from leverage_cache import LeverageCache
+from okx_trader import OKXTrader
+from okx_ws_state import AccountStateMirror
+
+SYMBOL = 'BTC-USDT-SWAP'
+SPEC = {'instId': SYMBOL, 'ctVal': '0.01', 'lotSz': '0.01', 'minSz': '0.01', 'tickSz': '0.1'}
+
+
+class StubIO:
+    """同步执行的 AsyncLoopThread 替身（杠杆请求直接返回成功）"""
+
+    def submit(self, coroutine):
+        if coroutine is not None:
+            coroutine.close()
+        future = Future()
+        future.set_result({'success': True})
+        return future
+
+
+class StubRisk:
+    def current_day(self):
+        return 20240614
+
+    def reserve(self, symbol, notional, orders):
+        return None
+
+    def finish(self, symbol, notional, orders, success, day=None):
+        pass
+
+
+def _trader(pos_mode='net_mode'):
+    """不连接交易所的 OKXTrader：持仓来自镜像，下单只记录参数"""
+    trader = object.__new__(OKXTrader)
+    trader.io = StubIO()
+    trader.state = AccountStateMirror(client=type('Client', (), {'flag': '1'})(), loop_thread=None)
+    trader.state._synced = True
+    trader.state._last_message = time.monotonic()
+    trader.instruments = InstrumentIndex(client=None)
+    trader.instruments.load([SPEC])
+    trader.exposure = ExposureLedger(trader.instruments)
+    trader.state.add_listener(trader.exposure.apply_positions)
+    trader.leverage_cache = LeverageCache()
+    trader.risk = StubRisk()
+    trader._pos_mode = pos_mode
+    trader._risk_check = lambda *args, **kwargs: {'success': True}
+    trader._set_leverage_async = lambda *args: None
+    trader.orders = []
+
+    def place_order(symbol, side, amount, **kwargs):
+        trader.orders.append((side, amount))
+        return {'success': True, 'order_id': str(len(trader.orders))}
+
+    def place_batch_orders(orders):
+        trader.orders.extend((order['side'], order['sz']) for order in orders)
+        return {'success': True, 'orders': [{'success': True, 'order_id': str(len(trader.orders))}] * len(orders)}
+
+    trader.place_order = place_order
+    trader.place_batch_orders = place_batch_orders
+    return trader
+
+
+def _push(mirror, pos, u_time, pos_side='net'):
+    mirror.handle_message(json.dumps({
+        'arg': {'channel': 'positions', 'instType': 'SWAP'},
+        'data': [{'instId': SYMBOL, 'posSide': pos_side, 'pos': pos, 'uTime': str(u_time)}]
+    }))
+
+
+def test_back_to_back_flip_before_fill_push():
+    trader = _trader()
+    assert trader.set_target_position(SYMBOL, 0.05, price=60000)['success']
+    # 成交推送尚未到达，紧接着的反向信号应从 +5 张反手到 -5 张
+    result = trader.set_target_position(SYMBOL, -0.05, price=60000)
+    assert result['success']
+    assert result['previous'] == 5.0
+    assert trader.orders == [('buy', '5'), ('sell', '10')]
+    assert trader.state.get_position(SYMBOL, 'net')['pos'] == '-5'
+
+
+def test_stale_push_does_not_revert_mirror():
+    trader = _trader()
+    before = int(time.time() * 1000) - 5000
+    trader.set_target_position(SYMBOL, 0.05, price=60000)
+    # 下单前的仓位（uTime 早于下单）在成交推送之前到达，忽略
+    _push(trader.state, '0', before)
+    assert trader.state.get_position(SYMBOL, 'net')['pos'] == '5'
+    assert trader.exposure.symbol_value(SYMBOL) == (3000.0, 3000.0)
+
+    trader.set_target_position(SYMBOL, 0.05, price=60000)
+    assert trader.orders == [('buy', '5')]
+
+
+def test_fill_push_takes_over():
+    trader = _trader()
+    trader.set_target_position(SYMBOL, 0.05, price=60000)
+    # 成交推送（部分成交 4 张）以交易所为准
+    _push(trader.state, '4', int(time.time() * 1000) + 1)
+    assert trader.state.get_position(SYMBOL, 'net')['pos'] == '4'
+    trader.set_target_position(SYMBOL, 0.05, price=60000)
+    assert trader.orders == [('buy', '5'), ('buy', '1')]
+
+
+def test_hedge_mode_flip():
+    trader = _trader('long_short_mode')
+    trader.set_target_position(SYMBOL, 0.03, price=60000)
+    trader.set_target_position(SYMBOL, -0.02, price=60000)
+    # 双向持仓：先平多 3 张，再开空 2 张
+    assert trader.orders == [('buy', '3'), ('sell', '3'), ('sell', '2')]
+    assert trader.state.get_position(SYMBOL, 'long') is None
+    assert trader.state.get_position(SYMBOL, 'short')['pos'] == '2'
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""webhook请求体解码为 Signal"""
+
+import json
+
+import pytest
+
+from trade_signal import Signal, SignalDecodeError, decode_signal
+
+PINE_ALERT = {
+    'action': 'buy', 'symbol': 'BINANCEBTCUSDT', 'price': 65000, 'size': 0.015,
+    'leverage': 10, 'stop_loss': 63700, 'take_profit': 66000, 'timestamp': '1718323200000'
+}
+
+
+def _decode(**fields):
+    data = dict(PINE_ALERT, **fields)
+    return decode_signal(json.dumps({k: v for k, v in data.items() if v is not ...}).encode('utf-8'))
+
+
+def test_pine_alert():
+    signal = _decode()
+    assert isinstance(signal, Signal)
+    assert (signal.action, signal.symbol, signal.price, signal.size) == ('buy', 'BINANCEBTCUSDT', 65000.0, 0.015)
+    assert (signal.leverage, signal.stop_loss, signal.take_profit) == (10, 63700.0, 66000.0)
+    assert signal.timestamp == '1718323200000'
+    assert signal.reduce_only is False
+
+
+def test_optional_fields_default():
+    signal = _decode(leverage=..., stop_loss=..., take_profit=..., timestamp=...)
+    assert (signal.leverage, signal.stop_loss, signal.take_profit, signal.timestamp) == (10, 0.0, 0.0, '')
+
+
+def test_loose_types_converted():
+    signal = _decode(action=' SELL ', price='65000.5', size='0.02', leverage='5', reduce_only='true')
+    assert (signal.action, signal.price, signal.size, signal.leverage) == ('sell', 65000.5, 0.02, 5)
+    assert signal.reduce_only is True
+
+
+@pytest.mark.parametrize('timestamp, expected', [
+    ('1718323200000', '1718323200000'),
+    ('2024-06-14T00:00:00Z', '2024-06-14T00:00:00Z'),   # TradingView {{timenow}}
+    (1718323200000, '1718323200000'),
+])
+def test_timestamp_kept_as_text(timestamp, expected):
+    assert _decode(timestamp=timestamp).timestamp == expected
+
+
+def test_missing_fields_listed():
+    with pytest.raises(SignalDecodeError, match=r"缺少必要字段: \['price', 'size'\]"):
+        _decode(price=..., size=...)
+
+
+@pytest.mark.parametrize('fields, message', [
+    ({'size': 'abc'}, '字段 size 不是有效数字'),
+    ({'size': [1]}, '字段 size 不是有效数字'),
+    ({'size': -1}, '字段 size 超出范围'),
+    ({'price': 'inf'}, '字段 price 超出范围'),
+    ({'leverage': 2.5}, '字段 leverage 必须是整数'),
+    ({'action': 'hold'}, '不支持的交易动作'),
+    ({'action': 'close'}, '不支持的交易动作'),
+    ({'symbol': '  '}, '交易对不能为空'),
+    ({'timestamp': {'t': 1}}, '字段 timestamp 必须是字符串'),
+])
+def test_schema_errors(fields, message):
+    with pytest.raises(SignalDecodeError, match=message):
+        _decode(**fields)
+
+
+@pytest.mark.parametrize('raw', [b'', b'not json', b'[1, 2]', b'"buy"', b'\xff\xfe'])
+def test_invalid_body(raw):
+    with pytest.raises(SignalDecodeError):
+        decode_signal(raw)
+
+
+def test_round_trip_excludes_transient_fields():
+    signal = _decode()
+    signal.inst_id, signal.client_id, signal.journal_id, signal.trace = 'BTC-USDT-SWAP', 'abc', 7, object()
+    data = signal.to_dict()
+    assert 'trace' not in data
+    restored = Signal.from_dict(json.loads(json.dumps(data)))
+    assert restored.to_dict() == data
+    assert restored.trace is None
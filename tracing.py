@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+信号追踪 - 每个webhook一个trace，记录从接收到下单完成的各个span
+
+功能特点：
+1. 每个webhook请求生成 trace_id（随响应返回），日志行带上 [trace_id]，同一信号的日志可以直接过滤
+2. trace 通过 contextvars 传递：webhook线程 -> 调度器工作线程（随Signal传递）
+   -> 后台事件循环（run_coroutine_threadsafe 会复制调用方的上下文），OKX每次请求都记录为span
+3. span() 同时记录 metrics 的阶段延迟直方图，一处埋点两份数据
+4. 完成的 trace 保存在固定大小的环形缓冲区中，可按ID查询或找出最慢的trace
+
+使用方法：
+    trace = tracer.start('webhook', symbol='BTCUSDT')
+    with tracer.activate(trace), span('parse'):
+        ...
+    tracer.finish(trace, 'ok')
+"""
+
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import metrics
+
+# 单个trace最多记录的span数量（防止异常情况下无限增长）
+MAX_SPANS = 256
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+_span_depth = contextvars.ContextVar('span_depth', default=0)
+
+
+class Trace:
+    """一次信号处理的追踪记录"""
+
+    __slots__ = ('trace_id', 'name', 'attrs', 'started_at', 'started', 'spans', 'duration',
+                 'status', 'enqueued_at', 'dropped_spans')
+
+    def __init__(self, name, attrs=None):
+        self.trace_id = os.urandom(8).hex()
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.duration = None
+        self.status = 'running'
+        self.enqueued_at = None
+        self.dropped_spans = 0
+
+    def add_span(self, name, started, ended, depth=0, attrs=None, error=None):
+        """记录一个span（started/ended 为 perf_counter 时间）"""
+        if len(self.spans) >= MAX_SPANS:
+            self.dropped_spans += 1
+            return
+        span = {
+            'name': name,
+            'start_ms': round((started - self.started) * 1000, 3),
+            'duration_ms': round((ended - started) * 1000, 3),
+            'depth': depth,
+            'thread': threading.current_thread().name
+        }
+        if attrs:
+            span['attrs'] = attrs
+        if error:
+            span['error'] = error
+        self.spans.append(span)
+
+    def elapsed(self):
+        if self.duration is not None:
+            return self.duration
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'status': self.status,
+            'started_at': self.started_at,
+            'duration_ms': round(self.elapsed() * 1000, 3),
+            'spans': len(self.spans),
+            'attrs': self.attrs
+        }
+
+    def to_dict(self):
+        result = self.summary()
+        result['spans'] = sorted(self.spans, key=lambda span: span['start_ms'])
+        if self.dropped_spans:
+            result['dropped_spans'] = self.dropped_spans
+        return result
+
+
+class Tracer:
+    """trace的创建、上下文传递和环形缓冲区"""
+
+    def __init__(self, capacity=1000):
+        self._lock = threading.Lock()
+        self._finished = deque(maxlen=max(1, int(capacity)))
+        self._index = {}      # trace_id -> Trace（进行中和缓冲区中的）
+        self.started = 0
+        self.finished = 0
+
+    def resize(self, capacity):
+        with self._lock:
+            self._finished = deque(self._finished, maxlen=max(1, int(capacity)))
+
+    def start(self, name, **attrs):
+        trace = Trace(name, attrs)
+        with self._lock:
+            self._index[trace.trace_id] = trace
+            self.started += 1
+        return trace
+
+    @contextlib.contextmanager
+    def activate(self, trace):
+        """在当前线程（上下文）中激活trace，之后的span都记录到该trace"""
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    def finish(self, trace, status='ok'):
+        """结束trace并放入环形缓冲区（重复调用无效）"""
+        if trace is None or trace.duration is not None:
+            return
+        trace.duration = time.perf_counter() - trace.started
+        trace.status = status
+        with self._lock:
+            if len(self._finished) == self._finished.maxlen:
+                evicted = self._finished[0]
+                self._index.pop(evicted.trace_id, None)
+            self._finished.append(trace)
+            self.finished += 1
+
+    def get(self, trace_id):
+        with self._lock:
+            return self._index.get(trace_id)
+
+    def slowest(self, count=10):
+        with self._lock:
+            traces = list(self._finished)
+        traces.sort(key=lambda trace: trace.duration, reverse=True)
+        return traces[:count]
+
+    def recent(self, count=20):
+        with self._lock:
+            traces = list(self._finished)[-count:]
+        return list(reversed(traces))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'started': self.started,
+                'finished': self.finished,
+                'in_flight': len(self._index) - len(self._finished),
+                'buffered': len(self._finished),
+                'capacity': self._finished.maxlen
+            }
+
+
+tracer = Tracer()
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def record_span(name, started, ended, error=None, **attrs):
+    """把一段已经计时的操作记录到当前trace（不记录metrics），没有trace时忽略"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, started, ended, _span_depth.get(), attrs or None, error)
+
+
+@contextlib.contextmanager
+def span(stage, **attrs):
+    """计时一个处理阶段：记录 metrics 阶段延迟，并在有trace时记录span"""
+    trace = _current_trace.get()
+    depth = _span_depth.get()
+    token = _span_depth.set(depth + 1)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        ended = time.perf_counter()
+        _span_depth.reset(token)
+        metrics.observe(stage, ended - started)
+        if trace is not None:
+            trace.add_span(stage, started, ended, depth, attrs or None, error)
+
+
+def traced(stage):
+    """span() 的装饰器形式（同步函数）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TraceLogFilter(logging.Filter):
+    """给日志记录加上 trace_id 字段（格式中使用 %(trace_id)s）"""
+
+    def filter(self, record):
+        trace = _current_trace.get()
+        record.trace_id = trace.trace_id if trace is not None else '-'
+        return True
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+交易信号解码 - 原始请求体 -> Signal 对象
+
+功能特点：
+1. 直接解析原始bytes（不先decode成str），安装了 orjson 时自动使用
+2. 按字段表（_SCHEMA）一次遍历完成取值、类型转换和校验
+3. Signal 使用 __slots__，字段固定、占用内存小，后续处理不再重复 float()/int() 转换
+4. 所有错误都抛出 SignalDecodeError，消息可直接返回给调用方
+
+信号格式（Pine策略发送）：
+    {"action":"buy","symbol":"BINANCEBTCUSDT","price":65000,"size":0.015,
+     "leverage":10,"stop_loss":63700,"take_profit":66000,"timestamp":"1718323200000"}
+"""
+
+import json
+import math
+
+try:
+    import orjson
+    _loads = orjson.loads
+    _DECODE_ERRORS = (orjson.JSONDecodeError,)
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+    _loads = json.loads
+    _DECODE_ERRORS = (ValueError,)  # 包含 JSONDecodeError 和 UnicodeDecodeError
+
+OPEN_ACTIONS = ('buy', 'sell')
+ACTIONS = frozenset(OPEN_ACTIONS)
+
+# 字段表中表示"必填"的缺省值
+_REQUIRED = object()
+
+
+class SignalDecodeError(ValueError):
+    """信号格式错误（请求体不是合法JSON、缺少字段或字段类型错误）"""
+
+
+# 转换函数的第一个分支处理Pine策略实际发送的类型，其余写法走较慢的通用分支
+
+def _action(value, name):
+    action = value.lower() if type(value) is str else str(value).strip().lower()
+    if action not in ACTIONS:
+        action = action.strip()
+        if action not in ACTIONS:
+            raise SignalDecodeError(f"不支持的交易动作: {value}")
+    return action
+
+
+def _text(value, name):
+    if type(value) is str:
+        return value.strip()
+    if isinstance(value, (dict, list)):
+        raise SignalDecodeError(f"字段 {name} 必须是字符串: {value!r}")
+    return str(value).strip()
+
+
+def _symbol(value, name):
+    symbol = _text(value, name)
+    if not symbol:
+        raise SignalDecodeError("交易对不能为空")
+    return symbol
+
+
+def _float(value, name):
+    value_type = type(value)
+    if value_type is float or value_type is int:
+        number = float(value)
+    elif value_type is str:
+        try:
+            number = float(value)
+        except ValueError:
+            raise SignalDecodeError(f"字段 {name} 不是有效数字: {value!r}") from None
+    else:
+        raise SignalDecodeError(f"字段 {name} 不是有效数字: {value!r}")
+    if not 0 <= number < math.inf:
+        raise SignalDecodeError(f"字段 {name} 超出范围: {value!r}")
+    return number
+
+
+def _int(value, name):
+    if type(value) is int and value >= 0:
+        return value
+    number = _float(value, name)
+    if number != int(number):
+        raise SignalDecodeError(f"字段 {name} 必须是整数: {value!r}")
+    return int(number)
+
+
+def _bool(value, name):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+# 字段表: (字段名, 转换函数, 缺省值)，顺序与 Signal.__slots__ 一致
+_SCHEMA = (
+    ('action', _action, _REQUIRED),
+    ('symbol', _symbol, _REQUIRED),
+    ('price', _float, _REQUIRED),
+    ('size', _float, _REQUIRED),
+    ('leverage', _int, 10),
+    ('stop_loss', _float, 0.0),
+    ('take_profit', _float, 0.0),
+    ('timestamp', _text, ''),
+    ('strategy', _text, ''),
+    ('reduce_only', _bool, False),
+)
+
+REQUIRED_FIELDS = tuple(name for name, _, default in _SCHEMA if default is _REQUIRED)
+
+
+class Signal:
+    """解码后的交易信号"""
+
+    __slots__ = tuple(name for name, _, _ in _SCHEMA) + ('inst_id', 'client_id', 'journal_id', 'trace')
+
+    # 只在进程内使用、不写入信号日志的字段
+    _TRANSIENT = ('trace',)
+
+    def __init__(self, action, symbol, price, size, leverage=10, stop_loss=0.0, take_profit=0.0,
+                 timestamp='', strategy='', reduce_only=False, inst_id=None, client_id=None, journal_id=None,
+                 trace=None):
+        self.action = action
+        self.symbol = symbol
+        self.price = price
+        self.size = size
+        self.leverage = leverage
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.timestamp = timestamp
+        self.strategy = strategy
+        self.reduce_only = reduce_only
+        self.inst_id = inst_id      # 解析后的OKX合约ID，由webhook入口填写
+        self.client_id = client_id  # clOrdId前缀（由去重键派生），由webhook入口填写
+        self.journal_id = journal_id  # 信号日志ID，由webhook入口填写
+        self.trace = trace          # tracing.Trace，随信号传到调度器工作线程
+
+    def get(self, name, default=None):
+        """与dict相同的读取方式（调度器等按字段名读取信号）"""
+        return getattr(self, name, default)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name not in self._TRANSIENT}
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 to_dict() 的结果重建（用于信号日志重放，字段已校验过）"""
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data and name not in cls._TRANSIENT})
+
+    def __repr__(self):
+        return (f"Signal({self.action} {self.symbol} size={self.size} price={self.price} "
+                f"lev={self.leverage} sl={self.stop_loss} tp={self.take_profit})")
+
+
+def decode_signal(raw):
+    """
+    把webhook请求体（bytes/str）解码为 Signal
+    格式错误时抛出 SignalDecodeError
+    """
+    try:
+        data = _loads(raw)
+    except _DECODE_ERRORS as e:
+        raise SignalDecodeError(f"JSON解析失败: {e}") from None
+    if not isinstance(data, dict):
+        raise SignalDecodeError("信号必须是JSON对象")
+
+    values = []
+    for name, convert, default in _SCHEMA:
+        value = data.get(name)
+        if value is not None:
+            values.append(convert(value, name))
+        elif default is _REQUIRED:
+            missing = [field for field in REQUIRED_FIELDS if data.get(field) is None]
+            raise SignalDecodeError(f"缺少必要字段: {missing}")
+        else:
+            values.append(default)
+    return Signal(*values)
@@ -9,35 +9,67 @@ TradingView Webhook服务器 - 对接OKX合约交易
 创建日期: 2024-06-14
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import json
 import hmac
 import hashlib
 import logging
 from datetime import datetime
-import threading
 import time
 from okx_trader import OKXTrader
+from signal_dispatcher import SignalDispatcher, TARGET_ACTIONS
+from trade_signal import Signal, decode_signal, SignalDecodeError
+from signal_dedupe import SignalDedupe, signal_key, client_order_id
+from signal_journal import SignalJournal
+from metrics import metrics
+from tracing import tracer, span, TraceLogFilter
+from process_locks import SymbolLocks, claim_directory, claim_singleton
+from indicator_engine import SignalEngine
+from okx_candle_stream import CandleStream
 from config import Config
 import os
 
 # 设置日志
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(levelname)s - [%(trace_id)s] %(message)s',
     handlers=[
         logging.FileHandler('webhook.log', encoding='utf-8'),
         logging.StreamHandler()
     ]
 )
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(TraceLogFilter())
 logger = logging.getLogger(__name__)
 
+# 最近完成的trace保存在环形缓冲区中（/traces 查询）
+tracer.resize(Config.TRACE_BUFFER_SIZE)
+
 # 创建Flask应用
 app = Flask(__name__)
 
 # 初始化OKX交易器
 okx_trader = OKXTrader()
 
+# 信号去重索引（重复投递的告警在入口直接丢弃）
+signal_dedupe = SignalDedupe(
+    Config.DEDUPE_DB_PATH or None,
+    ttl=Config.DEDUPE_TTL,
+    max_entries=Config.DEDUPE_MAX_ENTRIES
+) if Config.DEDUPE_ENABLED else None
+
+# 信号预写日志（已接收但未执行完的信号在重启后补执行）
+# 多worker部署时每个进程独占一个日志目录，进程重启后由新进程接管并补执行
+signal_journal = SignalJournal(
+    claim_directory(Config.JOURNAL_DIR),
+    segment_bytes=Config.JOURNAL_SEGMENT_BYTES,
+    fsync_interval=Config.JOURNAL_FSYNC_INTERVAL_MS / 1000,
+    sync_ack=Config.JOURNAL_SYNC_ACK
+) if Config.JOURNAL_ENABLED else None
+
+# 跨进程交易对锁：多个worker进程时同一交易对同一时间只由一个进程执行
+symbol_locks = SymbolLocks(Config.LOCK_DIR)
+
 # 请求验证函数
 def verify_webhook_signature(payload, signature, secret):
     """
@@ -67,68 +99,144 @@ def health_check():
 def receive_webhook():
     """
     接收TradingView webhook信号的主要处理函数
+    每个请求一个trace，trace_id 随响应返回，可通过 /traces/<trace_id> 查看处理过程
+    """
+    trace = tracer.start('webhook')
+    with tracer.activate(trace), span('ack'):
+        payload, status_code = handle_webhook(trace)
+    payload['trace_id'] = trace.trace_id
+    if trace.enqueued_at is None:
+        # 未进入队列（校验失败、重复信号等），trace到此结束；入队的信号由工作线程结束trace
+        trace.attrs['http_status'] = status_code
+        tracer.finish(trace, payload.get('status', 'error'))
+    return jsonify(payload), status_code
+
+def handle_webhook(trace):
+    """
+    校验、解码并提交信号，返回 (响应内容, HTTP状态码)
     """
     try:
         # 获取原始数据
-        raw_data = request.get_data()
+        with span('body_read'):
+            raw_data = request.get_data()
         logger.info(f"收到webhook请求，数据长度: {len(raw_data)} bytes")
         
         # 验证签名（如果配置了密钥）
-        signature = request.headers.get('X-TradingView-Signature', '')
-        if Config.WEBHOOK_SECRET and not verify_webhook_signature(raw_data, signature, Config.WEBHOOK_SECRET):
+        with span('signature'):
+            signature = request.headers.get('X-TradingView-Signature', '')
+            verified = not Config.WEBHOOK_SECRET or verify_webhook_signature(raw_data, signature, Config.WEBHOOK_SECRET)
+        if not verified:
             logger.warning("Webhook签名验证失败")
-            return jsonify({'error': '签名验证失败'}), 401
+            return {'error': '签名验证失败'}, 401
         
-        # 解析JSON数据
+        # 解码信号（直接解析原始bytes，一次完成字段校验和类型转换）
         try:
-            signal_data = json.loads(raw_data.decode('utf-8'))
-            logger.info(f"解析webhook信号: {signal_data}")
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON解析失败: {e}")
-            return jsonify({'error': 'Invalid JSON'}), 400
-        
-        # 验证必要字段
-        required_fields = ['action', 'symbol', 'price', 'size']
-        missing_fields = [field for field in required_fields if field not in signal_data]
-        if missing_fields:
-            logger.error(f"缺少必要字段: {missing_fields}")
-            return jsonify({'error': f'缺少必要字段: {missing_fields}'}), 400
-        
-        # 异步处理交易信号
-        threading.Thread(
-            target=process_trading_signal,
-            args=(signal_data,),
-            daemon=True
-        ).start()
+            with span('parse'):
+                signal = decode_signal(raw_data)
+            logger.info(f"解析webhook信号: {signal}")
+        except SignalDecodeError as e:
+            logger.error(f"信号格式错误: {e}")
+            return {'error': str(e)}, 400
         
-        return jsonify({
-            'status': 'received',
-            'message': '信号已接收，正在处理',
-            'timestamp': datetime.now().isoformat()
-        })
+        # 异步处理交易信号（放入有界优先级队列，由固定工作线程执行）
+        # 按OKX交易对分通道：同一交易对按顺序执行，不同交易对并行执行
+        signal.inst_id = convert_symbol_format(signal.symbol)
+        trace.attrs.update(action=signal.action, symbol=signal.symbol, inst_id=signal.inst_id)
+        if signal.inst_id is None:
+            logger.error(f"无法识别的交易对: {signal.symbol}")
+            return {'error': f"无法识别的交易对: {signal.symbol}"}, 400
+        
+        return submit_signal(signal, trace)
         
     except Exception as e:
         logger.error(f"webhook处理异常: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        return {'error': str(e)}, 500
+
+def submit_signal(signal, trace):
+    """
+    去重、写入信号日志并提交到调度器（signal.inst_id 已解析），返回 (响应内容, HTTP状态码)
+    webhook信号和K线推送生成的信号共用这一路径
+    """
+    # 去重：同一 (交易对, 动作, timestamp, 策略ID) 只执行一次，订单ID由同一个键派生
+    key = signal_key(signal)
+    signal.client_id = client_order_id(key) if key else None
+    if signal_dedupe is not None and not signal_dedupe.check(key):
+        logger.info(f"重复信号，已忽略: {key}")
+        return {
+            'status': 'duplicate',
+            'message': '重复信号，已忽略',
+            'timestamp': datetime.now().isoformat()
+        }, 200
+    
+    # 先写入预写日志再入队，响应之后进程退出也不会丢失信号
+    if signal_journal is not None:
+        with span('journal_append'):
+            signal.journal_id = signal_journal.append(signal.to_dict())
+    
+    signal.trace = trace
+    trace.attrs['client_id'] = signal.client_id
+    trace.enqueued_at = time.perf_counter()
+    if not dispatcher.submit(signal, lane=signal.inst_id):
+        trace.enqueued_at = None
+        if signal_journal is not None:
+            signal_journal.complete(signal.journal_id, 'rejected')
+        if Config.DISPATCH_QUEUE_FULL == 'reject':
+            # 返回503，TradingView可以重试：去重记录撤销，重试的同一信号不会被当作重复信号
+            if signal_dedupe is not None:
+                signal_dedupe.forget(key)
+            return {'error': '信号队列已满，请稍后重试'}, 503
+        # 默认与入队成功时一样返回200（TradingView看到的响应不变），信号丢弃，
+        # 去重记录保留：重新送达的同一信号也不再执行
+        logger.error(f"信号队列已满，信号已丢弃: {signal}")
+        send_notification(f"❌ 信号队列已满，信号已丢弃: {signal.action} {signal.symbol}")
+        return {
+            'status': 'dropped',
+            'message': '信号队列已满，信号未执行',
+            'timestamp': datetime.now().isoformat()
+        }, 200
+    
+    return {
+        'status': 'received',
+        'message': '信号已接收，正在处理',
+        'timestamp': datetime.now().isoformat()
+    }, 200
 
-def process_trading_signal(signal_data):
+def submit_stream_signal(payload):
+    """
+    K线推送生成的信号（与Pine脚本告警的JSON相同）：按webhook信号同样解码，
+    再经过去重、信号日志和调度器执行（process_trading_signal）
     """
-    处理交易信号的核心函数
+    signal = decode_signal(json.dumps(payload).encode('utf-8'))
+    signal.inst_id = payload['symbol']
+    trace = tracer.start('stream', action=signal.action, symbol=signal.symbol, inst_id=signal.inst_id)
+    with tracer.activate(trace):
+        result, status_code = submit_signal(signal, trace)
+    if trace.enqueued_at is None:
+        trace.attrs['http_status'] = status_code
+        tracer.finish(trace, result.get('status', 'error'))
+        if status_code != 200:
+            logger.error(f"K线信号提交失败: {payload} {result.get('error')}")
+
+def process_trading_signal(signal):
+    """
+    处理交易信号的核心函数（signal 为 trade_signal.Signal，字段已完成类型转换）
+    返回交易结果，信号无效或处理异常时返回None
     """
     try:
-        logger.info(f"开始处理交易信号: {signal_data}")
+        logger.info(f"开始处理交易信号: {signal}")
         
         # 提取信号信息
-        action = signal_data.get('action')  # 'buy' 或 'sell'
-        symbol = signal_data.get('symbol')  # 交易对
-        price = float(signal_data.get('price', 0))
-        size = float(signal_data.get('size', 0))
-        leverage = int(signal_data.get('leverage', 10))
-        stop_loss = float(signal_data.get('stop_loss', 0))
-        take_profit = float(signal_data.get('take_profit', 0))
+        action = signal.action  # 'buy' 或 'sell'
+        size = signal.size
+        leverage = signal.leverage
+        stop_loss = signal.stop_loss
+        take_profit = signal.take_profit
         
-        # 转换交易对格式（TradingView -> OKX）
-        okx_symbol = convert_symbol_format(symbol)
+        # 转换交易对格式（TradingView -> OKX，webhook入口已解析）
+        okx_symbol = signal.inst_id or convert_symbol_format(signal.symbol)
+        if okx_symbol is None:
+            logger.error(f"无法识别的交易对: {signal.symbol}")
+            return
         
         # 验证交易参数
         if not validate_trading_params(action, okx_symbol, size, leverage):
@@ -142,7 +250,9 @@ def process_trading_signal(signal_data):
                 size=size,
                 leverage=leverage,
                 stop_loss=stop_loss if stop_loss > 0 else None,
-                take_profit=take_profit if take_profit > 0 else None
+                take_profit=take_profit if take_profit > 0 else None,
+                client_id=signal.client_id,
+                price=signal.price
             )
         elif action.lower() == 'sell':
             # 开空仓
@@ -151,7 +261,9 @@ def process_trading_signal(signal_data):
                 size=size,
                 leverage=leverage,
                 stop_loss=stop_loss if stop_loss > 0 else None,
-                take_profit=take_profit if take_profit > 0 else None
+                take_profit=take_profit if take_profit > 0 else None,
+                client_id=signal.client_id,
+                price=signal.price
             )
         else:
             logger.error(f"不支持的交易动作: {action}")
@@ -168,6 +280,7 @@ def process_trading_signal(signal_data):
             
             # 发送失败通知（可选）
             send_notification(f"❌ 交易失败: {result.get('error', '未知错误')}")
+        return result
             
     except Exception as e:
         logger.error(f"处理交易信号异常: {str(e)}")
@@ -175,45 +288,11 @@ def process_trading_signal(signal_data):
 
 def convert_symbol_format(tv_symbol):
     """
-    将TradingView符号转换为OKX格式
-    例: BTCUSDT -> BTC-USDT-SWAP
+    将TradingView符号转换为OKX合约ID
+    例: BTCUSDT / BINANCEBTCUSDT / BTCUSDT.P -> BTC-USDT-SWAP
+    无法识别返回None（别名字典基于实时合约列表预先生成，见 symbol_resolver.py）
     """
-    try:
-        # 移除交易所前缀 (如 BINANCE:BTCUSDT -> BTCUSDT)
-        if ':' in tv_symbol:
-            tv_symbol = tv_symbol.split(':')[1]
-        
-        # 如果已经是OKX格式（包含-SWAP后缀），直接返回
-        if '-SWAP' in tv_symbol or '-FUTURES' in tv_symbol:
-            logger.info(f"交易对已是OKX格式: {tv_symbol}")
-            return tv_symbol
-        
-        # 处理常见格式
-        symbol_map = {
-            'BTCUSDT': 'BTC-USDT-SWAP',
-            'ETHUSDT': 'ETH-USDT-SWAP',
-            'ADAUSDT': 'ADA-USDT-SWAP',
-            'SOLUSDT': 'SOL-USDT-SWAP',
-            'DOTUSDT': 'DOT-USDT-SWAP',
-            'LINKUSDT': 'LINK-USDT-SWAP',
-            'LTCUSDT': 'LTC-USDT-SWAP',
-            'BCHUSDT': 'BCH-USDT-SWAP'
-        }
-        
-        if tv_symbol in symbol_map:
-            return symbol_map[tv_symbol]
-        
-        # 通用转换逻辑
-        if tv_symbol.endswith('USDT'):
-            base = tv_symbol[:-4]  # 移除USDT
-            return f"{base}-USDT-SWAP"
-        
-        logger.warning(f"未知交易对格式: {tv_symbol}, 使用原格式")
-        return tv_symbol
-        
-    except Exception as e:
-        logger.error(f"交易对格式转换失败: {e}")
-        return tv_symbol
+    return okx_trader.symbols.resolve(tv_symbol)
 
 def validate_trading_params(action, symbol, size, leverage):
     """
@@ -263,6 +342,159 @@ def send_notification(message):
     except Exception as e:
         logger.error(f"发送通知失败: {e}")
 
+def execute_signal(signal):
+    """调度器工作线程的入口：执行信号，在信号日志中记录执行状态，并结束信号的trace"""
+    trace = signal.trace
+    if trace is not None and trace.enqueued_at is not None:
+        trace.add_span('queue_wait', trace.enqueued_at, time.perf_counter())
+    result = None
+    status = 'error'
+    try:
+        with tracer.activate(trace), span('execute'):
+            with symbol_locks.hold(signal.inst_id or signal.symbol) as handoff:
+                if handoff:
+                    # 上一次由其他worker进程执行，本进程缓存的杠杆可能已经过时
+                    okx_trader.leverage_cache.invalidate(signal.inst_id)
+                if signal_journal is None or signal.journal_id is None:
+                    result = process_trading_signal(signal)
+                else:
+                    signal_journal.start(signal.journal_id)
+                    try:
+                        result = process_trading_signal(signal)
+                    finally:
+                        signal_journal.complete(signal.journal_id)
+        status = 'ok' if result and result.get('success') else 'failed'
+    finally:
+        # 加锁或执行过程中抛出异常时也结束trace（状态为error），不会一直留在进行中的列表里
+        tracer.finish(trace, status)
+
+def supersedes_pending(signal):
+    """
+    该信号是否替换同一交易对中尚未执行的信号
+    buy/sell 给出完整的目标仓位，只执行最后一个与依次执行全部的最终仓位相同
+    """
+    action = (signal.action or '').lower()
+    if action not in TARGET_ACTIONS:
+        return False
+    # 无效的开仓信号不能替换之前的有效信号
+    return validate_trading_params(action, signal.inst_id, signal.size, signal.leverage)
+
+def coalesce_signal(replaced, signal):
+    """信号被同一交易对后到的信号替换：结束其信号日志记录和trace"""
+    if signal_journal is not None and replaced.journal_id is not None:
+        signal_journal.complete(replaced.journal_id, 'coalesced')
+    if replaced.trace is not None:
+        replaced.trace.attrs['coalesced_into'] = signal.trace.trace_id if signal.trace is not None else None
+        tracer.finish(replaced.trace, 'coalesced')
+
+def replay_journal():
+    """
+    启动时重新提交上次未执行完的信号
+    超过 JOURNAL_REPLAY_MAX_AGE 的信号已过时，只记录日志不执行
+    """
+    if signal_journal is None:
+        return 0
+    replayed = 0
+    now = time.time()
+    for entry in signal_journal.pending():
+        age = now - (entry['ts'] or 0)
+        if age > Config.JOURNAL_REPLAY_MAX_AGE:
+            logger.warning(f"信号已过时，不再执行: {entry['signal']} (接收于 {age:.0f} 秒前)")
+            signal_journal.complete(entry['id'], 'expired')
+            continue
+        
+        signal = Signal.from_dict(entry['signal'])
+        signal.journal_id = entry['id']
+        signal.trace = tracer.start('replay', action=signal.action, symbol=signal.symbol,
+                                    inst_id=signal.inst_id, journal_id=entry['id'])
+        signal.trace.enqueued_at = time.perf_counter()
+        logger.info(f"重新提交未完成的信号: {signal}"
+                    + (" (上次执行中断)" if entry['started'] else ''))
+        if dispatcher.submit(signal, lane=signal.inst_id):
+            replayed += 1
+        else:
+            tracer.finish(signal.trace, 'rejected')
+            # 保留在日志中，下次启动再处理
+            logger.error(f"重新提交信号失败（队列已满）: {signal}")
+    return replayed
+
+def shutdown_server(timeout=10):
+    """
+    优雅退出：等待已入队的信号执行完，再关闭信号日志和去重索引
+    超时未执行完的信号保留在日志中，下次启动补执行
+    """
+    logger.info("正在停止信号处理...")
+    if candle_stream is not None:
+        candle_stream.stop()
+    dispatcher.shutdown(wait=True, timeout=timeout)
+    if signal_journal is not None:
+        signal_journal.close()
+    if signal_dedupe is not None:
+        signal_dedupe.close()
+
+# 初始化信号调度器
+dispatcher = SignalDispatcher(
+    execute_signal,
+    workers=Config.DISPATCH_WORKERS,
+    max_queue=Config.DISPATCH_QUEUE_SIZE,
+    wait_observer=lambda wait: metrics.observe('queue_wait', wait),
+    supersedes=supersedes_pending if Config.DISPATCH_COALESCE else None,
+    on_coalesced=coalesce_signal,
+    coalesce_window=Config.DISPATCH_COALESCE_WINDOW
+)
+dispatcher.start()
+replay_journal()
+
+# 服务端信号：订阅K线推送，用流式指标引擎生成信号（多worker部署时只有抢到锁的进程订阅）
+candle_stream = None
+if Config.STREAM_SIGNALS_ENABLED and claim_singleton(Config.LOCK_DIR, 'candle-stream'):
+    candle_stream = CandleStream(
+        SignalEngine(
+            length=Config.STREAM_LENGTH,
+            mult=Config.STREAM_MULT,
+            timeframes=Config.STREAM_TIMEFRAMES,
+            mtf_required=Config.STREAM_MTF_REQUIRED,
+            use_mtf_filter=Config.STREAM_MTF_FILTER,
+            stop_loss_pct=Config.STREAM_STOP_LOSS_PCT,
+            take_profit_pct=Config.STREAM_TAKE_PROFIT_PCT,
+            position_size_usdt=Config.STREAM_POSITION_USDT,
+            leverage=Config.STREAM_LEVERAGE,
+            max_signal_age=Config.STREAM_MAX_SIGNAL_AGE,
+            candle_capacity=Config.STREAM_CANDLE_CAPACITY
+        ),
+        okx_trader.client,
+        okx_trader.io,
+        Config.STREAM_SYMBOLS or sorted(Config.SUPPORTED_SYMBOLS),
+        on_signal=submit_stream_signal,
+        url=Config.OKX_WS_BUSINESS_URL or None,
+        warmup_bars=Config.STREAM_WARMUP_BARS
+    )
+    candle_stream.start()
+
+def _dispatcher_samples():
+    stats = dispatcher.stats()
+    return [
+        ((('state', 'queued'),), stats['queue_depth']),
+        ((('state', 'lane_backlog'),), stats['lane_backlog']),
+        ((('state', 'busy_workers'),), stats['busy_workers'])
+    ]
+
+def _signal_samples():
+    stats = dispatcher.stats()
+    samples = [((('result', key),), stats[key]) for key in ('submitted', 'completed', 'failed', 'rejected')]
+    samples.append(((('result', 'coalesced'),), stats['coalescing']['coalesced']))
+    if signal_dedupe is not None:
+        samples.append(((('result', 'duplicate'),), signal_dedupe.stats()['duplicates']))
+    return samples
+
+metrics.register_collector('signal_dispatcher_depth', 'gauge', '信号调度器队列状态', _dispatcher_samples)
+metrics.register_collector('signals_total', 'counter', '信号处理计数', _signal_samples)
+if signal_journal is not None:
+    metrics.register_collector(
+        'signal_journal_pending', 'gauge', '信号日志中未完成的信号',
+        lambda: [((), signal_journal.stats()['pending'])]
+    )
+
 @app.route('/positions', methods=['GET'])
 def get_positions():
     """获取当前持仓信息"""
@@ -289,8 +521,23 @@ def get_status():
     try:
         return jsonify({
             'server_status': 'running',
+            'worker_pid': os.getpid(),
             'okx_connection': okx_trader.check_connection(),
             'timestamp': datetime.now().isoformat(),
+            'dispatcher': dispatcher.stats(),
+            'account_state': okx_trader.state.stats(),
+            'leverage_cache': okx_trader.leverage_cache.stats(),
+            'symbols': okx_trader.symbols.stats(),
+            'dedupe': signal_dedupe.stats() if signal_dedupe is not None else None,
+            'journal': signal_journal.stats() if signal_journal is not None else None,
+            'latency': metrics.stage_summary(),
+            'traces': tracer.stats(),
+            'symbol_locks': symbol_locks.stats(),
+            'risk': okx_trader.risk.stats(),
+            'exposure': okx_trader.exposure.snapshot(),
+            'rate_limit': okx_trader.client.rate_limiter.stats() if okx_trader.client.rate_limiter else None,
+            'retry': okx_trader.client.retry.stats() if okx_trader.client.retry else None,
+            'candle_stream': candle_stream.stats() if candle_stream is not None else None,
             'config': {
                 'max_position_size': Config.MAX_POSITION_SIZE,
                 'max_leverage': Config.MAX_LEVERAGE,
@@ -301,6 +548,51 @@ def get_status():
         logger.error(f"获取状态失败: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/dispatcher', methods=['GET'])
+def get_dispatcher_stats():
+    """获取信号调度器统计（队列深度、等待时间、线程利用率）"""
+    try:
+        return jsonify({
+            'dispatcher': dispatcher.stats(),
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception as e:
+        logger.error(f"获取调度器统计失败: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus指标（分阶段延迟直方图、OKX接口耗时和错误码计数）"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/traces', methods=['GET'])
+def list_traces():
+    """
+    最近完成的trace摘要
+    ?slowest=N 返回最慢的N个，否则按 ?limit=N 返回最近的N个（默认20）
+    """
+    try:
+        slowest = request.args.get('slowest', type=int)
+        if slowest:
+            traces = tracer.slowest(slowest)
+        else:
+            traces = tracer.recent(request.args.get('limit', 20, type=int))
+        return jsonify({
+            'traces': [trace.summary() for trace in traces],
+            'stats': tracer.stats()
+        })
+    except Exception as e:
+        logger.error(f"获取trace列表失败: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/traces/<trace_id>', methods=['GET'])
+def get_trace(trace_id):
+    """单个trace的全部span（处理中的trace也可以查询）"""
+    trace = tracer.get(trace_id)
+    if trace is None:
+        return jsonify({'error': f"trace不存在或已被淘汰: {trace_id}"}), 404
+    return jsonify(trace.to_dict())
+
 @app.route('/debug-config', methods=['GET'])
 def debug_config():
     """调试配置信息（仅显示前几位，确保安全）"""
@@ -443,22 +735,22 @@ def test_raw_api():
                 'note': '直接HTTP请求异常'
             }
         
-        # 测试2: 使用OKX SDK但捕获更多信息
+        # 测试2: 使用OKX客户端但捕获更多信息
         try:
-            logger.info("测试OKX SDK详细调试")
+            logger.info("测试OKX客户端详细调试")
             
             # 临时启用详细日志
             import logging
-            okx_logger = logging.getLogger('okx')
+            okx_logger = logging.getLogger('okx_client')
             okx_logger.setLevel(logging.DEBUG)
             
-            # 创建新的handler来捕获OKX SDK日志
+            # 创建新的handler来捕获OKX客户端日志
             import io
             log_capture = io.StringIO()
             handler = logging.StreamHandler(log_capture)
             okx_logger.addHandler(handler)
             
-            # 调用SDK
+            # 调用客户端
             sdk_result = okx_trader.market_api.get_tickers(instType="SPOT")
             
             # 获取捕获的日志
@@ -468,7 +760,7 @@ def test_raw_api():
                 'success': True,
                 'result': str(sdk_result)[:500],
                 'captured_logs': captured_logs[:1000],
-                'note': 'OKX SDK调用详细调试'
+                'note': 'OKX客户端调用详细调试'
             }
             
         except Exception as e:
@@ -476,7 +768,7 @@ def test_raw_api():
                 'success': False,
                 'error': str(e),
                 'error_type': str(type(e)),
-                'note': 'OKX SDK调用失败'
+                'note': 'OKX客户端调用失败'
             }
         
         return jsonify({
@@ -605,22 +897,22 @@ def test_imports():
             results['requests'] = {'success': False, 'error': str(e)}
         
         try:
-            import okx
-            results['okx'] = {'success': True, 'version': getattr(okx, '__version__', 'unknown')}
+            import httpx
+            results['httpx'] = {'success': True, 'version': getattr(httpx, '__version__', 'unknown')}
         except Exception as e:
-            results['okx'] = {'success': False, 'error': str(e)}
+            results['httpx'] = {'success': False, 'error': str(e)}
         
         try:
-            import okx.Account as Account
-            results['okx_account'] = {'success': True}
+            import h2
+            results['h2'] = {'success': True, 'version': getattr(h2, '__version__', 'unknown')}
         except Exception as e:
-            results['okx_account'] = {'success': False, 'error': str(e)}
+            results['h2'] = {'success': False, 'error': str(e)}
         
         try:
-            import okx.MarketData as MarketData
-            results['okx_market'] = {'success': True}
+            import okx_client
+            results['okx_client'] = {'success': True}
         except Exception as e:
-            results['okx_market'] = {'success': False, 'error': str(e)}
+            results['okx_client'] = {'success': False, 'error': str(e)}
         
         return jsonify({
             'import_results': results,
@@ -815,6 +1107,17 @@ if __name__ == '__main__':
     print(f"❤️  健康检查: http://0.0.0.0:{port}/health")
     print(f"📊 状态页面: http://0.0.0.0:{port}/status")
     
+    # 收到退出信号时先落盘信号日志（Render重新部署时发送SIGTERM）
+    import signal as os_signal
+    import sys
+    
+    def handle_exit(sig, frame):
+        shutdown_server()
+        sys.exit(0)
+    
+    os_signal.signal(os_signal.SIGINT, handle_exit)
+    os_signal.signal(os_signal.SIGTERM, handle_exit)
+    
     # 启动Flask应用，适配云平台
     app.run(
         host='0.0.0.0',  # 云平台需要绑定所有接口